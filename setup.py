@@ -14,6 +14,10 @@ setup(
         "Flask==2.3.2",
         "Flask-Cors==3.0.10",
         "pysftp==0.2.9",
+        "pyarrow~=26.0",
+        "zstandard~=0.22",
+        "orjson~=3.8",
+        "pysimdjson~=7.0",
         "freezegun==1.2.2",
         "requests-mock~=1.11.0",
         "gobconfig @ git+https://github.com/Amsterdam/GOB-Config.git@v0.14.2",
@@ -0,0 +1,75 @@
+"""ESRI geometry throughput benchmark
+
+Compares the former shapely/WKT round-trip with the direct GeoJSON and WKB paths of
+gobexport.exporter.esri.create_geometry.
+
+Polygons are generated to resemble the exported collections:
+- gebieden: a small number of large polygons (thousands of vertices)
+- brk: many small parcels (tens of vertices)
+
+Usage (from the src directory):
+
+    python -m benchmarks.esri_geometry
+
+"""
+import math
+import random
+import time
+
+from osgeo import ogr
+from shapely.geometry import shape
+
+from gobexport.exporter.esri import create_geometry
+from gobexport.formatter.geometry import format_geometry
+
+SAMPLES = {
+    'gebieden': {'count': 200, 'vertices': 2_500},
+    'brk': {'count': 20_000, 'vertices': 24},
+}
+
+
+def _polygon(vertices: int) -> dict:
+    """Return a GeoJSON polygon around a random point in Amsterdam (RD)."""
+    x, y = random.uniform(110_000, 135_000), random.uniform(475_000, 495_000)
+    radius = random.uniform(10, 2_000)
+    ring = [
+        [round(x + radius * math.cos(2 * math.pi * i / vertices), 3),
+         round(y + radius * math.sin(2 * math.pi * i / vertices), 3)]
+        for i in range(vertices)
+    ]
+    return {'type': 'Polygon', 'coordinates': [ring + [ring[0]]]}
+
+
+def _wkt_roundtrip(geojson: dict):
+    """The previous path: GeoJSON to shapely to WKT (format_geometry), parsed again by OGR."""
+    return ogr.CreateGeometryFromWkt(format_geometry(geojson))
+
+
+def _measure(method, values) -> float:
+    start = time.perf_counter()
+    for value in values:
+        method(value)
+    return len(values) / (time.perf_counter() - start)
+
+
+def main():
+    random.seed(0)
+
+    for name, sample in SAMPLES.items():
+        geojsons = [_polygon(sample['vertices']) for _ in range(sample['count'])]
+        wkbs = [bytes(shape(g).wkb) for g in geojsons]
+
+        results = {
+            'wkt round-trip': _measure(_wkt_roundtrip, geojsons),
+            'geojson': _measure(create_geometry, geojsons),
+            'wkb': _measure(create_geometry, wkbs),
+        }
+
+        baseline = results['wkt round-trip']
+        print(f"{name} ({sample['count']:,} polygons, {sample['vertices']:,} vertices)")
+        for path, rate in results.items():
+            print(f"  {path:<15} {rate:>12,.0f} features/s  {rate / baseline:>5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
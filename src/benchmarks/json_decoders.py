@@ -0,0 +1,107 @@
+"""JSON decoder benchmark
+
+Compares the decoders of gobexport.utils on BRK-size NDJSON lines: the full decoder (the standard library json
+module), a full orjson decode and projected simdjson decodes of only the fields that the brk2 kadastralesubjecten
+products read and of a small selection of these fields.
+
+The lines resemble the NDJSON endpoint of the kadastrale subjecten: all attributes of the model, including the
+metadata and relations that are not exported.
+
+Usage (from the src directory):
+
+    python -m benchmarks.json_decoders
+
+"""
+import json
+import random
+import time
+
+from gobexport.exporter import CONFIG_MAPPING, product_source
+from gobexport.exporter.projection import get_source_fields
+from gobexport.utils import FULL_DECODER, MAX_PROJECTED_FIELDS, ORJSON_DECODER, ProjectedJsonDecoder, json_loads
+
+LINES = 50_000
+
+
+def _reference(i: int) -> dict:
+    return {'bronwaarde': f'NL.IMKAD.Persoon.{i}', 'identificatie': f'NL.IMKAD.Persoon.{i}', 'volgnummer': 1}
+
+
+def _address(i: int) -> dict:
+    return {
+        'openbareRuimteNaam': 'Amstel', 'huisnummer': i % 500, 'huisletter': None, 'huisnummerToevoeging': None,
+        'postcode': '1011PN', 'woonplaatsNaam': 'Amsterdam', 'adresseerbaarObject': f'0363010000{i:06}',
+    }
+
+
+def _line(i: int) -> bytes:
+    entity = {
+        'identificatie': f'NL.IMKAD.Persoon.{i}',
+        'typeSubject': random.choice(['NATUURLIJK PERSOON', 'NIET-NATUURLIJK PERSOON']),
+        'beschikkingsbevoegdheid': {'code': None, 'omschrijving': None},
+        'voornamen': 'Jan Pieter', 'voorvoegsels': 'van', 'geslachtsnaam': f'Achternaam{i}',
+        'geslacht': {'code': 'M', 'omschrijving': 'Man'},
+        'naamGebruik': {'code': 'E', 'omschrijving': 'Eigen geslachtsnaam'},
+        'voornamenPartner': None, 'voorvoegselsPartner': None, 'geslachtsnaamPartner': None,
+        'geboortedatum': '1970-01-01', 'geboorteplaats': 'Amsterdam',
+        'geboorteland': {'code': '6030', 'omschrijving': 'Nederland'},
+        'indicatieOverleden': False, 'datumOverlijden': None,
+        'landWaarnaarVertrokken': {'code': None, 'omschrijving': None},
+        'heeftBsnVoor': {'bronwaarde': f'{i:09}'}, 'heeftKvknummerVoor': None, 'heeftRsinVoor': None,
+        'rechtsvorm': {'code': None, 'omschrijving': None}, 'statutaireNaam': None, 'statutaireZetel': None,
+        'woonadres': _address(i), 'postadres': _address(i + 1),
+        'woonadresBuitenland': {'adres': None, 'woonplaats': None, 'regio': None, 'land': {'code': None}},
+        'postadresBuitenland': {'adres': None, 'woonplaats': None, 'regio': None, 'land': {'code': None}},
+        'postadresPostbus': {'postbusnummer': None, 'postcode': None, 'woonplaatsnaam': None},
+        # Attributes and relations that are not exported
+        'isVanRechten': [_reference(i * 10 + n) for n in range(random.randint(1, 10))],
+        'betrokkenPartnerVan': [_reference(i)],
+        'toestandsdatum': '2023-01-01T00:00:00', 'registratiedatum': '2023-01-01T00:00:00',
+        '_gobid': i, '_id': f'NL.IMKAD.Persoon.{i}', '_source': 'BRK', '_application': 'BRK',
+        '_source_id': f'NL.IMKAD.Persoon.{i}', '_last_event': i * 3, '_hash': f'{random.getrandbits(128):032x}',
+        '_version': '0.1', '_date_created': '2023-01-01T00:00:00', '_date_confirmed': '2023-01-01T00:00:00',
+        '_date_modified': '2023-01-01T00:00:00', '_date_deleted': None, '_expiration_date': None,
+        '_links': {'self': {'href': f'/gob/brk2/kadastralesubjecten/NL.IMKAD.Persoon.{i}/'}},
+    }
+    return json.dumps(entity).encode()
+
+
+def _measure(decode, lines: list) -> float:
+    start = time.perf_counter()
+    for line in lines:
+        decode(line)
+    duration = time.perf_counter() - start
+    return sum(len(line) for line in lines) / duration / 1_000_000
+
+
+def main():
+    random.seed(0)
+    lines = [_line(i) for i in range(LINES)]
+
+    products = CONFIG_MAPPING['brk2']['kadastralesubjecten'].products.values()
+    source = product_source(next(iter(products)))
+    fields = sorted(get_source_fields([product for product in products if product_source(product) == source]))
+    product_decoder = ProjectedJsonDecoder(fields)
+    max_decoder = ProjectedJsonDecoder(fields[:MAX_PROJECTED_FIELDS])
+    small_decoder = ProjectedJsonDecoder(fields[:3])
+
+    results = {
+        'json': lambda line: json_loads(line, FULL_DECODER),
+        'orjson': lambda line: json_loads(line, ORJSON_DECODER),
+        f'projected, {len(fields)} product fields': lambda line: json_loads(line, product_decoder),
+        f'projected, {MAX_PROJECTED_FIELDS} fields': lambda line: json_loads(line, max_decoder),
+        'projected, 3 fields': lambda line: json_loads(line, small_decoder),
+    }
+
+    print(f"{LINES:,} lines of {len(json.loads(lines[0]))} fields, "
+          f"{sum(len(line) for line in lines) // LINES:,} bytes on average")
+
+    baseline = None
+    for name, decode in results.items():
+        rate = _measure(decode, lines)
+        baseline = baseline or rate
+        print(f"  {name:<36} {rate:>8,.1f} MB/s  {rate / baseline:>5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
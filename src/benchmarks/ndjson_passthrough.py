@@ -0,0 +1,66 @@
+"""NDJSON pass-through throughput benchmark
+
+Compares the decoding path of the ndjson exporter (json_loads on every source line, json.dumps on every entity)
+with the raw pass-through path (source lines written as is).
+
+The lines resemble an enhanced view of an NDJSON endpoint (BAG verblijfsobjecten), both paths write to a
+temporary file through ndjson_exporter.
+
+Usage (from the src directory):
+
+    python -m benchmarks.ndjson_passthrough
+
+"""
+import json
+import os
+import random
+import tempfile
+import time
+
+from gobexport.exporter.ndjson import ndjson_exporter
+from gobexport.utils import json_loads
+
+LINES = 200_000
+
+
+def _line(i: int) -> bytes:
+    entity = {
+        'identificatie': f'0363010000{i:06}',
+        'volgnummer': random.randint(1, 5),
+        'registratiedatum': '2020-01-01T00:00:00',
+        'status': {'code': 1, 'omschrijving': 'Verblijfsobject in gebruik'},
+        'gebruiksdoel': [{'code': 1, 'omschrijving': 'woonfunctie'}],
+        'oppervlakte': random.randint(20, 200),
+        'heeftHoofdadres': {'identificatie': f'0363200000{i:06}', 'volgnummer': 1},
+        'ligtInBuurt': {'identificatie': '03630000000001', 'naam': 'Burgwallen-Oost'},
+        'geometrie': {'type': 'Point', 'coordinates': [random.uniform(110_000, 135_000),
+                                                       random.uniform(475_000, 495_000)]},
+    }
+    return json.dumps(entity).encode()
+
+
+def _measure(api, raw: bool, lines: list) -> float:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start = time.perf_counter()
+        ndjson_exporter(api, os.path.join(tmpdir, 'out.ndjson'), raw=raw)
+        duration = time.perf_counter() - start
+    return sum(len(line) + 1 for line in lines) / duration / 1_000_000
+
+
+def main():
+    random.seed(0)
+    lines = [_line(i) for i in range(LINES)]
+
+    results = {
+        'decode/encode': _measure((json_loads(line) for line in lines), False, lines),
+        'raw': _measure(iter(lines), True, lines),
+    }
+
+    baseline = results['decode/encode']
+    print(f"{LINES:,} lines")
+    for path, rate in results.items():
+        print(f"  {path:<15} {rate:>8,.1f} MB/s  {rate / baseline:>5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
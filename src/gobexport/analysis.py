@@ -0,0 +1,394 @@
+"""Analysis of exported files
+
+The statistics of an exported file (see gobexport.test) are calculated in one pass over its contents, which are read
+in chunks (see analyse). The chunks can be read from a file that has been downloaded, or be taken while the file is
+written, see StreamAnalysis.
+
+The exports write the statistics of each file to a manifest next to the file, together with the ETag of the file
+and the columns that have been checked for uniqueness (see get_check). The export test uses the statistics of the
+manifest instead of downloading and analysing the file, as long as the ETag of the file has not changed and the
+uniqueness of the columns of its check has been determined.
+"""
+import csv
+import hashlib
+import itertools
+import mmap
+import os
+import queue
+import re
+import threading
+from codecs import BOM_UTF8
+from collections import Counter
+from concurrent.futures import Future
+from io import BufferedReader, BytesIO, FileIO, RawIOBase, TextIOWrapper
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Union, IO
+
+import numpy as np
+
+from gobexport.csv_inspector import CSVInspector, get_lengths
+from gobexport.objectstore_client import NAME_VARIABLES
+from gobexport.product_logs import logger
+
+# The statistics manifest of a file is stored as {filename}{STATISTICS_SUFFIX}
+STATISTICS_SUFFIX = '.statistics.json'
+
+# Names of the lines that are hashed separately
+NTH = {
+    1: "first",
+    2: "second",
+    3: "third",
+    4: "fourth"
+}
+
+# read chunk size from IOstream
+READ_CHUNK_SIZE = 10_000_000
+
+# number of csv lines that are analysed at once
+LINE_BATCH_SIZE = 10_000
+
+# number of written chunks that wait to be analysed, see StreamAnalysis
+STREAM_QUEUE_SIZE = 2
+
+ENCODING = 'utf-8-sig'
+STRIP_CHARS = BOM_UTF8 + b"\t\n\r\v\f"
+
+# Runs of non ASCII bytes, the only bytes that need to be decoded to count characters
+_NON_ASCII = re.compile(b"[\x80-\xff]+")
+
+TYPE_FLAT_FILE = ("plain/text", "text/csv", "application/x-ndjson")
+TYPE_CSV = ("text/csv", )
+
+csv.field_size_limit(1_000_000)
+
+
+def get_check(checks: dict, filename: str) -> Optional[dict]:
+    """
+    Find a test specification (check) for the given filename
+
+    :param checks: all test specifications
+    :param filename: a filename, possibly containing variables
+    :return: the test specification for the given filename or None if not found
+    """
+    if checks.get(filename):
+        # Simple case, filename without variables
+        return checks[filename]
+
+    for check in checks.keys():
+        # Try variable substitution
+        pattern = re.escape(check)
+        for src, dst in NAME_VARIABLES.items():
+            pattern = pattern.replace(re.escape(src), dst)
+        if re.match(pattern, filename):
+            return checks[check]
+
+
+def _safe_divide(val1: int, val2: int) -> Union[int, float]:
+    try:
+        result = val1 / val2
+    except ZeroDivisionError:
+        return 0
+    else:
+        if result.is_integer():
+            return int(result)
+        return round(result, 4)
+
+
+class FlatfileStats:
+
+    def __init__(self):
+        self.chars = 0
+        self.lines = 0
+        self.digits = 0
+        self.alphas = 0
+        self.spaces = 0
+        self.lowers = 0
+        self.uppers = 0
+        self.empty_lines = 0
+        self.max_line = 0
+        self.min_line = 0
+        self.total_line = 0
+        self.first_10: list[bytes] = []
+        self.counter: dict[str, int] = Counter()
+        self.ascii_counts = np.zeros(128, dtype=np.int64)
+        self._tail = b""
+
+    def count_chars(self, chunk: bytes, final: bool = False):
+        """
+        Update character counts with a chunk of UTF-8 encoded text.
+        ASCII characters are counted as bytes, only runs of non ASCII bytes are decoded.
+        A run at the end of the chunk is kept until the next chunk, it can contain a split character.
+        """
+        histogram = np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256)
+        self.ascii_counts += histogram[:128]
+
+        if histogram[128:].any() or self._tail:
+            runs = _NON_ASCII.findall(self._tail + chunk)
+            self._tail = runs.pop() if runs and not final and chunk[-1] >= 0x80 else b""
+            self.counter.update(itertools.chain.from_iterable(run.decode("utf-8") for run in runs))
+
+    def calculate(self) -> dict:
+        """Return a dict of flatfile statistics for characters and lines."""
+        counts = self.counter + Counter({chr(byte): int(cnt) for byte, cnt in enumerate(self.ascii_counts) if cnt})
+
+        self.chars = sum(counts.values())
+        self.uppers = sum(cnt for char, cnt in counts.items() if char.isupper())
+        self.lowers = sum(cnt for char, cnt in counts.items() if char.islower())
+        self.digits = sum(cnt for char, cnt in counts.items() if char.isdigit())
+        self.spaces = sum(cnt for char, cnt in counts.items() if char.isspace())
+        self.alphas = self.uppers + self.lowers
+
+        return {
+            **self._hash_first_lines(),
+            **{
+                "chars": self.chars,
+                "lines": self.lines,
+                "empty_lines": self.empty_lines,
+                "max_line": self.max_line,
+                "min_line": self.min_line,
+                "avg_line": _safe_divide(self.total_line, self.lines - self.empty_lines),
+                "digits": _safe_divide(self.digits, self.chars),
+                "alphas": _safe_divide(self.alphas, self.chars),
+                "spaces": _safe_divide(self.spaces, self.chars),
+                "lowers": _safe_divide(self.lowers, self.alphas),
+                "uppers": _safe_divide(self.uppers, self.alphas)
+            }
+        }
+
+    def _hash_first_lines(self) -> dict[str, str]:
+        """
+        Return dict with hashed first N lines and first 10 lines. First line == header if present.
+        The hash should be equal for lines with different line breaks and byte order marks (if present).
+        """
+        return (
+            {f"{idx}_line": hashlib.md5(line).hexdigest() for idx, line in zip(NTH.values(), self.first_10)}
+            |
+            {"first_lines": hashlib.md5(b'\n'.join(self.first_10)).hexdigest()}
+        )
+
+    def count_lines(self, line_length: int):
+        """
+        Update line length statistics:
+        - empty
+        - maximum
+        - minimum
+        - total
+        - number of lines seen
+        """
+        self.empty_lines += line_length == 0
+        self.total_line += line_length
+
+        if (line_length and line_length < self.min_line) or self.lines == 0:
+            self.min_line = line_length
+        if line_length and line_length > self.max_line:
+            self.max_line = line_length
+
+        self.lines += 1
+
+    def count_line_lengths(self, lengths: np.ndarray):
+        """
+        Update line length statistics with the lengths of a batch of lines, as count_lines does per line.
+        """
+        if self.lines == 0 and len(lengths):
+            self.count_lines(int(lengths[0]))
+            lengths = lengths[1:]
+
+        non_empty = lengths[lengths > 0]
+        self.empty_lines += len(lengths) - len(non_empty)
+        self.total_line += int(lengths.sum())
+
+        if len(non_empty):
+            self.min_line = min(self.min_line, int(non_empty.min()))
+            self.max_line = max(self.max_line, int(non_empty.max()))
+
+        self.lines += len(lengths)
+
+
+class ScanReader(RawIOBase):
+    """
+    Read chunks of contents as a stream, in one pass.
+    Every chunk is passed to a callback as well when it is read, e.g. to count characters.
+
+    The chunks are only copied into the buffer of the reader.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], callback: Callable[[bytes], None]):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._callback = callback
+        self._chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            if (chunk := next(self._chunks, None)) is None:
+                return 0
+            if chunk:
+                self._callback(chunk)
+            self._chunk = memoryview(chunk)
+
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def read_chunks(obj: IO) -> Iterator[bytes]:
+    """
+    Read the contents of an object in chunks of READ_CHUNK_SIZE bytes.
+    Files on disk are memory mapped, objects in memory are read from the start.
+    """
+    if not isinstance(obj, FileIO):
+        obj.seek(0)
+        yield from iter(lambda: obj.read(READ_CHUNK_SIZE), b"")
+    elif size := os.fstat(obj.fileno()).st_size:  # empty files can not be mapped
+        with mmap.mmap(obj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, size, READ_CHUNK_SIZE):
+                yield mapped[offset:offset + READ_CHUNK_SIZE]
+
+
+def _split_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Split chunks into chunks of at most READ_CHUNK_SIZE bytes, larger chunks are slower to analyse.
+    """
+    for chunk in chunks:
+        for offset in range(0, len(chunk), READ_CHUNK_SIZE):
+            yield chunk[offset:offset + READ_CHUNK_SIZE]
+
+
+def _read_head(chunks: Iterator[bytes]) -> bytes:
+    """
+    Read chunks until at least the first 10,000 bytes and the first 10 lines have been read.
+    """
+    head, lines = bytearray(), 0
+    for chunk in chunks:
+        head += chunk
+        lines += chunk.count(b"\n")
+        if len(head) >= 10_000 and lines >= 10:
+            break
+    return bytes(head)
+
+
+def _read_batches(reader: Iterator[list[str]]) -> Iterator[tuple[list[list[str]], list[int]]]:
+    """
+    Read the lines of a csv reader in batches of LINE_BATCH_SIZE lines, with their line numbers.
+    """
+    lines, line_nos = [], []
+
+    for line in reader:
+        lines.append(line)
+        line_nos.append(reader.line_num)
+
+        if reader.line_num % 250_000 == 0:
+            logger.info(f"Checking lines {reader.line_num:,}")  # report status, can take some time
+
+        if len(lines) == LINE_BATCH_SIZE:
+            yield lines, line_nos
+            lines, line_nos = [], []
+
+    if lines:
+        yield lines, line_nos
+
+
+def analyse(
+    chunks: Iterable[bytes],
+    name: str,
+    content_type: str,
+    check: Optional[dict] = None,
+    tmp_dir: Optional[str] = None
+) -> dict[str, Union[str, float, int]]:
+    """
+    Return statistics for the contents of a file, in one pass over the chunks of its contents.
+    The age and the size of the file are not part of the statistics, they are taken from the objectstore.
+
+    :param chunks: contents in bytes
+    :param name: name of the file
+    :param content_type: content type of the file
+    :param check: checks to perform on csv file
+    :param tmp_dir: Temporary dir for offloading
+    :return: dict
+    """
+    is_flatfile = content_type in TYPE_FLAT_FILE
+    is_csv = content_type in TYPE_CSV or Path(name).suffix.lower() == ".csv"
+
+    chunks = _split_chunks(chunks)
+    head = _read_head(chunks)
+    analysis = {"first_bytes": hashlib.md5(head[:10_000]).hexdigest()}
+
+    if not head or not is_flatfile:
+        return analysis  # empty or binary file
+
+    stats = FlatfileStats()
+    stats.first_10 = [line.strip(STRIP_CHARS) for line in islice(BytesIO(head), 10)]
+
+    header = stats.first_10[0]
+    stats.count_lines(len(header))
+
+    # Count characters, line lengths and check csv lines in one pass over the contents, after any BOM
+    with ScanReader(itertools.chain([head.removeprefix(BOM_UTF8)], chunks), stats.count_chars) as scan:
+        reader = csv.reader(
+            TextIOWrapper(BufferedReader(scan, buffer_size=READ_CHUNK_SIZE), encoding=ENCODING),
+            delimiter=";"
+        )
+        inspector = CSVInspector(name, next(reader), check, tmp_dir)
+
+        for lines, line_nos in _read_batches(reader):
+            line_lengths, column_lengths = get_lengths(lines)
+            stats.count_line_lengths(line_lengths)
+
+            if is_csv:
+                inspector.check_lines(lines, line_nos, column_lengths)
+
+    stats.count_chars(b"", final=True)
+
+    analysis |= stats.calculate()
+    analysis |= inspector.check_uniqueness() if is_csv else {}
+    return analysis
+
+
+class StreamAnalysis:
+    """
+    Analyse the contents of a file while it is written, in a separate thread (see analyse).
+
+    The chunks that are written are analysed in the order of writing. When STREAM_QUEUE_SIZE chunks wait to be
+    analysed, writing waits until there is room. An analysis that ends early, e.g. of a binary file, keeps reading
+    the chunks, so writing never waits for it.
+    """
+
+    def __init__(self, name: str, content_type: str, check: Optional[dict] = None):
+        self._chunks = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._closed = False
+        self._result = Future()
+
+        threading.Thread(target=self._run, args=(name, content_type, check), daemon=True).start()
+
+    def _run(self, name: str, content_type: str, check: Optional[dict]):
+        chunks = iter(self._chunks.get, None)
+        try:
+            self._result.set_result(analyse(chunks, name, content_type, check))
+        except Exception as e:
+            self._result.set_exception(e)
+        finally:
+            for _ in chunks:
+                pass
+
+    def write(self, chunk: bytes):
+        self._chunks.put(chunk)
+
+    def close(self):
+        """
+        End the contents, the analysis finishes in the background.
+        """
+        if not self._closed:
+            self._closed = True
+            self._chunks.put(None)
+
+    def result(self) -> dict[str, Union[str, float, int]]:
+        """
+        End the contents and return the statistics, once they have been analysed.
+        """
+        self.close()
+        return self._result.result()
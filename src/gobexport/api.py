@@ -4,15 +4,19 @@ Encapsulates a paged API endpoint into an iterator
 
 """
 import time
+from typing import Collection, Optional
+
 import ijson
 
+from gobcore.exceptions import GOBException
+
 import gobexport.requests as requests
-from gobexport.utils import json_loads
+from gobexport.utils import get_decoder, json_loads
 
 
 class API:
 
-    def __init__(self, host, path, row_formatter=None, secure_user=None):
+    def __init__(self, host, path, row_formatter=None, secure_user=None, fields: Optional[Collection[str]] = None):
         """Constructor
 
         Lazy loading, Just register host and path and wait for the iterator to be called
@@ -20,11 +24,16 @@ class API:
 
         :param host:
         :param path:
+        :param fields: the top-level fields to decode from NDJSON lines, None to decode all fields
         """
         self.host = host
         self.path = path
         self.row_formatter = row_formatter
         self.secure_user = secure_user
+        self.decoder = get_decoder(fields)
+
+        # The page that is being read and the number of entities of the page that have been returned, see resume
+        self.position = {'path': path, 'skip': 0}
 
     def __repr__(self):
         """Representation
@@ -53,18 +62,61 @@ class API:
             print("ndjson")
             items = requests.get_stream(f'{self.host}{self.path}', secure_user=self.secure_user)
             for item in items:
-                yield self.format_item(json_loads(item))
+                yield self.format_item(json_loads(item, self.decoder))
         else:
-            while self.path is not None:
-                start = time.time()
-                response = requests.get(f'{self.host}{self.path}', secure_user=self.secure_user)
-                duration = round(time.time() - start, 2)
-                print(f"Query duration for {self.path}: {duration} secs")
-                assert response.ok, f"API Response not OK for url {self.path}"
-                data = response.json()
-                self.path = data['_links']['next']['href']
-                for entity in data['results']:
-                    yield self.format_item(entity)
+            yield from self._iter_pages()
+
+    def _iter_pages(self):
+        """Iterate over the entities of a paged endpoint, following the next links
+
+        :return:
+        """
+        skip = self.position['skip']
+        while self.path is not None:
+            self.position = {'path': self.path, 'skip': skip}
+            start = time.time()
+            response = requests.get(f'{self.host}{self.path}', secure_user=self.secure_user)
+            duration = round(time.time() - start, 2)
+            print(f"Query duration for {self.path}: {duration} secs")
+            assert response.ok, f"API Response not OK for url {self.path}"
+            data = response.json()
+            self.path = data['_links']['next']['href']
+            for entity in data['results']:
+                if skip:
+                    # Returned before the iteration was resumed
+                    skip -= 1
+                    continue
+                self.position['skip'] += 1
+                yield self.format_item(entity)
+
+    @property
+    def resumable(self) -> bool:
+        """Tells if the iteration can be resumed at a position, only paged endpoints can be resumed
+
+        :return:
+        """
+        return "stream=true" not in self.path and "ndjson=true" not in self.path
+
+    def resume(self, position: dict):
+        """Resumes the iteration at a position that has been saved during a previous iteration
+
+        :param position: the value of the position attribute
+        :return:
+        """
+        self.path = position['path']
+        self.position = dict(position)
+
+    def iter_raw(self):
+        """Iterate over the raw lines of an NDJSON endpoint
+
+        The lines are returned as bytes, without decoding or formatting them.
+
+        :return:
+        """
+        if "ndjson=true" not in self.path or self.row_formatter:
+            raise GOBException(f"Raw lines are only available for NDJSON endpoints without row formatter, {self}")
+
+        yield from requests.get_stream(f'{self.host}{self.path}', secure_user=self.secure_user)
 
     def format_item(self, item):
         if self.row_formatter:
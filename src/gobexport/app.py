@@ -11,11 +11,15 @@ from gobcore.message_broker.typing import ServiceDefinition
 from gobexport.config import GOB_EXPORT_API_PORT
 from gobexport.export import export
 from gobexport.flask_api import get_flask_app
+from gobexport.scheduler import export_catalogues
 from gobexport.test import test
 
 
 LOG_HANDLERS = [RequestsHandler(), StdoutHandler()]
 
+# The collection of an export request to export all collections of the catalogue(s), see gobexport.scheduler
+ALL_COLLECTIONS = '*'
+
 
 def assert_message_attributes(msg, attrs):
     for attr in attrs:
@@ -30,7 +34,21 @@ def handle_export_file_msg(msg):
            destination=header['destination'])
 
 
+def handle_export_catalogues_msg(msg):
+    header = msg["header"]
+    export_catalogues(catalogues=header['catalogue'].split(','),
+                      destination=header['destination'])
+
+
 def handle_export_msg(msg):
+    """Handles an export request
+
+    With collection ALL_COLLECTIONS all collections of the catalogue, or of a comma separated list of catalogues, are
+    exported.
+
+    :param msg:
+    :return:
+    """
     header = msg.get('header', {})
     assert_message_attributes(header, ["catalogue", "collection", "destination"])
 
@@ -48,7 +66,9 @@ def handle_export_msg(msg):
         'product': product,
     })
 
-    if destination in ["Objectstore", "File"]:
+    if destination in ["Objectstore", "File"] and collection == ALL_COLLECTIONS:
+        handle_export_catalogues_msg(msg)
+    elif destination in ["Objectstore", "File"]:
         handle_export_file_msg(msg)
     else:
         logger.error(f"Unrecognized destination for export {catalogue} {collection}: {destination}")
@@ -76,7 +96,7 @@ def handle_export_test_msg(msg):
         'entity': catalogue
     })
 
-    test(catalogue)
+    test(catalogue, full_analysis=header.get('full_analysis', False))
 
     summary = logger.get_summary()
     msg = {
@@ -5,7 +5,11 @@ The output of an iterable is written into a local file
 When the same iterable is requested the previous result is returned
 
 These classes eliminate duplicate API calls
+
+Buffers are stored per scope. Collections that are exported at the same time (see gobexport.scheduler) each use
+their own scope, so clearing the buffers of one collection leaves the buffers of the others intact.
 """
+import contextvars
 import os
 import shutil
 import tempfile
@@ -14,6 +18,9 @@ import json
 import functools
 import ijson
 
+# The scope of the buffers of the current context, None for the default scope
+buffer_scope = contextvars.ContextVar('buffer_scope', default=None)
+
 
 class Buffer:
 
@@ -33,7 +40,8 @@ class Buffer:
         # Store buffers in system temp dir
         dir = tempfile.gettempdir()
         # Store in a subfolder of temp dir
-        return os.path.join(dir, "buffer")
+        scope = buffer_scope.get()
+        return os.path.join(dir, f"buffer.{scope}" if scope else "buffer")
 
     @classmethod
     def _get_filename(cls, name):
@@ -0,0 +1,107 @@
+"""Export checkpoints
+
+A failed export is retried (see export._with_retries). To avoid that a retry requests and writes all rows again,
+the exporter regularly saves a checkpoint next to the file it writes: the position of the source (see the position
+attribute of API, GraphQL and GraphQLStreaming), the size of the file and the number of rows that have been written.
+A retry truncates the file to this size and continues reading the source at this position.
+
+Exports that cannot be resumed, e.g. shapefiles, compressed or encrypted files and sources that are shared with other
+products, are restarted from the beginning.
+"""
+import json
+import os
+import time
+from typing import IO
+
+from gobexport.config import EXPORT_CHECKPOINT_INTERVAL
+
+
+def _get_checkpoint_filename(file: str) -> str:
+    return f"{file}.checkpoint"
+
+
+def remove_checkpoint(file: str):
+    """Removes the checkpoint of a file, if any
+
+    :param file: the file that is exported
+    :return:
+    """
+    for filename in [_get_checkpoint_filename(file), f"{_get_checkpoint_filename(file)}.tmp"]:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+class Checkpoint:
+    """Saves and restores the progress of the export of a resumable source to a file."""
+
+    def __init__(self, file: str, source, interval: int = EXPORT_CHECKPOINT_INTERVAL):
+        """
+        :param file: the file that is exported
+        :param source: the source of the export, with a position attribute and a resume method
+        :param interval: the minimum number of seconds between two checkpoints
+        """
+        self.file = file
+        self.filename = _get_checkpoint_filename(file)
+        self.source = source
+        self.interval = interval
+
+        # The number of rows that had been written when the export was resumed
+        self.rows = 0
+        self.resumed = False
+        self.saved_at = time.time()
+
+    def due(self) -> bool:
+        """Tells if it is time to save a checkpoint
+
+        :return:
+        """
+        return time.time() - self.saved_at >= self.interval
+
+    def save(self, fp: IO, rows: int):
+        """Saves the current position of the source
+
+        All rows that have been read from the source should have been written to fp.
+
+        :param fp: the file that is written
+        :param rows: the number of rows that have been written
+        :return:
+        """
+        fp.flush()
+        checkpoint = {'position': self.source.position, 'offset': fp.tell(), 'rows': rows}
+
+        # Replace the previous checkpoint at once, an interrupted save leaves the previous checkpoint intact
+        with open(f"{self.filename}.tmp", 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(f"{self.filename}.tmp", self.filename)
+
+        self.saved_at = time.time()
+
+    def restore(self) -> bool:
+        """Restores the last checkpoint, if any
+
+        The file is truncated to the size it had at the checkpoint and the source continues at its position.
+
+        :return: True if the export is resumed
+        """
+        try:
+            with open(self.filename) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if not os.path.exists(self.file) or os.path.getsize(self.file) < checkpoint['offset']:
+            # The file does not match the checkpoint, start all over
+            return False
+
+        os.truncate(self.file, checkpoint['offset'])
+        self.source.resume(checkpoint['position'])
+        self.rows = checkpoint['rows']
+        self.resumed = True
+        return True
+
+    def clear(self):
+        """Removes the checkpoint, e.g. when the export has completed
+
+        :return:
+        """
+        remove_checkpoint(self.file)
@@ -41,6 +41,62 @@ SECURE_URL = '/gob'
 GOB_OBJECTSTORE = 'GOBObjectstore'
 BASISINFORMATIE_OBJECTSTORE = 'Basisinformatie'
 
+# Memory (bytes) that a UniqueFilter may use before it spills the values it has seen to disk
+UNIQUE_FILTER_MEMORY_BUDGET = int(os.getenv('UNIQUE_FILTER_MEMORY_BUDGET', 256 * 1024 * 1024))
+
+# Memory (bytes) that the uniqueness check of a csv file may use before it offloads the values to disk
+UNIQUE_CHECK_MEMORY_BUDGET = int(os.getenv('UNIQUE_CHECK_MEMORY_BUDGET', 256 * 1024 * 1024))
+
+# Maximum number of products of a collection that are exported at the same time
+EXPORT_PRODUCT_WORKERS = int(os.getenv('EXPORT_PRODUCT_WORKERS', 1))
+
+# Maximum number of collections that are exported at the same time by the scheduler
+EXPORT_COLLECTION_WORKERS = int(os.getenv('EXPORT_COLLECTION_WORKERS', 1))
+
+# The durations of the collection exports of the previous runs, used by the scheduler (an object in CONTAINER_BASE)
+EXPORT_DURATIONS_OBJECT = os.getenv('EXPORT_DURATIONS_OBJECT', '_state/export_durations.json')
+
+# Seconds between the checkpoints of a resumable export, 0 to disable checkpoints
+EXPORT_CHECKPOINT_INTERVAL = int(os.getenv('EXPORT_CHECKPOINT_INTERVAL', 60))
+
+# Files that are larger (bytes) are uploaded to the objectstore in segments of this size, as Static Large Objects
+OBJECTSTORE_SEGMENT_SIZE = int(os.getenv('OBJECTSTORE_SEGMENT_SIZE', 512 * 1024 * 1024))
+
+# Directory in the root of the container where the segments of Static Large Objects are stored
+OBJECTSTORE_SEGMENTS_DIR = os.getenv('OBJECTSTORE_SEGMENTS_DIR', '_segments')
+
+# Export text files directly to the objectstore, without a local file (see distributor.objectstore.ObjectstoreTarget)
+# These exports cannot be resumed from a checkpoint
+EXPORT_STREAM_TO_OBJECTSTORE = os.getenv('EXPORT_STREAM_TO_OBJECTSTORE', 'false').lower() == 'true'
+
+# Initial size (bytes) of the segments of files that are written directly to the objectstore, buffered in memory
+OBJECTSTORE_STREAM_SEGMENT_SIZE = int(os.getenv('OBJECTSTORE_STREAM_SEGMENT_SIZE', 64 * 1024 * 1024))
+
+# Maximum number of files or segments that are uploaded to the objectstore at the same time
+OBJECTSTORE_UPLOAD_WORKERS = int(os.getenv('OBJECTSTORE_UPLOAD_WORKERS', 4))
+
+# Maximum number of exported products whose files wait to be uploaded, further exports wait until there is room
+EXPORT_UPLOAD_QUEUE_SIZE = int(os.getenv('EXPORT_UPLOAD_QUEUE_SIZE', 2))
+
+# Maximum number of files that are downloaded and analysed at the same time by the export test
+EXPORT_TEST_WORKERS = int(os.getenv('EXPORT_TEST_WORKERS', 2))
+
+# Write the statistics of each exported file to a manifest next to the file (see gobexport.analysis)
+# Local files are read again to be analysed after they have been uploaded, one file at a time
+EXPORT_STATISTICS_MANIFEST = os.getenv('EXPORT_STATISTICS_MANIFEST', 'false').lower() == 'true'
+
+# Download and analyse all files in the export test, also the files that have an up to date statistics manifest
+EXPORT_TEST_FULL_ANALYSIS = os.getenv('EXPORT_TEST_FULL_ANALYSIS', 'false').lower() == 'true'
+
+# Maximum number of parts of a file that are downloaded from the objectstore at the same time
+OBJECTSTORE_DOWNLOAD_WORKERS = int(os.getenv('OBJECTSTORE_DOWNLOAD_WORKERS', 4))
+
+# Seconds that a listing of the objectstore is cached, writes through the objectstore client invalidate it earlier
+OBJECTSTORE_LISTING_TTL = int(os.getenv('OBJECTSTORE_LISTING_TTL', 300))
+
+# Number of times the upload of a segment is tried
+OBJECTSTORE_SEGMENT_TRIES = int(os.getenv('OBJECTSTORE_SEGMENT_TRIES', 3))
+
 GOB_EXPORT_API_PORT = os.getenv('GOB_EXPORT_API_PORT', 8168)
 API_BASE_PATH = os.getenv("BASE_PATH", default="")
 
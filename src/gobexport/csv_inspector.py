@@ -1,15 +1,164 @@
 import shutil
-from subprocess import Popen, PIPE
+import tempfile
 from collections import defaultdict
 from functools import cache
-from io import StringIO
-from itertools import islice
+from itertools import chain, islice
 
 from pathlib import Path
-from typing import Optional, Iterator
-import re
+from typing import Iterator, Optional
 
-from gobcore.logging.logger import logger
+import numpy as np
+
+from gobexport.config import UNIQUE_CHECK_MEMORY_BUDGET
+from gobexport.product_logs import logger
+
+
+def get_lengths(lines: list[list[str]]) -> tuple[np.ndarray, dict[int, np.ndarray]]:
+    """
+    Return the lengths of a batch of split lines and of their values.
+
+    The line lengths are the sums of the value lengths, in the order of the lines.
+    The value lengths are grouped by the number of values per line, as a matrix (lines x columns).
+
+    :param lines:
+    :return: line lengths, value lengths per number of columns
+    """
+    widths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+    lengths = np.fromiter(map(len, chain.from_iterable(lines)), dtype=np.int64, count=int(widths.sum()))
+
+    ends = np.cumsum(widths)
+    starts = ends - widths
+    totals = np.concatenate(([0], np.cumsum(lengths)))
+
+    return totals[ends] - totals[starts], {
+        int(width): lengths[starts[widths == width, None] + np.arange(width)]
+        for width in np.unique(widths) if width
+    }
+
+
+class DuplicateFinder:
+    """
+    Find the duplicate values of a column combination, with the numbers of the lines they are on.
+
+    Values are collected in batches. Per batch the values are encoded into one block of bytes and described by
+    fixed-width records: a 64-bit hash, the line number and the position of the value in the blocks.
+    When the batches use more memory than the budget, the blocks are appended to a file and the records to
+    files per partition (by hash), in a (temporary) dir.
+
+    Duplicates are found per partition: only the values of records with a hash that occurs more than once are
+    compared, so hash collisions are never reported.
+    """
+
+    BATCH_SIZE = 100_000
+    PARTITIONS = 64
+    DTYPE = np.dtype([("hash", "<u8"), ("line_no", "<u8"), ("offset", "<u8"), ("length", "<u4")])
+
+    def __init__(self, tmp_dir: str, memory_budget: int):
+        self.tmp_dir = tmp_dir
+        self.memory_budget = memory_budget
+
+        self._values = []
+        self._line_nos = []
+
+        self._batches: list[tuple[np.ndarray, bytes]] = []
+        self._nbytes = 0
+        self._size = 0  # size of all blocks
+        self._dir = None
+
+    def add(self, value: str, line_no: int):
+        self._values.append(value)
+        self._line_nos.append(line_no)
+
+        if len(self._values) == self.BATCH_SIZE:
+            self._add_batch()
+
+    def _add_batch(self):
+        encoded = [value.encode("utf-8", "surrogatepass") for value in self._values]
+        lengths = np.fromiter(map(len, encoded), dtype=np.uint64, count=len(encoded))
+
+        records = np.empty(len(encoded), dtype=self.DTYPE)
+        # hashes are only compared within the process, the builtin hash suffices
+        records["hash"] = np.fromiter(map(hash, encoded), dtype=np.int64, count=len(encoded)).view(np.uint64)
+        records["line_no"] = self._line_nos
+        records["offset"] = self._size + np.cumsum(lengths) - lengths
+        records["length"] = lengths
+
+        block = b"".join(encoded)
+        self._batches.append((records, block))
+        self._size += len(block)
+        self._nbytes += records.nbytes + len(block)
+
+        self._values = []
+        self._line_nos = []
+
+        if self._nbytes > self.memory_budget:
+            self._spill()
+
+    def _get_records(self) -> np.ndarray:
+        return np.concatenate([records for records, _ in self._batches] or [np.empty(0, dtype=self.DTYPE)])
+
+    def _get_path(self, name: str) -> Path:
+        return Path(self._dir, name)
+
+    def _spill(self):
+        """Append the batches to the files on disk."""
+        self._dir = self._dir or tempfile.mkdtemp(dir=self.tmp_dir)
+
+        with open(self._get_path("values"), mode="ab") as f:
+            f.writelines(block for _, block in self._batches)
+
+        records = self._get_records()
+        records = records[np.argsort(records["hash"] % self.PARTITIONS, kind="stable")]
+        bounds = np.searchsorted(records["hash"] % self.PARTITIONS, np.arange(self.PARTITIONS + 1))
+
+        for partition in range(self.PARTITIONS):
+            with open(self._get_path(f"{partition}.records"), mode="ab") as f:
+                f.write(records[bounds[partition]:bounds[partition + 1]].tobytes())
+
+        self._batches = []
+        self._nbytes = 0
+
+    def _get_partitions(self) -> Iterator[np.ndarray]:
+        if self._dir is None:
+            yield self._get_records()
+        else:
+            for partition in range(self.PARTITIONS):
+                yield np.fromfile(self._get_path(f"{partition}.records"), dtype=self.DTYPE)
+
+    @staticmethod
+    def _get_candidates(records: np.ndarray) -> np.ndarray:
+        """Return the records of which the hash occurs more than once."""
+        _, inverse, counts = np.unique(records["hash"], return_inverse=True, return_counts=True)
+        return records[counts[inverse] > 1]
+
+    def get_duplicates(self) -> dict[str, list[int]]:
+        """
+        Return the duplicate values and their line numbers.
+
+        The values and their line numbers are in the order that `sort` would output the lines <lineno> <value>.
+        """
+        if self._values:
+            self._add_batch()
+        if self._dir:
+            self._spill()
+
+        values = np.memmap(self._get_path("values"), dtype=np.uint8, mode="r") if self._dir and self._size else \
+            b"".join(block for _, block in self._batches)
+
+        line_nos = defaultdict(list)
+        for records in self._get_partitions():
+            candidates = self._get_candidates(records)
+            for line_no, offset, length in zip(candidates["line_no"].tolist(), candidates["offset"].tolist(),
+                                               candidates["length"].tolist()):
+                line_nos[bytes(values[offset:offset + length])].append(line_no)
+
+        if self._dir:
+            del values
+            shutil.rmtree(self._dir)
+
+        duplicates = {value.decode("utf-8", "surrogatepass"): lines for value, lines in line_nos.items()
+                      if len(lines) > 1}
+        return {value: sorted(duplicates[value], key=str) for value in sorted(duplicates)}
 
 
 class CSVInspector:
@@ -21,20 +170,21 @@ class CSVInspector:
 
     Usage:
         Initialize a instance with the filename, header checks and a (temporary) dir.
-        Iterate over the lines by calling check_line(line, line_no).
+        Iterate over the lines by calling check_line(line, line_no), or over batches of lines with check_lines.
         Call check_uniqueness() on the instance to return a dict with statistics.
 
     Note:
         The instance needs a storage for all the values and linenumbers to check, which can be all values from all
         columns.
-        This is done by offloading the data to temporary files per column combination.
-        The files are streamed to `sort` and `uniq` and the output with non-uniques is used again.
+        This is done by a DuplicateFinder per column combination, that stores hashes of the values compactly and
+        offloads them to temporary files when the memory budget is exceeded.
         If the csv file is very wide and long this way prevents out of memory errors.
     """
 
     MAX_WARNINGS = 25
 
-    def __init__(self, filename: str, header: list[str], check: Optional[dict], tmp_dir: str):
+    def __init__(self, filename: str, header: list[str], check: Optional[dict], tmp_dir: str,
+                 memory_budget: int = UNIQUE_CHECK_MEMORY_BUDGET):
         self.check = check or {}
         self.filename = filename
 
@@ -51,8 +201,10 @@ class CSVInspector:
         # use existing temporary dir, caller is responsible for cleaning up
         self.tmp_dir = tmp_dir
 
-        # Use StringIO as cache for writing to disk per key
-        self._write_cache = {key: StringIO("") for key in self.unique_cols}
+        # Find duplicates per key, the column combinations share the memory budget
+        self._finders = {
+            key: DuplicateFinder(tmp_dir, memory_budget // len(self.unique_cols)) for key in self.unique_cols
+        }
 
         self._log_intro()
 
@@ -78,47 +230,12 @@ class CSVInspector:
             unique_cols = ", ".join([cols for cols in self.unique_cols.keys()])
             logger.info(f"Checking {self.filename} for unique column values in columns {unique_cols}")
 
-    @staticmethod
-    def _get_duplicates(path: Path) -> Iterator[str]:
-        """
-        Return duplicate values from file in `path`.
-        lines in `path` require format: <lineno><space><value>\n
-        """
-        # uniq requires sorted data, sort on the second column
-        run_sort = [shutil.which("sort"), "-k2,2", path]
-
-        # pipe stream to uniq, check for duplicates on the second column (--skip-fields=1)
-        # only keep the duplicates (--all-repeated)
-        run_uniq = [shutil.which("uniq"), "--all-repeated", "--skip-fields=1"]
-
-        with (
-            Popen(run_sort, stdout=PIPE) as sort_process,
-            Popen(run_uniq, stdin=sort_process.stdout, stdout=PIPE, text=True) as uniq_process
-        ):
-            yield from uniq_process.stdout
-
-    def _get_path_for_key(self, key: str) -> Path:
-        """Return path for `key` with only alphanum and commas."""
-        return Path(self.tmp_dir, re.sub(r"[^\w,]+", "", key))
-
-    def _offload_cache(self, key: str):
-        """Write StringIO object for `key` to disk in tmp_dir."""
-        with self._write_cache[key] as src, open(self._get_path_for_key(key), mode="w") as dst:
-            src.seek(0)
-            shutil.copyfileobj(src, dst)
-
     def _get_non_uniques(self) -> dict[str, dict[str, list]]:
-        """Filters unique values file on values that occur in more than one line."""
-        non_unique_values = {uniques: defaultdict(list) for uniques in self.unique_cols.keys()}
-
-        for key in self.unique_cols:
-            self._offload_cache(key)
-
-            for line in self._get_duplicates(self._get_path_for_key(key)):
-                line_no, value = line.split()
-                non_unique_values[key][value].append(line_no)
-
-        return non_unique_values
+        """Returns the values that occur in more than one line, with the line numbers."""
+        return {
+            key: {value: [str(line_no) for line_no in line_nos] for value, line_nos in finder.get_duplicates().items()}
+            for key, finder in self._finders.items()
+        }
 
     def check_uniqueness(self):
         """
@@ -160,48 +277,62 @@ class CSVInspector:
         """
         Check the column lengths
 
+        :param values:
+        :return:
+        """
+        self._check_column_lengths(get_lengths([values])[1])
+
+    def _check_column_lengths(self, column_lengths: dict[int, np.ndarray]):
+        """
+        Check the column lengths of a batch of lines, as returned by get_lengths
+
         Why min and max per column?
         Suppose you want to assure that a column is either 3 or 8 characters long, but not 5
         Then specify that min is between 3 and 3 and max is between 8 and 8
         If any column should ever have length 5 the constraint is violated
 
-        :param values:
+        :param column_lengths:
         :return:
         """
         cols = self.cols
-        result = {}
-        minlen_str = self.cols_min_len(len(values))  # cached, called many times with same value
-        maxlen_str = self.cols_max_len(len(values))
-
-        for i, column in enumerate(values):
-            length = len(column)
-
-            try:
-                if length < cols[minlen_str[i]]:
-                    result[minlen_str[i]] = length
-                elif length > cols[maxlen_str[i]]:
-                    result[maxlen_str[i]] = length
-            except KeyError:
-                # The first time we get here, the key is not there
-                result[minlen_str[i]] = length
-                result[maxlen_str[i]] = length
-
-        if result:
-            cols.update(result)  # only update if we have to
+
+        for width, lengths in column_lengths.items():
+            minlen_str = self.cols_min_len(width)  # cached, called many times with same value
+            maxlen_str = self.cols_max_len(width)
+
+            for i, (min_length, max_length) in enumerate(zip(lengths.min(axis=0).tolist(),
+                                                             lengths.max(axis=0).tolist())):
+                # The first time we get here, the keys are not there
+                cols[minlen_str[i]] = min(cols.get(minlen_str[i], min_length), min_length)
+                cols[maxlen_str[i]] = max(cols.get(maxlen_str[i], max_length), max_length)
 
     def _collect_values_for_uniquess_check(self, values: list[str], line_no: int):
         """
-        Saves the values for the uniqueness check in a StringIO structure.
+        Saves the values for the uniqueness check in a DuplicateFinder per column combination.
 
         :param values: values to combine into one
         :param line_no: line number to add
         :return:
         """
         for key, col_idxs in self.unique_cols.items():
-            value = f"{line_no} {'.'.join(values[col_idx - 1] for col_idx in col_idxs)}\n"
-            self._write_cache[key].write(value)
+            self._finders[key].add('.'.join(values[col_idx - 1] for col_idx in col_idxs), line_no)
 
     def check_line(self, values: list[str], line_no: int):
         """Perform checks per split line."""
         self._collect_values_for_uniquess_check(values, line_no)
         self._check_lengths(values)
+
+    def check_lines(self, lines: list[list[str]], line_nos: list[int], column_lengths: dict[int, np.ndarray]):
+        """
+        Perform checks on a batch of split lines.
+
+        :param lines:
+        :param line_nos: the line numbers of the lines
+        :param column_lengths: the value lengths of the lines, see get_lengths
+        :return:
+        """
+        if self.unique_cols:
+            for values, line_no in zip(lines, line_nos):
+                self._collect_values_for_uniquess_check(values, line_no)
+
+        self._check_column_lengths(column_lengths)
@@ -1,9 +1,49 @@
+"""Objectstore distributor
+
+Small files are uploaded as single objects, at most OBJECTSTORE_UPLOAD_WORKERS at the same time. Files that are
+larger than OBJECTSTORE_SEGMENT_SIZE are uploaded as Swift Static Large Objects: the file is uploaded in segments,
+which are uploaded in parallel, and a manifest that lists the segments is stored under the name of the file.
+
+The segments are stored apart from the files, in OBJECTSTORE_SEGMENTS_DIR in the root of the container (see
+_get_segment_location), so they are not listed with the files.
+
+The MD5 checksum of each segment is compared with the ETag that the objectstore returns for it. A segment that fails
+to upload, or that arrives corrupted, is uploaded again without starting the upload of the file over.
+
+Exporters can also write directly to the objectstore, without a local file, see ObjectstoreTarget.
+"""
+import copy
+import io
+import json
+import math
+import os
+import threading
+import uuid
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import BinaryIO, Callable, Optional
+
 import swiftclient
+from swiftclient.utils import LengthWrapper
 
 from gobcore.exceptions import GOBException
-
 from gobcore.datastore.objectstore import put_object
 
+from gobexport.config import (
+    OBJECTSTORE_SEGMENT_SIZE,
+    OBJECTSTORE_SEGMENT_TRIES,
+    OBJECTSTORE_SEGMENTS_DIR,
+    OBJECTSTORE_STREAM_SEGMENT_SIZE,
+    OBJECTSTORE_UPLOAD_WORKERS,
+)
+from gobexport.product_logs import logger
+
+# Maximum number of segments of a Static Large Object (default of the Swift SLO middleware)
+MAX_SEGMENTS = 1000
+
+# The connections of the current thread, by the connection they are a copy of
+_local = threading.local()
+
 
 def distribute_to_objectstore(connection, container, object_name, contents, content_type):
     """Distribute to the objectstore
@@ -20,3 +60,371 @@ def distribute_to_objectstore(connection, container, object_name, contents, cont
         put_object(connection, container, object_name, contents=contents, content_type=content_type)
     except swiftclient.exceptions.ClientException as e:
         raise GOBException(e)
+
+
+def _get_thread_connection(connection):
+    """Returns the connection to use in the current thread, swiftclient connections are not thread safe
+
+    The connection is copied once per thread. The copy shares the authentication (url and token) of the connection,
+    but opens its own http connection.
+
+    :param connection:
+    :return:
+    """
+    connections = _local.__dict__.setdefault('connections', weakref.WeakKeyDictionary())
+    if connection not in connections:
+        thread_connection = copy.copy(connection)
+        thread_connection.http_conn = None
+        connections[connection] = thread_connection
+    return connections[connection]
+
+
+def _put_segment(connection, container: str, segment_name: str, fp: BinaryIO, size: int) -> dict:
+    """Uploads the next size bytes of fp as a segment, returns its entry in the manifest of the Static Large Object
+
+    :param connection:
+    :param container:
+    :param segment_name: The name of the segment object
+    :param fp: The seekable binary file, at the start of the segment
+    :param size: The size of the segment
+    :return:
+    """
+    start = fp.tell()
+    for tries_left in reversed(range(OBJECTSTORE_SEGMENT_TRIES)):
+        fp.seek(start)
+        contents = LengthWrapper(fp, size, md5=True)
+        try:
+            etag = _get_thread_connection(connection).put_object(container, segment_name, contents,
+                                                                 content_length=size)
+        except swiftclient.exceptions.ClientException as e:
+            error = str(e)
+        else:
+            if etag == contents.get_md5sum():
+                return {'path': f"/{container}/{segment_name}", 'etag': etag, 'size_bytes': size}
+            error = f"checksum {contents.get_md5sum()} does not match ETag {etag}"
+
+        if tries_left:
+            logger.warning(f"Upload of segment {segment_name} failed: {error}, retries left: {tries_left}")
+
+    raise GOBException(f"Upload of segment {segment_name} failed: {error}")
+
+
+def _upload_segment(connection, container: str, segment_name: str, filename: str, offset: int, size: int) -> dict:
+    """Uploads a segment of a file, returns its entry in the manifest of the Static Large Object
+
+    :param connection:
+    :param container:
+    :param segment_name: The name of the segment object
+    :param filename: The local file
+    :param offset: The position of the segment in the file
+    :param size: The size of the segment
+    :return:
+    """
+    with open(filename, 'rb') as fp:
+        fp.seek(offset)
+        return _put_segment(connection, container, segment_name, fp, size)
+
+
+def _put_manifest(connection, container: str, object_name: str, manifest: list[dict], content_type: str):
+    try:
+        connection.put_object(container, object_name, json.dumps(manifest), content_type=content_type,
+                              query_string='multipart-manifest=put')
+    except swiftclient.exceptions.ClientException as e:
+        raise GOBException(e)
+
+
+def _get_segment_location(container: str, object_name: str) -> tuple[str, str]:
+    """Returns the container and the name prefix of the segments of a new upload of an object
+
+    The segments of each upload are stored under a new prefix in OBJECTSTORE_SEGMENTS_DIR, in the root of the
+    container: {OBJECTSTORE_SEGMENTS_DIR}/{path of the object}/{upload id}/
+
+    :param container: The name of the container, which can include a path, e.g. development/_tmp/catalogue/
+    :param object_name:
+    :return:
+    """
+    root, _, path = container.partition('/')
+    parts = [OBJECTSTORE_SEGMENTS_DIR, path.strip('/'), object_name, uuid.uuid4().hex]
+    return root, '/'.join(part for part in parts if part) + '/'
+
+
+def _get_segments(size: int) -> list[tuple[int, int]]:
+    """Returns the offset and the size of the segments of a file
+
+    :param size: The size of the file
+    :return:
+    """
+    segment_size = max(OBJECTSTORE_SEGMENT_SIZE, math.ceil(size / MAX_SEGMENTS))
+    return [(offset, min(segment_size, size - offset)) for offset in range(0, size, segment_size)]
+
+
+def distribute_segmented(connection, container: str, object_name: str, filename: str, content_type: str):
+    """Distribute a file to the objectstore as a Static Large Object
+
+    The segments of each upload are stored under a new prefix, so the current version of the object can be read
+    until it is replaced by the manifest. Its segments are deleted afterwards, as are the segments of a failed upload.
+
+    :param connection:
+    :param container: The name of the container
+    :param object_name: The filename of the object on the objectstore
+    :param filename: The local file
+    :param content_type:
+    :return:
+    """
+    segments = _get_segments(os.path.getsize(filename))
+    segment_container, segment_prefix = _get_segment_location(container, object_name)
+    logger.info(f"Upload {object_name} in {len(segments)} segments")
+
+    with ThreadPoolExecutor(max_workers=OBJECTSTORE_UPLOAD_WORKERS) as pool:
+        futures = [pool.submit(_upload_segment, connection, segment_container, f"{segment_prefix}{index:08d}",
+                               filename, offset, size)
+                   for index, (offset, size) in enumerate(segments)]
+
+    try:
+        previous_segments = _get_segment_paths(connection, container, object_name)
+        _put_manifest(connection, container, object_name, [future.result() for future in futures], content_type)
+    except Exception:
+        _delete_segments(connection, [future.result()['path'] for future in futures if not future.exception()])
+        raise
+
+    _delete_segments(connection, previous_segments)
+
+
+def _distribute_file(connection, container: str, file: dict):
+    with open(file['temp_location'], 'rb') as fp:
+        distribute_to_objectstore(_get_thread_connection(connection), container, file['distribution'], fp,
+                                  file['mime_type'])
+
+
+def _as_gob_exception(error: Optional[Exception]) -> Optional[GOBException]:
+    if error is None or isinstance(error, GOBException):
+        return error
+    return GOBException(f"{type(error).__name__}: {str(error)}")
+
+
+def distribute_files(connection, container: str, files: list[dict]) -> list[Optional[Exception]]:
+    """Distribute local files to the objectstore
+
+    Files up to OBJECTSTORE_SEGMENT_SIZE, like the extra files of a shapefile, are uploaded concurrently by a pool
+    of OBJECTSTORE_UPLOAD_WORKERS threads. Meanwhile the larger files are uploaded one by one, in segments.
+    A file that fails to upload does not affect the upload of the other files, its error is returned as a
+    GOBException.
+
+    :param connection:
+    :param container: The name of the container
+    :param files: The files, with the temp_location, distribution and mime_type of each file
+    :return: The error of each file, None if the file has been distributed
+    """
+    errors = [None] * len(files)
+    with ThreadPoolExecutor(max_workers=OBJECTSTORE_UPLOAD_WORKERS) as pool:
+        futures = {index: pool.submit(_distribute_file, connection, container, file)
+                   for index, file in enumerate(files)
+                   if os.path.isfile(file['temp_location'])
+                   and os.path.getsize(file['temp_location']) <= OBJECTSTORE_SEGMENT_SIZE}
+
+        for index, file in enumerate(files):
+            if index not in futures:
+                try:
+                    distribute_segmented(connection, container, file['distribution'], file['temp_location'],
+                                         file['mime_type'])
+                except Exception as e:
+                    errors[index] = _as_gob_exception(e)
+
+        for index, future in futures.items():
+            errors[index] = _as_gob_exception(future.exception())
+    return errors
+
+
+def _get_stream_segment_size(index: int) -> int:
+    """Returns the size of a segment of a file that is written to the objectstore
+
+    The size of the file is not known in advance, so the segment size doubles every quarter of MAX_SEGMENTS.
+
+    :param index: The index of the segment
+    :return:
+    """
+    return OBJECTSTORE_STREAM_SEGMENT_SIZE * 2 ** (index // (MAX_SEGMENTS // 4))
+
+
+def _get_segment_paths(connection, container: str, object_name: str) -> list[str]:
+    """Returns the paths of the segments of an object, none if it is not a Static Large Object or does not exist
+
+    :param connection:
+    :param container:
+    :param object_name:
+    :return:
+    """
+    try:
+        headers = connection.head_object(container, object_name)
+        if headers.get('x-static-large-object', '').lower() != 'true':
+            return []
+        _, manifest = connection.get_object(container, object_name, query_string='multipart-manifest=get')
+    except swiftclient.exceptions.ClientException as e:
+        if e.http_status == 404:
+            return []
+        raise GOBException(e)
+    return [segment['name'] for segment in json.loads(manifest)]
+
+
+def _delete_segments(connection, paths: list[str]):
+    """Deletes segments, a segment that cannot be deleted is left behind
+
+    :param connection:
+    :param paths: The paths of the segments, /{container}/{segment_name}
+    :return:
+    """
+    for path in paths:
+        container, _, segment_name = path.lstrip('/').partition('/')
+        try:
+            connection.delete_object(container, segment_name)
+        except swiftclient.exceptions.ClientException as e:
+            logger.warning(f"Segment {path} could not be deleted: {str(e)}")
+
+
+def delete_segments(connection, container: str, object_name: str):
+    """Deletes the segments of an object if it is a Static Large Object, call it before the object is deleted
+
+    :param connection:
+    :param container:
+    :param object_name:
+    :return:
+    """
+    _delete_segments(connection, _get_segment_paths(connection, container, object_name))
+
+
+class ObjectstoreWriter(io.RawIOBase):
+    """Binary stream that uploads all data that is written to it to the objectstore, in segments
+
+    Each segment is buffered in memory and uploaded as soon as it is full, while the next segment is written. At most
+    OBJECTSTORE_UPLOAD_WORKERS segments are uploaded at the same time, writing waits until there is room. The last
+    segment is uploaded when the stream is closed, after which manifest lists the segments.
+
+    Each segment is passed to on_segment as well, if it is set, e.g. to analyse the data while it is written.
+    """
+
+    def __init__(self, connection, container: str, segment_prefix: str):
+        self.connection = connection
+        self.container = container
+        self.segment_prefix = segment_prefix
+
+        # The paths of the segments that are uploaded, and their manifest once the stream has been closed
+        self.segments = []
+        self.manifest = None
+        self.on_segment: Optional[Callable[[bytes], None]] = None
+
+        self._buffer = bytearray()
+        self._position = 0
+        self._executor = ThreadPoolExecutor(OBJECTSTORE_UPLOAD_WORKERS)
+        self._futures = []
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, b):
+        self._buffer += b
+        self._position += len(b)
+
+        while len(self._buffer) >= (size := _get_stream_segment_size(len(self._futures))):
+            self._upload(bytes(self._buffer[:size]))
+            del self._buffer[:size]
+        return len(b)
+
+    def _upload(self, segment: bytes):
+        pending = [future for future in self._futures if not future.done()]
+        if len(pending) >= OBJECTSTORE_UPLOAD_WORKERS:
+            wait(pending, return_when=FIRST_COMPLETED)
+
+        # Stop writing as soon as a segment has failed to upload
+        for future in self._futures:
+            if future.done() and future.exception():
+                raise future.exception()
+
+        if self.on_segment is not None:
+            self.on_segment(segment)
+
+        segment_name = f"{self.segment_prefix}{len(self._futures):08d}"
+        self.segments.append(f"/{self.container}/{segment_name}")
+        self._futures.append(self._executor.submit(_put_segment, self.connection, self.container, segment_name,
+                                                   io.BytesIO(segment), len(segment)))
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            if self._buffer:
+                self._upload(bytes(self._buffer))
+                self._buffer.clear()
+            self.manifest = [future.result() for future in self._futures]
+        finally:
+            self._executor.shutdown()
+            super().close()
+
+
+class ObjectstoreTarget(os.PathLike):
+    """An object on the objectstore that an exporter writes to directly, instead of to a local file
+
+    Text exporters open the target like a file, see gobexport.exporter.compression.open_file. The data is uploaded in
+    segments while it is written (see ObjectstoreWriter). The object is only created or replaced by the Static Large
+    Object of the segments when the target is committed, after the export has succeeded.
+
+    The segments of each write are stored under a new prefix, so the previous version of the object can be read until
+    it is replaced. Its segments are deleted afterwards, as are the segments of a write that is not committed.
+    """
+
+    def __init__(self, connection, container: str, object_name: str, content_type: str):
+        self.connection = connection
+        self.container = container
+        self.object_name = object_name
+        self.content_type = content_type
+
+        self._writer = None
+
+    def __fspath__(self):
+        return self.object_name
+
+    def open(self, mode: str = 'w') -> ObjectstoreWriter:
+        """Opens the target for writing, discards any previous write that has not been committed
+
+        :param mode: 'w', objects on the objectstore cannot be appended to
+        :return:
+        """
+        if mode != 'w':
+            raise GOBException(f"Appending to {self.object_name} on the objectstore is not supported")
+
+        self.discard()
+        self._writer = ObjectstoreWriter(self.connection, *_get_segment_location(self.container, self.object_name))
+        return self._writer
+
+    def commit(self):
+        """Creates or replaces the object by the data that has been written
+
+        :return:
+        """
+        if self._writer is None or self._writer.manifest is None:
+            raise GOBException(f"{self.object_name} has not been written")
+
+        connection = _get_thread_connection(self.connection)
+        previous_segments = _get_segment_paths(connection, self.container, self.object_name)
+
+        if manifest := self._writer.manifest:
+            _put_manifest(connection, self.container, self.object_name, manifest, self.content_type)
+        else:
+            # The segments of a Static Large Object cannot be empty
+            distribute_to_objectstore(connection, self.container, self.object_name, b'', self.content_type)
+        logger.info(f"Uploaded {self.object_name} in {len(manifest)} segments")
+
+        self._writer = None
+        _delete_segments(connection, previous_segments)
+
+    def discard(self):
+        """Deletes the segments that have been written, but not committed
+
+        :return:
+        """
+        if self._writer is not None:
+            _delete_segments(_get_thread_connection(self.connection), self._writer.segments)
+            self._writer = None
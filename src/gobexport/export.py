@@ -3,24 +3,41 @@
 This module contains the export entries for the meetbouten catalog
 
 """
+import contextlib
+import json
 import os
+import queue
 import tempfile
+import threading
 import time
 import sys
 import traceback
 import re
-
-from gobcore.exceptions import GOBException
-from gobcore.logging.logger import logger
-from gobcore.datastore.factory import DatastoreFactory
-from gobcore.datastore.objectstore import ObjectDatastore, delete_object, get_full_container_list
-from gobconfig.datastore.config import get_datastore_config
-
-from gobexport.config import get_host, CONTAINER_BASE, EXPORT_DIR, GOB_OBJECTSTORE
-from gobexport.distributor.objectstore import distribute_to_objectstore
-from gobexport.exporter import CONFIG_MAPPING, export_to_file, product_source
+from collections import defaultdict
+from io import FileIO
+from typing import Optional, Union
+
+from gobexport.analysis import STATISTICS_SUFFIX, StreamAnalysis, analyse, get_check, read_chunks
+from gobexport.config import (
+    get_host,
+    CONTAINER_BASE,
+    EXPORT_DIR,
+    EXPORT_PRODUCT_WORKERS,
+    EXPORT_STATISTICS_MANIFEST,
+    EXPORT_STREAM_TO_OBJECTSTORE,
+    EXPORT_UPLOAD_QUEUE_SIZE,
+    GOB_OBJECTSTORE,
+)
+from gobexport.distributor.objectstore import ObjectstoreTarget, ObjectstoreWriter, delete_segments, distribute_files
+from gobexport.exporter import CONFIG_MAPPING, STREAMING_EXPORTERS, export_to_file, product_source
+from gobexport.exporter.compression import compressed_filename, compressed_mime_type, open_file
+from gobexport.exporter.projection import get_source_fields
+from gobexport.objectstore_client import ObjectstoreClient, get_client
 from gobexport.buffered_iterable import with_buffered_iterable
-from gobexport.utils import resolve_config_filenames
+from gobexport.checkpoint import remove_checkpoint
+from gobexport.parallel import export_groups, get_product_groups
+from gobexport.product_logs import get_log_capture, logger, run_with_log_capture
+from gobexport.utils import json_loads, resolve_config_filenames
 
 _MAX_TRIES = 3          # Default number of times to try the export
 _RETRY_TIMEOUT = 300    # Default seconds between consecutive retries
@@ -72,17 +89,363 @@ def _with_retries(method, max_tries=_MAX_TRIES, retry_timeout=_RETRY_TIMEOUT, ex
             time.sleep(retry_timeout)
 
 
-def _append_to_file(src_file: str, dst_file: str):
+def _append_to_file(src_file: str, dst_file: str, compression: str = None):
     """Appends src_file to dst_file
 
     :param src_file:
     :param dst_file:
+    :param compression: the compression of both files, or None
     :return:
     """
-    with open(dst_file, 'a') as dst, open(src_file, 'r') as src:
+    with open_file(dst_file, 'a', compression) as dst, open_file(src_file, 'r', compression) as src:
         dst.write(src.read())
 
 
+def _get_product_files(product: dict, results_file: Union[str, ObjectstoreTarget]) -> list[dict]:
+    """Returns the files of an exported product to distribute
+
+    The file of a product that appends is appended to the file of the product it appends to, and is not distributed
+    itself. A file that has been written directly to the objectstore has no temp_location.
+
+    :param product: The product definition
+    :param results_file: The file the product has been exported to
+    :return:
+    """
+    files = []
+    if product.get('append', False):
+        # Append temporary file to existing file and cleanup temp file
+        _append_to_file(results_file, product['append_to_filename'], product.get('compression'))
+        os.remove(results_file)
+    else:
+        # Do not add file to files again when appending
+        files.append({
+            'temp_location': None if isinstance(results_file, ObjectstoreTarget) else results_file,
+            'distribution': compressed_filename(product['filename'], product.get('compression')),
+            'mime_type': compressed_mime_type(product['mime_type'], product.get('compression'))})
+
+    # Add extra result files (e.g. .prj file) and the files of any parts (split shapefiles)
+    extra_files = product.get('extra_files', []) + product.get('part_files', [])
+    files.extend([{'temp_location': _get_filename(file['filename']),
+                   'distribution': file['filename'],
+                   'mime_type': file['mime_type']} for file in extra_files])
+    return files
+
+
+def _export_product(host, catalogue, collection, config, destination, name, product,
+                    target: Optional[ObjectstoreTarget] = None) -> list[dict]:
+    """Export a product of a collection to a local file
+
+    :param host: The API host to retrieve the catalog and collection from
+    :param catalogue: The name of the catalog
+    :param collection: The name of the collection
+    :param config: The configuration of the collection
+    :param destination: The destination of the resulting output file(s)
+    :param name: The name of the product
+    :param product: The product definition
+    :param target: Write the file directly to this object on the objectstore instead of to a local file
+    :return: The files to distribute, see _get_product_files
+    """
+    logger.info(f"Export to file '{name}' started, API type: {product.get('api_type', 'REST')}")
+
+    # Get name of local file to write results to
+    results_file = target or (_get_filename(product['filename']) if destination == "Objectstore"
+                              else product['filename'])
+
+    if product.get('append', False):
+        # Add .to_append to avoid writing to the previously created file
+        results_file = _get_filename(f"{product['filename']}.to_append")
+        product['append_to_filename'] = _get_filename(product['filename']) \
+            if destination == "Objectstore" \
+            else product['filename']
+
+    # Buffer items if they are used multiple times. This prevents calling API multiple times for same data
+    source = product_source(product)
+    source_products = [p for p in config.products.values() if product_source(p) == source]
+    buffer_items = len(source_products) > 1
+
+    logger.info(f"Buffering API output {'enabled' if buffer_items else 'disabled'}")
+
+    # Decode only the fields that are read by the products of the source
+    fields = get_source_fields(source_products)
+
+    # Retries may resume the export (see gobexport.checkpoint), but a new export starts all over
+    if target is None:
+        remove_checkpoint(results_file)
+    try:
+        row_count = _with_retries(lambda: export_to_file(
+            host,
+            product,
+            results_file,
+            catalogue,
+            product.get('collection', collection),
+            buffer_items=buffer_items,
+            fields=fields))
+        if target:
+            target.commit()
+    except Exception as e:
+        if target:
+            target.discard()
+        logger.error(f"Export to {'Objectstore' if target else 'local file'} {name} failed: {str(e)}.")
+        return []
+
+    logger.info(f"{row_count} records exported to {'Objectstore' if target else 'local file'} {name}.")
+
+    return _get_product_files(product, results_file)
+
+
+def _export_products(host, catalogue, collection, config, destination, products: dict,
+                     uploader: Optional['_Uploader'] = None) -> list[dict]:
+    """Export the products of a collection to local files
+
+    Independent products are exported at the same time by at most EXPORT_PRODUCT_WORKERS threads, see
+    gobexport.parallel. The files are returned in the order of the products.
+
+    :param uploader: Uploads the files of each product as soon as the product has been exported, and provides the
+        objectstore targets of the products that are written directly to the objectstore
+    :return: The files to distribute
+    """
+    def export_product(name, product):
+        if uploader is None:
+            return _export_product(host, catalogue, collection, config, destination, name, product)
+
+        files = _export_product(host, catalogue, collection, config, destination, name, product,
+                                uploader.get_target(name))
+        uploader.exported(name, files)
+        return files
+
+    groups = get_product_groups(products)
+    max_workers = min(EXPORT_PRODUCT_WORKERS, len(groups))
+    if max_workers > 1:
+        logger.info(f"Export {len(products)} products in {len(groups)} groups, {max_workers} at the same time")
+        files = export_groups(groups, lambda name: export_product(name, products[name]), max_workers)
+    else:
+        files = {name: export_product(name, product) for name, product in products.items()}
+
+    return [file for name in products for file in files[name]]
+
+
+class _AnalysedTarget(ObjectstoreTarget):
+    """An objectstore target whose data is analysed while it is written, see gobexport.analysis.StreamAnalysis
+
+    The analysis of the committed data remains available after the commit.
+    """
+
+    def __init__(self, connection, container: str, object_name: str, content_type: str, check: Optional[dict] = None):
+        super().__init__(connection, container, object_name, content_type)
+        self.check = check
+        self.analysis = None
+
+    def open(self, mode: str = 'w') -> ObjectstoreWriter:
+        writer = super().open(mode)
+        self.analysis = StreamAnalysis(self.object_name, self.content_type, self.check)
+        writer.on_segment = self.analysis.write
+        return writer
+
+    def discard(self):
+        super().discard()
+        if self.analysis is not None:
+            self.analysis.close()
+            self.analysis = None
+
+
+class _Uploader:
+    """Uploads the files of exported products to the objectstore in a background thread
+
+    The files of a product are uploaded while the next products are exported. A file is uploaded when all products
+    that write to it, the product itself and the products that append to it, have been exported. When the files of
+    EXPORT_UPLOAD_QUEUE_SIZE products are waiting to be uploaded, the next exported product waits for the uploads.
+
+    With EXPORT_STREAM_TO_OBJECTSTORE, text files that no other product appends to are written directly to the
+    objectstore, see get_target. They are registered without a temp_location and are not uploaded again.
+
+    After a file has been uploaded, its previous versions are deleted (see cleanup_datefiles) and the local file is
+    removed. A file that fails to upload is kept and registered in errors. The previous versions of the other files
+    of the product are kept as well, so the files of a product remain a consistent set.
+
+    With EXPORT_STATISTICS_MANIFEST, the statistics of each uploaded file are written to a manifest next to the file,
+    for the export test (see gobexport.analysis). Files that are written directly to the objectstore are analysed
+    while they are written, local files are analysed after they have been uploaded. The uniqueness of the unique_cols
+    of the check of a file (see gobexport.test) is determined as well, and stored with the unique_cols.
+    """
+
+    def __init__(self, client: ObjectstoreClient, catalogue: str, products: dict):
+        self.client = client
+        self.catalogue = catalogue
+        self.container = f'{CONTAINER_BASE}/{EXPORT_DIR}/{catalogue}/'
+        self.products = products
+        self.queue = queue.Queue(maxsize=EXPORT_UPLOAD_QUEUE_SIZE)
+        self.thread = None
+
+        # The distribution names of the files that failed to upload
+        self.errors = []
+
+        # The products that are still to write to each file and their exported files
+        self.lock = threading.Lock()
+        self.writers = defaultdict(set)
+        for name, product in products.items():
+            self.writers[product['filename']].add(name)
+        self.exported_files = defaultdict(list)
+
+        # The products that are written directly to the objectstore
+        self.streamed = {name for name, product in products.items()
+                         if EXPORT_STREAM_TO_OBJECTSTORE
+                         and product.get('exporter') in STREAMING_EXPORTERS
+                         and not product.get('append', False)
+                         and self.writers[product['filename']] == {name}}
+
+        # The targets of the files that are analysed while they are written, by distribution name
+        self.targets = {}
+
+        # The checks of the export test, for the uniqueness of columns
+        self.checks = _load_checks(client, catalogue) if EXPORT_STATISTICS_MANIFEST else {}
+
+    def __enter__(self):
+        # The upload messages are logged with the messages of the export, see gobexport.product_logs
+        self.thread = threading.Thread(target=run_with_log_capture, args=(get_log_capture(), self._run))
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.queue.put(None)
+        self.thread.join()
+
+        # End the analyses of the files that have not been uploaded
+        for target in self.targets.values():
+            target.discard()
+
+    def get_target(self, name: str) -> Optional[ObjectstoreTarget]:
+        """Returns the objectstore target to write the file of a product to, None to write it to a local file
+
+        :param name: The name of the product
+        :return:
+        """
+        if name not in self.streamed:
+            return None
+
+        product = self.products[name]
+        distribution = compressed_filename(product['filename'], product.get('compression'))
+        mime_type = compressed_mime_type(product['mime_type'], product.get('compression'))
+        if not EXPORT_STATISTICS_MANIFEST:
+            return ObjectstoreTarget(self.client.connection, self.container, distribution, mime_type)
+
+        self.targets[distribution] = _AnalysedTarget(self.client.connection, self.container, distribution, mime_type,
+                                                     self._get_uniqueness_check(distribution))
+        return self.targets[distribution]
+
+    def _get_uniqueness_check(self, distribution: str) -> Optional[dict]:
+        """Returns the check on the uniqueness of columns of a file, None if the columns are not checked
+
+        :param distribution: The distribution name of the file
+        :return:
+        """
+        unique_cols = (get_check(self.checks, distribution) or {}).get('unique_cols')
+        return {'unique_cols': unique_cols} if unique_cols else None
+
+    def exported(self, name: str, files: list[dict]):
+        """Registers the files of an exported product, queues the files that are complete for upload
+
+        :param name: The name of the product
+        :param files: The files of the product, see _export_product
+        :return:
+        """
+        filename = self.products[name]['filename']
+        with self.lock:
+            self.writers[filename].discard(name)
+            self.exported_files[filename].extend(files)
+            files = [] if self.writers[filename] else self.exported_files.pop(filename)
+
+        if files:
+            self.queue.put(files)
+
+    def _run(self):
+        while (files := self.queue.get()) is not None:
+            try:
+                self._upload(files)
+            except Exception as e:
+                # Continue with the next files, the exports may be waiting for room in the queue
+                logger.error(f"Upload to Objectstore failed: {str(e)}")
+                self.errors.extend(file['distribution'] for file in files if file['distribution'] not in self.errors)
+
+    def _upload(self, files: list[dict]):
+        for file in files:
+            logger.info(f"Write file '{file['distribution']}'.")
+
+        # Files without a temp_location have already been written to the objectstore
+        local_files = [file for file in files if file['temp_location'] is not None]
+        errors = iter(distribute_files(self.client.connection, self.container, local_files))
+        errors = [next(errors) if file['temp_location'] is not None else None for file in files]
+
+        for file, error in zip(files, errors):
+            if error:
+                logger.error(f"Failed to copy to Objectstore on location: {self.container}{file['distribution']}. \
+                             Error: {error}")
+                self.errors.append(file['distribution'])
+                continue
+
+            logger.info(f"File copied to Objectstore on location: {self.container}{file['distribution']}.")
+
+            self.client.invalidate(self.container, file['distribution'])
+            if any(errors):
+                logger.warning(f"Previous versions of {file['distribution']} are kept, "
+                               f"not all files of the product have been copied")
+            else:
+                cleanup_datefiles(self.client, CONTAINER_BASE,
+                                  f"{EXPORT_DIR}/{self.catalogue}/{file['distribution']}")
+
+            if EXPORT_STATISTICS_MANIFEST:
+                self._write_statistics(file)
+
+            # Delete temp file
+            if file['temp_location'] is not None:
+                os.remove(file['temp_location'])
+
+    def _get_statistics(self, file: dict, check: Optional[dict]) -> dict:
+        if file['temp_location'] is None:
+            return self.targets.pop(file['distribution']).analysis.result()
+
+        with FileIO(file['temp_location']) as obj, contextlib.closing(read_chunks(obj)) as chunks:
+            return analyse(chunks, file['distribution'], file['mime_type'], check)
+
+    def _write_statistics(self, file: dict):
+        """Writes the statistics of an uploaded file and its ETag to the statistics manifest of the file
+
+        The manifest saves the export test the analysis of the file, a manifest that fails to be written is skipped.
+
+        :param file: The uploaded file, see _get_product_files
+        :return:
+        """
+        name = file['distribution']
+        check = self._get_uniqueness_check(name)
+        try:
+            statistics = self._get_statistics(file, check)
+            headers = self.client.connection.head_object(self.container, name)
+            manifest = {
+                'etag': headers['etag'].strip('"'),
+                'content_type': file['mime_type'],
+                'unique_cols': (check or {}).get('unique_cols'),
+                'statistics': statistics,
+            }
+            self.client.put_object(self.container, f"{name}{STATISTICS_SUFFIX}", json.dumps(manifest),
+                                   'application/json')
+        except Exception as e:
+            logger.warning(f"Statistics manifest of {name} not written: {str(e)}")
+
+
+def _load_checks(client: ObjectstoreClient, catalogue: str) -> dict:
+    """Returns the checks of the export test for the files of a catalogue, see gobexport.test
+
+    :param client: The objectstore client
+    :param catalogue: The name of the catalogue
+    :return: The checks by filename, empty if they can not be loaded
+    """
+    try:
+        _, contents = client.connection.get_object(CONTAINER_BASE, f"checks.{catalogue}.json")
+        return json_loads(contents)
+    except Exception as e:
+        logger.warning(f"Checks of {catalogue} not loaded, the uniqueness of columns is not determined: {str(e)}")
+        return {}
+
+
 @with_buffered_iterable  # noqa: C901
 def _export_collection(host, catalogue, collection, product_name, destination):  # noqa: C901
     """Export a collection from a catalog
@@ -100,8 +463,6 @@ def _export_collection(host, catalogue, collection, product_name, destination):
     config = CONFIG_MAPPING[catalogue][collection]
     resolve_config_filenames(config)
 
-    files = []
-
     # If a product has been supplied, export only that product
     try:
         products = {product_name: config.products[product_name]} if product_name else config.products
@@ -109,101 +470,35 @@ def _export_collection(host, catalogue, collection, product_name, destination):
         logger.error(f"Product '{product_name}' not found")
         return
 
-    # Start exporting each product
-    for name, product in products.items():
-        logger.info(f"Export to file '{name}' started, API type: {product.get('api_type', 'REST')}")
-
-        # Get name of local file to write results to
-        results_file = _get_filename(product['filename']) if destination == "Objectstore" else product['filename']
-
-        if product.get('append', False):
-            # Add .to_append to avoid writing to the previously created file
-            results_file = _get_filename(f"{product['filename']}.to_append")
-            product['append_to_filename'] = _get_filename(product['filename']) \
-                if destination == "Objectstore" \
-                else product['filename']
-
-        # Buffer items if they are used multiple times. This prevents calling API multiple times for same data
-        source = product_source(product)
-        buffer_items = len(list(filter(lambda p: product_source(p) == source, config.products.values()))) > 1
-
-        logger.info(f"Buffering API output {'enabled' if buffer_items else 'disabled'}")
-        try:
-            row_count = _with_retries(lambda: export_to_file(
-                host,
-                product,
-                results_file,
-                catalogue,
-                product.get('collection', collection),
-                buffer_items=buffer_items))
-        except Exception as e:
-            logger.error(f"Export to local file {name} failed: {str(e)}.")
-        else:
-            logger.info(f"{row_count} records exported to local file {name}.")
-
-            if product.get('append', False):
-                # Append temporary file to existing file and cleanup temp file
-                _append_to_file(results_file, product['append_to_filename'])
-                os.remove(results_file)
-            else:
-                # Do not add file to files again when appending
-                files.append({
-                    'temp_location': results_file,
-                    'distribution': product['filename'],
-                    'mime_type': product['mime_type']})
-
-            # Add extra result files (e.g. .prj file)
-            extra_files = product.get('extra_files', [])
-            files.extend([{'temp_location': _get_filename(file['filename']),
-                           'distribution': file['filename'],
-                           'mime_type': file['mime_type']} for file in extra_files])
-
     if destination == "Objectstore":
         # Get objectstore connection
-        config = get_datastore_config(GOB_OBJECTSTORE)
-        datastore = DatastoreFactory.get_datastore(config)
-        datastore.connect()
-
-        assert isinstance(datastore, ObjectDatastore)
-
-        connection = datastore.connection
-        logger.info(f"Connection to {destination} {datastore.user} has been made.")
-
-    # Start distribution of all resulting files
-    for file in files:
-        logger.info(f"Write file '{file['distribution']}'.")
-        if destination == "Objectstore":
-            # Distribute to pre-final location
-            container = f'{CONTAINER_BASE}/{EXPORT_DIR}/{catalogue}/'
-            with open(file['temp_location'], 'rb') as fp:
-                try:
-                    distribute_to_objectstore(connection,
-                                              container,
-                                              file['distribution'],
-                                              fp,
-                                              file['mime_type'])
-                except GOBException as e:
-                    logger.error(f"Failed to copy to {destination} on location: {container}{file['distribution']}. \
-                                 Error: {e}")
-                    return False
-
-            logger.info(f"File copied to {destination} on location: {container}{file['distribution']}.")
-
-            cleanup_datefiles(connection, CONTAINER_BASE, f"{EXPORT_DIR}/{catalogue}/{file['distribution']}")
-
-            # Delete temp file
-            os.remove(file['temp_location'])
-
-        elif destination == "File":
+        client = get_client(GOB_OBJECTSTORE)
+        logger.info(f"Connection to {destination} {client.datastore.user} has been made.")
+
+        # Distribute the files of each product while the next products are exported
+        with _Uploader(client, catalogue, products) as uploader:
+            _export_products(host, catalogue, collection, config, destination, products, uploader)
+
+        if uploader.errors:
+            logger.error(f"{len(uploader.errors)} file(s) failed to copy to {destination}: "
+                         f"{', '.join(uploader.errors)}")
+            return False
+
+    elif destination == "File":
+        files = _export_products(host, catalogue, collection, config, destination, products)
+        for file in files:
+            logger.info(f"Write file '{file['distribution']}'.")
             logger.info(f"Export is written to {file['distribution']}.")
 
     logger.info("Export completed")
 
 
-def cleanup_datefiles(connection, container, filename):
+def cleanup_datefiles(client, container, filename):
     """Delete previous files from ObjectStore.
 
-    The file with filename is not deleted.
+    The file with filename is not deleted, nor is its statistics manifest. The segments of previous files that are
+    Static Large Objects are deleted with the files. Only the directory of the file is listed, the listing is shared
+    by the files in the directory (see gobexport.objectstore_client).
     """
     cleanup_pattern = get_cleanup_pattern(filename)
     if cleanup_pattern == filename:
@@ -212,9 +507,15 @@ def cleanup_datefiles(connection, container, filename):
 
     logger.info(f'Clean previous files for {filename}.')
 
-    for item in get_full_container_list(connection, container):
-        if re.match(cleanup_pattern, item['name']) and item['name'] != filename:
-            delete_object(connection, container, item)
+    # The directory up to the first date
+    dirname = os.path.dirname(filename[:re.search(r"\d{8}", filename).start()])
+    listing = client.listing(container, f"{dirname}/" if dirname else '')
+
+    keep = (filename, f"{filename}{STATISTICS_SUFFIX}")
+    for item in listing.startswith(filename):
+        if re.match(cleanup_pattern, item['name']) and item['name'] not in keep:
+            delete_segments(client.connection, container, item['name'])
+            client.delete_object(container, item)
             logger.info(f'File {item["name"]} deleted.')
 
 
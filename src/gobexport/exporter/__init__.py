@@ -1,17 +1,33 @@
 """Exporter init and mapping."""
 
+import os
+from typing import Any, Iterable, Optional, Union
 
-from typing import Any
+from gobcore.exceptions import GOBException
 
 from gobexport.api import API
 from gobexport.buffered_iterable import BufferedIterable
+from gobexport.checkpoint import Checkpoint
+from gobexport.config import EXPORT_CHECKPOINT_INTERVAL
+from gobexport.distributor.objectstore import ObjectstoreTarget
 from gobexport.exporter.config import bag, bgt, brk, brk2, gebieden, meetbouten, nap, test, wkpb
+from gobexport.exporter.csv import csv_exporter
+from gobexport.exporter.dat import dat_exporter
 from gobexport.exporter.encryption import encrypt_file
+from gobexport.exporter.esri import part_filename
+from gobexport.exporter.ndjson import ndjson_exporter
+from gobexport.exporter.pushdown import CountingIterable, push_down_filters
+from gobexport.filters.entity_filter import EntityFilter
 from gobexport.filters.group_filter import GroupFilter
+from gobexport.filters.raw_filter import RawFilter
 from gobexport.graphql import GraphQL
 from gobexport.graphql_streaming import GraphQLStreaming
 from gobexport.merged_api import MergedApi
 from gobexport.objectstore import ObjectstoreFile
+from gobexport.product_logs import logger
+
+# Text exporters that write their file through open_file, so it can be compressed, encrypted or streamed
+STREAMING_EXPORTERS = (csv_exporter, dat_exporter, ndjson_exporter)
 
 CONFIG_MAPPING = {
     'test_catalogue': {
@@ -82,7 +98,8 @@ def product_source(product):
     return product.get('endpoint', product.get('query', product.get('filename')))
 
 
-def _init_api(product: dict[str, Any], host: str, catalogue: str, collection: str):
+def _init_api(product: dict[str, Any], host: str, catalogue: str, collection: str,
+              fields: Optional[set[str]] = None, entity_filters: Optional[list[EntityFilter]] = None):
     unfold = product.get('unfold', False)
     secure_user = product.get('secure_user')
 
@@ -93,20 +110,21 @@ def _init_api(product: dict[str, Any], host: str, catalogue: str, collection: st
         sort = product.get('sort')
         api = GraphQL(host, query, catalogue, collection, expand_history, sort=sort, unfold=unfold,
                       secure_user=secure_user, row_formatter=product.get('row_formatter'),
-                      cross_relations=product.get('cross_relations', False))
+                      cross_relations=product.get('cross_relations', False), entity_filters=entity_filters)
     elif product.get('api_type') == 'graphql_streaming':
         query = product['query']
         api = GraphQLStreaming(host, query, unfold=unfold, sort=product.get('sort'), secure_user=secure_user,
                                row_formatter=product.get('row_formatter'),
                                cross_relations=product.get('cross_relations', False),
-                               batch_size=product.get('batch_size'))
+                               batch_size=product.get('batch_size'), entity_filters=entity_filters)
     elif product.get('api_type') == 'objectstore':
         config = product['config']
         api = ObjectstoreFile(config, row_formatter=product.get('row_formatter'))
     else:
         # Use the REST API
         endpoint = product.get('endpoint')
-        api = API(host=host, path=endpoint, row_formatter=product.get('row_formatter'), secure_user=secure_user)
+        api = API(host=host, path=endpoint, row_formatter=product.get('row_formatter'), secure_user=secure_user,
+                  fields=fields)
 
     if product.get('merge_result'):
         # A secondary API is defined. Return a new MergedAPI object that combines the results from both API's.
@@ -117,7 +135,177 @@ def _init_api(product: dict[str, Any], host: str, catalogue: str, collection: st
     return api
 
 
-def export_to_file(host, product, file_path, catalogue, collection, buffer_items=False):
+def _get_parts(file_path: str) -> list[int]:
+    """Returns the numbers of the parts (part 2 and up) that have been written for a file that is split into parts.
+
+    :param file_path: The path of the file
+    :return:
+    """
+    parts = []
+    while os.path.exists(part_filename(file_path, len(parts) + 2)):
+        parts.append(len(parts) + 2)
+    return parts
+
+
+def _get_part_files(product: dict, file_path: str) -> list[dict]:
+    """Returns the part files (part 2 and up) that have been written for a product that is split into parts.
+
+    Each part consists of the product file and all its extra files.
+
+    :param product: The product definition
+    :param file_path: The path of the file the product has been written to
+    :return: The part files in the same format as extra_files
+    """
+    files = [product] + product.get('extra_files', [])
+
+    return [{
+        'filename': part_filename(file['filename'], part),
+        'mime_type': file['mime_type']
+    } for part in _get_parts(file_path) for file in files]
+
+
+def _encrypt_files(product: dict, file_path: str):
+    """Encrypts the file of a product that has been exported, and the file of each part if it is split into parts
+
+    :param product: The product definition
+    :param file_path: The path of the file the product has been written to
+    :return:
+    """
+    parts = _get_parts(file_path) if product.get("max_part_size") else []
+    for path in [file_path] + [part_filename(file_path, part) for part in parts]:
+        encrypt_file(path, product['encryption_key'])
+
+
+def _get_exporter_kwargs(product: dict) -> dict:
+    """Returns the optional keyword arguments for the exporter of a product
+
+    :param product: The product definition
+    :return:
+    """
+    kwargs = {}
+    if product.get("append", False):
+        kwargs["unique_csv_id"] = product.get("unique_csv_id")
+    if product.get("max_part_size"):
+        kwargs["max_part_size"] = product["max_part_size"]
+    if product.get("compression"):
+        kwargs["compression"] = product["compression"]
+    if product.get("encryption_key") and product.get("exporter") in STREAMING_EXPORTERS \
+            and not product.get("append", False):
+        kwargs["encryption_key"] = product["encryption_key"]
+    if product.get("raw"):
+        kwargs["raw"] = True
+    return kwargs
+
+
+def _get_raw_lines(product: dict, api):
+    """Returns the raw lines of the api of a product that passes its source through (raw=True)
+
+    Raw lines are available for the ndjson exporter on NDJSON REST endpoints and on streaming GraphQL queries that
+    don't require formatting. Entity filters are applied to the raw lines, so they should be RawFilters.
+
+    :param product: The product definition
+    :param api: The api of the product
+    :return: An iterator over the raw lines
+    """
+    if product.get('exporter') is not ndjson_exporter or not isinstance(api, (API, GraphQLStreaming)):
+        raise GOBException("Raw export is only available for the ndjson exporter on an NDJSON source")
+
+    if not all(isinstance(f, RawFilter) for f in product.get('entity_filters', [])):
+        raise GOBException("Raw export only supports RawFilters")
+
+    return api.iter_raw()
+
+
+def _get_early_filters(product: dict, buffer_items: bool) -> list[EntityFilter]:
+    """Returns the entity filters of a product that are evaluated on the GraphQL entities before they are formatted
+
+    Like pushed down filters, early filters are only applied to sources that are not shared with other products.
+
+    :param product: The product definition
+    :param buffer_items: Whether the source is shared with other products
+    :return:
+    """
+    if buffer_items or product.get('merge_result') or product.get('api_type') not in ['graphql', 'graphql_streaming']:
+        return []
+    return [f for f in product.get('entity_filters', []) if f.get_raw_fields() is not None]
+
+
+def _get_source(product: dict, host: str, catalogue: str, collection: str, buffer_items: bool,
+                fields: Optional[set[str]]) -> tuple[Iterable, Any, list[EntityFilter]]:
+    """Returns the source of the entities of a product, its api and the entity filters that have been pushed down
+    into it
+
+    Filters are only pushed down into sources that are not shared with other products (buffer_items=False), as
+    pushing down a filter removes entities from the source. The source of a product with pushed down filters counts
+    the entities that are received.
+
+    :param product: The product definition
+    :param host: The API host
+    :param catalogue: The catalogue to export
+    :param collection: The collection to export
+    :param buffer_items: Whether the source is shared with other products
+    :param fields: The top-level fields of the source entities that are read, None if any field can be read
+    :return: The source, the api and the pushed down filters
+    """
+    query, pushed_filters = (product.get('query'), []) if buffer_items else push_down_filters(product)
+    api = _init_api({**product, 'query': query} if pushed_filters else product, host, catalogue, collection, fields,
+                    entity_filters=_get_early_filters(product, buffer_items))
+
+    if product.get('raw'):
+        # Raw lines are passed through without buffering
+        return _get_raw_lines(product, api), api, pushed_filters
+
+    source = BufferedIterable(api, product_source(product), buffer_items=buffer_items)
+    return (CountingIterable(source) if pushed_filters else source), api, pushed_filters
+
+
+def _get_checkpoint(product: dict, api, file_path: Union[str, ObjectstoreTarget], buffer_items: bool,
+                    filter: Optional[EntityFilter]) -> Optional[Checkpoint]:
+    """Returns the checkpoint of the export of a product, None if the export cannot be resumed
+
+    An export can be resumed when its source can continue at a position and the rows of the file can be truncated
+    and appended to: uncompressed and unencrypted local text files that are written at once. Sources that are shared
+    with other products are not resumed, nor are exports with a filter that depends on the entities it has seen.
+
+    :param product: The product definition
+    :param api: The api of the product
+    :param file_path: The path of the file the product is written to
+    :param buffer_items: Whether the source is shared with other products
+    :param filter: The entity filter of the product
+    :return:
+    """
+    resumable = EXPORT_CHECKPOINT_INTERVAL > 0 \
+        and getattr(api, 'resumable', False) \
+        and not buffer_items \
+        and not isinstance(file_path, ObjectstoreTarget) \
+        and product.get('exporter') in STREAMING_EXPORTERS \
+        and not any(product.get(key) for key in ['append', 'compression', 'encryption_key', 'max_part_size', 'raw']) \
+        and (filter is None or filter.get_raw_fields() is not None)
+    return Checkpoint(file_path, api) if resumable else None
+
+
+def _log_filter_results(product: dict, buffer_items: bool, source, api, pushed_filters: list[EntityFilter],
+                        row_count: int):
+    """Logs the number of entities that have been left out by early and pushed down filters
+
+    :param product: The product definition
+    :param buffer_items: Whether the source is shared with other products
+    :param source: The source of the entities, see _get_source
+    :param api: The api of the product
+    :param pushed_filters: The filters that have been pushed down into the source
+    :param row_count: The number of rows that have been exported from the source
+    :return:
+    """
+    if early_filters := _get_early_filters(product, buffer_items):
+        logger.info(f"{len(early_filters)} entity filter(s) evaluated before formatting: "
+                    f"{api.formatter.pruned} entities left out")
+
+    if pushed_filters:
+        logger.info(f"{len(pushed_filters)} entity filter(s) pushed down into the query: "
+                    f"{source.count} rows received, {source.count - row_count} rows filtered out")
+
+
+def export_to_file(host, product, file_path, catalogue, collection, buffer_items=False, fields=None):
     """Export a collection from a catalog to a file.
 
     The entities that are exposed by the specified API host are retrieved, converted and written to
@@ -125,31 +313,47 @@ def export_to_file(host, product, file_path, catalogue, collection, buffer_items
 
     :param host: The API host
     :param product: The product definition for this export type
-    :param file_path: The path of the file to write the output to
+    :param file_path: The path of the file to write the output to, or the ObjectstoreTarget of a text exporter
     :param catalogue: The catalogue to export
     :param collection: The collection to export
+    :param fields: The top-level fields of the source entities that are read, None if any field can be read
     :return: The number of exported rows
     """
-    api = _init_api(product, host, catalogue, collection)
+    buffered_api, api, pushed_filters = _get_source(product, host, catalogue, collection, buffer_items, fields)
 
     exporter = product.get('exporter')
     format = product.get('format')
 
-    buffered_api = BufferedIterable(api, product_source(product), buffer_items=buffer_items)
-
-    kwargs = {}
-
     filter = GroupFilter(product['entity_filters']) if product.get('entity_filters') else None
+    kwargs = _get_exporter_kwargs(product)
     kwargs['filter'] = filter
-    if product.get("append", False):
-        kwargs["unique_csv_id"] = product.get("unique_csv_id")
+
+    # Text exporters encrypt while writing, the files of other exporters are encrypted afterwards
+    encrypt_afterwards = bool(product.get('encryption_key')) and 'encryption_key' not in kwargs
+
+    # Continue a previous try of the export, if any
+    if checkpoint := _get_checkpoint(product, api, file_path, buffer_items, filter):
+        kwargs['checkpoint'] = checkpoint
+        if checkpoint.restore():
+            logger.info(f"Export resumed after {checkpoint.rows} rows")
 
     row_count = exporter(buffered_api, file_path, format,
                          append=product.get('append', False) and product['append_to_filename'],
                          **kwargs)
 
-    if product.get('encryption_key'):
-        encrypt_file(file_path, product.get('encryption_key'))
+    if checkpoint:
+        checkpoint.clear()
+
+    if product.get("max_part_size"):
+        # Register the part files, so that they are distributed together with the extra files
+        product['part_files'] = _get_part_files(product, file_path)
+
+    if encrypt_afterwards:
+        _encrypt_files(product, file_path)
+
+    # The rows that were exported before the export was resumed have not been received by the source
+    _log_filter_results(product, buffer_items, buffered_api, api, pushed_filters,
+                        row_count - (checkpoint.rows if checkpoint else 0))
 
     # Reset the entity filter(s)
     if filter:
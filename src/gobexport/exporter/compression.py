@@ -0,0 +1,159 @@
+"""Streaming compression and encryption of export files
+
+Text exporters write their output through open_file. When a compression or encryption key is given the output is
+compressed and/or encrypted while it is being written, so no plain copy of the export is stored. Exports to an
+ObjectstoreTarget are written directly to the objectstore, without a local file.
+
+Appending to a compressed file adds a new gzip member or zstd frame to the file. Readers decompress all members
+or frames as a single stream.
+"""
+import gzip
+import io
+import os
+from typing import BinaryIO, IO, Optional, Union
+
+import zstandard
+
+from gobcore.exceptions import GOBException
+
+from gobexport.distributor.objectstore import ObjectstoreTarget
+from gobexport.exporter.encryption import EncryptedWriter
+from gobexport.product_logs import logger
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+COMPRESSIONS = {
+    GZIP: {
+        'extension': '.gz',
+        'mime_type': 'application/gzip',
+    },
+    ZSTD: {
+        'extension': '.zst',
+        'mime_type': 'application/zstd',
+    },
+}
+
+
+def _get_compression(compression: str) -> dict:
+    try:
+        return COMPRESSIONS[compression]
+    except KeyError:
+        raise GOBException(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+
+
+def compressed_filename(filename: str, compression: Optional[str]) -> str:
+    """Returns the filename of a (possibly) compressed file
+
+    :param filename: the name of the uncompressed file
+    :param compression: the compression, or None
+    :return:
+    """
+    return f"{filename}{_get_compression(compression)['extension']}" if compression else filename
+
+
+def compressed_mime_type(mime_type: str, compression: Optional[str]) -> str:
+    """Returns the mime type of a (possibly) compressed file
+
+    :param mime_type: the mime type of the uncompressed file
+    :param compression: the compression, or None
+    :return:
+    """
+    return _get_compression(compression)['mime_type'] if compression else mime_type
+
+
+class _CompressedWriter(io.RawIOBase):
+    """Binary stream that compresses all data that is written to a file object
+
+    The number of bytes before and after compression is logged when the stream is closed. The file object is closed
+    when the stream is closed.
+    """
+
+    def __init__(self, fp: BinaryIO, file: str, compression: str):
+        self.file = file
+        self.compression = compression
+
+        self._fp = fp
+        self._start = self._fp.tell()
+        self.bytes_written = 0
+
+        if compression == GZIP:
+            self._compressor = gzip.GzipFile(filename='', mode='wb', fileobj=self._fp)
+        else:
+            self._compressor = zstandard.ZstdCompressor().stream_writer(self._fp, closefd=False)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._compressor.write(b)
+        self.bytes_written += len(b)
+        return len(b)
+
+    def close(self):
+        if self.closed:
+            return
+
+        self._compressor.close()
+        compressed_size = self._fp.tell() - self._start
+        self._fp.close()
+        super().close()
+
+        # The compressed size includes at least the gzip header or zstd frame header
+        logger.info(f"Compressed {os.path.basename(self.file)} ({self.compression}): "
+                    f"{self.bytes_written} bytes to {compressed_size} bytes, "
+                    f"ratio {self.bytes_written / compressed_size:.1f}")
+
+
+def _open_reader(file: str, compression: str) -> IO:
+    if compression == GZIP:
+        return gzip.open(file, 'rb')
+    return zstandard.ZstdDecompressor().stream_reader(open(file, 'rb'), read_across_frames=True)
+
+
+def _open_writer(file: Union[str, ObjectstoreTarget], mode: str, compression: Optional[str],
+                 encryption_key: Optional[str]) -> BinaryIO:
+    if encryption_key and mode != 'w':
+        raise GOBException("Appending to an encrypted file is not supported")
+
+    stream = file.open(mode) if isinstance(file, ObjectstoreTarget) else open(file, f"{mode}b")
+    if encryption_key:
+        stream = EncryptedWriter(stream, encryption_key)
+    if compression:
+        stream = _CompressedWriter(stream, file, compression)
+    return stream
+
+
+def open_file(file: Union[str, ObjectstoreTarget], mode: str = 'r', compression: Optional[str] = None,
+              encryption_key: Optional[str] = None, **kwargs) -> IO:
+    """Opens a file, which is compressed with the given compression and/or encrypted with the given key
+
+    Data is compressed before it is encrypted. Without a compression and encryption this is the builtin open, unless
+    the file is an ObjectstoreTarget, which can only be written.
+
+    :param file: the name of the file, or the object on the objectstore to write to
+    :param mode: 'r', 'w' or 'a' for a text stream, 'rb', 'wb' or 'ab' for a binary stream
+    :param compression: the compression, or None
+    :param encryption_key: the name of the public key to encrypt the file with (write only), or None
+    :param kwargs: encoding, errors and newline, as for open
+    :return: the text or binary stream
+    """
+    if not (compression or encryption_key or isinstance(file, ObjectstoreTarget)):
+        return open(file, mode, **kwargs)
+
+    if compression:
+        _get_compression(compression)
+
+    binary = mode.endswith('b')
+    mode = mode.removesuffix('b')
+
+    if mode == 'r':
+        if encryption_key:
+            raise GOBException("Reading an encrypted file is not supported")
+        if isinstance(file, ObjectstoreTarget):
+            raise GOBException("Reading a file from the objectstore is not supported")
+        stream = _open_reader(file, compression)
+    else:
+        stream = io.BufferedWriter(_open_writer(file, mode, compression, encryption_key)) if binary \
+            else _open_writer(file, mode, compression, encryption_key)
+    return stream if binary else io.TextIOWrapper(stream, **kwargs)
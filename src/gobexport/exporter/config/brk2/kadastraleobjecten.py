@@ -5,7 +5,7 @@ from fractions import Fraction
 
 from gobexport.exporter.config.brk2.utils import brk2_directory, brk2_filename
 from gobexport.exporter.csv import csv_exporter
-from gobexport.exporter.esri import esri_exporter
+from gobexport.exporter.esri import SHAPEFILE_PART_SIZE, esri_exporter
 from gobexport.exporter.shared.brk import format_timestamp
 from gobexport.exporter.utils import convert_format, get_entity_value
 from gobexport.filters.entity_filter import EntityFilter
@@ -837,6 +837,12 @@ class KadastraleobjectenExportConfig:
 
             return True
 
+        def get_fields(self):
+            return [self.vot_identificatie, self.city]
+
+        def get_raw_fields(self):
+            return self.get_fields()
+
     sort = {
         "invRustOpBrkKadastraalObjectBrk2Zakelijkerechten"
         ".invVanBrkZakelijkRechtBrk2Tenaamstellingen"
@@ -871,6 +877,7 @@ class KadastraleobjectenExportConfig:
             "query": esri_query,
             "filename": (f"{brk2_directory('shp', use_sensitive_dir=False)}" "/BRK_Adam_totaal_G_zonderSubjecten.shp"),
             "mime_type": "application/octet-stream",
+            "max_part_size": SHAPEFILE_PART_SIZE,
             "format": esri_format_no_subjects.get_format(),
             "extra_files": [
                 {
@@ -907,6 +914,8 @@ class KadastraleobjectenExportConfig:
             "entity_filters": [
                 NotEmptyFilter("bijpijlingGeometrie"),
             ],
+            # The GraphQL endpoint selects the rows with a bijpijlingGeometrie, see gobexport.exporter.pushdown
+            "pushdown_filters": True,
             "mime_type": "application/octet-stream",
             "format": {
                 "BRK_KOT_ID": "identificatie",
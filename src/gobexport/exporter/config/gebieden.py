@@ -8,6 +8,7 @@ following properties:
         - dat_exporter
         - csv_exporter
         - esri_exporter
+        - parquet_exporter
     endpoint: The endpoint to the API used for getting the data
     filename: The resulting filename of the exported file
     mime_type: The mime_type for the product, needed for export to the objectstore
@@ -15,11 +16,14 @@ following properties:
     extra_files: Resulting extra files of an export which need to be uploaded as
                  well. For example the esri product creates .dbf, .shx and .prj
                  files.
+    compression: Optional compression of the file while it is written (gzip or zstd), for the csv, dat and
+                 ndjson exporters. The file is distributed with a .gz or .zst extension.
 """
 
 
 from gobexport.exporter.csv import csv_exporter
 from gobexport.exporter.esri import esri_exporter
+from gobexport.exporter.parquet import parquet_product
 
 from gobexport.formatter.geometry import format_geometry
 
@@ -169,6 +173,9 @@ class StadsdelenExportConfig:
         }
     }
 
+    products['parquet_actueel'] = parquet_product(products['csv_actueel'],
+                                                  'Parquet_Actueel/GBD_stadsdeel_Actueel.parquet')
+
 
 class GGPGebiedenExportConfig:
 
@@ -454,6 +461,9 @@ class GGWGebiedenExportConfig:
         }
     }
 
+    products['parquet_actueel'] = parquet_product(products['csv_actueel'],
+                                                  'Parquet_Actueel/GBD_ggw_gebied_Actueel.parquet')
+
 
 class WijkenExportConfig:
 
@@ -663,6 +673,9 @@ class WijkenExportConfig:
         }
     }
 
+    products['parquet_actueel'] = parquet_product(products['csv_actueel'],
+                                                  'Parquet_Actueel/GBD_wijk_Actueel.parquet')
+
 
 class BuurtenExportConfig:
 
@@ -930,6 +943,9 @@ class BuurtenExportConfig:
         }
     }
 
+    products['parquet_actueel'] = parquet_product(products['csv_actueel'],
+                                                  'Parquet_Actueel/GBD_buurt_Actueel.parquet')
+
 
 class BouwblokkenExportConfig:
     query_actueel = """
@@ -1204,3 +1220,6 @@ class BouwblokkenExportConfig:
 '''
         }
     }
+
+    products['parquet_actueel'] = parquet_product(products['csv_actueel'],
+                                                  'Parquet_Actueel/GBD_bouwblok_Actueel.parquet')
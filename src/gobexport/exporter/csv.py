@@ -1,10 +1,16 @@
 import csv
-from typing import Optional, Sequence
+from typing import Iterable, Iterator, Optional, Sequence
 
 from gobcore.exceptions import GOBException
 from gobcore.utils import ProgressTicker
+from gobexport.checkpoint import Checkpoint
+from gobexport.exporter.compression import open_file
 from gobexport.exporter.utils import get_entity_value, split_field_reference
 from gobexport.filters.entity_filter import EntityFilter
+from gobexport.formatter.geometry import format_geometry, format_geometries
+
+# Number of rows for which the geometry columns are formatted at once
+GEOMETRY_BATCH_SIZE = 10_000
 
 
 def build_mapping_from_format(format):
@@ -20,48 +26,129 @@ def build_mapping_from_format(format):
     return mapping
 
 
-def _get_headers_from_file(file: str) -> Optional[Sequence[str]]:
+def _get_geometry_columns(mapping: dict) -> dict:
+    """Returns the columns that format a geometry to wkt
+
+    These columns are formatted in batches by format_geometries instead of row by row.
+
+    :param mapping:
+    :return: the format actions by column name
+    """
+    return {
+        attribute_name: lookup_key for attribute_name, lookup_key in mapping.items()
+        if isinstance(lookup_key, dict)
+        and lookup_key.get('action') == 'format'
+        and lookup_key.get('formatter') is format_geometry
+    }
+
+
+def _build_row(entity: dict, mapping: dict, geometry_columns: dict) -> dict:
+    """Builds a csv row for entity
+
+    The geometry columns get the raw geometry value, which is formatted when the batch of rows is written.
+
+    :param entity:
+    :param mapping:
+    :param geometry_columns:
+    :return:
+    """
+    row = {}
+    for attribute_name, lookup_key in mapping.items():
+        if attribute_name in geometry_columns:
+            row[attribute_name] = get_entity_value(entity, lookup_key['value'])
+        else:
+            row[attribute_name] = get_entity_value(entity, lookup_key)
+    return row
+
+
+def _write_rows(writer, rows: list[dict], geometry_columns: dict):
+    """Formats the geometry columns of rows in one batch, then writes the rows
+
+    Empty geometries are left empty, as does the format action.
+
+    :param writer:
+    :param rows: rows with the raw geometry values in the geometry columns
+    :param geometry_columns:
+    :return:
+    """
+    for attribute_name, action in geometry_columns.items():
+        values = [row[attribute_name] for row in rows]
+        wkts = format_geometries([value for value in values if value], **action.get('kwargs', {}))
+
+        wkts_iter = iter(wkts)
+        for row, value in zip(rows, values):
+            row[attribute_name] = next(wkts_iter) if value else None
+
+    for row in rows:
+        writer.writerow(row)
+
+
+def _get_headers_from_file(file: str, compression: Optional[str] = None) -> Optional[Sequence[str]]:
     """Returns existing column names from a CSV file
 
     :param file:
+    :param compression:
     :return:
     """
 
     # utf-8-sig encoding handles UTF-8 BOM character correctly
-    with open(file, 'r', encoding='utf-8-sig') as fp:
+    with open_file(file, 'r', compression, encoding='utf-8-sig') as fp:
         reader = csv.DictReader(fp, delimiter=';')
         headers = reader.fieldnames
 
     return headers
 
 
-def _ensure_fieldnames_match_existing_file(fieldnames, file):
+def _ensure_fieldnames_match_existing_file(fieldnames, file, compression: Optional[str] = None):
     """Raises GOBException if fieldnames don't match the header names present in file
 
     :param fieldnames:
     :param file:
+    :param compression:
     :return:
     """
-    existing_headers = _get_headers_from_file(file)
+    existing_headers = _get_headers_from_file(file, compression)
 
     if existing_headers != fieldnames:
         raise GOBException('Fields from existing file do not match fields to append')
 
 
-def _get_csv_ids(csv_file: str, csv_id: str) -> set[str]:
+def _get_csv_ids(csv_file: str, csv_id: str, compression: Optional[str] = None) -> set[str]:
     """Return list with all csv_id's in csv_file.
 
     :param csv_file:
     :param csv_id:
+    :param compression:
     :return:
     """
-    with open(csv_file, 'r', encoding='utf-8-sig') as fp:
+    with open_file(csv_file, 'r', compression, encoding='utf-8-sig') as fp:
         reader = csv.DictReader(fp, delimiter=';')
         return {row[csv_id] for row in reader}
 
 
+def _filter_entities(entities: Iterable[dict], filter: Optional[EntityFilter], csv_id_key: Optional[str],
+                     csv_ids: set[str]) -> Iterator[dict]:
+    """Returns the entities that pass the filter and whose csv id is not in csv_ids
+
+    :param entities:
+    :param filter:
+    :param csv_id_key: the key of the csv id of an entity, or None to include entities regardless of their csv id
+    :param csv_ids:
+    :return:
+    """
+    for entity in entities:
+        if filter and not filter.filter(entity):
+            continue
+
+        if csv_id_key and entity[csv_id_key] in csv_ids:
+            continue
+
+        yield entity
+
+
 def csv_exporter(
-    api, file, format=None, append=False, filter: Optional[EntityFilter] = None, unique_csv_id: Optional[str] = None
+    api, file, format=None, append=False, filter: Optional[EntityFilter] = None, unique_csv_id: Optional[str] = None,
+    compression: Optional[str] = None, encryption_key: Optional[str] = None, checkpoint: Optional[Checkpoint] = None
 ):
     """CSV Exporter
 
@@ -95,38 +182,47 @@ def csv_exporter(
     :param file: the local file to write to
     :param format: format definition, see above for examples
     :param append: the file the result of this export will be appended to, or False
+    :param unique_csv_id: skip entities with an id that is already present in the file that is appended to
+    :param compression: compress the file while it is written (gzip, zstd), see open_file
+    :param encryption_key: encrypt the file while it is written with this public key, see open_file
+    :param checkpoint: save checkpoints while writing, continue after the rows of a restored checkpoint
     :return:
     """
-    row_count = 0
+    resumed = checkpoint is not None and checkpoint.resumed
+    row_count = checkpoint.rows if resumed else 0
 
     mapping = build_mapping_from_format(format)
     fieldnames = [*mapping.keys()]
+    geometry_columns = _get_geometry_columns(mapping)
 
+    csv_ids = set()
     if append:
-        _ensure_fieldnames_match_existing_file(fieldnames, append)
-        csv_ids = _get_csv_ids(file.removesuffix(".to_append"), unique_csv_id) if unique_csv_id else set()
+        _ensure_fieldnames_match_existing_file(fieldnames, append, compression)
+        csv_ids = _get_csv_ids(file.removesuffix(".to_append"), unique_csv_id, compression) if unique_csv_id else set()
 
-    with open(file, 'a' if append else 'w', encoding='utf-8-sig') as fp, \
+    with open_file(file, 'a' if append or resumed else 'w', compression, encryption_key, encoding='utf-8-sig') as fp, \
             ProgressTicker("Export entities", 10000) as progress:
         # Get the fieldnames from the mapping
         writer = csv.DictWriter(fp, fieldnames=fieldnames, delimiter=';')
 
-        if not append:
+        if not (append or resumed):
             writer.writeheader()
 
-        for entity in api:
-            if filter and not filter.filter(entity):
-                continue
+        rows = []
+        for entity in _filter_entities(api, filter, mapping[unique_csv_id] if unique_csv_id else None, csv_ids):
+            rows.append(_build_row(entity, mapping, geometry_columns))
+            row_count += 1
+            progress.tick()
 
-            if unique_csv_id and entity[mapping[unique_csv_id]] in csv_ids:
-                continue
+            # Write the pending rows before saving a checkpoint
+            save_checkpoint = checkpoint is not None and checkpoint.due()
+            if len(rows) == GEOMETRY_BATCH_SIZE or save_checkpoint:
+                _write_rows(writer, rows, geometry_columns)
+                rows = []
 
-            row = {}
-            for attribute_name, lookup_key in mapping.items():
-                row[attribute_name] = get_entity_value(entity, lookup_key)
+            if save_checkpoint:
+                checkpoint.save(fp, row_count)
 
-            writer.writerow(row)
-            row_count += 1
-            progress.tick()
+        _write_rows(writer, rows, geometry_columns)
 
     return row_count
@@ -16,9 +16,14 @@ import decimal
 
 from gobcore.utils import ProgressTicker
 
+from gobexport.checkpoint import Checkpoint
+from gobexport.exporter.compression import open_file
 from gobexport.exporter.utils import nested_entity_get
 from gobexport.filters.entity_filter import EntityFilter
 
+# Matches the attributes of a format, e.g. 'identificatie:str|ligtInBuurt.code:str|status.code:str:{1: "A"}'
+FORMAT_PATTERN = re.compile('([\\[\\]\\w.]+):(\\w+):?({[\\d\\w\\s:",]*}|\\w+)?\\|?')
+
 
 def _to_plain(value, *args):
     """Convert to plain string value
@@ -218,7 +223,8 @@ def type_convert(type_name, value, *args):
     return converters[type_name](value, *args)
 
 
-def dat_exporter(api, file, format=None, append=False, filter: EntityFilter = None):
+def dat_exporter(api, file, format=None, append=False, filter: EntityFilter = None, compression: str = None,
+                 encryption_key: str = None, checkpoint: Checkpoint = None):
     """Exports a single entity
 
     Headers:       None
@@ -230,13 +236,18 @@ def dat_exporter(api, file, format=None, append=False, filter: EntityFilter = No
     A declarative way of describing exports is used:
     The export format is used both to read the attributes and types and to write the correct output format.
 
+    :param compression: compress the file while it is written (gzip, zstd), see open_file
+    :param encryption_key: encrypt the file while it is written with this public key, see open_file
+    :param checkpoint: save checkpoints while writing, continue after the rows of a restored checkpoint
     :return:
     """
     if append:
         raise NotImplementedError("Appending not implemented for this exporter")
 
-    row_count = 0
-    with open(file, 'w') as fp, ProgressTicker("Export entities", 10000) as progress:
+    resumed = checkpoint is not None and checkpoint.resumed
+    row_count = checkpoint.rows if resumed else 0
+    with open_file(file, 'a' if resumed else 'w', compression, encryption_key) as fp, \
+            ProgressTicker("Export entities", 10000) as progress:
         # Get the headers from the first record in the API
         for entity in api:
             if filter and not filter.filter(entity):
@@ -246,9 +257,8 @@ def dat_exporter(api, file, format=None, append=False, filter: EntityFilter = No
             row_count += 1
             entity['row_count'] = row_count
 
-            pattern = re.compile('([\\[\\]\\w.]+):(\\w+):?({[\\d\\w\\s:",]*}|\\w+)?\\|?')
             export = []
-            for (attr_name, attr_type, args) in re.findall(pattern, format):
+            for (attr_name, attr_type, args) in re.findall(FORMAT_PATTERN, format):
                 # Get the nested value if a '.' is in the attr_name
                 value = nested_entity_get(entity, attr_name.split('.')) if '.' in attr_name else entity.get(attr_name)
                 attr_value = type_convert(attr_type, value, args)
@@ -258,4 +268,7 @@ def dat_exporter(api, file, format=None, append=False, filter: EntityFilter = No
 
             progress.tick()
 
+            if checkpoint and checkpoint.due():
+                checkpoint.save(fp, row_count)
+
     return row_count
@@ -1,14 +1,54 @@
+"""Hybrid encryption of export files
+
+The data is encrypted with a random AES-256 key in AES-GCM mode. The AES key is encrypted using an asymmetric public
+key (RSA-OAEP), because asymmetrical encryption is not suited for large files.
+
+An encrypted file consists of a header followed by the encrypted chunks:
+
+    MAGIC:key_length:encrypted_key:chunk chunk ... chunk
+
+    key_length:    the length of the encrypted key, 4 digits
+    encrypted_key: the base64 encoded, RSA-OAEP encrypted AES key
+    chunk:         4 bytes (big-endian) length of the encrypted chunk, followed by the encrypted chunk (including
+                   the 16 bytes GCM authentication tag)
+
+Each chunk contains at most CHUNK_SIZE bytes of data. The nonce of a chunk is its index (11 bytes, big-endian)
+followed by a byte that marks the last chunk. Reordering, removing or truncating chunks therefore fails to decrypt.
+
+Chunks are encrypted as the data is written, so a file is never held in memory as a whole.
+"""
 import base64
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterator
 
-from cryptography.fernet import Fernet
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
+from gobcore.exceptions import GOBException
 from gobexport.config import get_public_key
 
+MAGIC = b'GOBAESGCM1'
 DELIMITER = b':'
 
+CHUNK_SIZE = 1024 * 1024
+CHUNK_LENGTH_SIZE = 4
+
+# Number of threads that encrypt chunks in parallel
+WORKERS = min(4, os.cpu_count() or 1)
+
+
+def _padding():
+    return padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+
 
 def _encrypt_symmetric_key(public_key, symmetric_key):
     """ Encrypt a symmetric key using an asymmetric public key.
@@ -23,44 +63,169 @@ def _encrypt_symmetric_key(public_key, symmetric_key):
             backend=default_backend()
         )
 
-    encrypted_key = public_key.encrypt(
-        symmetric_key,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        ))
+    encrypted_key = public_key.encrypt(symmetric_key, _padding())
 
     # Base64 encrypt the key for transport
     return base64.b64encode(encrypted_key)
 
 
+def _decrypt_symmetric_key(private_key, encrypted_key, password=None):
+    """ Decrypt a symmetric key that has been encrypted by _encrypt_symmetric_key
+
+    :param private_key: The file with the private key that matches the public key
+    :param encrypted_key: The base64 encoded encrypted key
+    :param password: The password of the private key, if any
+    :return: The symmetric key
+    """
+    with open(private_key, 'rb') as key:
+        private_key = serialization.load_pem_private_key(
+            key.read(),
+            password=password,
+            backend=default_backend()
+        )
+
+    return private_key.decrypt(base64.b64decode(encrypted_key), _padding())
+
+
+def _nonce(index: int, last: bool) -> bytes:
+    return index.to_bytes(11, 'big') + (b'\x01' if last else b'\x00')
+
+
+class EncryptedWriter(io.RawIOBase):
+    """Binary stream that encrypts all data that is written to a file object
+
+    The header is written when the stream is created. Full chunks are encrypted in parallel by WORKERS threads, the
+    encrypted chunks are written in order. The last chunk is encrypted when the stream is closed.
+
+    The file object is closed when the stream is closed.
+    """
+
+    def __init__(self, fp: BinaryIO, key_name: str, chunk_size: int = CHUNK_SIZE, workers: int = WORKERS):
+        self._fp = fp
+        self.chunk_size = chunk_size
+
+        symmetric_key = AESGCM.generate_key(bit_length=256)
+        self._aesgcm = AESGCM(symmetric_key)
+
+        encrypted_key = _encrypt_symmetric_key(get_public_key(key_name), symmetric_key)
+        key_length = f'{len(encrypted_key):04}'.encode()
+        fp.write(DELIMITER.join([MAGIC, key_length, encrypted_key, b'']))
+
+        self._buffer = bytearray()
+        self._position = 0
+        self._index = 0
+
+        # Limit the number of chunks in memory
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(workers) if workers > 1 else None
+        self._pending = deque()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, b):
+        self._buffer += b
+        self._position += len(b)
+
+        # Only encrypt a full chunk when more data follows, the last chunk is encrypted on close
+        while len(self._buffer) > self.chunk_size:
+            self._encrypt(bytes(self._buffer[:self.chunk_size]), last=False)
+            del self._buffer[:self.chunk_size]
+        return len(b)
+
+    def _encrypt(self, chunk: bytes, last: bool):
+        nonce = _nonce(self._index, last)
+        self._index += 1
+
+        if self._executor is None:
+            self._write_chunk(self._aesgcm.encrypt(nonce, chunk, MAGIC))
+            return
+
+        self._pending.append(self._executor.submit(self._aesgcm.encrypt, nonce, chunk, MAGIC))
+        while len(self._pending) > 2 * self._workers:
+            self._write_chunk(self._pending.popleft().result())
+
+    def _write_chunk(self, encrypted_chunk: bytes):
+        self._fp.write(len(encrypted_chunk).to_bytes(CHUNK_LENGTH_SIZE, 'big'))
+        self._fp.write(encrypted_chunk)
+
+    def close(self):
+        if self.closed:
+            return
+
+        self._encrypt(bytes(self._buffer), last=True)
+        while self._pending:
+            self._write_chunk(self._pending.popleft().result())
+
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._fp.close()
+        super().close()
+
+
 def encrypt_file(file_name, key_name):
     """ Encrypt a file using symmetric encryption and encrypt the symmetric key using an asymmetric public key.
 
-    The result is a file with the key length, the encrypted symmetric key, and the encrypted data. This hybrid approach
-    is chosen because asymmetrical encryption is not suited for large files.
+    The file is encrypted chunk by chunk to a new file, which then replaces the original file.
+    Exporters that write text files encrypt while writing instead, see open_file.
 
     :param file_name: The file_name of the file to encrypt
     :param key_name: The name of the public key to use
     """
-    public_key = get_public_key(key_name)
+    encrypted_file_name = f"{file_name}.encrypted"
+
+    with open(file_name, 'rb') as src, EncryptedWriter(open(encrypted_file_name, 'wb'), key_name) as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            dst.write(chunk)
+
+    os.replace(encrypted_file_name, file_name)
+
+
+def _read(fp: BinaryIO, size: int) -> bytes:
+    data = fp.read(size)
+    if len(data) != size:
+        raise GOBException("Encrypted file is truncated")
+    return data
+
+
+def decrypt_stream(fp: BinaryIO, private_key: str, password: bytes = None) -> Iterator[bytes]:
+    """ Decrypt an encrypted file chunk by chunk
+
+    :param fp: The encrypted file, opened in binary mode
+    :param private_key: The file with the private key that matches the public key that has been used to encrypt
+    :param password: The password of the private key, if any
+    :return: The decrypted chunks
+    """
+    if _read(fp, len(MAGIC) + 1) != MAGIC + DELIMITER:
+        raise GOBException("Not an encrypted file")
 
-    symmetric_key = Fernet.generate_key()
+    key_length = int(_read(fp, 4))
+    _read(fp, 1)
+    aesgcm = AESGCM(_decrypt_symmetric_key(private_key, _read(fp, key_length), password))
+    _read(fp, 1)
 
-    with open(file_name, "rb") as file:
-        unencrypted_data = file.read()
+    index = 0
+    length = _read(fp, CHUNK_LENGTH_SIZE)
+    while length:
+        encrypted_chunk = _read(fp, int.from_bytes(length, 'big'))
 
-    # Encrypt the data in the file using Fernet
-    f = Fernet(symmetric_key)
-    encrypted_data = f.encrypt(unencrypted_data)
+        # The chunk is the last chunk if no other chunk follows
+        length = fp.read(CHUNK_LENGTH_SIZE)
+        yield aesgcm.decrypt(_nonce(index, last=not length), encrypted_chunk, MAGIC)
+        index += 1
 
-    # Encrypt the symmetric key using the public key
-    encrypted_symmetric_key = _encrypt_symmetric_key(public_key, symmetric_key)
 
-    # The first 4 bytes of the file will be the length of the encrypted_symmetric_key
-    key_length = f'{len(encrypted_symmetric_key):04}'.encode()
+def decrypt_file(file_name, destination, private_key, password=None):
+    """ Decrypt a file that has been encrypted by encrypt_file or while it was exported
 
-    # Save the key length, encrypted key and data separated by dots to the file
-    with open(file_name, 'wb') as file:
-        file.write(DELIMITER.join([key_length, encrypted_symmetric_key, encrypted_data]))
+    :param file_name: The file_name of the encrypted file
+    :param destination: The file_name of the decrypted file
+    :param private_key: The file with the private key that matches the public key that has been used to encrypt
+    :param password: The password of the private key, if any
+    """
+    with open(file_name, 'rb') as src, open(destination, 'wb') as dst:
+        for chunk in decrypt_stream(src, private_key, password):
+            dst.write(chunk)
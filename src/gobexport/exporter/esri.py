@@ -1,13 +1,15 @@
+import glob
+import json
 import os
 
 import osgeo
 from osgeo import gdal, ogr, osr
-from shapely.geometry import shape
 
 from gobcore.utils import ProgressTicker
 
 from gobexport.exporter.utils import split_field_reference, get_entity_value
 from gobexport.filters.entity_filter import EntityFilter
+from gobexport.formatter.geometry import format_geometry
 
 
 GDAL_MAJOR = int(osgeo.__version__.split('.')[0])
@@ -32,6 +34,9 @@ if GDAL_MAJOR > 2:  # pragma: no cover
 transform = osr.CoordinateTransformation(spatialref_rd, spatialref_wgs84)
 COORDINATE_PRECISION = 7
 
+# The max_part_size of large shapefiles, which stays well below the 2 GB limit of the .shp and .dbf files
+SHAPEFILE_PART_SIZE = 1_900_000_000
+
 
 def add_field_definitions(layer, fieldnames):
     """Adds all fieldnames to a shape layer definition
@@ -46,11 +51,27 @@ def add_field_definitions(layer, fieldnames):
 
 
 def create_geometry(entity_geometry):
+    """Create an OGR geometry from the geometry value of an entity.
+
+    The value is handed to OGR directly, without a shapely/WKT round-trip:
+    - str: WKT (GraphQLStreaming)
+    - dict: GeoJSON (REST and GraphQL)
+    - bytes: WKB
+    - any other value is considered to be OGR-ready (ogr.Geometry) and used as is
+
+    :param entity_geometry:
+    :return: the OGR geometry
+    """
     assert entity_geometry is not None
-    # Get geometry from GEOJSON or WKTstring (GraphQLStreaming)
-    geometry_wkt = shape(entity_geometry).wkt if isinstance(entity_geometry, dict) else entity_geometry
-    # Add geometrie
-    poly = ogr.CreateGeometryFromWkt(geometry_wkt)
+
+    if isinstance(entity_geometry, str):
+        poly = ogr.CreateGeometryFromWkt(entity_geometry)
+    elif isinstance(entity_geometry, dict):
+        poly = ogr.CreateGeometryFromJson(json.dumps(entity_geometry))
+    elif isinstance(entity_geometry, (bytes, bytearray)):
+        poly = ogr.CreateGeometryFromWkb(bytes(entity_geometry))
+    else:
+        poly = entity_geometry
 
     # Force geometriecollection to polygon
     if poly and poly.GetGeometryType() == ogr.wkbGeometryCollection:
@@ -65,6 +86,21 @@ def _get_geometry_type(entity_geometry):
     return geometry_type
 
 
+def _get_geometry_source(geometry_field):
+    """Return the reference to read the geometry of an entity from.
+
+    When the geometry is only formatted to WKT by format_geometry, the formatter is skipped and the source value
+    (GeoJSON or WKT) is read instead. create_geometry parses it directly.
+
+    :param geometry_field: the geometry field reference or action as defined in the format
+    :return:
+    """
+    if isinstance(geometry_field, dict) and geometry_field.get('formatter') is format_geometry \
+            and not geometry_field.get('kwargs'):
+        return geometry_field['value']
+    return geometry_field
+
+
 def _create_cpg(filepath: str):
     """
     Write cpg file to the same destination, which specifies the encoding of the .dbf file.
@@ -77,7 +113,152 @@ def _create_cpg(filepath: str):
         cpg_file.write(ENCODING)
 
 
-def esri_exporter(api, file, format=None, append=False, filter: EntityFilter = None):
+def part_filename(filename: str, part: int) -> str:
+    """Return the filename of a numbered part of a file
+
+    The first part keeps the original filename, e.g.
+        SHP/BAG_pand.shp, 1 => SHP/BAG_pand.shp
+        SHP/BAG_pand.shp, 2 => SHP/BAG_pand_part2.shp
+
+    :param filename:
+    :param part:
+    :return:
+    """
+    if part == 1:
+        return filename
+    path, ext = os.path.splitext(filename)
+    return f"{path}_part{part}{ext}"
+
+
+def _remove_parts(filepath: str):
+    """Remove any part files (part 2 and up) of a previous export of filepath, including their extra files."""
+    path, _ = os.path.splitext(filepath)
+    for part_file in glob.glob(f"{glob.escape(path)}_part[0-9]*.*"):
+        os.remove(part_file)
+
+
+class _PartSize:
+    """Estimates the size of the .shp and .dbf files of a shapefile while it is being written
+
+    The .dbf records are written with the declared field widths, which are widened to fit longer values. The fields
+    are only reduced to the width of their values (RESIZE=YES) when the file is closed.
+    """
+    SHP_HEADER = 100
+    SHP_RECORD_HEADER = 8 + 44  # record header, shape type, bounding box, number of parts and points
+    DBF_FIELD_HEADER = 32
+    # The width of the string fields without a declared width, see add_field_definitions
+    DBF_STRING_WIDTH = 80
+
+    def __init__(self, fieldnames):
+        self.shp = self.SHP_HEADER
+        self.rows = 0
+        self.widths = {fieldname: self.DBF_STRING_WIDTH for fieldname in fieldnames}
+
+    def add(self, geometry, values: dict):
+        self.shp += self.SHP_RECORD_HEADER + (geometry.WkbSize() if geometry is not None else 0)
+        self.rows += 1
+        for fieldname, value in values.items():
+            self.widths[fieldname] = max(self.widths[fieldname], len(str(value).encode(ENCODING)))
+
+    @property
+    def dbf(self):
+        header = self.DBF_FIELD_HEADER * (len(self.widths) + 1) + 1
+        return header + self.rows * (1 + sum(self.widths.values()))
+
+    def exceeds(self, max_size: int) -> bool:
+        return max(self.shp, self.dbf) >= max_size
+
+
+def _create_layer(dstfile, spatialref, geometry_type, fieldnames, name="layer", options=None):
+    """Create the layer of a vector file and add all field definitions
+
+    :return: the layer
+    """
+    dstlayer = dstfile.CreateLayer(name, spatialref, geom_type=geometry_type, options=options or [])
+    add_field_definitions(dstlayer, fieldnames)
+    return dstlayer
+
+
+def _set_fields(feature, entity: dict, fields: dict, empty_value='') -> dict:
+    """Set the attribute fields of a feature to the values of an entity
+
+    :param feature:
+    :param entity:
+    :param fields: the field references by attribute name
+    :param empty_value: value to set when the entity has no value, None leaves the field unset
+    :return: the values by attribute name
+    """
+    values = {}
+    for attribute_name, source in fields.items():
+        value = get_entity_value(entity, split_field_reference(source))
+        value = empty_value if value is None else value
+
+        if value is not None:
+            feature.SetField(attribute_name, value)
+        values[attribute_name] = value
+    return values
+
+
+class _ShapefileParts:
+    """Shapefile data source that rolls over to numbered part files
+
+    Without a max_part_size all features are written to a single shapefile.
+    """
+
+    # Auto-reduce field sizes, encode data to utf-8
+    # see https://gdal.org/drivers/vector/shapefile.html#layer-creation-options
+    LAYER_OPTIONS = ['RESIZE=YES', f'ENCODING={ENCODING}']
+
+    def __init__(self, file: str, spatialref, fieldnames, max_part_size: int = None):
+        self.file = file
+        self.spatialref = spatialref
+        self.fieldnames = fieldnames
+        self.max_part_size = max_part_size
+
+        self.part = 1
+        self.geometry_type = None
+        self.dstlayer = None
+        self.size = _PartSize(fieldnames)
+
+        if max_part_size:
+            _remove_parts(file)
+
+        self.driver = ogr.GetDriverByName("ESRI Shapefile")
+        self.dstfile = self.driver.CreateDataSource(file)
+
+    def create_layer(self, geometry_type):
+        self.geometry_type = geometry_type
+        self.dstlayer = _create_layer(
+            self.dstfile, self.spatialref, geometry_type, self.fieldnames, options=self.LAYER_OPTIONS)
+        self.size = _PartSize(self.fieldnames)
+
+    def layer(self):
+        """Return the layer to write the next feature to
+
+        When the current part is full, it is closed and the layer of the next part is returned.
+        """
+        if self.max_part_size and self.size.exceeds(self.max_part_size):
+            self.close()
+            self.part += 1
+            self.dstfile = self.driver.CreateDataSource(part_filename(self.file, self.part))
+            self.create_layer(self.geometry_type)
+        return self.dstlayer
+
+    def add(self, geometry, values: dict):
+        """Register a written feature."""
+        if self.max_part_size:
+            self.size.add(geometry, values)
+
+    def close(self):
+        # When no rows are returned no layer has been made, so create it afterwards to make sure files exist
+        if self.dstlayer is None:
+            self.dstlayer = self.dstfile.CreateLayer("layer", self.spatialref, geom_type=ogr.wkbPolygon)
+
+        self.dstfile.Destroy()
+        _create_cpg(part_filename(self.file, self.part))
+
+
+def esri_exporter(api, file, format=None, append=False, filter: EntityFilter = None, max_part_size: int = None):
     """ESRI Exporter
 
     This function will transform the output of an API to ESRI shape files. The
@@ -86,23 +267,31 @@ def esri_exporter(api, file, format=None, append=False, filter: EntityFilter = N
 
     It uses the python bindings to the GDAL library.
 
+    When max_part_size is set, the export rolls over to a new set of files before the .shp or .dbf file
+    of the current part exceeds max_part_size bytes. The parts are numbered, see part_filename.
+
     :param api: The encapsulated API as an iterator
     :param file: The main file (.shp) to write to
     :param format: The mapping of the API output to ESRI fields as defined in the
     export config. The max length of an esri fieldname is 10 characters.
+    :param max_part_size: The maximum size in bytes of the .shp and .dbf file of each part
     """
     if append:
         raise NotImplementedError("Appending not implemented for this exporter")
 
     row_count = 0
-    driver = ogr.GetDriverByName("ESRI Shapefile")
-    dstfile = driver.CreateDataSource(file)
 
     # Set spatialref to RD
     spatialref = osr.SpatialReference()
     spatialref.ImportFromEPSG(28992)
 
     geometry_field = format['geometrie'] if 'geometrie' in format.keys() else 'geometrie'
+    geometry_source = _get_geometry_source(geometry_field)
+
+    # Add all field definitions, but skip geometrie
+    all_fields = {k: v for k, v in format.items() if k is not geometry_field}
+
+    shapefile = _ShapefileParts(file, spatialref, all_fields.keys(), max_part_size)
 
     with ProgressTicker("Export entities", 10000) as progress:
         # Get records from the API and build the esri file
@@ -110,47 +299,31 @@ def esri_exporter(api, file, format=None, append=False, filter: EntityFilter = N
             if filter and not filter.filter(entity):
                 continue
 
-            entity_geometry = get_entity_value(entity, geometry_field)
+            entity_geometry = get_entity_value(entity, geometry_source)
 
             # On the first entity determine the type of shapefile we need to export
             if row_count == 0:
                 # Please note that it will fail if a file with the same name already exists
-                geometry_type = _get_geometry_type(entity_geometry)
-
-                # Auto-reduce field sizes, encode data to utf-8
-                # see https://gdal.org/drivers/vector/shapefile.html#layer-creation-options
-                dstlayer = dstfile.CreateLayer(
-                    "layer", spatialref, geom_type=geometry_type, options=['RESIZE=YES', f'ENCODING={ENCODING}']
-                )
-
-                # Add all field definitions, but skip geometrie
-                all_fields = {k: v for k, v in format.items() if k is not geometry_field}
-                add_field_definitions(dstlayer, all_fields.keys())
+                shapefile.create_layer(_get_geometry_type(entity_geometry))
 
+            dstlayer = shapefile.layer()
             feature = ogr.Feature(dstlayer.GetLayerDefn())
-            if entity_geometry:
-                feature.SetGeometry(create_geometry(entity_geometry))
 
-            for attribute_name, source in all_fields.items():
-                mapping = split_field_reference(source)
-                value = get_entity_value(entity, mapping)
-
-                # Esri expects an emtpy string when value is None
-                value = '' if value is None else value
+            geometry = create_geometry(entity_geometry) if entity_geometry else None
+            if entity_geometry:
+                feature.SetGeometry(geometry)
 
-                feature.SetField(attribute_name, value)
+            # Esri expects an emtpy string when value is None
+            values = _set_fields(feature, entity, all_fields, empty_value='')
 
             dstlayer.CreateFeature(feature)
 
             feature.Destroy()
+            shapefile.add(geometry, values)
             row_count += 1
             progress.tick()
 
-    # When no rows are returned no layer has been made, so create it afterwards to make sure files exist
-    dstlayer = dstfile.CreateLayer("layer", spatialref, geom_type=ogr.wkbPolygon) if row_count == 0 else dstlayer
-
-    dstfile.Destroy()
-    _create_cpg(file)
+    shapefile.close()
 
     return row_count
 
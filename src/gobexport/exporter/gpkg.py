@@ -0,0 +1,99 @@
+import os
+
+from osgeo import ogr, osr
+
+from gobcore.utils import ProgressTicker
+
+from gobexport.exporter.esri import _create_layer, _get_geometry_source, _get_geometry_type, _set_fields, \
+    create_geometry
+from gobexport.exporter.utils import get_entity_value
+from gobexport.filters.entity_filter import EntityFilter
+
+# Number of features that are written in one SQLite transaction
+BATCH_SIZE = 10_000
+
+
+def _create_datasource(file: str):
+    """Create an empty GeoPackage, a GeoPackage is a database so any existing file is removed first."""
+    driver = ogr.GetDriverByName("GPKG")
+    if os.path.exists(file):
+        driver.DeleteDataSource(file)
+    return driver.CreateDataSource(file)
+
+
+def _close_layer(dstfile, dstlayer, spatialref, fieldnames, layer_name: str):
+    """Commit the last transaction and build the spatial index
+
+    When no rows are returned no layer has been made, so create it afterwards to make sure the layer exists
+    """
+    if dstlayer is None:
+        _create_layer(dstfile, spatialref, ogr.wkbPolygon, fieldnames, name=layer_name)
+    else:
+        dstlayer.CommitTransaction()
+        dstfile.ExecuteSQL(f"SELECT gpkgAddSpatialIndex('{layer_name}', '{dstlayer.GetGeometryColumn()}')")
+
+
+def gpkg_exporter(api, file, format=None, append=False, filter: EntityFilter = None):
+    """GeoPackage Exporter
+
+    This function will transform the output of an API to a GeoPackage (.gpkg) file. The format is the same as
+    for the ESRI exporter, but a GeoPackage has no 2 GB file size limit and no 254 character field limit.
+
+    The features are written in SQLite transactions of BATCH_SIZE features. The spatial index is built once, after
+    all features have been written.
+
+    :param api: The encapsulated API as an iterator
+    :param file: The file (.gpkg) to write to
+    :param format: The mapping of the API output to fields as defined in the export config, see esri_exporter
+    """
+    if append:
+        raise NotImplementedError("Appending not implemented for this exporter")
+
+    row_count = 0
+    dstfile = _create_datasource(file)
+    dstlayer = None
+
+    # Set spatialref to RD
+    spatialref = osr.SpatialReference()
+    spatialref.ImportFromEPSG(28992)
+
+    layer_name = os.path.splitext(os.path.basename(file))[0]
+
+    geometry_field = format['geometrie'] if 'geometrie' in format.keys() else 'geometrie'
+    geometry_source = _get_geometry_source(geometry_field)
+
+    # Add all field definitions, but skip geometrie
+    all_fields = {k: v for k, v in format.items() if k is not geometry_field}
+
+    with ProgressTicker("Export entities", 10000) as progress:
+        for entity in api:
+            if filter and not filter.filter(entity):
+                continue
+
+            entity_geometry = get_entity_value(entity, geometry_source)
+
+            if row_count == 0:
+                dstlayer = _create_layer(dstfile, spatialref, _get_geometry_type(entity_geometry), all_fields.keys(),
+                                         name=layer_name, options=['SPATIAL_INDEX=NO'])
+                dstlayer.StartTransaction()
+            elif row_count % BATCH_SIZE == 0:
+                dstlayer.CommitTransaction()
+                dstlayer.StartTransaction()
+
+            feature = ogr.Feature(dstlayer.GetLayerDefn())
+            if entity_geometry:
+                feature.SetGeometry(create_geometry(entity_geometry))
+
+            # Leave fields without a value empty (NULL)
+            _set_fields(feature, entity, all_fields, empty_value=None)
+
+            dstlayer.CreateFeature(feature)
+
+            feature.Destroy()
+            row_count += 1
+            progress.tick()
+
+    _close_layer(dstfile, dstlayer, spatialref, all_fields.keys(), layer_name)
+    dstfile.Destroy()
+
+    return row_count
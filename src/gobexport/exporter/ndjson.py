@@ -1,24 +1,64 @@
 import json
+from typing import Iterable
 
 from gobcore.utils import ProgressTicker
+from gobexport.checkpoint import Checkpoint
+from gobexport.exporter.compression import open_file
 from gobexport.filters.entity_filter import EntityFilter
 
 
-def ndjson_exporter(api, file, format=None, append=False, filter: EntityFilter = None):
+def _write_raw(lines: Iterable[bytes], fp, filter: EntityFilter, progress) -> int:
+    """Writes raw NDJSON lines to a binary file, without decoding and encoding the lines
+
+    :param lines: the lines of the source, without line endings
+    :param fp: the binary file
+    :param filter: filter on the raw lines, see RawFilter
+    :param progress:
+    :return: number of lines written
+    """
+    row_count = 0
+    for line in lines:
+        if filter and not filter.filter(line):
+            continue
+
+        fp.write(line)
+        fp.write(b'\n')
+
+        row_count += 1
+        progress.tick()
+
+    return row_count
+
+
+def ndjson_exporter(api, file, format=None, append=False, filter: EntityFilter = None, compression: str = None,
+                    encryption_key: str = None, raw: bool = False, checkpoint: Checkpoint = None):
     """
     Exports a single entity in Newline Delimited JSON format
 
+    In raw mode the api returns the lines of an NDJSON source as bytes, these lines are written as is.
+
     :param api: API reader instance
     :param file: name of the file to write results
     :param format: NA
     :param append: NA
+    :param compression: compress the file while it is written (gzip, zstd), see open_file
+    :param encryption_key: encrypt the file while it is written with this public key, see open_file
+    :param raw: pass the raw lines of the api through to the file
+    :param checkpoint: save checkpoints while writing, continue after the rows of a restored checkpoint
     :return: number of rows exported
     """
     if append:
         raise NotImplementedError("Appending not implemented for this exporter")
 
-    row_count = 0
-    with open(file, 'w') as fp, ProgressTicker("Export entities", 10000) as progress:
+    if raw:
+        with open_file(file, 'wb', compression, encryption_key) as fp, \
+                ProgressTicker("Export entities", 10000) as progress:
+            return _write_raw(api, fp, filter, progress)
+
+    resumed = checkpoint is not None and checkpoint.resumed
+    row_count = checkpoint.rows if resumed else 0
+    with open_file(file, 'a' if resumed else 'w', compression, encryption_key) as fp, \
+            ProgressTicker("Export entities", 10000) as progress:
         for entity in api:
             if filter and not filter.filter(entity):
                 continue
@@ -30,4 +70,7 @@ def ndjson_exporter(api, file, format=None, append=False, filter: EntityFilter =
             row_count += 1
             progress.tick()
 
+            if checkpoint and checkpoint.due():
+                checkpoint.save(fp, row_count)
+
     return row_count
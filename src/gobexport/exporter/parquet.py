@@ -0,0 +1,198 @@
+import copy
+import json
+import pickle
+import tempfile
+from typing import BinaryIO, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from osgeo import osr
+
+from gobcore.exceptions import GOBException
+from gobcore.utils import ProgressTicker
+from gobexport.exporter.csv import build_mapping_from_format, _build_row, _get_geometry_columns
+from gobexport.filters.entity_filter import EntityFilter
+from gobexport.formatter.geometry import geometries_to_wkb
+
+# Number of rows that are written at once, each batch becomes a row group in the parquet file
+ROW_GROUP_SIZE = 50_000
+
+MIME_TYPE = "application/vnd.apache.parquet"
+
+# See https://geoparquet.org/releases/v1.0.0/
+GEOPARQUET_VERSION = "1.0.0"
+
+
+def parquet_product(product: dict, filename: str) -> dict:
+    """Returns a parquet product with the same source and format as the given (csv) product
+
+    The products share the same source, so the entities are retrieved only once for both products. The products
+    get their own copies of the format and the entity filters, as filters keep state while filtering.
+
+    :param product: the product to derive the parquet product from
+    :param filename: the filename of the parquet product
+    :return:
+    """
+    return {
+        **product,
+        **{key: copy.deepcopy(product[key]) for key in ['format', 'entity_filters'] if key in product},
+        'exporter': parquet_exporter,
+        'filename': filename,
+        'mime_type': MIME_TYPE,
+    }
+
+
+def _get_crs() -> dict:
+    """Returns the RD coordinate reference system as PROJJSON."""
+    spatialref = osr.SpatialReference()
+    spatialref.ImportFromEPSG(28992)
+    return json.loads(spatialref.ExportToPROJJSON())
+
+
+def _get_column_type(types: set[type]) -> pa.DataType:
+    """Returns the column type for the types of the values of a column
+
+    Columns with only booleans, integers or numbers get the corresponding type, all other columns are strings. Integers
+    and numbers together are numbers.
+
+    :param types: the types of the values of the column, without the type of None
+    :return:
+    """
+    if types == {bool}:
+        return pa.bool_()
+    if types == {int}:
+        return pa.int64()
+    if types and types <= {int, float}:
+        return pa.float64()
+    return pa.string()
+
+
+def _get_schema(column_types: dict[str, set[type]], fieldnames: list[str], geometry_columns: dict) -> pa.Schema:
+    """Returns the schema of the parquet file, including the GeoParquet metadata
+
+    :param column_types: the types of the values of each column, see _get_column_type
+    :param fieldnames:
+    :param geometry_columns:
+    :return:
+    """
+    fields = [
+        pa.field(name, pa.binary() if name in geometry_columns else _get_column_type(column_types[name]))
+        for name in fieldnames
+    ]
+
+    if not geometry_columns:
+        return pa.schema(fields)
+
+    crs = _get_crs()
+    geo = {
+        'version': GEOPARQUET_VERSION,
+        'primary_column': next(iter(geometry_columns)),
+        'columns': {
+            name: {'encoding': 'WKB', 'geometry_types': [], 'crs': crs} for name in geometry_columns
+        }
+    }
+    return pa.schema(fields, metadata={'geo': json.dumps(geo)})
+
+
+def _to_array(values: list, field: pa.Field) -> pa.Array:
+    """Returns the values of a column as an array of the column type
+
+    The values are converted by a safe cast, values that do not fit the column type (e.g. an integer that does not
+    fit in 64 bits) are not truncated but raise an exception.
+
+    :param values:
+    :param field:
+    :return:
+    """
+    if pa.types.is_string(field.type):
+        values = [None if value is None else str(value) for value in values]
+
+    try:
+        return pa.array(values).cast(field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError) as e:
+        raise GOBException(f"Column {field.name} does not match type {field.type}: {str(e)}")
+
+
+def _spill_rows(spill: BinaryIO, rows: list[dict], fieldnames: list[str], geometry_columns: dict,
+                column_types: dict[str, set[type]]):
+    """Writes the columns of a row group to the spill file and registers the types of their values
+
+    The geometry columns are converted to wkb in one batch.
+
+    :param spill: the file to write the columns to
+    :param rows: rows with the raw geometry values in the geometry columns
+    :param fieldnames:
+    :param geometry_columns:
+    :param column_types: the types of the values of each column so far
+    :return:
+    """
+    columns = {}
+    for name in fieldnames:
+        values = [row[name] for row in rows]
+        if name in geometry_columns:
+            values = geometries_to_wkb(values)
+        else:
+            column_types[name] |= {type(value) for value in values if value is not None}
+        columns[name] = values
+
+    pickle.dump(columns, spill, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _write_row_group(writer: pq.ParquetWriter, columns: dict[str, list]):
+    writer.write_table(pa.Table.from_arrays([_to_array(columns[field.name], field) for field in writer.schema],
+                                            schema=writer.schema))
+
+
+def parquet_exporter(api, file, format=None, append=False, filter: Optional[EntityFilter] = None):
+    """Parquet Exporter
+
+    Exports the output of the API to a (Geo)Parquet file. The format is the same as for the csv exporter.
+
+    The rows are written in row groups of ROW_GROUP_SIZE rows, so only one row group is kept in memory. Columns are
+    typed by all their values (integer, number, boolean or otherwise string), so the row groups are first written
+    to a temporary spill file and copied to the parquet file when the types are known. Geometry columns (formatted
+    by format_geometry) are written as wkb, these columns are described in the GeoParquet metadata of the file.
+
+    :param api: the API wrapper which can be iterated through
+    :param file: the local file to write to
+    :param format: format definition, see csv_exporter
+    :param append: NA
+    :param filter:
+    :return: number of rows exported
+    """
+    if append:
+        raise NotImplementedError("Appending not implemented for this exporter")
+
+    row_count = 0
+
+    mapping = build_mapping_from_format(format)
+    fieldnames = [*mapping.keys()]
+    geometry_columns = _get_geometry_columns(mapping)
+
+    column_types = {name: set() for name in fieldnames}
+    row_groups = 0
+    with ProgressTicker("Export entities", 10000) as progress, tempfile.TemporaryFile() as spill:
+        rows = []
+        for entity in api:
+            if filter and not filter.filter(entity):
+                continue
+
+            rows.append(_build_row(entity, mapping, geometry_columns))
+            row_count += 1
+            progress.tick()
+
+            if len(rows) == ROW_GROUP_SIZE:
+                _spill_rows(spill, rows, fieldnames, geometry_columns, column_types)
+                row_groups += 1
+                rows = []
+
+        if rows:
+            _spill_rows(spill, rows, fieldnames, geometry_columns, column_types)
+            row_groups += 1
+
+        spill.seek(0)
+        with pq.ParquetWriter(file, _get_schema(column_types, fieldnames, geometry_columns)) as writer:
+            for _ in range(row_groups):
+                _write_row_group(writer, pickle.load(spill))
+
+    return row_count
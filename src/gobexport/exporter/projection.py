@@ -0,0 +1,141 @@
+"""Field projection of products
+
+Determines the top-level fields of the source entities that the products of a source read. Sources that are
+decoded from JSON only need to decode these fields, see gobexport.utils.get_decoder.
+
+When the fields of a product cannot be determined (no format, a row formatter, a value builder, an unknown entity
+filter, ...) the product may read any field and no projection is returned.
+"""
+import re
+from typing import Iterable, Optional
+
+from gobexport.exporter.csv import csv_exporter
+from gobexport.exporter.dat import dat_exporter, FORMAT_PATTERN
+from gobexport.exporter.esri import esri_exporter
+from gobexport.exporter.gpkg import gpkg_exporter
+from gobexport.exporter.parquet import parquet_exporter
+from gobexport.exporter.utils import split_field_reference
+
+# Exporters with a format that maps names to field references (lookup keys)
+MAPPING_EXPORTERS = (csv_exporter, esri_exporter, gpkg_exporter, parquet_exporter)
+
+# Exporters that read the geometrie field when the format doesn't define it
+GEOMETRY_EXPORTERS = (esri_exporter, gpkg_exporter)
+
+# Nested references that are not found in an entity are looked up in its _embedded object, see nested_entity_get
+EMBEDDED = '_embedded'
+
+
+def _get_action_references(action: dict) -> Optional[list]:
+    """Returns the field references that an action reads, None if unknown
+
+    :param action:
+    :return:
+    """
+    action_type = action.get('action')
+    if action_type == 'concat':
+        return action['fields']
+    if action_type == 'literal':
+        return []
+    if action_type in ['fill', 'format']:
+        return [action['value']]
+    if action_type == 'case':
+        return [action['reference']]
+    # A value builder can read any field
+    return None
+
+
+def _get_lookup_key_fields(lookup_key) -> Optional[set[str]]:
+    """Returns the top-level fields that a lookup key reads, see get_entity_value
+
+    :param lookup_key: a field reference, a list of keys, an action or a condition
+    :return: the fields, None if unknown
+    """
+    if not lookup_key:
+        return set()
+
+    if isinstance(lookup_key, str):
+        lookup_key = split_field_reference(lookup_key)
+
+    if isinstance(lookup_key, str):
+        return {lookup_key}
+    if isinstance(lookup_key, list):
+        return {lookup_key[0]}
+
+    if lookup_key.get('action'):
+        references = _get_action_references(lookup_key)
+    elif lookup_key.get('condition'):
+        references = [lookup_key.get(key) for key in ['reference', 'trueval', 'falseval']]
+    else:
+        references = None
+
+    return None if references is None else _get_references_fields(references)
+
+
+def _get_references_fields(references: Iterable) -> Optional[set[str]]:
+    fields = set()
+    for reference in references:
+        reference_fields = _get_lookup_key_fields(reference)
+        if reference_fields is None:
+            return None
+        fields |= reference_fields
+    return fields
+
+
+def _get_format_references(product: dict) -> Optional[list]:
+    """Returns the field references in the format of a product, None if unknown
+
+    :param product:
+    :return:
+    """
+    exporter = product.get('exporter')
+    format = product.get('format')
+
+    if format is None:
+        return None
+    if exporter in MAPPING_EXPORTERS:
+        geometry = ['geometrie'] if exporter in GEOMETRY_EXPORTERS and 'geometrie' not in format else []
+        return list(format.values()) + geometry
+    if exporter is dat_exporter:
+        return [attr_name for (attr_name, *_) in re.findall(FORMAT_PATTERN, format)]
+    return None
+
+
+def get_product_fields(product: dict) -> Optional[set[str]]:
+    """Returns the top-level fields of the source entities that are read by a product
+
+    :param product: The product definition
+    :return: the fields, None if the product may read any field
+    """
+    if product.get('row_formatter') or product.get('merge_result'):
+        return None
+
+    references = _get_format_references(product)
+    if references is None:
+        return None
+
+    for entity_filter in product.get('entity_filters', []):
+        filter_references = entity_filter.get_fields()
+        if filter_references is None:
+            return None
+        references += filter_references
+
+    fields = _get_references_fields(references)
+    return None if fields is None else fields | {EMBEDDED}
+
+
+def get_source_fields(products: Iterable[dict]) -> Optional[set[str]]:
+    """Returns the top-level fields of the source entities that are read by all products of the same source
+
+    The products of a source share its (buffered) entities, so each entity should contain the fields of all products.
+
+    :param products: the products with the same source
+    :return: the fields, None if any of the products may read any field
+    """
+    fields = set()
+    for product in products:
+        product_fields = get_product_fields(product)
+        if product_fields is None:
+            return None
+        fields |= product_fields
+    return fields
@@ -0,0 +1,112 @@
+"""Filter pushdown
+
+Entity filters are applied to the entities after they have been transferred, decoded and formatted. Some filters
+can also be expressed as an argument of the root collection of a streaming GraphQL query, so the rows that are
+filtered out are not transferred at all.
+
+The entity filters remain applied to the rows that are received, as a safety net for differences between the
+argument and the filter (e.g. NotEmptyFilter also filters out empty strings and lists).
+
+Pushdown is opt-in per product ('pushdown_filters': True). Only enable it for a product once it has been verified
+that the GOB GraphQL endpoint supports the argument for the filtered attribute, e.g. NOT_NULL for a geometry.
+"""
+import re
+from typing import Optional
+
+from gobexport.filters.entity_filter import EntityFilter
+from gobexport.filters.notempty_filter import NotEmptyFilter
+
+# Argument value of the GOB GraphQL endpoint that selects the rows that have a value for an attribute
+NOT_NULL = '"!null"'
+
+# The root collection of a query and its arguments, if any
+ROOT_PATTERN = re.compile(r'^(\s*{\s*\w+\s*)(\((.*?)\))?')
+
+TOKEN_PATTERN = re.compile(r'\w+|{|}|\([^)]*\)')
+
+
+def _get_root_attributes(query: str) -> set[str]:
+    """Returns the attributes of the root node of a query that have no selection (i.e. are no relations)
+
+    :param query:
+    :return:
+    """
+    node = re.search(r'\bnode\s*{', query)
+    if not node:
+        return set()
+
+    tokens = TOKEN_PATTERN.findall(query[node.end():])
+    attributes = set()
+    depth = 0
+    for token, next_token in zip(tokens, tokens[1:] + ['']):
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            if depth == 0:
+                break
+            depth -= 1
+        elif depth == 0 and token[0] != '(' and next_token != '{' and not next_token.startswith('('):
+            attributes.add(token)
+    return attributes
+
+
+def _get_filter_arguments(entity_filter: EntityFilter, attributes: set[str]) -> Optional[dict]:
+    """Returns the query arguments that select the same rows as an entity filter, None if there are none
+
+    :param entity_filter:
+    :param attributes: the attributes of the root node
+    :return:
+    """
+    if isinstance(entity_filter, NotEmptyFilter) and len(entity_filter.fields) == 1 \
+            and entity_filter.fields[0] in attributes:
+        return {entity_filter.fields[0]: NOT_NULL}
+    return None
+
+
+def _add_arguments(query: str, arguments: dict) -> str:
+    arguments_string = ", ".join([f'{k}: {v}' for k, v in arguments.items()])
+    root = ROOT_PATTERN.search(query)
+
+    if root[3] and root[3].strip():
+        arguments_string = f'{root[3]}, {arguments_string}'
+    return ROOT_PATTERN.sub(lambda m: f'{m[1].rstrip()}({arguments_string})' + ('' if m[2] else ' '), query, count=1)
+
+
+def push_down_filters(product: dict) -> tuple[str, list[EntityFilter]]:
+    """Returns the query of a product with the arguments of the entity filters that can be pushed down
+
+    Only filters on attributes of the root collection of streaming GraphQL queries of products that opt in
+    ('pushdown_filters': True) are pushed down.
+
+    :param product: the product definition
+    :return: the (rewritten) query and the filters that have been pushed down into the query
+    """
+    query = product.get('query')
+    if not product.get('pushdown_filters') or product.get('api_type') != 'graphql_streaming' \
+            or product.get('merge_result'):
+        return query, []
+
+    attributes = _get_root_attributes(query)
+
+    arguments = {}
+    pushed_filters = []
+    for entity_filter in product.get('entity_filters', []):
+        filter_arguments = _get_filter_arguments(entity_filter, attributes)
+        if filter_arguments:
+            arguments |= filter_arguments
+            pushed_filters.append(entity_filter)
+
+    return (_add_arguments(query, arguments), pushed_filters) if arguments else (query, [])
+
+
+class CountingIterable:
+    """Counts the rows of an iterable while it is iterated."""
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.count = 0
+
+    def __iter__(self):
+        for item in self.iterable:
+            self.count += 1
+            yield item
@@ -1,9 +1,25 @@
+from typing import Optional
+
+
 class EntityFilter:
     """Baseclass for EntityFilters. """
 
     def filter(self, entity: dict):
         raise NotImplementedError()
 
+    def get_fields(self) -> Optional[list]:
+        """Returns the field references that the filter reads from an entity, None if unknown."""
+        return None
+
+    def get_raw_fields(self) -> Optional[list]:
+        """Returns the field references that the filter reads, if the filter can be evaluated before the entities
+        are formatted, None otherwise.
+
+        A filter can be evaluated before formatting when it keeps no state and its result only depends on the values
+        of these fields, see GraphQLResultFormatter._is_pruned.
+        """
+        return None
+
     def reset(self):
         # Some filters need a reset after exporting a file
         pass
@@ -19,6 +19,14 @@ class GroupFilter(EntityFilter):
         """
         return all([f.filter(entity) for f in self.filters])
 
+    def get_fields(self):
+        fields = [f.get_fields() for f in self.filters]
+        return None if None in fields else [field for f in fields for field in f]
+
+    def get_raw_fields(self):
+        fields = [f.get_raw_fields() for f in self.filters]
+        return None if None in fields else [field for f in fields for field in f]
+
     def reset(self):
         for f in self.filters:
             f.reset()
@@ -14,3 +14,9 @@ class NotEmptyFilter(EntityFilter):
 
     def filter(self, entity: dict):
         return any([get_entity_value(entity, field) for field in self.fields])
+
+    def get_fields(self):
+        return list(self.fields)
+
+    def get_raw_fields(self):
+        return self.get_fields()
@@ -0,0 +1,27 @@
+from gobexport.filters.entity_filter import EntityFilter
+
+
+class RawFilter(EntityFilter):
+    """Baseclass for filters on raw NDJSON lines.
+
+    Raw exports pass the lines of the source to the output file without decoding them. A RawFilter decides on the
+    bytes of a line whether the line is exported.
+    """
+
+    def filter(self, entity: bytes):
+        raise NotImplementedError()
+
+
+class ContainsFilter(RawFilter):
+    """ContainsFilter
+
+    RawFilter that checks if a line contains the given bytes, e.g. b'"publiceerbaar": true'. With exclude=True only
+    lines that don't contain the bytes pass.
+    """
+
+    def __init__(self, value: bytes, exclude: bool = False):
+        self.value = value
+        self.exclude = exclude
+
+    def filter(self, entity: bytes):
+        return (self.value in entity) != self.exclude
@@ -1,24 +1,189 @@
+"""Unique filter
+
+The values that have been seen are stored compactly: each value is encoded to bytes and identified by a 64-bit
+hash. The hashes are kept in an open-addressing table of fixed-width integers, the encoded values in a single
+bytearray. A hash match is confirmed by comparing the encoded values, so hash collisions never filter out an entity.
+
+When the table uses more memory than the budget, it is spilled to disk as a run of hashes sorted for binary search
+and an empty table is started. Values are then looked up in the table and in all runs.
+"""
+import array
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from gobexport.config import UNIQUE_FILTER_MEMORY_BUDGET
 from gobexport.filters.entity_filter import EntityFilter
 from gobexport.exporter.utils import get_entity_value
 
+# A slot without a value, hashes that are 0 are stored as 1
+EMPTY = 0
+
+INITIAL_CAPACITY = 1024
+MAX_LOAD_FACTOR = 0.5
+
+# The encoded values are prefixed by their length
+LENGTH_SIZE = 4
+
+
+def _encode(value) -> bytes:
+    """Returns the bytes of a value, values that are equal in a set get the same bytes (e.g. 1, 1.0 and True)
+
+    :param value:
+    :return:
+    """
+    if value is None:
+        return b'n'
+    if isinstance(value, str):
+        return b's' + value.encode('utf-8', 'surrogatepass')
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        return b'i' + str(int(value)).encode()
+    if isinstance(value, float):
+        return b'f' + repr(value).encode()
+
+    # Unhashable values (lists, dicts) raise a TypeError, as they do in a set
+    hash(value)
+    return b'r' + repr(value).encode()
+
+
+def _hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+
+class _HashTable:
+    """Open-addressing (linear probing) table of 64-bit hashes and the offsets of the encoded values."""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.hashes = array.array('Q', [EMPTY]) * capacity
+        self.offsets = array.array('Q', [0]) * capacity
+        self.keys = bytearray()
+        self.size = 0
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.hashes) + len(self.offsets)) * 8 + len(self.keys)
+
+    def key(self, offset: int) -> bytes:
+        length = int.from_bytes(self.keys[offset:offset + LENGTH_SIZE], 'little')
+        return bytes(self.keys[offset + LENGTH_SIZE:offset + LENGTH_SIZE + length])
+
+    def add(self, hash: int, key: bytes) -> bool:
+        """Adds a key, returns False if the key is already present
+
+        :param hash: the hash of the key
+        :param key: the encoded value
+        :return:
+        """
+        mask = len(self.hashes) - 1
+        index = hash & mask
+        while (slot := self.hashes[index]) != EMPTY:
+            if slot == hash and self.key(self.offsets[index]) == key:
+                return False
+            index = (index + 1) & mask
+
+        self.hashes[index] = hash
+        self.offsets[index] = len(self.keys)
+        self.keys += len(key).to_bytes(LENGTH_SIZE, 'little') + key
+        self.size += 1
+
+        if self.size > len(self.hashes) * MAX_LOAD_FACTOR:
+            self._grow()
+        return True
+
+    def _grow(self):
+        hashes, offsets = self.hashes, self.offsets
+        capacity = len(hashes) * 2
+        self.hashes = array.array('Q', [EMPTY]) * capacity
+        self.offsets = array.array('Q', [0]) * capacity
+
+        mask = capacity - 1
+        for hash, offset in zip(hashes, offsets):
+            if hash != EMPTY:
+                index = hash & mask
+                while self.hashes[index] != EMPTY:
+                    index = (index + 1) & mask
+                self.hashes[index] = hash
+                self.offsets[index] = offset
+
+
+class _SortedRun:
+    """A spilled hash table on disk: the hashes in sorted order, the offsets of their keys and the keys."""
+
+    def __init__(self, directory: str, table: _HashTable):
+        hashes = np.frombuffer(table.hashes, dtype=np.uint64)
+        offsets = np.frombuffer(table.offsets, dtype=np.uint64)
+
+        used = hashes != EMPTY
+        order = np.argsort(hashes[used], kind='stable')
+
+        fd, self.filename = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(hashes[used][order].tobytes())
+            f.write(offsets[used][order].tobytes())
+            f.write(table.keys)
+
+        self.size = table.size
+        self.hashes = np.memmap(self.filename, dtype=np.uint64, mode='r', shape=(self.size,))
+        self.offsets = np.memmap(self.filename, dtype=np.uint64, mode='r', offset=self.size * 8, shape=(self.size,))
+        self.keys = np.memmap(self.filename, dtype=np.uint8, mode='r', offset=self.size * 16)
+
+    def key(self, offset: int) -> bytes:
+        length = int.from_bytes(self.keys[offset:offset + LENGTH_SIZE].tobytes(), 'little')
+        return self.keys[offset + LENGTH_SIZE:offset + LENGTH_SIZE + length].tobytes()
+
+    def contains(self, hash: int, key: bytes) -> bool:
+        index = int(np.searchsorted(self.hashes, np.uint64(hash)))
+        while index < self.size and self.hashes[index] == hash:
+            if self.key(int(self.offsets[index])) == key:
+                return True
+            index += 1
+        return False
+
 
 class UniqueFilter(EntityFilter):
     """UniqueFilter
 
     EntityFilter that checks is the value of the specified value is unique. Duplicates will be filtered out.
+
+    The values that have been seen take at most memory_budget bytes of memory, above the budget they are spilled to
+    disk.
     """
 
-    def __init__(self, field: str):
-        self.values = set()
+    def __init__(self, field: str, memory_budget: int = UNIQUE_FILTER_MEMORY_BUDGET):
         self.field = field
+        self.memory_budget = memory_budget
+
+        self.table = _HashTable()
+        self.runs = []
+        self.directory = None
 
     def filter(self, entity: dict):
-        value = get_entity_value(entity, self.field)
-        if value in self.values:
+        key = _encode(get_entity_value(entity, self.field))
+        hash = _hash(key)
+
+        if any(run.contains(hash, key) for run in self.runs) or not self.table.add(hash, key):
             return False
-        else:
-            self.values.add(value)
-            return True
+
+        if self.table.nbytes > self.memory_budget:
+            self._spill()
+        return True
+
+    def _spill(self):
+        self.directory = self.directory or tempfile.mkdtemp()
+        self.runs.append(_SortedRun(self.directory, self.table))
+        self.table = _HashTable()
+
+    def get_fields(self):
+        return [self.field]
 
     def reset(self):
-        self.values = set()
+        self.table = _HashTable()
+        self.runs = []
+        if self.directory:
+            shutil.rmtree(self.directory)
+            self.directory = None
@@ -1,14 +1,133 @@
+from typing import Optional
+
+import numpy as np
+import shapely
 from shapely.geometry import shape
 
+# Full precision, shape(value).wkt equals to_wkt with rounding_precision=-1 and trim=True
+WKT_ROUNDING_PRECISION = -1
+
+# Nesting levels of the GeoJSON coordinates (above a single position) per geometry type
+_GEOJSON_LEVELS = {
+    'Point': (shapely.GeometryType.POINT, 0),
+    'LineString': (shapely.GeometryType.LINESTRING, 1),
+    'MultiPoint': (shapely.GeometryType.MULTIPOINT, 1),
+    'Polygon': (shapely.GeometryType.POLYGON, 2),
+    'MultiLineString': (shapely.GeometryType.MULTILINESTRING, 2),
+    'MultiPolygon': (shapely.GeometryType.MULTIPOLYGON, 3),
+}
+
 
-def format_geometry(value):
+def format_geometry(value, rounding_precision=WKT_ROUNDING_PRECISION, trim=True):
     """Returns geometry as wkt string for file exports
 
     :param value item:
+    :param rounding_precision: number of decimals in the wkt, -1 for full precision
+    :param trim: remove trailing zeros from the decimals
     :return:
     """
     if isinstance(value, dict):
         # Transform geojson to wkt, if None return an empty string
-        return shape(value).wkt
+        geometry = shape(value)
+        if rounding_precision == WKT_ROUNDING_PRECISION and trim:
+            return geometry.wkt
+        return shapely.to_wkt(geometry, rounding_precision=rounding_precision, trim=trim)
     else:
         return value if value else ''
+
+
+def _geometries_from_geojson(geometry_type: str, coordinates: list) -> np.ndarray:
+    """Create geometries of one type at once from their GeoJSON coordinates
+
+    The nested coordinate lists are flattened to a ragged array (coordinates and offsets) which shapely converts
+    to geometries in a single vectorized call.
+
+    :param geometry_type: the GeoJSON geometry type, e.g. Polygon
+    :param coordinates: the GeoJSON coordinates of each geometry
+    :return:
+    """
+    shapely_type, levels = _GEOJSON_LEVELS[geometry_type]
+
+    parts = coordinates
+    offsets = []
+    for _ in range(levels):
+        # Offsets are ordered from the innermost to the outermost level
+        offsets.insert(0, np.cumsum([0] + [len(part) for part in parts]))
+        parts = [item for part in parts for item in part]
+
+    return shapely.from_ragged_array(shapely_type, np.array(parts, dtype=float), tuple(offsets) or None)
+
+
+def format_geometries(values: list, rounding_precision=WKT_ROUNDING_PRECISION, trim=True) -> list:
+    """Returns geometries as wkt strings for file exports, batch version of format_geometry
+
+    GeoJSON values are grouped by geometry type. Each group is converted to geometries and serialized to wkt with
+    shapely vectorized operations. Any group that cannot be converted at once (e.g. empty or mixed dimension
+    geometries, unsupported geometry types) is formatted value by value by format_geometry.
+
+    :param values: geometries as GeoJSON or wkt
+    :param rounding_precision: number of decimals in the wkt, -1 for full precision
+    :param trim: remove trailing zeros from the decimals
+    :return: the wkt strings in the order of values
+    """
+    result = [None if isinstance(value, dict) else format_geometry(value) for value in values]
+
+    groups = {}
+    for i, value in enumerate(values):
+        if isinstance(value, dict):
+            groups.setdefault(value.get('type'), []).append(i)
+
+    for geometry_type, indexes in groups.items():
+        try:
+            geometries = _geometries_from_geojson(geometry_type, [values[i]['coordinates'] for i in indexes])
+        except (KeyError, TypeError, ValueError):
+            wkts = [format_geometry(values[i], rounding_precision, trim) for i in indexes]
+        else:
+            wkts = shapely.to_wkt(geometries, rounding_precision=rounding_precision, trim=trim).tolist()
+
+        for i, wkt in zip(indexes, wkts):
+            result[i] = wkt
+
+    return result
+
+
+def _to_geometries(geometry_type: Optional[str], values: list):
+    """Create geometries from GeoJSON values of one geometry type, or from wkt values if no type is given
+
+    :param geometry_type: the GeoJSON geometry type or None for wkt values
+    :param values:
+    :return:
+    """
+    if geometry_type is None:
+        return shapely.from_wkt(values)
+
+    try:
+        return _geometries_from_geojson(geometry_type, [value['coordinates'] for value in values])
+    except (KeyError, TypeError, ValueError):
+        return [shape(value) for value in values]
+
+
+def geometries_to_wkb(values: list) -> list:
+    """Returns geometries as wkb for binary file exports
+
+    GeoJSON values are converted per geometry type in vectorized calls, as in format_geometries. Wkt values are
+    parsed, empty values remain None.
+
+    :param values: geometries as GeoJSON or wkt
+    :return: the wkb bytes in the order of values
+    """
+    result = [None] * len(values)
+
+    groups = {}
+    for i, value in enumerate(values):
+        if isinstance(value, dict):
+            groups.setdefault(value.get('type'), []).append(i)
+        elif value:
+            groups.setdefault(None, []).append(i)
+
+    for geometry_type, indexes in groups.items():
+        geometries = _to_geometries(geometry_type, [values[i] for i in indexes])
+        for i, wkb in zip(indexes, shapely.to_wkb(geometries).tolist()):
+            result[i] = wkb
+
+    return result
@@ -1,6 +1,6 @@
 import copy
 
-from typing import List
+from typing import List, Optional
 
 from gobexport.converters.history import convert_to_history_rows
 from gobexport.formatter.sorter.graphql import GraphQlResultSorter
@@ -8,7 +8,8 @@ from gobexport.formatter.sorter.graphql import GraphQlResultSorter
 
 class GraphQLResultFormatter:
 
-    def __init__(self, expand_history=False, sort=None, unfold=False, row_formatter=None, cross_relations=False):
+    def __init__(self, expand_history=False, sort=None, unfold=False, row_formatter=None, cross_relations=False,
+                 entity_filters: Optional[list] = None):
         """
         :param expand_history:
         :param sort:
@@ -21,6 +22,9 @@ class GraphQLResultFormatter:
         would result in two rows where only relation A is present and two rows where only relation B is present. This
         parameter can only be used in combination with unfold=True (otherwise crossing relations would not make any
         sense).
+        :param entity_filters: Entity filters that are evaluated on the items before they are formatted, see
+        _is_pruned. The filters that declare no raw fields are ignored, as are all filters when the items are formatted
+        by a row formatter or expanded to history rows.
         """
         self.sorter = None
         self.expand_history = expand_history
@@ -31,6 +35,62 @@ class GraphQLResultFormatter:
         if sort:
             self.sorter = GraphQlResultSorter(sort)
 
+        # The filters with the top-level fields of the raw fields that they read
+        self.entity_filters = [] if row_formatter or expand_history else [
+            (entity_filter, {field.split('.')[0] for field in entity_filter.get_raw_fields()})
+            for entity_filter in entity_filters or [] if entity_filter.get_raw_fields() is not None
+        ]
+        # The number of items that have been left out by the entity filters
+        self.pruned = 0
+
+    def _is_relation(self, value) -> bool:
+        return isinstance(value, dict) and 'edges' in value
+
+    def _get_nested_relation_keys(self, node: dict) -> set:
+        """Returns the keys of the relations of the nodes in the relations of a node (at any depth)
+
+        Nested relations are copied to the main row when a row is flattened, see _flatten_edge.
+
+        :param node:
+        :return:
+        """
+        keys = set()
+        for value in node.values():
+            if self._is_relation(value):
+                for edge in value['edges']:
+                    if edge:
+                        keys |= {key for key, nested in edge['node'].items() if self._is_relation(nested)}
+                        keys |= self._get_nested_relation_keys(edge['node'])
+        return keys
+
+    def _is_pruned(self, item) -> bool:
+        """Tells if an item can be left out, because none of the rows that are formatted from it passes a filter
+
+        A filter is evaluated on the item when all its fields have the same value in every row of the item. These
+        are the attributes and the relations without any edges of the node, provided that no nested relation with the
+        same name is copied into the rows.
+
+        Only the items are left out, the remaining rows are still filtered by the exporter.
+
+        :param item:
+        :return:
+        """
+        node = item['node']
+        nested_keys = None
+        for entity_filter, keys in self.entity_filters:
+            if not all(key in node and not (self._is_relation(node[key]) and node[key]['edges']) for key in keys):
+                continue
+
+            nested_keys = self._get_nested_relation_keys(node) if nested_keys is None else nested_keys
+            if keys & nested_keys:
+                continue
+
+            flat_node = {key: [] if self._is_relation(value) else value for key, value in node.items()}
+            if not entity_filter.filter(flat_node):
+                self.pruned += 1
+                return True
+        return False
+
     def _expand_history(self, edge):
         history_rows = convert_to_history_rows(self._flatten_edge(edge))
         for row in history_rows:
@@ -95,6 +155,8 @@ class GraphQLResultFormatter:
 
         # Convert to list
         items = item if isinstance(item, list) else [item]
+        if self.entity_filters:
+            items = [item for item in items if not self._is_pruned(item)]
 
         if self.expand_history:
             yield from self._expand_history_items(items)
@@ -20,7 +20,7 @@ class GraphQL:
     sorter = None
 
     def __init__(self, host, query, catalogue, collection, expand_history=False, sort=None, unfold=False,
-                 row_formatter=None, cross_relations=False, secure_user=None):
+                 row_formatter=None, cross_relations=False, secure_user=None, entity_filters=None):
         """GraphQL constructor.
 
         Lazy loading, Just register host and query and wait for the iterator to be called
@@ -41,9 +41,14 @@ class GraphQL:
         self.query = self._update_query(query, NUM_RECORDS)
         self.has_next_page = True
 
+        # The cursor that the page that is being read starts after and the number of rows of the page that have been
+        # returned, see resume
+        self.position = {'end_cursor': self.end_cursor, 'skip': 0}
+        self.resumable = True
+
         self.formatter = GraphQLResultFormatter(
             expand_history, sort=sort, unfold=unfold,
-            row_formatter=row_formatter, cross_relations=cross_relations)
+            row_formatter=row_formatter, cross_relations=cross_relations, entity_filters=entity_filters)
 
     def __repr__(self):
         """Representation.
@@ -63,7 +68,9 @@ class GraphQL:
         :return:
         """
         num_records = NUM_RECORDS
+        skip = self.position['skip']
         while self.has_next_page:
+            self.position = {'end_cursor': self.end_cursor, 'skip': skip}
             start = time.time()
             print(f"Request {num_records} rows...")
             response = requests.post(self.url, json={'query': self.query}, secure_user=self.secure_user)
@@ -84,7 +91,23 @@ class GraphQL:
                 self.query = self._update_query(self.query, num_records)
 
             for edge in data['data'][self.schema_collection_name]['edges']:
-                yield from self.formatter.format_item(edge)
+                for item in self.formatter.format_item(edge):
+                    if skip:
+                        # Returned before the iteration was resumed
+                        skip -= 1
+                        continue
+                    self.position['skip'] += 1
+                    yield item
+
+    def resume(self, position: dict):
+        """Resumes the iteration at a position that has been saved during a previous iteration.
+
+        :param position: the value of the position attribute
+        :return:
+        """
+        self.end_cursor = position['end_cursor']
+        self.query = self._update_query(self.query, NUM_RECORDS)
+        self.position = dict(position)
 
     def _update_query(self, query, num_records):
         """Updates a GraphQL query for pagination.
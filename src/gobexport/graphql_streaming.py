@@ -1,5 +1,7 @@
 import re
 
+from gobcore.exceptions import GOBException
+
 from gobexport.requests import post_stream
 
 from gobexport.config import PUBLIC_URL, SECURE_URL
@@ -13,7 +15,7 @@ STREAMING_GRAPHQL_SECURE_ENDPOINT = f'{SECURE_URL}/graphql/streaming/'
 class GraphQLStreaming:
 
     def __init__(self, host, query, unfold=False, sort=None, row_formatter=None, cross_relations=False,
-                 batch_size=None, secure_user=None):
+                 batch_size=None, secure_user=None, entity_filters=None):
         self.host = host
         self.query = query
         self.secure_user = secure_user
@@ -22,10 +24,18 @@ class GraphQLStreaming:
         self.batch_size = batch_size
 
         self.formatter = GraphQLResultFormatter(sort=sort, unfold=unfold, row_formatter=row_formatter,
-                                                cross_relations=cross_relations)
+                                                cross_relations=cross_relations, entity_filters=entity_filters)
+
+        # Raw lines can only be passed through when no formatting or pagination is required
+        self.raw_available = not (unfold or sort or row_formatter or cross_relations or batch_size)
 
         self.current_page = None
 
+        # The cursor of the last item that has been completely returned and the number of rows of the next item that
+        # have been returned, see resume. Only paginated queries can be resumed.
+        self.position = {'after': None, 'skip': 0}
+        self.resumable = batch_size is not None
+
     def _execute_query(self, query):
         yield from post_stream(self.url, {'query': query}, secure_user=self.secure_user)
 
@@ -72,7 +82,7 @@ class GraphQLStreaming:
         yield from self._execute_query(page_query)
 
     def _query_paginated(self):
-        last_item = None
+        last_item, skip = self.position['after'], self.position['skip']
         while True:
             items = self._query_page(last_item)
             result_cnt = 0
@@ -80,13 +90,42 @@ class GraphQLStreaming:
             for item in items:
                 result_cnt += 1
 
-                for formatted_item in self.formatter.format_item(json_loads(item)):
-                    last_item = formatted_item['cursor']
+                # Take the cursor from the item itself, the formatter may leave out all rows of an item
+                item = json_loads(item)
+                for formatted_item in self.formatter.format_item(item):
+                    if skip:
+                        # Returned before the iteration was resumed
+                        skip -= 1
+                        continue
+                    self.position['skip'] += 1
                     yield formatted_item
 
+                last_item = item['node']['cursor']
+                self.position = {'after': last_item, 'skip': 0}
+
             if result_cnt == 0:
                 break
 
+    def resume(self, position: dict):
+        """Resumes the iteration at a position that has been saved during a previous iteration
+
+        :param position: the value of the position attribute
+        :return:
+        """
+        self.position = dict(position)
+
+    def iter_raw(self):
+        """Iterate over the raw result lines of the query
+
+        The lines are returned as bytes, without decoding or formatting (flattening) them.
+
+        :return:
+        """
+        if not self.raw_available:
+            raise GOBException("Raw lines are only available for queries without formatting or pagination")
+
+        yield from self._execute_query(self.query)
+
     def __iter__(self):
         if self.batch_size is None:
             yield from self._query_all()
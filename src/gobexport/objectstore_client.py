@@ -0,0 +1,230 @@
+"""Objectstore client
+
+Export, test and distribution share one client per objectstore (see get_client):
+
+- The objectstore is connected once per process. Each thread uses its own copy of the connection, which shares the
+  authentication of the connection (see distributor.objectstore._get_thread_connection).
+- The listings of the objects under a prefix of a container are cached. A listing is indexed by normalized name, in
+  which variables like dates are replaced by their name (e.g. {DATE}), so all versions of a file are found at once.
+- Writes through the client invalidate the cached listings that contain the object that is written. Listings expire
+  after OBJECTSTORE_LISTING_TTL seconds, as objects can also be written by other processes.
+"""
+import bisect
+import re
+import threading
+import time
+from typing import Iterator, Optional
+
+import swiftclient
+
+from gobcore.exceptions import GOBException
+from gobcore.datastore.factory import DatastoreFactory
+from gobcore.datastore.objectstore import ObjectDatastore, delete_object, put_object
+from gobconfig.datastore.config import get_datastore_config
+
+from gobexport.config import GOB_OBJECTSTORE, OBJECTSTORE_LISTING_TTL
+from gobexport.distributor.objectstore import _get_thread_connection
+
+# Variables in filenames and the regular expression of their values
+NAME_VARIABLES = {
+    "{DATE}": "\\d{8}"
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def normalize_name(name: str) -> str:
+    """Returns the name with the values of variables replaced by the variable, e.g. file_20240101.csv: file_{DATE}.csv
+
+    :param name:
+    :return:
+    """
+    for variable, pattern in NAME_VARIABLES.items():
+        name = re.sub(pattern, variable, name)
+    return name
+
+
+def _get_path(container: str, name: str) -> str:
+    # Containers can include a path, e.g. development/_tmp/catalogue/
+    return f"{container.rstrip('/')}/{name}"
+
+
+class ObjectListing:
+    """The objects under a prefix of a container, ordered and indexed by normalized name"""
+
+    def __init__(self, container: str, prefix: str, items: list[dict], listed_at: float = None):
+        self.container = container
+        self.prefix = prefix
+        self.listed_at = time.time() if listed_at is None else listed_at
+
+        self._items = sorted(items, key=lambda item: normalize_name(item['name']))
+        self._keys = [normalize_name(item['name']) for item in self._items]
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def _range(self, key: str, hi_key: str) -> list[dict]:
+        return self._items[bisect.bisect_left(self._keys, key):bisect.bisect_left(self._keys, hi_key)]
+
+    def find(self, name: str) -> list[dict]:
+        """Returns the objects with the same normalized name as name, e.g. all dated versions of a file
+
+        :param name: The object name, possibly with variables
+        :return:
+        """
+        key = normalize_name(name)
+        return self._range(key, f"{key}\0")
+
+    def startswith(self, name: str) -> list[dict]:
+        """Returns the objects whose normalized name starts with the normalized name, e.g. a file and its segments
+
+        :param name: The object name, possibly with variables
+        :return:
+        """
+        key = normalize_name(name)
+        return self._range(key, f"{key}\U0010ffff")
+
+    def latest(self, name: str) -> Optional[dict]:
+        """Returns the most recent object with the same normalized name as name, if any
+
+        :param name: The object name, possibly with variables
+        :return:
+        """
+        # The first of the most recent objects, in the order of the objectstore
+        items = sorted(self.find(name), key=lambda item: item['name'])
+        return max(items, key=lambda item: item['last_modified'], default=None)
+
+    def remove(self, name: str):
+        """Removes an object that has been deleted from the listing
+
+        :param name:
+        :return:
+        """
+        key = normalize_name(name)
+        for index in range(bisect.bisect_left(self._keys, key), bisect.bisect_right(self._keys, key)):
+            if self._items[index]['name'] == name:
+                del self._items[index]
+                del self._keys[index]
+                return
+
+
+class ObjectstoreClient:
+    """Shared connection and cached listings of an objectstore"""
+
+    def __init__(self, datastore: ObjectDatastore):
+        self.datastore = datastore
+
+        self._lock = threading.Lock()
+        self._listings: dict[tuple[str, str], ObjectListing] = {}
+
+    @property
+    def connection(self):
+        """The connection of the current thread
+
+        :return:
+        """
+        return _get_thread_connection(self.datastore.connection)
+
+    def _get_cached_listing(self, container: str, prefix: str) -> Optional[ObjectListing]:
+        with self._lock:
+            expired = [key for key, listing in self._listings.items()
+                       if time.time() - listing.listed_at >= OBJECTSTORE_LISTING_TTL]
+            for key in expired:
+                del self._listings[key]
+
+            if (container, prefix) in self._listings:
+                return self._listings[(container, prefix)]
+
+            # A listing of a shorter prefix contains the objects
+            for (listing_container, listing_prefix), listing in self._listings.items():
+                if listing_container == container and prefix.startswith(listing_prefix):
+                    return ObjectListing(container, prefix,
+                                         [item for item in listing if item['name'].startswith(prefix)],
+                                         listing.listed_at)
+        return None
+
+    def listing(self, container: str, prefix: str = '', refresh: bool = False) -> ObjectListing:
+        """Returns the objects under a prefix of a container
+
+        The listing is retrieved once, until an object under the prefix is written or the listing expires.
+
+        :param container:
+        :param prefix: A name prefix, e.g. a directory with a trailing slash
+        :param refresh: Retrieve the listing, also if it has been cached
+        :return:
+        """
+        if not refresh and (listing := self._get_cached_listing(container, prefix)) is not None:
+            return listing
+
+        try:
+            _, items = self.connection.get_container(container, prefix=prefix or None, full_listing=True)
+        except swiftclient.exceptions.ClientException as e:
+            raise GOBException(e)
+
+        listing = ObjectListing(container, prefix, items)
+        with self._lock:
+            self._listings[(container, prefix)] = listing
+        return listing
+
+    def invalidate(self, container: str, name: str):
+        """Invalidates the cached listings that contain an object, call it after the object has been written
+
+        :param container:
+        :param name: The name of the object
+        :return:
+        """
+        path = _get_path(container, name)
+        with self._lock:
+            for key in [key for key in self._listings if path.startswith(_get_path(*key))]:
+                del self._listings[key]
+
+    def put_object(self, container: str, name: str, contents, content_type: str):
+        put_object(self.connection, container, name, contents=contents, content_type=content_type)
+        self.invalidate(container, name)
+
+    def copy_object(self, container: str, name: str, destination: str):
+        """Copies an object
+
+        :param container:
+        :param name:
+        :param destination: The path of the copy, {container}/{name}
+        :return:
+        """
+        self.connection.copy_object(container, name, destination)
+        self.invalidate(*destination.split('/', 1))
+
+    def delete_object(self, container: str, item: dict):
+        """Deletes an object, the object is removed from the cached listings
+
+        :param container:
+        :param item: The object, as in a listing
+        :return:
+        """
+        delete_object(self.connection, container, item)
+
+        path = _get_path(container, item['name'])
+        with self._lock:
+            for (listing_container, prefix), listing in self._listings.items():
+                if path.startswith(_get_path(listing_container, prefix)):
+                    listing.remove(path[len(_get_path(listing_container, '')):])
+
+
+def get_client(name: str = GOB_OBJECTSTORE) -> ObjectstoreClient:
+    """Returns the client of an objectstore, the objectstore is connected once
+
+    :param name: The name of the datastore configuration
+    :return:
+    """
+    with _clients_lock:
+        if name not in _clients:
+            datastore = DatastoreFactory.get_datastore(get_datastore_config(name))
+            datastore.connect()
+
+            assert isinstance(datastore, ObjectDatastore)
+
+            _clients[name] = ObjectstoreClient(datastore)
+        return _clients[name]
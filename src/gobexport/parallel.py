@@ -0,0 +1,85 @@
+"""Parallel export of products
+
+The products of a collection are exported in groups. The products in a group are exported one after another, in
+the order of the configuration: products that share a source (so that the source is read once and buffered for the
+other products) and products that append to the file of another product.
+
+Independent groups are exported at the same time by a pool of threads. The exports mostly wait on the API, so
+threads suffice and the products can share the buffered sources and the logger.
+
+The messages that are logged while a product is exported in a worker thread are collected and logged together
+when the group of the product has been exported, see gobexport.product_logs.
+"""
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable
+
+from gobexport.exporter import product_source
+from gobexport.product_logs import ProductLogs
+
+
+def _are_related(product: dict, other: dict) -> bool:
+    """Tells if two products should be exported one after another
+
+    :param product:
+    :param other:
+    :return:
+    """
+    appends = product.get('append', False) or other.get('append', False)
+    return product_source(product) == product_source(other) or (appends and product['filename'] == other['filename'])
+
+
+def get_product_groups(products: dict[str, dict]) -> list[list[str]]:
+    """Groups the names of the products that should be exported one after another
+
+    The groups and the products within each group are in the order of the products.
+
+    :param products: the products by name, the filenames should have been resolved
+    :return: the groups of product names
+    """
+    order = list(products)
+    groups = []
+    for name, product in products.items():
+        related = [group for group in groups if any(_are_related(product, products[other]) for other in group)]
+        group = sorted([other for group in related for other in group] + [name], key=order.index)
+        groups = [group for group in groups if group not in related] + [group]
+    return sorted(groups, key=lambda group: order.index(group[0]))
+
+
+def _export_group(group: list[str], export: Callable[[str], Any], logs: ProductLogs) -> dict[str, Any]:
+    results = {}
+    for name in group:
+        results[name] = logs.run(name, functools.partial(export, name))
+    return results
+
+
+def export_groups(groups: list[list[str]], export: Callable[[str], Any], max_workers: int) -> dict[str, Any]:
+    """Exports the groups of products with a pool of at most max_workers threads
+
+    The log messages of the products of a group are logged when the group has been exported. When the export of
+    a group raises an exception, the other groups are exported before the exception is raised.
+
+    :param groups: the groups of product names, see get_product_groups
+    :param export: the method that exports a product, given its name
+    :param max_workers: the maximum number of groups that are exported at the same time
+    :return: the results of export by product name
+    """
+    results = {}
+    exceptions = []
+    logs = ProductLogs()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # The groups are exported in the context of the caller, e.g. its buffer scope
+        futures = {pool.submit(contextvars.copy_context().run, _export_group, group, export, logs): group
+                   for group in groups}
+        for future in as_completed(futures):
+            for name in futures[future]:
+                logs.flush(name)
+            try:
+                results |= future.result()
+            except Exception as e:
+                exceptions.append(e)
+
+    if exceptions:
+        raise exceptions[0]
+    return results
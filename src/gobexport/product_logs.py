@@ -0,0 +1,105 @@
+"""Log messages per product
+
+Products (and the collections of a catalogue, and the files of the export test) can be exported at the same time.
+The messages that are logged while a product is exported are collected and logged together afterwards, so that the
+log of each product remains readable.
+
+The modules that log while a product is exported use the logger of this module. The messages are logged by the GOB
+logger, unless they are logged in the context of a product that collects its messages (see ProductLogs.run). The
+product is kept in a context variable, other threads and contexts are not affected.
+"""
+import contextvars
+from typing import Any, Callable, Hashable, Optional
+
+from gobcore.logging.logger import logger as gob_logger
+
+# The ProductLogs and the product of the current context
+_capture: contextvars.ContextVar[tuple[Optional['ProductLogs'], Optional[Hashable]]] = \
+    contextvars.ContextVar('product_logs', default=(None, None))
+
+
+class ProductLogger:
+    """Logs the messages of a product, see the module docstring
+
+    Any other attribute is the attribute of the GOB logger.
+    """
+
+    def info(self, *args, **kwargs):
+        self._log('info', *args, **kwargs)
+
+    def warning(self, *args, **kwargs):
+        self._log('warning', *args, **kwargs)
+
+    def error(self, *args, **kwargs):
+        self._log('error', *args, **kwargs)
+
+    def _log(self, method: str, *args, **kwargs):
+        logs, product = _capture.get()
+        if logs is None:
+            getattr(gob_logger, method)(*args, **kwargs)
+        else:
+            logs.messages[product].append((method, args, kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(gob_logger, name)
+
+
+logger = ProductLogger()
+
+
+class ProductLogs:
+    """Collects the log messages of products
+
+    The messages that are logged by the logger of this module while a product is run are stored for that product,
+    until they are flushed. Messages outside a product are logged as usual.
+
+    ProductLogs can be nested: the messages of a product that are flushed while another product is run are collected
+    for that product.
+    """
+
+    def __init__(self):
+        self.messages = {}
+
+    def run(self, product: Hashable, func: Callable[[], Any]) -> Any:
+        """Runs func and collects its log messages for product
+
+        :param product: the name of the product
+        :param func:
+        :return: the result of func
+        """
+        self.messages.setdefault(product, [])
+        token = _capture.set((self, product))
+        try:
+            return func()
+        finally:
+            _capture.reset(token)
+
+    def flush(self, product: Hashable):
+        """Logs the collected messages of a product
+
+        :param product: the name of the product
+        :return:
+        """
+        for method, args, kwargs in self.messages.pop(product, []):
+            logger._log(method, *args, **kwargs)
+
+
+def get_log_capture() -> tuple[Optional[ProductLogs], Optional[Hashable]]:
+    """Returns the ProductLogs and the product that collect the log messages of the current context, if any
+
+    :return:
+    """
+    return _capture.get()
+
+
+def run_with_log_capture(capture: tuple[Optional[ProductLogs], Optional[Hashable]], func: Callable[[], Any]) -> Any:
+    """Runs func and collects its log messages like the context that returned capture, see get_log_capture
+
+    Threads do not inherit the context of the thread that starts them, this passes the product on to a thread.
+
+    :param capture:
+    :param func:
+    :return: the result of func
+    """
+    logs, product = capture
+    return func() if logs is None else logs.run(product, func)
@@ -0,0 +1,165 @@
+"""Export scheduler
+
+Exports all collections of one or more catalogues in a single run, at most EXPORT_COLLECTION_WORKERS collections at
+the same time.
+
+The collections are the jobs of a directed acyclic graph. A collection depends on every earlier collection (in the
+order of CONFIG_MAPPING) that it shares a file with: a product that appends to a file needs the collection that
+writes the file to be exported first, and products with the same filename share a local file. Collections that
+only share a source are independent, each requests the data of the source itself.
+
+Of the collections that are ready to be exported, the one with the longest expected duration, including the
+longest chain of collections that depend on it, is started first. The expected durations are the durations of the
+last successful export of each collection, which are recorded in the objectstore (EXPORT_DURATIONS_OBJECT).
+
+When collections are exported at the same time, the messages of each collection are logged together when the
+collection has been exported (see gobexport.product_logs). Otherwise they are logged as they occur.
+"""
+import contextvars
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+from gobexport.buffered_iterable import buffer_scope
+from gobexport.config import CONTAINER_BASE, EXPORT_COLLECTION_WORKERS, EXPORT_DURATIONS_OBJECT, GOB_OBJECTSTORE
+from gobexport.export import export
+from gobexport.exporter import CONFIG_MAPPING
+from gobexport.objectstore_client import get_client
+from gobexport.product_logs import ProductLogs, logger, run_with_log_capture
+from gobexport.utils import resolve_config_filenames
+
+# A job exports a collection of a catalogue
+Job = tuple[str, str]
+
+
+def _get_job_name(job: Job) -> str:
+    return ':'.join(job)
+
+
+def _get_files(job: Job) -> set[str]:
+    """Returns the files that the products of a collection write or append to
+
+    :param job:
+    :return:
+    """
+    catalogue, collection = job
+    config = CONFIG_MAPPING[catalogue][collection]
+    resolve_config_filenames(config)
+
+    return {file['filename'] for product in config.products.values()
+            for file in [product] + product.get('extra_files', [])}
+
+
+def get_dependencies(jobs: list[Job]) -> dict[Job, set[Job]]:
+    """Returns the jobs that each job depends on
+
+    :param jobs: the jobs in the order of CONFIG_MAPPING
+    :return:
+    """
+    files = {job: _get_files(job) for job in jobs}
+    return {job: {other for other in jobs[:i] if files[job] & files[other]} for i, job in enumerate(jobs)}
+
+
+def get_priorities(jobs: list[Job], dependencies: dict[Job, set[Job]],
+                   durations: dict[str, float]) -> dict[Job, float]:
+    """Returns the priority of each job: its expected duration plus the longest chain of jobs that depend on it
+
+    Jobs without a recorded duration are expected to take the average recorded duration.
+
+    :param jobs: the jobs in the order of CONFIG_MAPPING
+    :param dependencies:
+    :param durations: the recorded durations by job name
+    :return:
+    """
+    known = [durations[_get_job_name(job)] for job in jobs if _get_job_name(job) in durations]
+    default = sum(known) / len(known) if known else 0
+
+    priorities = {}
+    # Dependent jobs come later, so their priority is known when the priority of a job is determined
+    for job in reversed(jobs):
+        dependents = [priorities[other] for other in jobs if job in dependencies[other]]
+        priorities[job] = durations.get(_get_job_name(job), default) + max(dependents, default=0)
+    return priorities
+
+
+def _load_durations() -> dict[str, float]:
+    try:
+        _, contents = get_client(GOB_OBJECTSTORE).connection.get_object(CONTAINER_BASE, EXPORT_DURATIONS_OBJECT)
+        return json.loads(contents)
+    except Exception as e:
+        logger.info(f"No durations of previous exports: {str(e)}")
+        return {}
+
+
+def _save_durations(durations: dict[str, float]):
+    try:
+        get_client(GOB_OBJECTSTORE).put_object(CONTAINER_BASE, EXPORT_DURATIONS_OBJECT,
+                                               json.dumps(durations, indent=2, sort_keys=True), 'application/json')
+    except Exception as e:
+        logger.warning(f"Durations of the exports not saved: {str(e)}")
+
+
+def _export_job(job: Job, destination: str, logs: Optional[ProductLogs]) -> Optional[float]:
+    """Exports a collection, returns the duration of the export or None if the export failed
+
+    :param job:
+    :param destination:
+    :param logs: collects the messages of the export, if any
+    :return:
+    """
+    catalogue, collection = job
+    # Use separate buffers for each collection
+    buffer_scope.set(f"{catalogue}.{collection}")
+
+    start = time.time()
+    try:
+        run_with_log_capture((logs, job), lambda: export(catalogue, collection, None, destination))
+    except Exception as e:
+        logger.error(f"Export {catalogue}:{collection} failed: {str(e)}")
+        return None
+    return time.time() - start
+
+
+def _get_ready_jobs(jobs: list[Job], dependencies: dict[Job, set[Job]], priorities: dict[Job, float],
+                    started: set[Job], done: set[Job]) -> list[Job]:
+    ready = [job for job in jobs if job not in started and dependencies[job] <= done]
+    return sorted(ready, key=lambda job: priorities[job], reverse=True)
+
+
+def export_catalogues(catalogues: list[str], destination: str):
+    """Exports all collections of the catalogues
+
+    :param catalogues: the names of the catalogues
+    :param destination: the destination of the exports
+    :return:
+    """
+    jobs = [(catalogue, collection) for catalogue in catalogues for collection in CONFIG_MAPPING[catalogue]]
+    dependencies = get_dependencies(jobs)
+    durations = _load_durations()
+    priorities = get_priorities(jobs, dependencies, durations)
+
+    logger.info(f"Export {len(jobs)} collections of {', '.join(catalogues)}, "
+                f"{EXPORT_COLLECTION_WORKERS} at the same time")
+
+    running = {}
+    done = set()
+    # Only collections that are exported at the same time need to collect their messages
+    logs = ProductLogs() if EXPORT_COLLECTION_WORKERS > 1 else None
+    with ThreadPoolExecutor(max_workers=EXPORT_COLLECTION_WORKERS) as pool:
+        while len(done) < len(jobs):
+            ready = _get_ready_jobs(jobs, dependencies, priorities, done | set(running.values()), done)
+            for job in ready[:EXPORT_COLLECTION_WORKERS - len(running)]:
+                running[pool.submit(contextvars.copy_context().run, _export_job, job, destination, logs)] = job
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                if logs:
+                    logs.flush(job)
+                if (duration := future.result()) is not None:
+                    durations[_get_job_name(job)] = duration
+                done.add(job)
+
+    _save_durations(durations)
+    logger.info(f"Export of {', '.join(catalogues)} completed")
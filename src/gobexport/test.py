@@ -34,191 +34,91 @@ unique_cols array of array of columns that should have unique values, e.g. [ [1]
 
 """
 import copy
+import contextlib
 import datetime
 import itertools
-from codecs import BOM_UTF8
-from collections import Counter
-from io import TextIOWrapper, BytesIO, FileIO
-from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, FileIO, TextIOWrapper
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Optional, Union, IO
+from typing import Iterator, Optional, Union, IO
 
 import dateutil.parser
-import hashlib
 import json
 import math
 import re
 import numbers
-import csv
-
-from gobcore.datastore.objectstore import get_full_container_list, get_object, put_object
-
-from gobcore.logging.logger import logger
-
-from gobexport.config import CONTAINER_BASE, EXPORT_DIR, GOB_OBJECTSTORE
-from gobconfig.datastore.config import get_datastore_config
-from gobcore.datastore.factory import DatastoreFactory
+import functools
+
+from gobcore.datastore.objectstore import get_object
+from gobcore.exceptions import GOBException
+
+from gobexport.analysis import NTH, READ_CHUNK_SIZE, STATISTICS_SUFFIX, analyse, get_check, read_chunks
+from gobexport.config import (
+    CONTAINER_BASE,
+    EXPORT_DIR,
+    EXPORT_TEST_FULL_ANALYSIS,
+    EXPORT_TEST_WORKERS,
+    GOB_OBJECTSTORE,
+    OBJECTSTORE_DOWNLOAD_WORKERS,
+)
 from gobexport.exporter import CONFIG_MAPPING
+from gobexport.exporter.compression import compressed_filename
+from gobexport.exporter.esri import part_filename
 from gobexport.utils import resolve_config_filenames, json_loads
-from gobexport.csv_inspector import CSVInspector
 from gobexport.export import cleanup_datefiles
+from gobexport.distributor.objectstore import _get_thread_connection
+from gobexport.objectstore_client import NAME_VARIABLES, ObjectListing, get_client, normalize_name
+from gobexport.product_logs import ProductLogs, logger
 
 # Collect all export configs
 _export_config = {cat: configs.values() for cat, configs in CONFIG_MAPPING.items()}
 
 # Allow for variables in filenames. A variable will be converted into a regular expression
 # and vice versa for a generated proposal
-_REPLACEMENTS = {
-    "{DATE}": "\\d{8}"
-}
+_REPLACEMENTS = NAME_VARIABLES
 
 # Definition of test values
-_NTH = {
-    1: "first",
-    2: "second",
-    3: "third",
-    4: "fourth"
-}
 _MAXIMUM_VALUES = ["age_hours"]
 _MINIMUM_VALUES = ["bytes", "chars", "lines"]
-_ABSOLUTE_VALUES = ["empty_lines", "first_bytes", "first_lines"] + [f"{nth}_line" for nth in _NTH.values()]
+_ABSOLUTE_VALUES = ["empty_lines", "first_bytes", "first_lines"] + [f"{nth}_line" for nth in NTH.values()]
 
 # chunksize for downloading from objectstore, must be < 2gb
 _CHUNKSIZE = 100_000_000
 # download files bigger then this threshold to disk
 _OFFLOAD_THRESHOLD = 500_000_000
 
-# read chunk size from IOstream
-READ_CHUNK_SIZE = 10_000_000
-
-ENCODING = 'utf-8-sig'
-STRIP_CHARS = BOM_UTF8 + b"\t\n\r\v\f"
-
-TYPE_FLAT_FILE = ("plain/text", "text/csv", "application/x-ndjson")
-TYPE_CSV = ("text/csv", )
-
-csv.field_size_limit(1_000_000)
-
-
-def _safe_divide(val1: int, val2: int) -> Union[int, float]:
-    try:
-        result = val1 / val2
-    except ZeroDivisionError:
-        return 0
-    else:
-        if result.is_integer():
-            return int(result)
-        return round(result, 4)
-
-
-class FlatfileStats:
-
-    def __init__(self):
-        self.chars = 0
-        self.lines = 0
-        self.digits = 0
-        self.alphas = 0
-        self.spaces = 0
-        self.lowers = 0
-        self.uppers = 0
-        self.empty_lines = 0
-        self.max_line = 0
-        self.min_line = 0
-        self.total_line = 0
-        self.first_10: list[bytes] = []
-        self.counter: dict[str, int] = Counter()
-
-    def calculate(self) -> dict:
-        """Return a dict of flatfile statistics for characters and lines."""
-        counts = self.counter
-
-        self.chars = sum(counts.values())
-        self.uppers = sum(cnt for char, cnt in counts.items() if char.isupper())
-        self.lowers = sum(cnt for char, cnt in counts.items() if char.islower())
-        self.digits = sum(cnt for char, cnt in counts.items() if char.isdigit())
-        self.spaces = sum(cnt for char, cnt in counts.items() if char.isspace())
-        self.alphas = self.uppers + self.lowers
-
-        return {
-            **self._hash_first_lines(),
-            **{
-                "chars": self.chars,
-                "lines": self.lines,
-                "empty_lines": self.empty_lines,
-                "max_line": self.max_line,
-                "min_line": self.min_line,
-                "avg_line": _safe_divide(self.total_line, self.lines - self.empty_lines),
-                "digits": _safe_divide(self.digits, self.chars),
-                "alphas": _safe_divide(self.alphas, self.chars),
-                "spaces": _safe_divide(self.spaces, self.chars),
-                "lowers": _safe_divide(self.lowers, self.alphas),
-                "uppers": _safe_divide(self.uppers, self.alphas)
-            }
-        }
-
-    def _hash_first_lines(self) -> dict[str, str]:
-        """
-        Return dict with hashed first N lines and first 10 lines. First line == header if present.
-        The hash should be equal for lines with different line breaks and byte order marks (if present).
-        """
-        return (
-            {f"{idx}_line": hashlib.md5(line).hexdigest() for idx, line in zip(_NTH.values(), self.first_10)}
-            |
-            {"first_lines": hashlib.md5(b'\n'.join(self.first_10)).hexdigest()}
-        )
-
-    def count_lines(self, line_length: int):
-        """
-        Update line length statistics:
-        - empty
-        - maximum
-        - minimum
-        - total
-        - number of lines seen
-        """
-        self.empty_lines += line_length == 0
-        self.total_line += line_length
 
-        if (line_length and line_length < self.min_line) or self.lines == 0:
-            self.min_line = line_length
-        if line_length and line_length > self.max_line:
-            self.max_line = line_length
-
-        self.lines += 1
-
-
-def test(catalogue):
+def test(catalogue, full_analysis=False):
     """
     Test export files for a given catalogue.
 
     :param catalogue: catalogue to test
+    :param full_analysis: download and analyse all files, also the files with an up to date statistics manifest
     """
     logger.info(f"Test export for catalogue {catalogue}")
 
     logger.info("Connect to Objectstore")
 
-    config = get_datastore_config(GOB_OBJECTSTORE)
-    datastore = DatastoreFactory.get_datastore(config)
-    datastore.connect()
+    client = get_client(GOB_OBJECTSTORE)
     container_name = CONTAINER_BASE
 
     logger.info(f"Load files from {container_name}")
     conn_info = {
-        "connection": datastore.connection,
+        "client": client,
+        "connection": client.connection,
         "container": container_name
     }
-    # get full container_list only once
-    container_list = list(get_full_container_list(conn_info["connection"], conn_info["container"]))
+    # list the exported files of the catalogue only once, the files may have been exported by another process
+    listing = client.listing(container_name, f"{EXPORT_DIR}/{catalogue}/", refresh=True)
 
     # tmp dir for downloading/offloading files
     tmp_dir = TemporaryDirectory()
 
     # Get test definitions for the given catalogue
-    checks = _get_checks(container_list, conn_info, catalogue)
+    checks = _get_checks(client.listing(container_name, f"checks.{catalogue}.", refresh=True), conn_info, catalogue)
 
-    # Make proposals for any missing test definitions
-    proposals = {}
+    filenames = []
     for config in _export_config[catalogue]:
         resolve_config_filenames(config)
 
@@ -230,42 +130,149 @@ def test(catalogue):
 
         for _, product in unique_products:
             product = next(product)  # product is iterable, get first one
+            filenames.extend(_get_product_filenames(listing, catalogue, product))
 
-            filenames = [product['filename']] + [product['filename'] for product in product.get('extra_files', [])]
-
-            for filename in filenames:
-                obj_info, obj = _get_file(
-                    container_list, conn_info, f"{EXPORT_DIR}/{catalogue}/{filename}", destination=tmp_dir.name
-                )
-
-                if obj_info is None:
-                    logger.error(f"File {filename} MISSING")
-                    continue
-
-                # Clone check so that changes to the check file don't affect other runs
-                if file_checks := copy.deepcopy(_get_check(checks, filename)):
-                    stats = _get_analysis(obj_info, obj, check=file_checks, tmp_dir=tmp_dir.name)
-
-                    # Report results with the name of the matched file
-                    matched_filename = obj_info['name']
-                    if _check_file(file_checks, matched_filename, stats):
-                        logger.info(f"Check {matched_filename} OK")
-                        # Copy the file to its final location
-                        distribute_file(conn_info, matched_filename)
-                    else:
-                        logger.info(f"Check {matched_filename} FAILED")
-                else:
-                    # Do not copy unchecked files
-                    logger.warning(f"File {filename} UNCHECKED")
-                    stats = _get_analysis(obj_info, obj, tmp_dir=tmp_dir.name)
-
-                _propose_check_file(proposals, filename, stats)
+    # Make proposals for any missing test definitions
+    proposals = {}
+    full_analysis = full_analysis or EXPORT_TEST_FULL_ANALYSIS
+    for filename, stats in _test_files(listing, conn_info, checks, catalogue, filenames, tmp_dir.name, full_analysis):
+        _propose_check_file(proposals, filename, stats)
 
     # Write out any missing test definitions
     _write_proposals(conn_info, catalogue, checks, proposals)
     tmp_dir.cleanup()
 
 
+def _test_files(
+        listing: ObjectListing, conn_info: dict, checks: dict, catalogue: str, filenames: list[str], tmp_dir: str,
+        full_analysis: bool = False
+) -> Iterator[tuple[str, dict]]:
+    """
+    Test the files of a catalogue, EXPORT_TEST_WORKERS files are downloaded and analysed at the same time.
+
+    The messages that are logged while a file is tested are logged together, in the order of the files.
+
+    :param listing: Objectstore listing
+    :param conn_info: Objectstore connection
+    :param checks: all test specifications
+    :param catalogue: Catalogue name
+    :param filenames: the files to test
+    :param tmp_dir: Temporary dir for downloading/offloading files
+    :param full_analysis: download and analyse the files, also if their statistics manifest is up to date
+    :return: the statistics of the files that exist, in the order of the files
+    """
+    logs = ProductLogs()
+    with ThreadPoolExecutor(max_workers=EXPORT_TEST_WORKERS) as pool:
+        futures = [
+            pool.submit(logs.run, filename, functools.partial(
+                _test_file, listing, conn_info, checks, catalogue, filename, tmp_dir, full_analysis
+            ))
+            for filename in filenames
+        ]
+
+        for filename, future in zip(filenames, futures):
+            exception = future.exception()  # waits until the file has been tested
+            logs.flush(filename)
+
+            if exception:
+                # Do not start testing any other files
+                for other in futures:
+                    other.cancel()
+                raise exception
+
+            if stats := future.result():
+                yield filename, stats
+
+
+def _test_file(
+        listing: ObjectListing, conn_info: dict, checks: dict, catalogue: str, filename: str, tmp_dir: str,
+        full_analysis: bool = False
+) -> Optional[dict]:
+    """
+    Test an exported file and copy it to its final location if the check is OK
+
+    :param listing: Objectstore listing
+    :param conn_info: Objectstore connection
+    :param checks: all test specifications
+    :param catalogue: Catalogue name
+    :param filename: the file to test
+    :param tmp_dir: Temporary dir for downloading/offloading files
+    :param full_analysis: download and analyse the file, also if its statistics manifest is up to date
+    :return: the statistics of the file, None if the file is missing
+    """
+    # Connections are not thread safe, use the connection of the current thread
+    conn_info = conn_info | {"connection": conn_info["client"].connection}
+
+    item = listing.latest(f"{EXPORT_DIR}/{catalogue}/{filename}")
+
+    if item is None:
+        logger.error(f"File {filename} MISSING")
+        return None
+
+    # Clone check so that changes to the check file don't affect other runs
+    file_checks = copy.deepcopy(get_check(checks, filename))
+
+    if not full_analysis and (stats := _get_manifest_analysis(listing, conn_info, item, file_checks)):
+        logger.info(f"Statistics of {item['name']} read from its manifest")
+    else:
+        obj_info, obj = _get_file(listing, conn_info, item['name'], destination=tmp_dir)
+        stats = _get_analysis(obj_info, obj, check=file_checks, tmp_dir=tmp_dir)
+
+    if file_checks:
+        # Report results with the name of the matched file
+        matched_filename = item['name']
+        if _check_file(file_checks, matched_filename, stats):
+            logger.info(f"Check {matched_filename} OK")
+            # Copy the file to its final location
+            distribute_file(conn_info, matched_filename)
+        else:
+            logger.info(f"Check {matched_filename} FAILED")
+    else:
+        # Do not copy unchecked files
+        logger.warning(f"File {filename} UNCHECKED")
+
+    return stats
+
+
+def _get_manifest_analysis(
+        listing: ObjectListing, conn_info: dict, item: dict, check: Optional[dict]
+) -> Optional[dict[str, Union[str, float, int]]]:
+    """
+    Get the statistics of an exported file from its statistics manifest, written by the export
+
+    The statistics are only used if the manifest is up to date, i.e. the ETag of the manifest is the ETag of the file.
+    The uniqueness of columns depends on the check, the manifest has to contain the uniqueness of the unique_cols of
+    the check.
+
+    :param listing: Objectstore listing
+    :param conn_info: Objectstore connection
+    :param item: the file, as in the listing
+    :param check: checks to perform on csv file
+    :return: the statistics of the file, None if the file should be analysed
+    """
+    name = f"{item['name']}{STATISTICS_SUFFIX}"
+    if not (manifest_item := next((other for other in listing.find(name) if other['name'] == name), None)):
+        return None
+
+    try:
+        connection, container = conn_info['connection'], conn_info['container']
+        manifest = json.loads(get_object(connection, manifest_item, container, chunk_size=None))
+        etag = connection.head_object(container, item['name'])['etag'].strip('"')
+    except Exception as e:
+        logger.warning(f"Statistics manifest of {item['name']} not read: {str(e)}")
+        return None
+
+    if (manifest.get('etag'), manifest.get('content_type')) != (etag, item['content_type']):
+        logger.info(f"Statistics manifest of {item['name']} is out of date")
+        return None
+
+    if check and check.get('unique_cols') and manifest.get('unique_cols') != check['unique_cols']:
+        logger.info(f"Statistics manifest of {item['name']} has no uniqueness of {check['unique_cols']}")
+        return None
+
+    return _get_base_analysis(item) | manifest['statistics']
+
+
 def distribute_file(conn_info, filename):
     """
     Copy the checked file to its final location
@@ -284,94 +291,158 @@ def distribute_file(conn_info, filename):
 
     # Copy the file to the destination location
     logger.info(f"Distribute to {dst}")
-    conn_info['connection'].copy_object(CONTAINER_BASE, filename, f"{CONTAINER_BASE}/{dst}")
+    conn_info['client'].copy_object(CONTAINER_BASE, filename, f"{CONTAINER_BASE}/{dst}")
 
     # Do not delete the file from its temporary location because a re-run would cause missing file errors
 
     # Cleanup any date files at the destination location
-    cleanup_datefiles(conn_info['connection'], CONTAINER_BASE, dst)
+    cleanup_datefiles(conn_info['client'], CONTAINER_BASE, dst)
+
+
+def _get_product_filenames(listing: ObjectListing, catalogue: str, product: dict) -> list[str]:
+    """
+    Get the filenames of all files of a product: the product file, its extra files and any part files
+
+    :param listing: Objectstore listing
+    :param catalogue: Catalogue name
+    :param product: product definition
+    :return:
+    """
+    filenames = [compressed_filename(product['filename'], product.get('compression'))] + \
+        [file['filename'] for file in product.get('extra_files', [])]
+
+    if product.get('max_part_size'):
+        filenames += _get_part_filenames(listing, f"{EXPORT_DIR}/{catalogue}", filenames)
+
+    return filenames
+
+
+def _get_part_filenames(listing: ObjectListing, dirname: str, filenames: list[str]) -> list[str]:
+    """
+    Get the filenames of the parts (part 2 and up) of a product that has been split into parts
+
+    The parts are numbered consecutively, see part_filename.
+
+    :param listing: Objectstore listing
+    :param dirname: directory of the product files in the container
+    :param filenames: the product filename and the filenames of its extra files
+    :return: the filenames of all parts that exist in the container
+    """
+    part_filenames = []
+    part = 2
+    while listing.find(f"{dirname}/{part_filename(filenames[0], part)}"):
+        part_filenames.extend(part_filename(filename, part) for filename in filenames)
+        part += 1
+    return part_filenames
 
 
 def _get_file(
-        container_list: list, conn_info: dict, filename: str, destination: str = None
+        listing: ObjectListing, conn_info: dict, filename: str, destination: str = None
 ) -> tuple[dict[str, str], Optional[IO]]:
     """
     Get a file from Objectstore
 
+    If the filename contains any replacement patterns, e.g. dates, the most recent matching file is retrieved.
+
+    :param listing: Objectstore listing
     :param conn_info: Objectstore connection
     :param filename: name of the file to retrieve
     :return:
     """
-    # If the filename contains any replacement patterns, use the pattern to find the file
-    for src, dst in _REPLACEMENTS.items():
-        filename = re.sub(dst, src, filename)
-
-    obj_info = None
-    obj = None
-    for item in container_list:
-        item_name = item['name']
-        for src, dst in _REPLACEMENTS.items():
-            item_name = re.sub(dst, src, item_name)
-
-        if item_name == filename and (obj_info is None or item['last_modified'] > obj_info['last_modified']):
-            # If multiple matches, match with the most recent item
-            obj_info = dict(item)
-
-            logger.info(f"Downloading {item['name']}")
-            # if obj_info["bytes"] == 0 we dont know the size, offload to be sure
-            if destination and (int(obj_info["bytes"]) > _OFFLOAD_THRESHOLD or obj_info["bytes"] == 0):
-                tmp_path = Path(destination, filename)
-                tmp_path.parent.mkdir(parents=True, exist_ok=True)
-
-                with open(tmp_path, 'wb') as writer:
-                    chunk_gen = get_object(
-                        connection=conn_info['connection'],
-                        object_meta_data=item,
-                        dirname=conn_info['container'],
-                        chunk_size=_CHUNKSIZE
-                    )
-
-                    for chunk in chunk_gen:
-                        writer.write(chunk)
-
-                obj = FileIO(tmp_path, mode='rb')
-            else:
-                obj = BytesIO(get_object(conn_info['connection'], item, conn_info['container'], chunk_size=None))
+    item = listing.latest(filename)
+    if item is None:
+        return None, None
+
+    obj_info = dict(item)
+
+    logger.info(f"Downloading {item['name']}")
+    # if obj_info["bytes"] == 0 we dont know the size, offload to be sure
+    if destination and (int(obj_info["bytes"]) > _OFFLOAD_THRESHOLD or obj_info["bytes"] == 0):
+        tmp_path = Path(destination, normalize_name(filename))
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if size := int(obj_info["bytes"]):
+            _download_ranges(conn_info, item, tmp_path, size)
+        else:
+            with open(tmp_path, 'wb') as writer:
+                chunk_gen = get_object(
+                    connection=conn_info['connection'],
+                    object_meta_data=item,
+                    dirname=conn_info['container'],
+                    chunk_size=_CHUNKSIZE
+                )
+
+                for chunk in chunk_gen:
+                    writer.write(chunk)
+
+        obj = FileIO(tmp_path, mode='rb')
+    else:
+        obj = BytesIO(get_object(conn_info['connection'], item, conn_info['container'], chunk_size=None))
 
     return obj_info, obj
 
 
-def _get_check(checks, filename):
+def _download_range(connection, container: str, name: str, path: Path, offset: int, size: int):
+    """
+    Download size bytes of an object from offset to the same position in the file at path
+
+    :param connection: Objectstore connection
+    :param container:
+    :param name: name of the object
+    :param path: the file to write to
+    :param offset:
+    :param size:
+    :return:
+    """
+    _, contents = _get_thread_connection(connection).get_object(
+        container, name, headers={"Range": f"bytes={offset}-{offset + size - 1}"}, resp_chunk_size=READ_CHUNK_SIZE
+    )
+
+    with open(path, 'r+b') as writer:
+        writer.seek(offset)
+        written = sum(writer.write(chunk) for chunk in contents)
+
+    if written != size:
+        raise GOBException(f"Download of {name} failed, {written} of {size} bytes received at offset {offset}")
+
+
+def _download_ranges(conn_info: dict, item: dict, path: Path, size: int):
     """
-    Find a test specification (check) for the give filename
+    Download an object in parts of _CHUNKSIZE bytes, OBJECTSTORE_DOWNLOAD_WORKERS parts at the same time
 
-    :param checks: all test specifications
-    :param filename: a filename, possibly containing variables
-    :return: the test specification for the given filename or None if not found
+    :param conn_info: Objectstore connection
+    :param item: the object, as in a listing
+    :param path: the file to write to
+    :param size: the size of the object
+    :return:
     """
-    if checks.get(filename):
-        # Simple case, filename without variables
-        return checks[filename]
+    with open(path, 'wb') as writer:
+        writer.truncate(size)
+
+    with ThreadPoolExecutor(max_workers=OBJECTSTORE_DOWNLOAD_WORKERS) as pool:
+        futures = [
+            pool.submit(_download_range, conn_info['connection'], conn_info['container'], item['name'], path,
+                        offset, min(_CHUNKSIZE, size - offset))
+            for offset in range(0, size, _CHUNKSIZE)
+        ]
 
-    for check in checks.keys():
-        # Try variable substitution
-        pattern = re.escape(check)
-        for src, dst in _REPLACEMENTS.items():
-            pattern = pattern.replace(re.escape(src), dst)
-        if re.match(pattern, filename):
-            return checks[check]
+        for future in futures:
+            if future.exception():
+                pool.shutdown(cancel_futures=True)
+                raise future.exception()
 
 
-def _get_checks(container_list, conn_info, catalogue):
+def _get_checks(listing, conn_info, catalogue):
     """
     Get test definitions for the given catalogue
 
+    :param listing: Objectstore listing of the checks files
     :param conn_info: Objectstore connection
     :param catalogue: Catalogue name
     :return:
     """
     filename = f"checks.{catalogue}.json"
-    _, checks_file = _get_file(container_list, conn_info, filename)
+    _, checks_file = _get_file(listing, conn_info, filename)
 
     try:
         with TextIOWrapper(checks_file, encoding='utf-8') as buffer:
@@ -399,11 +470,10 @@ def _write_proposals(conn_info, catalogue, checks, proposals):
         # If no checks have yet been defined write an initial check definitions file
         proposal = ".proposal" if checks.keys() else ""
         filename = f"checks.{catalogue}{proposal}.json"
-        put_object(conn_info['connection'],
-                   conn_info['container'],
-                   filename,
-                   contents=json.dumps(proposals, indent=4),
-                   content_type="application/json")
+        conn_info['client'].put_object(conn_info['container'],
+                                       filename,
+                                       contents=json.dumps(proposals, indent=4),
+                                       content_type="application/json")
 
 
 def _propose_check_file(proposals, filename, stats):
@@ -537,44 +607,14 @@ def _check_file(check: dict[str, str], filename: str, stats: dict[str, str]):
     return total_result
 
 
-def _peek(obj: IO, size: int) -> bytes:
-    cur_pos = obj.tell()
-    data = obj.read(size)
-    obj.seek(cur_pos)
-    return data
-
-
-def _get_base_anlysis(obj: IO, obj_info: dict) -> dict[str, str]:
+def _get_base_analysis(obj_info: dict) -> dict[str, Union[str, float, int]]:
     return {
         "age_hours":
             (datetime.datetime.now() - dateutil.parser.parse(obj_info["last_modified"])).total_seconds() / 3600,
         "bytes": obj_info["bytes"],  # can be zero, file still has content
-        "first_bytes": hashlib.md5(_peek(obj, 10_000)).hexdigest()
     }
 
 
-def _read_text(obj: IO) -> str:
-    """
-    Read text from IO buffer, tries to decode using utf-8.
-    In case of UnicodeDecodeError add up to 4 extra bytes and try again.
-    After 4 extra bytes raises the UnicodeDecodeError
-    """
-    bytes_obj = obj.read(READ_CHUNK_SIZE)
-    error = None
-
-    for extra in range(0, 4):
-        bytes_obj += obj.read(extra)
-
-        try:
-            return bytes_obj.decode(ENCODING)
-        except UnicodeDecodeError as err:
-            # we may end up with split bytes
-            error = err
-
-    if error:
-        raise error
-
-
 def _get_analysis(
     obj_info: dict,
     obj: IO,
@@ -591,43 +631,10 @@ def _get_analysis(
     :param tmp_dir: Temporary dir for offloading
     :return: dict
     """
-    is_flatfile = obj_info['content_type'] in TYPE_FLAT_FILE
-    is_csv = obj_info['content_type'] in TYPE_CSV or Path(obj_info['name']).suffix.lower() == ".csv"
-
-    with obj:
-        base = _get_base_anlysis(obj, obj_info)
-
-        if not _peek(obj, 1):
-            return base  # empty object
-
-        if is_flatfile:
-            stats = FlatfileStats()
+    base = _get_base_analysis(obj_info)
 
-            obj.seek(0)
-            while chunk := _read_text(obj):
-                stats.counter.update(chunk)
-
-            obj.seek(0)
-            stats.first_10 = [line.strip(STRIP_CHARS) for line in islice(obj, 10)]
-
-            header = stats.first_10[0]
-            stats.count_lines(len(header))
-
-            obj.seek(0)
-            reader = csv.reader(TextIOWrapper(obj, encoding=ENCODING), delimiter=";")
-            inspector = CSVInspector(obj_info["name"], next(reader), check, tmp_dir)
-
-            for line in reader:
-                stats.count_lines(sum(len(val) for val in line))
-
-                if is_csv:
-                    inspector.check_line(line, reader.line_num)
-
-                if reader.line_num % 250_000 == 0:
-                    logger.info(f"Checking lines {reader.line_num:,}")  # report status, can take some time
+    with obj, contextlib.closing(read_chunks(obj)) as chunks:
+        base |= analyse(chunks, obj_info['name'], obj_info['content_type'], check, tmp_dir)
 
     assert obj.closed, "Object not closed."
-
-    base |= stats.calculate() if is_flatfile else {}
-    base |= inspector.check_uniqueness() if is_csv else {}
     return base
@@ -1,6 +1,17 @@
 import json
 import time
 from functools import cache
+from typing import Collection, Iterable, Optional
+
+import orjson
+
+try:
+    import simdjson
+except ImportError:  # pragma: no cover
+    # simdjson requires a CPU with SSE4.2 (x86) or NEON (ARM), fall back to full decoding without it
+    simdjson = None
+
+from gobexport.product_logs import logger
 
 
 def resolve_config_filenames(config):
@@ -34,11 +45,88 @@ def resolve_config_filenames(config):
             file[filename] = file[resolve_filename]()
 
 
-def json_loads(item):
-    try:
+# Above this number of fields a full decode by orjson is faster than a projected decode (see benchmarks.json_decoders)
+MAX_PROJECTED_FIELDS = 10
+
+# The maximum number of characters of an item that is logged when the item cannot be decoded
+MAX_LOGGED_ITEM_LENGTH = 200
+
+_MISSING = object()
+
+
+class JsonDecoder:
+    """Decodes a JSON document as a whole."""
+
+    def loads(self, item):
         return json.loads(item)
+
+
+class OrjsonDecoder(JsonDecoder):
+    """Decodes a JSON document as a whole by orjson
+
+    Unlike json, orjson rejects NaN and Infinity and decodes integers that do not fit in 64 bits to inexact floats.
+    It is only used for the sources of which a projection of the fields is decoded, see get_decoder.
+    """
+
+    def loads(self, item):
+        return orjson.loads(item)
+
+
+class ProjectedJsonDecoder(JsonDecoder):
+    """Decodes only the given top-level fields of a JSON object
+
+    The document is parsed lazily by simdjson, only the values of the given fields are converted to Python objects.
+    Fields that are not in the document are left out of the result, as if the document has been decoded as a whole.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = tuple(fields)
+        self.parser = simdjson.Parser()
+
+    def loads(self, item):
+        # The parser reuses its buffers, so the document is only valid until the next item is parsed
+        document = self.parser.parse(item if isinstance(item, bytes) else item.encode())
+
+        result = {}
+        for field in self.fields:
+            value = document.get(field, _MISSING)
+            if value is not _MISSING:
+                result[field] = _to_python(value)
+        return result
+
+
+def _to_python(value):
+    if isinstance(value, simdjson.Object):
+        return value.as_dict()
+    if isinstance(value, simdjson.Array):
+        return value.as_list()
+    return value
+
+
+FULL_DECODER = JsonDecoder()
+ORJSON_DECODER = OrjsonDecoder()
+
+
+def get_decoder(fields: Optional[Collection[str]] = None) -> JsonDecoder:
+    """Returns the decoder for the given top-level fields
+
+    :param fields: the fields that are read from the decoded objects, None if all fields can be read
+    :return: the full decoder if all fields can be read, otherwise a projected decoder for the fields, or the
+        orjson decoder for more than MAX_PROJECTED_FIELDS fields or if simdjson is not available
+    """
+    if fields is None:
+        return FULL_DECODER
+    if len(fields) > MAX_PROJECTED_FIELDS or simdjson is None:
+        return ORJSON_DECODER
+    return ProjectedJsonDecoder(fields)
+
+
+def json_loads(item, decoder: JsonDecoder = FULL_DECODER):
+    try:
+        return decoder.loads(item)
     except Exception as e:
-        print(f"ERROR: Deserialization failed for item {item}.")
+        truncated = "..." if len(item) > MAX_LOGGED_ITEM_LENGTH else ""
+        logger.error(f"Deserialization failed for item {item[:MAX_LOGGED_ITEM_LENGTH]!r}{truncated}: {str(e)}")
         raise e
 
 
@@ -1,3 +1,11 @@
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
 import pytest
 
 import swiftclient
@@ -5,7 +13,21 @@ import swiftclient
 from gobcore.exceptions import GOBException
 
 import gobexport.distributor.objectstore
-from gobexport.distributor.objectstore import distribute_to_objectstore
+from gobexport.distributor.objectstore import (
+    ObjectstoreTarget,
+    ObjectstoreWriter,
+    _delete_segments,
+    _get_segment_location,
+    _get_segment_paths,
+    _get_segments,
+    _get_stream_segment_size,
+    _get_thread_connection,
+    _upload_segment,
+    delete_segments,
+    distribute_files,
+    distribute_segmented,
+    distribute_to_objectstore,
+)
 
 
 class MockFile:
@@ -43,3 +65,336 @@ def test_distribute_to_objectstore(monkeypatch):
     # Assert an exception is raised if no connection is provided
     with pytest.raises(GOBException):
         distribute_to_objectstore(None, 'container', 'object_name', 'contents', 'content_type')
+
+
+class MockConnection:
+    """Stores the objects that are put, returns the MD5 of their contents as ETag"""
+
+    def __init__(self):
+        self.objects = {}
+        self.http_conn = 'http connection'
+
+    def put_object(self, container, obj, contents, content_length=None, content_type=None, query_string=None):
+        data = contents if isinstance(contents, (str, bytes)) else contents.read()
+        self.objects[f"{container}/{obj}"] = (data, content_type, query_string)
+        return hashlib.md5(data if isinstance(data, bytes) else data.encode()).hexdigest()
+
+    def head_object(self, container, obj):
+        if f"{container}/{obj}" not in self.objects:
+            raise swiftclient.exceptions.ClientException('Not found', http_status=404)
+        _, _, query_string = self.objects[f"{container}/{obj}"]
+        return {'x-static-large-object': 'True'} if query_string == 'multipart-manifest=put' else {}
+
+    def get_object(self, container, obj, query_string=None):
+        # The manifest of a Static Large Object lists the name of each segment
+        data, _, _ = self.objects[f"{container}/{obj}"]
+        return {}, json.dumps([{'name': segment['path']} for segment in json.loads(data)])
+
+    def delete_object(self, container, obj):
+        del self.objects[f"{container}/{obj}"]
+
+
+@patch("gobexport.distributor.objectstore.logger", MagicMock())
+@patch("gobexport.distributor.objectstore._get_thread_connection", lambda connection: connection)
+class TestSegmentedUpload(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'file.csv')
+        with open(self.filename, 'wb') as f:
+            f.write(b'0123456789')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_upload_segment(self):
+        connection = MockConnection()
+        self.assertEqual({'path': '/container/seg', 'etag': hashlib.md5(b'2345').hexdigest(), 'size_bytes': 4},
+                         _upload_segment(connection, 'container', 'seg', self.filename, 2, 4))
+        self.assertEqual(b'2345', connection.objects['container/seg'][0])
+
+    def test_upload_segment_retries(self):
+        results = iter([swiftclient.exceptions.ClientException('Error'), 'wrong etag', None])
+
+        def put_object(container, obj, contents, content_length):
+            etag = hashlib.md5(contents.read()).hexdigest()
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result or etag
+
+        connection = MagicMock()
+        connection.put_object.side_effect = put_object
+        self.assertEqual(hashlib.md5(b'01').hexdigest(),
+                         _upload_segment(connection, 'container', 'seg', self.filename, 0, 2)['etag'])
+        self.assertEqual(3, connection.put_object.call_count)
+
+        connection.put_object.side_effect = lambda *args, **kwargs: 'wrong etag'
+        with self.assertRaisesRegex(GOBException, "does not match ETag wrong etag"):
+            _upload_segment(connection, 'container', 'seg', self.filename, 0, 2)
+
+    @patch("gobexport.distributor.objectstore.OBJECTSTORE_SEGMENT_SIZE", 4)
+    def test_get_segments(self):
+        self.assertEqual([(0, 4), (4, 4), (8, 2)], _get_segments(10))
+        self.assertEqual([(0, 4)], _get_segments(4))
+        self.assertEqual([], _get_segments(0))
+
+        with patch("gobexport.distributor.objectstore.MAX_SEGMENTS", 2):
+            self.assertEqual([(0, 5), (5, 5)], _get_segments(10))
+
+    @patch("gobexport.distributor.objectstore.OBJECTSTORE_SEGMENT_SIZE", 4)
+    @patch("gobexport.distributor.objectstore.uuid.uuid4")
+    def test_distribute_segmented(self, mock_uuid4):
+        mock_uuid4.return_value.hex = 'id'
+        connection = MockConnection()
+        distribute_segmented(connection, 'container', 'file.csv', self.filename, 'text/csv')
+
+        manifest, content_type, query_string = connection.objects['container/file.csv']
+        self.assertEqual('text/csv', content_type)
+        self.assertEqual('multipart-manifest=put', query_string)
+        self.assertEqual([
+            {'path': '/container/_segments/file.csv/id/00000000', 'etag': hashlib.md5(b'0123').hexdigest(),
+             'size_bytes': 4},
+            {'path': '/container/_segments/file.csv/id/00000001', 'etag': hashlib.md5(b'4567').hexdigest(),
+             'size_bytes': 4},
+            {'path': '/container/_segments/file.csv/id/00000002', 'etag': hashlib.md5(b'89').hexdigest(),
+             'size_bytes': 2},
+        ], json.loads(manifest))
+
+        # A new upload does not overwrite the segments of the current object, they are deleted afterwards
+        with open(self.filename, 'wb') as f:
+            f.write(b'abcde')
+        mock_uuid4.return_value.hex = 'id2'
+        distribute_segmented(connection, 'container', 'file.csv', self.filename, 'text/csv')
+        self.assertEqual(['container/_segments/file.csv/id2/00000000', 'container/_segments/file.csv/id2/00000001',
+                          'container/file.csv'], sorted(connection.objects))
+
+        connection = MagicMock()
+        connection.put_object.side_effect = swiftclient.exceptions.ClientException('Error')
+        with self.assertRaises(GOBException):
+            distribute_segmented(connection, 'container', 'file.csv', self.filename, 'text/csv')
+
+        # The segments have been uploaded, the manifest fails: the segments are deleted, the object is kept
+        connection = MockConnection()
+        connection.put_object('container', 'file.csv', 'data')
+        connection.put_object = MagicMock(side_effect=lambda *args, **kwargs: MockConnection.put_object(
+            connection, *args, **kwargs) if 'query_string' not in kwargs else fail())
+        with self.assertRaises(GOBException):
+            distribute_segmented(connection, 'container', 'file.csv', self.filename, 'text/csv')
+        self.assertEqual(['container/file.csv'], list(connection.objects))
+
+        # Also on any other error
+        connection.put_object.side_effect = lambda *args, **kwargs: MockConnection.put_object(
+            connection, *args, **kwargs) if 'query_string' not in kwargs else {}['error']
+        with self.assertRaises(KeyError):
+            distribute_segmented(connection, 'container', 'file.csv', self.filename, 'text/csv')
+        self.assertEqual(['container/file.csv'], list(connection.objects))
+
+    @patch("gobexport.distributor.objectstore.OBJECTSTORE_SEGMENT_SIZE", 4)
+    @patch("gobexport.distributor.objectstore.put_object", lambda connection, container, obj, contents, content_type:
+           connection.put_object(container, obj, contents, content_type=content_type))
+    def test_distribute_files(self):
+        small = os.path.join(self.dir.name, 'file.prj')
+        with open(small, 'wb') as f:
+            f.write(b'prj')
+
+        connection = MockConnection()
+        files = [
+            {'temp_location': self.filename, 'distribution': 'file.csv', 'mime_type': 'text/csv'},
+            {'temp_location': small, 'distribution': 'file.prj', 'mime_type': 'text/plain'},
+        ]
+        self.assertEqual([None, None], distribute_files(connection, 'container', files))
+        self.assertEqual(b'prj', connection.objects['container/file.prj'][0])
+        self.assertEqual('multipart-manifest=put', connection.objects['container/file.csv'][2])
+
+        with patch("gobexport.distributor.objectstore.put_object", side_effect=swiftclient.exceptions.ClientException(
+                'Error')), patch("gobexport.distributor.objectstore.distribute_segmented",
+                                 side_effect=GOBException('Segment error')):
+            errors = distribute_files(connection, 'container', files)
+        self.assertEqual(['Segment error', 'Error'], [str(error) for error in errors])
+
+        # Other errors are returned as a GOBException of the file, the other files are distributed
+        missing = {'temp_location': os.path.join(self.dir.name, 'missing.shx'), 'distribution': 'file.shx',
+                   'mime_type': 'text/plain'}
+        with patch("gobexport.distributor.objectstore.distribute_segmented", side_effect=OSError('Disk error')):
+            errors = distribute_files(connection, 'container', files + [missing])
+        self.assertEqual([GOBException, type(None), GOBException], [type(error) for error in errors])
+        self.assertEqual('OSError: Disk error', str(errors[0]))
+
+
+@patch("gobexport.distributor.objectstore.logger", MagicMock())
+@patch("gobexport.distributor.objectstore._get_thread_connection", lambda connection: connection)
+@patch("gobexport.distributor.objectstore.OBJECTSTORE_STREAM_SEGMENT_SIZE", 4)
+class TestStreamedUpload(TestCase):
+
+    def test_get_stream_segment_size(self):
+        self.assertEqual(4, _get_stream_segment_size(0))
+        self.assertEqual(4, _get_stream_segment_size(249))
+        self.assertEqual(8, _get_stream_segment_size(250))
+        self.assertEqual(32, _get_stream_segment_size(999))
+
+    def test_writer(self):
+        connection = MockConnection()
+        writer = ObjectstoreWriter(connection, 'container', '_segments/file.csv/id/')
+        self.assertTrue(writer.writable())
+
+        writer.write(b'012')
+        writer.write(b'3456789')
+        self.assertEqual(10, writer.tell())
+        self.assertIsNone(writer.manifest)
+
+        # The last segment is uploaded on close
+        writer.close()
+        writer.close()
+        self.assertEqual([
+            {'path': '/container/_segments/file.csv/id/00000000', 'etag': hashlib.md5(b'0123').hexdigest(),
+             'size_bytes': 4},
+            {'path': '/container/_segments/file.csv/id/00000001', 'etag': hashlib.md5(b'4567').hexdigest(),
+             'size_bytes': 4},
+            {'path': '/container/_segments/file.csv/id/00000002', 'etag': hashlib.md5(b'89').hexdigest(),
+             'size_bytes': 2},
+        ], writer.manifest)
+        self.assertEqual([segment['path'] for segment in writer.manifest], writer.segments)
+        self.assertEqual(b'89', connection.objects['container/_segments/file.csv/id/00000002'][0])
+
+    def test_writer_on_segment(self):
+        segments = []
+        writer = ObjectstoreWriter(MockConnection(), 'container', '_segments/file.csv/id/')
+        writer.on_segment = segments.append
+
+        writer.write(b'0123456')
+        writer.close()
+
+        # The segments are passed on in order
+        self.assertEqual([b'0123', b'456'], segments)
+
+    @patch("gobexport.distributor.objectstore.OBJECTSTORE_SEGMENT_TRIES", 1)
+    @patch("gobexport.distributor.objectstore.OBJECTSTORE_UPLOAD_WORKERS", 1)
+    def test_writer_error(self):
+        connection = MagicMock()
+        connection.put_object.side_effect = swiftclient.exceptions.ClientException('Error')
+
+        # Writing stops at the first segment that failed
+        writer = ObjectstoreWriter(connection, 'container', '_segments/file.csv/id/')
+        with self.assertRaisesRegex(GOBException, "Upload of segment _segments/file.csv/id/00000000 failed"):
+            writer.write(b'01234567')
+        self.assertEqual(1, connection.put_object.call_count)
+
+        with self.assertRaises(GOBException):
+            writer.close()
+        self.assertTrue(writer.closed)
+        self.assertIsNone(writer.manifest)
+
+    def test_target(self):
+        connection = MockConnection()
+        target = ObjectstoreTarget(connection, 'container', 'file.csv', 'text/csv')
+        self.assertEqual('file.csv', os.fspath(target))
+
+        with self.assertRaisesRegex(GOBException, "file.csv has not been written"):
+            target.commit()
+
+        with target.open() as fp:
+            fp.write(b'0123456789')
+        target.commit()
+
+        data, content_type, query_string = connection.objects['container/file.csv']
+        self.assertEqual(('text/csv', 'multipart-manifest=put'), (content_type, query_string))
+        segments = [segment['path'] for segment in json.loads(data)]
+        self.assertEqual(3, len(segments))
+        self.assertTrue(all(segment.startswith('/container/_segments/file.csv/') for segment in segments))
+
+        # A new write is stored next to the current object, which is replaced by the commit
+        with target.open() as fp:
+            fp.write(b'abcde')
+        self.assertEqual(data, connection.objects['container/file.csv'][0])
+        self.assertEqual(6, len(connection.objects))
+
+        target.commit()
+        self.assertEqual(3, len(connection.objects))
+        self.assertEqual(2, len(json.loads(connection.objects['container/file.csv'][0])))
+
+        # An empty object is not stored as a Static Large Object
+        with patch("gobexport.distributor.objectstore.put_object",
+                   lambda connection, container, obj, contents, content_type:
+                   connection.put_object(container, obj, contents, content_type=content_type)):
+            target.open().close()
+            target.commit()
+        self.assertEqual({'container/file.csv': (b'', 'text/csv', None)}, connection.objects)
+
+    def test_target_discard(self):
+        connection = MockConnection()
+        target = ObjectstoreTarget(connection, 'container', 'file.csv', 'text/csv')
+        target.discard()
+
+        with target.open() as fp:
+            fp.write(b'01234')
+        self.assertEqual(2, len(connection.objects))
+
+        # Opening the target again discards the previous write
+        with target.open() as fp:
+            fp.write(b'0')
+        self.assertEqual(1, len(connection.objects))
+
+        target.discard()
+        self.assertEqual({}, connection.objects)
+
+        with self.assertRaisesRegex(GOBException, "Appending to file.csv on the objectstore is not supported"):
+            target.open('a')
+
+    def test_get_segment_paths(self):
+        connection = MockConnection()
+        self.assertEqual([], _get_segment_paths(connection, 'container', 'file.csv'))
+
+        connection.put_object('container', 'file.csv', 'data')
+        self.assertEqual([], _get_segment_paths(connection, 'container', 'file.csv'))
+
+        connection = MagicMock()
+        connection.head_object.side_effect = swiftclient.exceptions.ClientException('Error', http_status=500)
+        with self.assertRaises(GOBException):
+            _get_segment_paths(connection, 'container', 'file.csv')
+
+    @patch("gobexport.distributor.objectstore.uuid.uuid4")
+    def test_get_segment_location(self, mock_uuid4):
+        mock_uuid4.return_value.hex = 'id'
+        self.assertEqual(('container', '_segments/file.csv/id/'), _get_segment_location('container', 'file.csv'))
+        self.assertEqual(('development', '_segments/_tmp/cat/dir/file.csv/id/'),
+                         _get_segment_location('development/_tmp/cat/', 'dir/file.csv'))
+
+    def test_delete_segments(self):
+        connection = MagicMock()
+        connection.delete_object.side_effect = [swiftclient.exceptions.ClientException('Error'), None]
+
+        # A segment that cannot be deleted is skipped
+        _delete_segments(connection, ['/container/a.segments/1', '/container/path/a.segments/2'])
+        connection.delete_object.assert_called_with('container', 'path/a.segments/2')
+
+    def test_delete_object_segments(self):
+        connection = MockConnection()
+        connection.put_object('container', '_segments/file.csv/id/00000000', b'0123')
+        connection.put_object('container', 'file.csv', json.dumps([{'path': '/container/_segments/file.csv/id/00000000'}]),
+                              query_string='multipart-manifest=put')
+        connection.put_object('container', 'other.csv', 'data')
+
+        delete_segments(connection, 'container', 'other.csv')
+        delete_segments(connection, 'container', 'file.csv')
+        self.assertEqual(['container/file.csv', 'container/other.csv'], list(connection.objects))
+
+
+class TestThreadConnection(TestCase):
+
+    def test_get_thread_connection(self):
+        connection = MockConnection()
+
+        thread_connection = _get_thread_connection(connection)
+        self.assertIs(thread_connection, _get_thread_connection(connection))
+        self.assertIsNot(connection, thread_connection)
+        self.assertIsNone(thread_connection.http_conn)
+        self.assertEqual('http connection', connection.http_conn)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            other = pool.submit(_get_thread_connection, connection).result()
+        self.assertIsNot(thread_connection, other)
+
+
+def fail():
+    raise swiftclient.exceptions.ClientException('Error')
@@ -36,3 +36,10 @@ class TestBrkBagExportConfig(TestCase):
 
         self.assertTrue(vot_filter.filter(entity), 'Should return True when VOT identification not set and city '
                                                    'not set')
+
+    def test_vot_filter_fields(self):
+        vot_filter = KadastraleobjectenExportConfig().VotFilter()
+        expected = ['heeftEenRelatieMetVerblijfsobject.[0].identificatie',
+                    'heeftEenRelatieMetVerblijfsobject.[0].broninfo.woonplaatsnaam']
+        self.assertEqual(expected, vot_filter.get_fields())
+        self.assertEqual(expected, vot_filter.get_raw_fields())
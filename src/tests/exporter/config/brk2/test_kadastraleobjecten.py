@@ -79,6 +79,16 @@ class TestBrk2ExportConfig(TestCase):
             "Should return True when VOT identification not set and city not set",
         )
 
+    def test_vot_filter_fields(self):
+        """VotFilter fields tests."""
+        vot_filter = KadastraleobjectenExportConfig().VotFilter()
+        expected = [
+            "heeftEenRelatieMetBagVerblijfsobject.[0].identificatie",
+            "heeftEenRelatieMetBagVerblijfsobject.[0].broninfo.woonplaatsnaam",
+        ]
+        self.assertEqual(expected, vot_filter.get_fields())
+        self.assertEqual(expected, vot_filter.get_raw_fields())
+
 
 class TestKadastraleobjectenCsvFormat(TestCase):
     """KadastraleobjectenCsvFormat tests."""
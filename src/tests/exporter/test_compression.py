@@ -0,0 +1,148 @@
+import gzip
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import ANY, MagicMock, patch
+
+import zstandard
+
+from gobcore.exceptions import GOBException
+from gobexport.distributor.objectstore import ObjectstoreTarget
+from gobexport.exporter.compression import compressed_filename, compressed_mime_type, open_file
+
+
+class TestCompression(TestCase):
+
+    def test_compressed_filename(self):
+        self.assertEqual('CSV/any.csv', compressed_filename('CSV/any.csv', None))
+        self.assertEqual('CSV/any.csv.gz', compressed_filename('CSV/any.csv', 'gzip'))
+        self.assertEqual('CSV/any.csv.zst', compressed_filename('CSV/any.csv', 'zstd'))
+
+        with self.assertRaisesRegex(GOBException, "Unknown compression 'bz2'"):
+            compressed_filename('CSV/any.csv', 'bz2')
+
+    def test_compressed_mime_type(self):
+        self.assertEqual('plain/text', compressed_mime_type('plain/text', None))
+        self.assertEqual('application/gzip', compressed_mime_type('plain/text', 'gzip'))
+        self.assertEqual('application/zstd', compressed_mime_type('plain/text', 'zstd'))
+
+    def test_open_file_uncompressed(self):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'any.csv')
+
+            with open_file(file, 'w', encoding='utf-8-sig') as fp:
+                fp.write('a;b\n')
+
+            with open(file, 'rb') as fp:
+                self.assertEqual(b'\xef\xbb\xbfa;b\n', fp.read())
+
+    @patch("gobexport.exporter.compression.logger")
+    def test_open_file(self, mock_logger):
+        decompress = {
+            'gzip': gzip.decompress,
+            'zstd': lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+        }
+
+        for compression in ['gzip', 'zstd']:
+            with TemporaryDirectory() as tmpdir:
+                file = os.path.join(tmpdir, 'any.csv')
+
+                with open_file(file, 'w', compression, encoding='utf-8-sig') as fp:
+                    fp.write('a;b\n' * 1000)
+
+                with open(file, 'rb') as fp:
+                    self.assertEqual(b'\xef\xbb\xbf' + b'a;b\n' * 1000, decompress[compression](fp.read()))
+
+                size = os.path.getsize(file)
+                mock_logger.info.assert_called_with(
+                    f"Compressed any.csv ({compression}): 4003 bytes to {size} bytes, ratio {4003 / size:.1f}")
+
+                # Appending adds a new member (gzip) or frame (zstd), the file is read as a single stream
+                with open_file(file, 'a', compression) as fp:
+                    fp.write('c;d\n')
+
+                with open_file(file, 'r', compression, encoding='utf-8-sig') as fp:
+                    self.assertEqual('a;b\n' * 1000 + 'c;d\n', fp.read())
+
+    @patch("gobexport.exporter.compression.logger")
+    def test_open_file_empty(self, mock_logger):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'any.csv')
+
+            fp = open_file(file, 'w', 'zstd')
+            fp.close()
+            fp.buffer.close()
+
+            with open_file(file, 'r', 'zstd') as fp:
+                self.assertEqual('', fp.read())
+
+            mock_logger.info.assert_called_once()
+
+    @patch("gobexport.exporter.compression.logger", MagicMock())
+    @patch("gobexport.exporter.compression.EncryptedWriter")
+    def test_open_file_encrypted(self, mock_encrypted_writer):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'any.csv')
+            encrypted = BytesIO()
+            encrypted.close = MagicMock()
+            mock_encrypted_writer.side_effect = lambda fp, key_name: fp.close() or encrypted
+
+            # The data is compressed before it is encrypted
+            with open_file(file, 'w', 'gzip', 'any key', encoding='utf-8') as fp:
+                fp.write('a;b\n')
+
+            mock_encrypted_writer.assert_called_with(ANY, 'any key')
+            self.assertEqual(b'a;b\n', gzip.decompress(encrypted.getvalue()))
+
+            with open_file(file, 'w', encryption_key='any key') as fp:
+                fp.write('c;d\n')
+            self.assertEqual(b'c;d\n', encrypted.getvalue()[-4:])
+
+            with self.assertRaisesRegex(GOBException, "Reading an encrypted file is not supported"):
+                open_file(file, 'r', encryption_key='any key')
+
+            with self.assertRaisesRegex(GOBException, "Appending to an encrypted file is not supported"):
+                open_file(file, 'a', 'gzip', 'any key')
+
+    @patch("gobexport.exporter.compression.logger", MagicMock())
+    def test_open_file_binary(self):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'any.ndjson')
+
+            with open_file(file, 'wb', 'zstd') as fp:
+                fp.write(b'{"a": 1}\n')
+
+            with open_file(file, 'rb', 'zstd') as fp:
+                self.assertEqual(b'{"a": 1}\n', fp.read())
+
+            with open_file(file, 'wb') as fp:
+                fp.write(b'{"a": 2}\n')
+
+            with open(file, 'rb') as fp:
+                self.assertEqual(b'{"a": 2}\n', fp.read())
+
+    @patch("gobexport.exporter.compression.logger")
+    def test_open_file_objectstore(self, mock_logger):
+        written = BytesIO()
+        written.close = MagicMock()
+        target = MagicMock(spec=ObjectstoreTarget)
+        target.__fspath__.return_value = 'any.csv'
+        target.open.return_value = written
+
+        # An objectstore target is written directly, also without compression
+        with open_file(target, 'w', encoding='utf-8-sig') as fp:
+            fp.write('a;b\n')
+        target.open.assert_called_with('w')
+        self.assertEqual('\ufeffa;b\n'.encode(), written.getvalue())
+        written.close.assert_called_once()
+
+        written.seek(0)
+        written.truncate()
+        with open_file(target, 'w', 'gzip') as fp:
+            fp.write('c;d\n')
+        self.assertEqual(b'c;d\n', gzip.decompress(written.getvalue()))
+        self.assertIn('any.csv', mock_logger.info.call_args.args[0])
+
+        with self.assertRaisesRegex(GOBException, "Reading a file from the objectstore is not supported"):
+            open_file(target, 'r')
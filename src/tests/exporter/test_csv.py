@@ -1,3 +1,5 @@
+import os
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import patch, MagicMock, mock_open, call
 
@@ -6,6 +8,9 @@ from gobexport.exporter.csv import (
     get_entity_value, _get_headers_from_file, _ensure_fieldnames_match_existing_file,
     _get_csv_ids, csv_exporter
 )
+from gobexport.checkpoint import Checkpoint
+from gobexport.exporter.compression import open_file
+from gobexport.formatter.geometry import format_geometry
 
 
 class TestCsvExporter(TestCase):
@@ -26,7 +31,7 @@ class TestCsvExporter(TestCase):
 
         # Headers match, no exception
         _ensure_fieldnames_match_existing_file(existing_fields.copy(), 'somefile')
-        mock_get_headers.assert_called_with('somefile')
+        mock_get_headers.assert_called_with('somefile', None)
 
         error_cases = [
             [],
@@ -94,7 +99,7 @@ class TestCsvExporter(TestCase):
 
         count = csv_exporter(api, csv_file, append=True, unique_csv_id=csv_id)
         self.assertEqual(count, 2)
-        mock_csv_ids.assert_called_with(csv_file, csv_id)
+        mock_csv_ids.assert_called_with(csv_file, csv_id, None)
 
     @patch("builtins.open", mock_open())
     @patch("gobexport.exporter.csv.csv.DictReader")
@@ -102,3 +107,88 @@ class TestCsvExporter(TestCase):
         mock_reader.return_value = [{"BRK2_AANTEK_ID": "x", "field": "data"}, {"BRK2_AANTEK_ID": "y", "field": "data"}]
         result = _get_csv_ids("file.csv", "BRK2_AANTEK_ID")
         self.assertEqual(result, set(["x", "y"]))
+
+    @patch("gobexport.exporter.csv.GEOMETRY_BATCH_SIZE", 2)
+    def test_csv_exporter_geometry_batches(self):
+        api = [
+            {'id': 1, 'geometrie': {'type': 'Point', 'coordinates': [1.5, 2]}},
+            {'id': 2, 'geometrie': None},
+            {'id': 3, 'geometrie': 'POINT (3 4)'},
+            {'id': 4, 'geometrie': {'type': 'Point', 'coordinates': [5.123, 6]}},
+            {'id': 5, 'geometrie': {'type': 'Point', 'coordinates': [5.123, 6]}},
+        ]
+        format = {
+            'id': 'id',
+            'geometrie': {'action': 'format', 'formatter': format_geometry, 'value': 'geometrie'},
+            'afgerond': {'action': 'format', 'formatter': format_geometry, 'value': 'geometrie',
+                         'kwargs': {'rounding_precision': 1}},
+        }
+
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'out.csv')
+            self.assertEqual(5, csv_exporter(api, file, format))
+
+            with open(file, encoding='utf-8-sig') as fp:
+                self.assertEqual([
+                    'id;geometrie;afgerond',
+                    '1;POINT (1.5 2);POINT (1.5 2)',
+                    '2;;',
+                    '3;POINT (3 4);POINT (3 4)',
+                    '4;POINT (5.123 6);POINT (5.1 6)',
+                    '5;POINT (5.123 6);POINT (5.1 6)',
+                ], fp.read().splitlines())
+
+    @patch("gobexport.exporter.compression.logger", MagicMock())
+    def test_csv_exporter_compression(self):
+        format = {'id': 'id', 'naam': 'naam'}
+
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'out.csv')
+            self.assertEqual(2, csv_exporter([{'id': 1, 'naam': 'a'}, {'id': 2, 'naam': 'b'}], file, format,
+                                             compression='zstd'))
+
+            # Append to the compressed file, skipping existing ids
+            to_append = f"{file}.to_append"
+            self.assertEqual(1, csv_exporter([{'id': '2', 'naam': 'b'}, {'id': '3', 'naam': 'c'}], to_append, format,
+                                             append=file, unique_csv_id='id', compression='zstd'))
+
+            with open_file(to_append, 'r', 'zstd', encoding='utf-8-sig') as fp:
+                self.assertEqual(['3;c'], fp.read().splitlines())
+
+            with open_file(file, 'r', 'zstd', encoding='utf-8-sig') as fp:
+                self.assertEqual(['id;naam', '1;a', '2;b'], fp.read().splitlines())
+
+    def test_csv_exporter_checkpoint(self):
+        class Source:
+            """Fails at an entity until it is resumed"""
+
+            def __init__(self, entities, fail_at):
+                self.entities, self.fail_at = entities, fail_at
+                self.position = {'skip': 0}
+
+            def resume(self, position):
+                self.position = dict(position)
+                self.fail_at = None
+
+            def __iter__(self):
+                for entity in self.entities[self.position['skip']:]:
+                    if entity['id'] == self.fail_at:
+                        raise ConnectionError
+                    self.position['skip'] += 1
+                    yield entity
+
+        format = {'id': 'id', 'naam': 'naam'}
+        entities = [{'id': i, 'naam': f'é{i}'} for i in range(1, 5)]
+
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'out.csv')
+            source = Source(entities, fail_at=3)
+            with self.assertRaises(ConnectionError):
+                csv_exporter(source, file, format, checkpoint=Checkpoint(file, source, interval=0))
+
+            checkpoint = Checkpoint(file, source, interval=0)
+            self.assertTrue(checkpoint.restore())
+            self.assertEqual(4, csv_exporter(source, file, format, checkpoint=checkpoint))
+
+            with open(file, encoding='utf-8-sig') as fp:
+                self.assertEqual(['id;naam', '1;é1', '2;é2', '3;é3', '4;é4'], fp.read().splitlines())
@@ -30,3 +30,17 @@ class TestDatExporter(TestCase):
 
         mock_filter.filter.assert_called_with({'a': 'b', 'row_count': 1})
         mock_tick.tick.assert_not_called()
+
+    @patch("gobexport.exporter.dat.ProgressTicker", MagicMock())
+    def test_dat_exporter_checkpoint(self):
+        checkpoint = MagicMock(resumed=True, rows=2)
+        checkpoint.due.side_effect = [False, True]
+
+        with patch("builtins.open", mock_open()) as mock_file:
+            self.assertEqual(4, dat_exporter([{'a': 'c'}, {'a': 'd'}], 'file', '$a:str$|$row_count:num$',
+                                             checkpoint=checkpoint))
+
+        # The file is appended to, the row numbers continue after the rows that have been written before
+        mock_file.assert_called_with('file', 'a')
+        mock_file.return_value.write.assert_called_with('$$d$$|4\n')
+        checkpoint.save.assert_called_once_with(mock_file.return_value, 4)
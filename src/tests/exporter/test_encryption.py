@@ -1,9 +1,17 @@
 import base64
+import os
+from tempfile import TemporaryDirectory
 
 from unittest import TestCase
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import patch, MagicMock
 
-from gobexport.exporter.encryption import _encrypt_symmetric_key, encrypt_file
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from gobcore.exceptions import GOBException
+from gobexport.exporter.encryption import _encrypt_symmetric_key, encrypt_file, decrypt_file, decrypt_stream, \
+    EncryptedWriter
 
 
 class TestEncryption(TestCase):
@@ -28,30 +36,95 @@ class TestEncryption(TestCase):
         
         self.assertEqual(base64.b64encode(b'any bytes'), result)
 
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_key = os.path.join(self.tmpdir.name, 'key')
+        with open(self.private_key, 'wb') as fp:
+            fp.write(private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                               serialization.NoEncryption()))
+
+        self.public_key = os.path.join(self.tmpdir.name, 'key.pub')
+        with open(self.public_key, 'wb') as fp:
+            fp.write(private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                           serialization.PublicFormat.SubjectPublicKeyInfo))
+
+        self.file = os.path.join(self.tmpdir.name, 'any file')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _decrypt(self, file):
+        with open(file, 'rb') as fp:
+            return b''.join(decrypt_stream(fp, self.private_key))
+
+    @patch("gobexport.exporter.encryption.CHUNK_SIZE", 10)
     @patch("gobexport.exporter.encryption.get_public_key")
-    @patch("gobexport.exporter.encryption.Fernet")
-    @patch("gobexport.exporter.encryption._encrypt_symmetric_key")
-    def test_encrypt_file(self, mock_encrypt_symmetric_key, mock_Fernet, mock_get_public_key):
-        mock_get_public_key.return_value = 'any public key'
+    def test_encrypt_file(self, mock_get_public_key):
+        mock_get_public_key.return_value = self.public_key
+        data = b'any data' * 100
 
-        mock_Fernet.generate_key.return_value = 'any symmetric key'
-        mocked_fernet = MagicMock()
-        mock_Fernet.return_value = mocked_fernet
+        with open(self.file, 'wb') as fp:
+            fp.write(data)
 
-        mock_encrypt_symmetric_key.return_value = b'any encrypted key'
-        mocked_fernet.encrypt.return_value = b'any bytes'
+        encrypt_file(self.file, 'any key name')
+        mock_get_public_key.assert_called_with('any key name')
 
-        mocked_file = mock_open(read_data="any data")
-        with patch('builtins.open', mocked_file):
-            encrypt_file('any file', 'any key name')
-            assert mocked_file.call_count == 2
-            
-            handle = mocked_file()
-            handle.write.assert_called_once_with(b'0017:any encrypted key:any bytes')
+        with open(self.file, 'rb') as fp:
+            self.assertTrue(fp.read().startswith(b'GOBAESGCM1:0344:'))
+        self.assertEqual([os.path.basename(self.file), 'key', 'key.pub'], sorted(os.listdir(self.tmpdir.name)))
 
-            mock_get_public_key.assert_called_with('any key name')
-            mock_Fernet.assert_called_with('any symmetric key')
+        destination = os.path.join(self.tmpdir.name, 'decrypted')
+        decrypt_file(self.file, destination, self.private_key)
+        with open(destination, 'rb') as fp:
+            self.assertEqual(data, fp.read())
 
-            mocked_fernet.encrypt.assert_called_with('any data')
+    @patch("gobexport.exporter.encryption.get_public_key")
+    def test_encrypted_writer(self, mock_get_public_key):
+        mock_get_public_key.return_value = self.public_key
+
+        for workers in [1, 3]:
+            for data in [b'', b'abcd', b'abcdefghijklmnopqrstuvwxyz']:
+                with EncryptedWriter(open(self.file, 'wb'), 'any key name', chunk_size=4, workers=workers) as writer:
+                    for i in range(0, len(data), 3):
+                        writer.write(data[i:i + 3])
+                    self.assertEqual(len(data), writer.tell())
+
+                # A closed writer can be closed again
+                writer.close()
 
-            mock_encrypt_symmetric_key.assert_called_with('any public key', 'any symmetric key')
+                # One chunk per 4 bytes, the last chunk can be empty
+                with open(self.file, 'rb') as fp:
+                    expected_size = len(b'GOBAESGCM1:0344:') + 344 + 1 + len(data) + 20 * max(1, -(-len(data) // 4))
+                    self.assertEqual(expected_size, len(fp.read()))
+
+                self.assertEqual(data, self._decrypt(self.file))
+
+    @patch("gobexport.exporter.encryption.get_public_key")
+    def test_decrypt_stream_tampered(self, mock_get_public_key):
+        mock_get_public_key.return_value = self.public_key
+
+        with EncryptedWriter(open(self.file, 'wb'), 'any key name', chunk_size=4, workers=1) as writer:
+            writer.write(b'abcdefghij')
+
+        with open(self.file, 'rb') as fp:
+            encrypted = fp.read()
+
+        # Truncated within a chunk
+        with open(self.file, 'wb') as fp:
+            fp.write(encrypted[:-1])
+        with self.assertRaisesRegex(GOBException, "truncated"):
+            self._decrypt(self.file)
+
+        # Last chunk removed
+        with open(self.file, 'wb') as fp:
+            fp.write(encrypted[:-(4 + 2 + 16)])
+        with self.assertRaises(InvalidTag):
+            self._decrypt(self.file)
+
+        # Not encrypted
+        with open(self.file, 'wb') as fp:
+            fp.write(b'abcdefghijklmnopqrstuvwxyz')
+        with self.assertRaisesRegex(GOBException, "Not an encrypted file"):
+            self._decrypt(self.file)
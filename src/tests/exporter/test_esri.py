@@ -6,7 +6,8 @@ from unittest.mock import MagicMock, mock_open, patch
 import pytest
 
 from gobexport.exporter.esri import get_centroid, get_x, get_y, get_longitude, get_latitude, esri_exporter, ogr, \
-    COORDINATE_PRECISION
+    COORDINATE_PRECISION, create_geometry, _get_geometry_source, part_filename, _remove_parts, _PartSize
+from gobexport.formatter.geometry import format_geometry
 
 
 class TestEsriExporter(TestCase):
@@ -56,6 +57,109 @@ class TestEsriExporter(TestCase):
                 for feature, entitiy in zip(tmp_shp.GetLayer(), api):
                     self.assertEqual(entitiy[field], feature.GetField(field))
 
+    def test_esri_exporter_parts(self):
+        api = [{'id': str(i), 'geometrie': f"POINT ({i} {i})"} for i in range(10)]
+
+        with TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'test_shp.shp')
+
+            # Stale part of a previous export
+            with open(os.path.join(tmpdir, 'test_shp_part9.shp'), 'w'):
+                pass
+
+            # Every part holds 4 points, the 5th would exceed the maximum size
+            shp_size = _PartSize.SHP_HEADER + 4 * (_PartSize.SHP_RECORD_HEADER + 21)
+            self.assertEqual(10, esri_exporter(api, filepath, format={'id': 'id'}, max_part_size=shp_size))
+
+            self.assertEqual(sorted([
+                'test_shp.shp', 'test_shp.shx', 'test_shp.dbf', 'test_shp.prj', 'test_shp.cpg',
+                'test_shp_part2.shp', 'test_shp_part2.shx', 'test_shp_part2.dbf', 'test_shp_part2.prj',
+                'test_shp_part2.cpg',
+                'test_shp_part3.shp', 'test_shp_part3.shx', 'test_shp_part3.dbf', 'test_shp_part3.prj',
+                'test_shp_part3.cpg',
+            ]), sorted(os.listdir(tmpdir)))
+
+            driver = ogr.GetDriverByName("ESRI Shapefile")
+            ids = []
+            for part in range(1, 4):
+                datasource = driver.Open(part_filename(filepath, part), 0)
+                ids.append([feature.GetField('id') for feature in datasource.GetLayer()])
+            self.assertEqual([['0', '1', '2', '3'], ['4', '5', '6', '7'], ['8', '9']], ids)
+
+
+def test_part_filename():
+    assert part_filename('SHP/BAG_pand.shp', 1) == 'SHP/BAG_pand.shp'
+    assert part_filename('SHP/BAG_pand.shp', 2) == 'SHP/BAG_pand_part2.shp'
+    assert part_filename('SHP/BAG_pand_20240101.dbf', 12) == 'SHP/BAG_pand_20240101_part12.dbf'
+
+
+def test_remove_parts():
+    with TemporaryDirectory() as tmpdir:
+        for name in ['a.shp', 'a.dbf', 'a_part2.shp', 'a_part2.dbf', 'a_part13.cpg', 'a_partial.shp', 'b_part2.shp']:
+            with open(os.path.join(tmpdir, name), 'w'):
+                pass
+
+        _remove_parts(os.path.join(tmpdir, 'a.shp'))
+
+        assert sorted(os.listdir(tmpdir)) == ['a.dbf', 'a.shp', 'a_partial.shp', 'b_part2.shp']
+
+
+def test_part_size():
+    size = _PartSize(['a', 'b'])
+    geometry = MagicMock()
+    geometry.WkbSize.return_value = 21
+
+    size.add(geometry, {'a': 'abc', 'b': ''})
+    size.add(None, {'a': 'é', 'b': 12345})
+
+    assert size.shp == 100 + 2 * 52 + 21
+    # header: 32 bytes per field + file header, records: deletion flag + the declared field widths
+    assert size.dbf == 32 * 3 + 1 + 2 * (1 + 80 + 80)
+
+    # Fields are widened for longer values
+    size.add(None, {'a': 'x' * 100, 'b': ''})
+    assert size.dbf == 32 * 3 + 1 + 3 * (1 + 100 + 80)
+    assert size.exceeds(size.dbf)
+    assert not size.exceeds(size.dbf + 1)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        {"type": "Point", "coordinates": [121897.414, 486037.556]},
+        "POINT (121897.414 486037.556)",
+        ogr.CreateGeometryFromWkt("POINT (121897.414 486037.556)").ExportToWkb(),
+        ogr.CreateGeometryFromWkt("POINT (121897.414 486037.556)"),
+    ],
+)
+def test_create_geometry(value):
+    assert create_geometry(value).ExportToWkt() == "POINT (121897.414 486037.556)"
+
+
+def test_create_geometry_ogr_ready():
+    geometry = ogr.CreateGeometryFromWkt("POINT (121897.414 486037.556)")
+    assert create_geometry(geometry) is geometry
+
+
+def test_create_geometry_collection():
+    geojson = {
+        "type": "GeometryCollection",
+        "geometries": [{"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}]
+    }
+    assert create_geometry(geojson).GetGeometryType() == ogr.wkbPolygon
+
+
+def test_get_geometry_source():
+    assert _get_geometry_source('geometrie') == 'geometrie'
+    assert _get_geometry_source(
+        {'action': 'format', 'formatter': format_geometry, 'value': 'bijpijlingGeometrie'}) == 'bijpijlingGeometrie'
+
+    other_action = {'action': 'format', 'formatter': str, 'value': 'geometrie'}
+    assert _get_geometry_source(other_action) == other_action
+
+    with_kwargs = {'action': 'format', 'formatter': format_geometry, 'value': 'geometrie', 'kwargs': {'a': 1}}
+    assert _get_geometry_source(with_kwargs) == with_kwargs
+
 
 @pytest.mark.parametrize(
     "wkt, expected",
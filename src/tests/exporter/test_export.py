@@ -3,13 +3,16 @@ import importlib
 from tempfile import mkdtemp
 
 from unittest import TestCase
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, call, patch, MagicMock
 
 import gobexport.api
 from gobexport.exporter import CONFIG_MAPPING
+from gobexport.distributor.objectstore import ObjectstoreTarget
 from gobexport.exporter.dat import dat_exporter
 from gobexport.exporter.csv import csv_exporter
 from gobexport.exporter.esri import esri_exporter
+from gobexport.filters.notempty_filter import NotEmptyFilter
+from gobexport.filters.unique_filter import UniqueFilter
 
 from gobexport.formatter.geometry import format_geometry
 
@@ -35,7 +38,8 @@ class MockAPI:
 
 class MockGraphQL:
     def __init__(self, host=None, query=None, catalogue=None, collection=None, expand_history=None, sort=None,
-                 unfold=False, row_formatter=None, cross_relations=False, batch_size=None, secure_user=None):
+                 unfold=False, row_formatter=None, cross_relations=False, batch_size=None, secure_user=None,
+                 entity_filters=None):
         pass
 
     def __iter__(self):
@@ -177,6 +181,136 @@ class TestExportToFile(TestCase):
         mock_merged_api.assert_called_with(mock_api.return_value, mock_api.return_value,
                                            ['attr_a', 'attr_b'], ['merge_attr'])
 
+    @patch("gobexport.exporter.logger")
+    @patch("gobexport.exporter.GraphQLStreaming")
+    @patch("gobexport.exporter.BufferedIterable")
+    def test_export_to_file_pushdown(self, mock_buffered_iterable, mock_graphql_streaming, mock_logger):
+        from gobexport.exporter import export_to_file
+
+        notempty_filter = NotEmptyFilter('geometrie')
+        product = {
+            'api_type': 'graphql_streaming',
+            'query': '{ collection(active: false) { edges { node { identificatie geometrie } } } }',
+            'exporter': MagicMock(side_effect=lambda api, *args, filter, **kwargs: len([e for e in api if filter.filter(e)])),
+            'entity_filters': [notempty_filter],
+            'pushdown_filters': True,
+        }
+        mock_buffered_iterable.return_value = [{'geometrie': 'POINT (1 2)'}, {'geometrie': ''}]
+
+        self.assertEqual(1, export_to_file('host', product, 'file', 'catalogue', 'collection'))
+        self.assertEqual('{ collection(active: false, geometrie: "!null") { edges { node { identificatie geometrie } } } }',
+                         mock_graphql_streaming.call_args.args[1])
+        mock_logger.info.assert_called_with(
+            "1 entity filter(s) pushed down into the query: 2 rows received, 1 rows filtered out")
+
+        # Shared sources are not changed
+        mock_logger.reset_mock()
+        export_to_file('host', product, 'file', 'catalogue', 'collection', buffer_items=True)
+        self.assertEqual(product['query'], mock_graphql_streaming.call_args.args[1])
+        mock_logger.info.assert_not_called()
+
+    @patch("gobexport.exporter.logger")
+    @patch("gobexport.exporter.GraphQLStreaming")
+    @patch("gobexport.exporter.BufferedIterable", MagicMock())
+    def test_export_to_file_early_filters(self, mock_graphql_streaming, mock_logger):
+        from gobexport.exporter import export_to_file
+
+        notempty_filter = NotEmptyFilter('rel.[0].identificatie')
+        product = {
+            'api_type': 'graphql_streaming',
+            'query': '{ collection { edges { node { identificatie rel { edges { node { identificatie } } } } } } }',
+            'exporter': MagicMock(return_value=1),
+            'entity_filters': [notempty_filter, UniqueFilter('identificatie')],
+        }
+        mock_graphql_streaming.return_value.formatter.pruned = 2
+
+        export_to_file('host', product, 'file', 'catalogue', 'collection')
+        self.assertEqual([notempty_filter], mock_graphql_streaming.call_args.kwargs['entity_filters'])
+        mock_logger.info.assert_called_with("1 entity filter(s) evaluated before formatting: 2 entities left out")
+
+        # Not for shared sources
+        mock_logger.reset_mock()
+        export_to_file('host', product, 'file', 'catalogue', 'collection', buffer_items=True)
+        self.assertEqual([], mock_graphql_streaming.call_args.kwargs['entity_filters'])
+        mock_logger.info.assert_not_called()
+
+        # Not for merged results
+        product['merge_result'] = {'api_type': 'graphql_streaming', 'query': 'query', 'match_attributes': [],
+                                   'attributes': []}
+        with patch("gobexport.exporter.MergedApi"):
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
+        self.assertEqual([], mock_graphql_streaming.call_args_list[-2].kwargs['entity_filters'])
+        mock_logger.info.assert_not_called()
+
+    @patch("gobexport.exporter.logger")
+    @patch("gobexport.exporter.Checkpoint")
+    @patch("gobexport.exporter.API")
+    @patch("gobexport.exporter.BufferedIterable", MagicMock())
+    def test_export_to_file_checkpoint(self, mock_api, mock_checkpoint, mock_logger):
+        from gobexport.exporter import export_to_file
+
+        exporter = MagicMock(return_value=5)
+        mock_api.return_value.resumable = True
+        checkpoint = mock_checkpoint.return_value
+        checkpoint.rows = 3
+
+        with patch("gobexport.exporter.STREAMING_EXPORTERS", (exporter,)):
+            product = {'endpoint': '/end/point', 'exporter': exporter}
+            self.assertEqual(5, export_to_file('host', product, 'file', 'catalogue', 'collection'))
+
+            mock_checkpoint.assert_called_with('file', mock_api.return_value)
+            exporter.assert_called_with(ANY, 'file', None, append=False, filter=None, checkpoint=checkpoint)
+            mock_logger.info.assert_called_with("Export resumed after 3 rows")
+            checkpoint.clear.assert_called_once()
+
+            # Without a checkpoint to restore
+            checkpoint.restore.return_value = False
+            mock_logger.reset_mock()
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
+            exporter.assert_called_with(ANY, 'file', None, append=False, filter=None, checkpoint=checkpoint)
+            mock_logger.info.assert_not_called()
+
+            # Exports that cannot be resumed
+            mock_checkpoint.reset_mock()
+            for update, buffer_items in [
+                ({'compression': 'gzip'}, False),
+                ({'entity_filters': [UniqueFilter('id')]}, False),
+                ({'exporter': MagicMock()}, False),
+                ({}, True),
+            ]:
+                export_to_file('host', {**product, **update}, 'file', 'catalogue', 'collection',
+                               buffer_items=buffer_items)
+                self.assertNotIn('checkpoint', ({**product, **update})['exporter'].call_args.kwargs)
+
+            mock_api.return_value.resumable = False
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
+            self.assertNotIn('checkpoint', exporter.call_args.kwargs)
+
+            with patch("gobexport.exporter.EXPORT_CHECKPOINT_INTERVAL", 0):
+                mock_api.return_value.resumable = True
+                export_to_file('host', product, 'file', 'catalogue', 'collection')
+                self.assertNotIn('checkpoint', exporter.call_args.kwargs)
+
+            # Files that are written directly to the objectstore cannot be truncated
+            export_to_file('host', product, ObjectstoreTarget('connection', 'container', 'file', 'text/csv'),
+                           'catalogue', 'collection')
+            self.assertNotIn('checkpoint', exporter.call_args.kwargs)
+
+            mock_checkpoint.assert_not_called()
+
+    @patch("gobexport.exporter.API")
+    @patch("gobexport.exporter.BufferedIterable", MagicMock())
+    def test_export_to_file_fields(self, mock_api):
+        from gobexport.exporter import export_to_file
+
+        product = {
+            'endpoint': '/end/point?ndjson=true',
+            'exporter': MagicMock(),
+        }
+        export_to_file('host', product, 'file', 'catalogue', 'collection', fields={'a', 'b'})
+        mock_api.assert_called_with(host='host', path='/end/point?ndjson=true', row_formatter=None, secure_user=None,
+                                    fields={'a', 'b'})
+
     @patch("gobexport.exporter.GraphQLStreaming")
     @patch("gobexport.exporter.BufferedIterable")
     @patch("gobexport.exporter.product_source", lambda x: 'source')
@@ -193,7 +327,7 @@ class TestExportToFile(TestCase):
         result = export_to_file('host', product, 'file', 'catalogue', 'collection', False)
         mock_graphql_streaming.assert_called_with('host', product['query'], row_formatter=None, sort=None,
                                                   unfold=False, cross_relations=False, batch_size=None,
-                                                  secure_user='any secure user')
+                                                  secure_user='any secure user', entity_filters=[])
 
         mock_buffered_iterable.assert_called_with(mock_graphql_streaming.return_value, 'source', buffer_items=False)
         product['exporter'].assert_called_with(mock_buffered_iterable.return_value, 'file', 'the format',
@@ -217,7 +351,7 @@ class TestExportToFile(TestCase):
         result = export_to_file('host', product, 'file', 'catalogue', 'collection', False)
         mock_graphql_streaming.assert_called_with('host', product['query'], unfold='true_or_false', sort='sorter',
                                                   row_formatter='row_form', cross_relations=False, batch_size=None,
-                                                  secure_user=None)
+                                                  secure_user=None, entity_filters=[])
 
     @patch("gobexport.exporter.GraphQLStreaming")
     @patch("gobexport.exporter.BufferedIterable")
@@ -270,3 +404,91 @@ class TestExportToFile(TestCase):
         mock_buffered_iterable.assert_called_with(mock_objectstore_file.return_value, 'source', buffer_items=False)
         product['exporter'].assert_called_with(mock_buffered_iterable.return_value, 'file', 'the format',
                                                append=False, filter=None)
+
+    @patch("gobexport.exporter.BufferedIterable")
+    @patch("gobexport.exporter.product_source", lambda x: 'source')
+    @patch("gobexport.exporter._init_api", MagicMock())
+    @patch("gobexport.exporter._get_part_files")
+    def test_export_to_file_max_part_size(self, mock_get_part_files, mock_buffered_iterable):
+        from gobexport.exporter import export_to_file
+
+        product = {
+            'api_type': 'graphql',
+            'exporter': MagicMock(),
+            'format': 'the format',
+            'max_part_size': 100,
+        }
+        export_to_file('host', product, 'file', 'catalogue', 'collection', False)
+        product['exporter'].assert_called_with(mock_buffered_iterable.return_value, 'file', 'the format',
+                                               append=False, filter=None, max_part_size=100)
+        mock_get_part_files.assert_called_with(product, 'file')
+        self.assertEqual(mock_get_part_files.return_value, product['part_files'])
+
+    @patch("gobexport.exporter.BufferedIterable", MagicMock())
+    @patch("gobexport.exporter.product_source", lambda x: 'source')
+    @patch("gobexport.exporter._init_api", MagicMock())
+    @patch("gobexport.exporter.encrypt_file")
+    def test_export_to_file_encrypt_parts(self, mock_encrypt_file):
+        from gobexport.exporter import export_to_file
+
+        tmpdir = mkdtemp()
+        file_path = os.path.join(tmpdir, 'any.shp')
+        for part in [2, 3]:
+            with open(os.path.join(tmpdir, f'any_part{part}.shp'), 'w'):
+                pass
+
+        product = {
+            'api_type': 'graphql',
+            'exporter': MagicMock(),
+            'filename': 'SHP/any.shp',
+            'mime_type': 'application/octet-stream',
+            'format': 'the format',
+            'max_part_size': 100,
+            'encryption_key': 'key',
+        }
+        export_to_file('host', product, file_path, 'catalogue', 'collection', False)
+        self.assertEqual([
+            call(file_path, 'key'),
+            call(os.path.join(tmpdir, 'any_part2.shp'), 'key'),
+            call(os.path.join(tmpdir, 'any_part3.shp'), 'key'),
+        ], mock_encrypt_file.call_args_list)
+
+    @patch("gobexport.exporter.BufferedIterable")
+    @patch("gobexport.exporter.product_source", lambda x: 'source')
+    @patch("gobexport.exporter._init_api", MagicMock())
+    def test_export_to_file_compression(self, mock_buffered_iterable):
+        from gobexport.exporter import export_to_file
+
+        product = {
+            'api_type': 'graphql',
+            'exporter': MagicMock(),
+            'format': 'the format',
+            'compression': 'gzip',
+        }
+        export_to_file('host', product, 'file', 'catalogue', 'collection', False)
+        product['exporter'].assert_called_with(mock_buffered_iterable.return_value, 'file', 'the format',
+                                               append=False, filter=None, compression='gzip')
+
+    def test_get_part_files(self):
+        from gobexport.exporter import _get_part_files
+
+        product = {
+            'filename': 'SHP/any.shp',
+            'mime_type': 'application/octet-stream',
+            'extra_files': [{'filename': 'SHP/any.dbf', 'mime_type': 'application/dbf'}]
+        }
+
+        tmpdir = mkdtemp()
+        file_path = os.path.join(tmpdir, 'any.shp')
+        self.assertEqual([], _get_part_files(product, file_path))
+
+        for part in [2, 3]:
+            with open(os.path.join(tmpdir, f'any_part{part}.shp'), 'w'):
+                pass
+
+        self.assertEqual([
+            {'filename': 'SHP/any_part2.shp', 'mime_type': 'application/octet-stream'},
+            {'filename': 'SHP/any_part2.dbf', 'mime_type': 'application/dbf'},
+            {'filename': 'SHP/any_part3.shp', 'mime_type': 'application/octet-stream'},
+            {'filename': 'SHP/any_part3.dbf', 'mime_type': 'application/dbf'},
+        ], _get_part_files(product, file_path))
@@ -0,0 +1,57 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from gobexport.exporter.gpkg import gpkg_exporter, ogr
+from gobexport.formatter.geometry import format_geometry
+
+
+class TestGpkgExporter(TestCase):
+
+    def test_append_raises_notimplementederror(self):
+        with self.assertRaises(NotImplementedError):
+            gpkg_exporter([], '', append=True)
+
+    @patch("gobexport.exporter.gpkg.BATCH_SIZE", 2)
+    def test_gpkg_exporter(self):
+        api = [
+            {'identificatie': '1', 'naam': 'Turbón', 'geometrie': {'type': 'Point', 'coordinates': [1.5, 2]}},
+            {'identificatie': '2', 'naam': None, 'geometrie': "POINT (3 4)"},
+            {'identificatie': '3', 'naam': 'x' * 300, 'geometrie': None},
+        ]
+        format = {
+            'id': 'identificatie',
+            'naam': 'naam',
+            'geometrie': {'action': 'format', 'formatter': format_geometry, 'value': 'geometrie'},
+        }
+
+        with TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'test.gpkg')
+
+            # An existing file is replaced
+            self.assertEqual(3, gpkg_exporter(api, filepath, format))
+            self.assertEqual(3, gpkg_exporter(api, filepath, format))
+
+            datasource = ogr.Open(filepath, 0)
+            layer = datasource.GetLayerByName('test')
+
+            features = [feature for feature in layer]
+            self.assertEqual(['1', '2', '3'], [feature.GetField('id') for feature in features])
+            self.assertEqual(['Turbón', None, 'x' * 300], [feature.GetField('naam') for feature in features])
+            self.assertEqual('POINT (1.5 2)', features[0].GetGeometryRef().ExportToWkt())
+            self.assertIsNone(features[2].GetGeometryRef())
+
+            # The spatial index has been built
+            index = datasource.ExecuteSQL("SELECT HasSpatialIndex('test', 'geom')")
+            self.assertEqual(1, index.GetNextFeature().GetField(0))
+            datasource.ReleaseResultSet(index)
+
+    def test_gpkg_exporter_empty(self):
+        with TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'empty.gpkg')
+
+            self.assertEqual(0, gpkg_exporter([], filepath, {'id': 'identificatie'}))
+
+            datasource = ogr.Open(filepath, 0)
+            self.assertEqual(0, datasource.GetLayerByName('empty').GetFeatureCount())
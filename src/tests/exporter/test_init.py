@@ -1,7 +1,11 @@
 from unittest import TestCase
 from unittest.mock import ANY, MagicMock, patch
 
+from gobcore.exceptions import GOBException
+
+from gobexport.api import API
 from gobexport.exporter import export_to_file
+from gobexport.filters.raw_filter import ContainsFilter
 
 
 class TestInit(TestCase):
@@ -56,3 +60,65 @@ class TestInit(TestCase):
         # Do append, pass value of append_to_filename to exporter
         export_to_file('host', product, 'file', 'catalogue', 'collection')
         mock_encrypt_file.assert_called_with('file', 'any key')
+
+    @patch("gobexport.exporter._init_api", MagicMock())
+    @patch("gobexport.exporter.BufferedIterable", MagicMock())
+    @patch("gobexport.exporter.encrypt_file")
+    def test_export_encrypt_while_writing(self, mock_encrypt_file):
+        exporter = MagicMock()
+        product = {
+            'exporter': exporter,
+            'format': 'the format',
+            'encryption_key': 'any key'
+        }
+
+        with patch("gobexport.exporter.STREAMING_EXPORTERS", (exporter,)):
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
+            exporter.assert_called_with(ANY, 'file', 'the format', append=False, filter=None, encryption_key='any key')
+            mock_encrypt_file.assert_not_called()
+
+            # Appended files are encrypted afterwards
+            product['append'] = True
+            product['append_to_filename'] = 'the filename'
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
+            exporter.assert_called_with(ANY, 'file', 'the format', append='the filename', filter=None,
+                                        unique_csv_id=None)
+            mock_encrypt_file.assert_called_with('file', 'any key')
+
+    @patch("gobexport.exporter.API", API)
+    @patch("gobexport.exporter.BufferedIterable")
+    def test_export_raw(self, mock_buffered_iterable):
+        api = MagicMock(spec=API)
+        raw_filter = ContainsFilter(b'any')
+        product = {
+            'exporter': MagicMock(),
+            'format': None,
+            'raw': True,
+            'entity_filters': [raw_filter],
+        }
+
+        with patch("gobexport.exporter._init_api", lambda *args, **kwargs: api), \
+                patch("gobexport.exporter.ndjson_exporter", product['exporter']):
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
+
+            mock_buffered_iterable.assert_not_called()
+            product['exporter'].assert_called_with(api.iter_raw.return_value, 'file', None, append=False,
+                                                   filter=ANY, raw=True)
+            self.assertEqual([raw_filter], product['exporter'].call_args.kwargs['filter'].filters)
+
+            # Entity filters on decoded entities cannot be applied to raw lines
+            product['entity_filters'] = [MagicMock()]
+            with self.assertRaisesRegex(GOBException, "RawFilters"):
+                export_to_file('host', product, 'file', 'catalogue', 'collection')
+
+        # Only the ndjson exporter supports raw lines
+        product['entity_filters'] = []
+        with patch("gobexport.exporter._init_api", lambda *args, **kwargs: api), \
+                self.assertRaisesRegex(GOBException, "ndjson exporter on an NDJSON source"):
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
+
+        # Only API and GraphQLStreaming provide raw lines
+        with patch("gobexport.exporter._init_api", MagicMock()), \
+                patch("gobexport.exporter.ndjson_exporter", product['exporter']), \
+                self.assertRaisesRegex(GOBException, "ndjson exporter on an NDJSON source"):
+            export_to_file('host', product, 'file', 'catalogue', 'collection')
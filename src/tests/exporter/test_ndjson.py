@@ -1,7 +1,11 @@
+import gzip
+import os
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import patch, MagicMock, mock_open
 
 from gobexport.exporter.ndjson import ndjson_exporter
+from gobexport.filters.raw_filter import ContainsFilter
 
 
 class TestNDJSONExporter(TestCase):
@@ -40,3 +44,46 @@ class TestNDJSONExporter(TestCase):
         mock_filter.filter.assert_called_with('a')
         mock_tick.tick.assert_not_called()
 
+    @patch("gobexport.exporter.compression.logger", MagicMock())
+    def test_write_compressed(self):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'out.ndjson')
+            self.assertEqual(2, ndjson_exporter([{}, {"a": 1}], file, compression='gzip'))
+
+            with gzip.open(file, 'rt') as fp:
+                self.assertEqual('{}\n{"a": 1}\n', fp.read())
+
+    def test_write_raw(self):
+        lines = [b'{"a":1}', b'{"a":2,"b":"\xc3\xa9"}', b'{"a":3}']
+
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'out.ndjson')
+            self.assertEqual(2, ndjson_exporter(iter(lines), file, raw=True, filter=ContainsFilter(b'"a":3', True)))
+
+            with open(file, 'rb') as fp:
+                self.assertEqual(b'{"a":1}\n{"a":2,"b":"\xc3\xa9"}\n', fp.read())
+
+    @patch("gobexport.exporter.compression.logger", MagicMock())
+    def test_write_raw_compressed(self):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'out.ndjson')
+            self.assertEqual(2, ndjson_exporter(iter([b'{}', b'{"a":1}']), file, raw=True, compression='gzip'))
+
+            with gzip.open(file, 'rb') as fp:
+                self.assertEqual(b'{}\n{"a":1}\n', fp.read())
+
+    def test_write_checkpoint(self):
+        checkpoint = MagicMock(resumed=True, rows=1)
+        checkpoint.due.side_effect = [True, False]
+
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'out.ndjson')
+            with open(file, 'w') as fp:
+                fp.write('{}\n')
+
+            self.assertEqual(3, ndjson_exporter([{"a": 1}, {"a": 2}], file, checkpoint=checkpoint))
+            checkpoint.save.assert_called_once()
+            self.assertEqual(2, checkpoint.save.call_args[0][1])
+
+            with open(file) as fp:
+                self.assertEqual('{}\n{"a": 1}\n{"a": 2}\n', fp.read())
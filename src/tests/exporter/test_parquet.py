@@ -0,0 +1,202 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+from gobcore.exceptions import GOBException
+from gobexport.exporter.parquet import parquet_exporter, parquet_product, _get_column_type, _get_crs, MIME_TYPE
+from gobexport.filters.unique_filter import UniqueFilter
+from gobexport.formatter.geometry import format_geometry
+
+
+class MockFilter:
+
+    def filter(self, entity):
+        return entity['id'] != 'skip'
+
+
+@patch("gobexport.exporter.parquet._get_crs", lambda: {'id': {'authority': 'EPSG', 'code': 28992}})
+class TestParquetExporter(TestCase):
+
+    format = {
+        'identificatie': 'id',
+        'naam': 'naam',
+        'nummer': 'nummer',
+        'oppervlakte': 'oppervlakte',
+        'indicatie': 'indicatie',
+        'ligtIn:GBD.WIJK.code': 'ligtInWijk.code',
+        'geometrie': {
+            'action': 'format',
+            'formatter': format_geometry,
+            'value': 'geometrie'
+        },
+    }
+
+    api = [
+        {
+            'id': '1', 'naam': 'Turbón', 'nummer': 1, 'oppervlakte': 1, 'indicatie': True,
+            'ligtInWijk': {'code': 'A01'}, 'geometrie': {'type': 'Point', 'coordinates': [1.5, 2]}
+        },
+        {
+            'id': 'skip', 'naam': None, 'nummer': None, 'oppervlakte': None, 'indicatie': None,
+            'ligtInWijk': {}, 'geometrie': None
+        },
+        {
+            'id': '2', 'naam': None, 'nummer': 2, 'oppervlakte': 2.5, 'indicatie': False,
+            'ligtInWijk': {'code': None}, 'geometrie': 'POINT (3 4)'
+        },
+        {
+            'id': '3', 'naam': 'x', 'nummer': None, 'oppervlakte': None, 'indicatie': None,
+            'ligtInWijk': {'code': 'A02'}, 'geometrie': None
+        },
+    ]
+
+    def test_append_raises_notimplementederror(self):
+        with self.assertRaises(NotImplementedError):
+            parquet_exporter([], '', self.format, append=True)
+
+    @patch("gobexport.exporter.parquet.ROW_GROUP_SIZE", 2)
+    def test_parquet_exporter(self):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'test.parquet')
+
+            self.assertEqual(3, parquet_exporter(self.api, file, self.format, filter=MockFilter()))
+
+            parquet_file = pq.ParquetFile(file)
+            self.assertEqual(2, parquet_file.num_row_groups)
+
+            table = parquet_file.read()
+
+        self.assertEqual(pa.schema([
+            ('identificatie', pa.string()),
+            ('naam', pa.string()),
+            ('nummer', pa.int64()),
+            ('oppervlakte', pa.float64()),
+            ('indicatie', pa.string()),
+            ('ligtIn:GBD.WIJK.code', pa.string()),
+            ('geometrie', pa.binary()),
+        ]), table.schema.remove_metadata())
+
+        rows = table.to_pylist()
+        self.assertEqual(['1', '2', '3'], [row['identificatie'] for row in rows])
+        self.assertEqual(['Turbón', None, 'x'], [row['naam'] for row in rows])
+        self.assertEqual([1, 2, None], [row['nummer'] for row in rows])
+        self.assertEqual([1.0, 2.5, None], [row['oppervlakte'] for row in rows])
+        # Booleans are exported as J/N, as in the csv export
+        self.assertEqual(['J', 'N', None], [row['indicatie'] for row in rows])
+        self.assertEqual(['A01', None, 'A02'], [row['ligtIn:GBD.WIJK.code'] for row in rows])
+        self.assertEqual(['POINT (1.5 2)', 'POINT (3 4)', None],
+                         [shapely.from_wkb(row['geometrie']).wkt if row['geometrie'] else None for row in rows])
+
+        self.assertEqual({
+            'version': '1.0.0',
+            'primary_column': 'geometrie',
+            'columns': {
+                'geometrie': {
+                    'encoding': 'WKB',
+                    'geometry_types': [],
+                    'crs': {'id': {'authority': 'EPSG', 'code': 28992}}
+                }
+            }
+        }, json.loads(table.schema.metadata[b'geo']))
+
+    def test_parquet_exporter_no_geometry(self):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'test.parquet')
+
+            self.assertEqual(2, parquet_exporter([{'id': 1}, {'id': 'a'}], file, {'identificatie': 'id'}))
+
+            table = pq.read_table(file)
+
+        self.assertIsNone(table.schema.metadata)
+        self.assertEqual(['1', 'a'], table.column('identificatie').to_pylist())
+
+    def test_parquet_exporter_empty(self):
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'test.parquet')
+
+            self.assertEqual(0, parquet_exporter([], file, self.format))
+
+            table = pq.read_table(file)
+
+        self.assertEqual(0, table.num_rows)
+        self.assertEqual(list(self.format.keys()), table.column_names)
+
+    @patch("gobexport.exporter.parquet.ROW_GROUP_SIZE", 1)
+    def test_parquet_exporter_column_types(self):
+        api = [{'id': 1, 'nummer': 1}, {'id': 1.5, 'nummer': None}, {'id': 'a', 'nummer': 2}]
+        format = {'identificatie': 'id', 'nummer': 'nummer'}
+
+        with TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'test.parquet')
+
+            self.assertEqual(3, parquet_exporter(api, file, format))
+
+            parquet_file = pq.ParquetFile(file)
+            self.assertEqual(3, parquet_file.num_row_groups)
+
+            table = parquet_file.read()
+            self.assertEqual(['test.parquet'], os.listdir(tmpdir))
+
+        # The column types are determined by the values of all row groups
+        self.assertEqual(pa.schema([('identificatie', pa.string()), ('nummer', pa.int64())]), table.schema)
+        self.assertEqual(['1', '1.5', 'a'], table.column('identificatie').to_pylist())
+        self.assertEqual([1, None, 2], table.column('nummer').to_pylist())
+
+    def test_parquet_exporter_type_mismatch(self):
+        api = [{'id': 2 ** 64}]
+
+        with TemporaryDirectory() as tmpdir, self.assertRaisesRegex(GOBException, 'identificatie'):
+            parquet_exporter(api, os.path.join(tmpdir, 'test.parquet'), {'identificatie': 'id'})
+
+
+def test_get_column_type():
+    assert _get_column_type({bool}) == pa.bool_()
+    assert _get_column_type({int}) == pa.int64()
+    assert _get_column_type({int, float}) == pa.float64()
+    assert _get_column_type({float}) == pa.float64()
+    assert _get_column_type({int, bool}) == pa.string()
+    assert _get_column_type({str, int}) == pa.string()
+    assert _get_column_type(set()) == pa.string()
+
+
+@patch("gobexport.exporter.parquet.osr")
+def test_get_crs(mock_osr):
+    mock_osr.SpatialReference.return_value.ExportToPROJJSON.return_value = '{"name": "Amersfoort / RD New"}'
+
+    assert _get_crs() == {'name': 'Amersfoort / RD New'}
+    mock_osr.SpatialReference.return_value.ImportFromEPSG.assert_called_with(28992)
+
+
+def test_parquet_product():
+    product = {
+        'api_type': 'graphql',
+        'exporter': MagicMock(),
+        'filename': 'CSV_Actueel/any.csv',
+        'mime_type': 'plain/text',
+        'format': {'id': 'identificatie', 'nested': {'action': 'literal', 'value': 'x'}},
+        'query': 'any query',
+    }
+
+    parquet = parquet_product(product, 'Parquet_Actueel/any.parquet')
+    assert parquet == {
+        'api_type': 'graphql',
+        'exporter': parquet_exporter,
+        'filename': 'Parquet_Actueel/any.parquet',
+        'mime_type': MIME_TYPE,
+        'format': {'id': 'identificatie', 'nested': {'action': 'literal', 'value': 'x'}},
+        'query': 'any query',
+    }
+
+    # The format and the entity filters are not shared
+    assert parquet['format']['nested'] is not product['format']['nested']
+
+    product['entity_filters'] = [UniqueFilter('identificatie')]
+    parquet = parquet_product(product, 'Parquet_Actueel/any.parquet')
+    assert type(parquet['entity_filters'][0]) is UniqueFilter
+    assert parquet['entity_filters'][0] is not product['entity_filters'][0]
@@ -0,0 +1,88 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from gobexport.exporter.csv import csv_exporter
+from gobexport.exporter.dat import dat_exporter
+from gobexport.exporter.esri import esri_exporter
+from gobexport.exporter.ndjson import ndjson_exporter
+from gobexport.exporter.projection import get_product_fields, get_source_fields
+from gobexport.filters.entity_filter import EntityFilter
+from gobexport.filters.notempty_filter import NotEmptyFilter
+from gobexport.formatter.geometry import format_geometry
+
+
+class TestProjection(TestCase):
+
+    def test_get_product_fields(self):
+        product = {
+            'exporter': csv_exporter,
+            'format': {
+                'id': 'identificatie',
+                'buurt': 'ligtInBuurt.identificatie',
+                'adres': ['heeftHoofdadres', 'identificatie'],
+                'empty': '',
+                'naam': {
+                    'condition': 'isempty',
+                    'reference': 'naam',
+                    'trueval': 'officieleNaam',
+                    'falseval': {
+                        'action': 'concat',
+                        'fields': ['straat', {'action': 'literal', 'value': ' '}, 'huisnummer'],
+                    },
+                },
+                'code': {'action': 'fill', 'length': 4, 'value': 'code', 'character': '0', 'fill_type': 'rjust'},
+                'geometrie': {'action': 'format', 'formatter': format_geometry, 'value': 'geometrie'},
+                'status': {'action': 'case', 'reference': 'status.code', 'values': {1: 'A'}},
+            },
+            'entity_filters': [NotEmptyFilter('eindGeldigheid')],
+        }
+        self.assertEqual({
+            'identificatie', 'ligtInBuurt', 'heeftHoofdadres', 'naam', 'officieleNaam', 'straat', 'huisnummer',
+            'code', 'geometrie', 'status', 'eindGeldigheid', '_embedded'
+        }, get_product_fields(product))
+
+    def test_get_product_fields_esri(self):
+        product = {
+            'exporter': esri_exporter,
+            'format': {'id': 'identificatie'},
+        }
+        self.assertEqual({'identificatie', 'geometrie', '_embedded'}, get_product_fields(product))
+
+        product['format']['geometrie'] = 'geometry'
+        self.assertEqual({'identificatie', 'geometry', '_embedded'}, get_product_fields(product))
+
+    def test_get_product_fields_dat(self):
+        product = {
+            'exporter': dat_exporter,
+            'format': 'identificatie:str|ligtInBuurt.code:str|geometrie:coo:x|heeftLaatsteMeting.[0].datum:dat|'
+                      'status.code:str:{1: "A", 3:"V"}',
+        }
+        self.assertEqual({'identificatie', 'ligtInBuurt', 'geometrie', 'heeftLaatsteMeting', 'status', '_embedded'},
+                         get_product_fields(product))
+
+    def test_get_product_fields_unknown(self):
+        format = {'id': 'identificatie'}
+        products = [
+            {'exporter': ndjson_exporter},
+            {'exporter': MagicMock(), 'format': format},
+            {'exporter': csv_exporter, 'format': format, 'row_formatter': lambda x: x},
+            {'exporter': csv_exporter, 'format': format, 'merge_result': {'endpoint': '/end/point'}},
+            {'exporter': csv_exporter, 'format': format, 'entity_filters': [EntityFilter()]},
+            {'exporter': csv_exporter, 'format': {'id': {'action': 'build_value', 'valuebuilder': lambda x: x}}},
+            {'exporter': csv_exporter, 'format': {'id': {'action': 'unknown'}}},
+            {'exporter': csv_exporter, 'format': {'id': {'other': 'any'}}},
+            {'exporter': csv_exporter, 'format': {
+                'id': {'action': 'concat', 'fields': [{'action': 'build_value', 'valuebuilder': lambda x: x}]}
+            }},
+        ]
+        for product in products:
+            self.assertIsNone(get_product_fields(product))
+
+    def test_get_source_fields(self):
+        csv_product = {'exporter': csv_exporter, 'format': {'id': 'identificatie'}}
+        esri_product = {'exporter': esri_exporter, 'format': {'naam': 'naam'}}
+
+        self.assertEqual(set(), get_source_fields([]))
+        self.assertEqual({'identificatie', 'naam', 'geometrie', '_embedded'},
+                         get_source_fields([csv_product, esri_product]))
+        self.assertIsNone(get_source_fields([csv_product, {'exporter': ndjson_exporter}]))
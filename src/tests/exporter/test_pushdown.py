@@ -0,0 +1,140 @@
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobexport.exporter import CONFIG_MAPPING, export_to_file
+from gobexport.exporter.pushdown import CountingIterable, push_down_filters
+from gobexport.filters.notempty_filter import NotEmptyFilter
+from gobexport.filters.unique_filter import UniqueFilter
+
+QUERY = """
+{
+  brk2Kadastraleobjecten(indexletter: "G") {
+    edges {
+      node {
+        identificatie
+        aangeduidDoorBrkGemeente {
+          edges {
+            node {
+              naam
+            }
+          }
+        }
+        heeftEenRelatieMetBagVerblijfsobject(active: false) {
+          edges {
+            node {
+              bronwaarde
+            }
+          }
+        }
+        bijpijlingGeometrie
+      }
+    }
+  }
+}
+"""
+
+
+class TestPushdown(TestCase):
+
+    def test_push_down_filters(self):
+        bijpijling_filter = NotEmptyFilter('bijpijlingGeometrie')
+        product = {
+            'api_type': 'graphql_streaming',
+            'pushdown_filters': True,
+            'query': QUERY,
+            'entity_filters': [
+                bijpijling_filter,
+                # Relations, attributes of relations, multiple fields and other filters are not pushed down
+                NotEmptyFilter('aangeduidDoorBrkGemeente'),
+                NotEmptyFilter('naam'),
+                NotEmptyFilter('heeftEenRelatieMetBagVerblijfsobject.[0].bronwaarde'),
+                NotEmptyFilter('identificatie', 'bijpijlingGeometrie'),
+                UniqueFilter('identificatie'),
+            ],
+        }
+
+        query, pushed_filters = push_down_filters(product)
+        self.assertEqual(QUERY.replace('(indexletter: "G")', '(indexletter: "G", bijpijlingGeometrie: "!null")'),
+                         query)
+        self.assertEqual([bijpijling_filter], pushed_filters)
+
+    def test_push_down_filters_no_arguments(self):
+        product = {
+            'api_type': 'graphql_streaming',
+            'pushdown_filters': True,
+            'query': QUERY.replace('(indexletter: "G")', ''),
+            'entity_filters': [NotEmptyFilter('bijpijlingGeometrie'), NotEmptyFilter('identificatie')],
+        }
+
+        query, pushed_filters = push_down_filters(product)
+        self.assertEqual(QUERY.replace('(indexletter: "G")',
+                                       '(bijpijlingGeometrie: "!null", identificatie: "!null")'), query)
+        self.assertEqual(product['entity_filters'], pushed_filters)
+
+    def test_push_down_filters_not_pushed(self):
+        products = [
+            # Pushdown is opt-in
+            {'api_type': 'graphql_streaming', 'query': QUERY, 'entity_filters': [NotEmptyFilter('bijpijlingGeometrie')],
+             'pushdown_filters': False},
+            {'api_type': 'graphql_streaming', 'query': QUERY},
+            {'api_type': 'graphql', 'query': QUERY, 'entity_filters': [NotEmptyFilter('bijpijlingGeometrie')]},
+            {'api_type': 'graphql_streaming', 'query': QUERY, 'entity_filters': [NotEmptyFilter('naam')]},
+            {'api_type': 'graphql_streaming', 'query': QUERY, 'entity_filters': [NotEmptyFilter('bijpijlingGeometrie')],
+             'merge_result': {'query': QUERY}},
+            {'api_type': 'graphql_streaming', 'query': '{ brk2Kadastraleobjecten { totalCount } }',
+             'entity_filters': [NotEmptyFilter('totalCount')]},
+        ]
+        for product in products:
+            self.assertEqual((product['query'], []), push_down_filters({'pushdown_filters': True, **product}))
+
+    def test_counting_iterable(self):
+        iterable = CountingIterable(iter([1, 2, 3]))
+        self.assertEqual(0, iterable.count)
+        self.assertEqual([1, 2, 3], list(iterable))
+        self.assertEqual(3, iterable.count)
+
+
+class TestPushdownProducts(TestCase):
+    """The products with pushed down filters export the same rows as with the filters applied locally."""
+
+    ITEMS = [
+        {'node': {'identificatie': '1', 'perceelnummer': 10, 'bijpijlingGeometrie': 'POINT (1 2)'}},
+        {'node': {'identificatie': '2', 'perceelnummer': 20, 'bijpijlingGeometrie': None}},
+        {'node': {'identificatie': '3', 'perceelnummer': 30, 'bijpijlingGeometrie': 'POINT (3 4)'}},
+        {'node': {'identificatie': '4', 'perceelnummer': 40, 'bijpijlingGeometrie': None}},
+    ]
+
+    def post_stream(self, url, json_data, secure_user=None):
+        # The GOB GraphQL endpoint only returns the rows with a value for a "!null" argument
+        self.queries.append(json_data['query'])
+        pushed_down = 'bijpijlingGeometrie: "!null"' in json_data['query']
+        return [json.dumps(item) for item in self.ITEMS if not pushed_down or item['node']['bijpijlingGeometrie']]
+
+    def export(self, product: dict, pushdown_filters: bool) -> list[dict]:
+        rows = []
+
+        def exporter(api, file, format, filter=None, **kwargs):
+            rows.extend(entity for entity in api if filter.filter(entity))
+            return len(rows)
+
+        product = {**product, 'exporter': exporter, 'pushdown_filters': pushdown_filters}
+        export_to_file('host', product, 'file', 'catalogue', 'collection')
+        return rows
+
+    @patch("gobexport.exporter.logger", MagicMock())
+    def test_bijpijling_shape(self):
+        for catalogue in ['brk', 'brk2']:
+            with self.subTest(catalogue=catalogue), patch("gobexport.graphql_streaming.post_stream",
+                                                          side_effect=self.post_stream):
+                self.queries = []
+                product = CONFIG_MAPPING[catalogue]['kadastraleobjecten'].products['bijpijling_shape']
+                self.assertTrue(product['pushdown_filters'])
+
+                local = self.export(product, False)
+                pushed_down = self.export(product, True)
+
+                self.assertNotIn('!null', self.queries[0])
+                self.assertIn('bijpijlingGeometrie: "!null"', self.queries[1])
+                self.assertEqual(['1', '3'], [row['identificatie'] for row in pushed_down])
+                self.assertEqual(local, pushed_down)
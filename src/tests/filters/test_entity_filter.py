@@ -11,3 +11,9 @@ class TestEntityFilter(TestCase):
             entity_filter.filter({})
 
         entity_filter.reset()
+
+    def test_get_fields(self):
+        self.assertIsNone(EntityFilter().get_fields())
+
+    def test_get_raw_fields(self):
+        self.assertIsNone(EntityFilter().get_raw_fields())
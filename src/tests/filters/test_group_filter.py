@@ -1,6 +1,9 @@
 from unittest import TestCase
 
+from gobexport.filters.entity_filter import EntityFilter
 from gobexport.filters.group_filter import GroupFilter
+from gobexport.filters.notempty_filter import NotEmptyFilter
+from gobexport.filters.unique_filter import UniqueFilter
 
 
 class TestGroupFilter(TestCase):
@@ -33,3 +36,13 @@ class TestGroupFilter(TestCase):
             group_filter.reset()
             for filter in filters:
                 self.assertEqual(filter.resetted, True)
+
+    def test_get_fields(self):
+        self.assertEqual([], GroupFilter([]).get_fields())
+        self.assertEqual(['a', 'b', 'c'], GroupFilter([NotEmptyFilter('a', 'b'), UniqueFilter('c')]).get_fields())
+        self.assertIsNone(GroupFilter([NotEmptyFilter('a'), EntityFilter()]).get_fields())
+
+    def test_get_raw_fields(self):
+        self.assertEqual([], GroupFilter([]).get_raw_fields())
+        self.assertEqual(['a', 'b', 'c'], GroupFilter([NotEmptyFilter('a', 'b'), NotEmptyFilter('c')]).get_raw_fields())
+        self.assertIsNone(GroupFilter([NotEmptyFilter('a'), UniqueFilter('c')]).get_raw_fields())
@@ -46,3 +46,9 @@ class TestNotEmptyFilter(TestCase):
 
         for entity, result in test_cases:
             self.assertEqual(result, notempty_filter.filter(entity))
+
+    def test_get_fields(self):
+        self.assertEqual(['a', 'b.c'], NotEmptyFilter('a', 'b.c').get_fields())
+
+    def test_get_raw_fields(self):
+        self.assertEqual(['a', 'b.c'], NotEmptyFilter('a', 'b.c').get_raw_fields())
@@ -0,0 +1,19 @@
+from unittest import TestCase
+
+from gobexport.filters.raw_filter import RawFilter, ContainsFilter
+
+
+class TestRawFilter(TestCase):
+
+    def test_filter(self):
+        with self.assertRaises(NotImplementedError):
+            RawFilter().filter(b'')
+
+    def test_contains_filter(self):
+        line = b'{"identificatie": "1", "publiceerbaar": true}'
+
+        self.assertTrue(ContainsFilter(b'"publiceerbaar": true').filter(line))
+        self.assertFalse(ContainsFilter(b'"publiceerbaar": false').filter(line))
+
+        self.assertFalse(ContainsFilter(b'"publiceerbaar": true', exclude=True).filter(line))
+        self.assertTrue(ContainsFilter(b'"publiceerbaar": false', exclude=True).filter(line))
@@ -1,7 +1,8 @@
+import os
 from unittest import TestCase
 from unittest.mock import patch
 
-from gobexport.filters.unique_filter import UniqueFilter
+from gobexport.filters.unique_filter import UniqueFilter, INITIAL_CAPACITY, _encode
 
 
 def mock_get_entity_value(entity: dict, field: str):
@@ -33,3 +34,70 @@ class TestUniqueFilter(TestCase):
         unique_filter.reset()
         for entity, result in test_cases:
             self.assertEqual(result, unique_filter.filter(entity))
+
+    def test_get_fields(self):
+        self.assertEqual(['a'], UniqueFilter('a').get_fields())
+
+    def _assert_unique(self, unique_filter, values):
+        seen = set()
+        for value in values:
+            self.assertEqual(value not in seen, unique_filter.filter({'field': value}), value)
+            seen.add(value)
+
+    @patch("gobexport.filters.unique_filter.get_entity_value", mock_get_entity_value)
+    def test_filter_values(self):
+        values = [None, 'a', 1, '1', 1.0, 1.5, None, 'a', 2, 'é', 'é', (1, 2), (1, 2), 1.5, '1', 2.0]
+        self._assert_unique(UniqueFilter('field'), values)
+
+        # Grow the table
+        values = [f"value {i % (INITIAL_CAPACITY * 2)}" for i in range(INITIAL_CAPACITY * 4)]
+        unique_filter = UniqueFilter('field')
+        self._assert_unique(unique_filter, values)
+        self.assertEqual(INITIAL_CAPACITY * 4, len(unique_filter.table.hashes))
+
+    @patch("gobexport.filters.unique_filter.get_entity_value", mock_get_entity_value)
+    def test_filter_spill(self):
+        values = [f"value {i % 100}" for i in range(400)]
+
+        # Spill after each new value
+        unique_filter = UniqueFilter('field', memory_budget=0)
+        self._assert_unique(unique_filter, values)
+        self.assertEqual(100, len(unique_filter.runs))
+
+        directory = unique_filter.directory
+        self.assertTrue(os.path.isdir(directory))
+
+        unique_filter.reset()
+        self.assertFalse(os.path.exists(directory))
+        self.assertEqual([], unique_filter.runs)
+        self._assert_unique(unique_filter, values)
+        unique_filter.reset()
+
+        # Spill every once in a while
+        unique_filter = UniqueFilter('field', memory_budget=INITIAL_CAPACITY * 16 + 200)
+        self._assert_unique(unique_filter, values)
+        self.assertGreater(len(unique_filter.runs), 1)
+        self.assertLess(len(unique_filter.runs), 100)
+        unique_filter.reset()
+
+    @patch("gobexport.filters.unique_filter.get_entity_value", mock_get_entity_value)
+    @patch("gobexport.filters.unique_filter._hash", lambda key: 1)
+    def test_filter_collisions(self):
+        values = ['a', 'b', 'a', 'c', 'b', None, 'c', 'd']
+
+        self._assert_unique(UniqueFilter('field'), values)
+
+        unique_filter = UniqueFilter('field', memory_budget=0)
+        self._assert_unique(unique_filter, values)
+        unique_filter.reset()
+
+    def test_encode(self):
+        # Values that are equal in a set are encoded equally
+        self.assertEqual(_encode(1), _encode(1.0))
+        self.assertEqual(_encode(1), _encode(True))
+        self.assertNotEqual(_encode(1), _encode('1'))
+        self.assertNotEqual(_encode(1.5), _encode('1.5'))
+        self.assertNotEqual(_encode(None), _encode('None'))
+
+        with self.assertRaises(TypeError):
+            _encode(['unhashable'])
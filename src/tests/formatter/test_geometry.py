@@ -2,8 +2,9 @@ from unittest import TestCase
 from unittest.mock import patch
 
 from shapely.errors import GeometryTypeError
+import shapely
 
-from gobexport.formatter.geometry import format_geometry
+from gobexport.formatter.geometry import format_geometry, format_geometries, geometries_to_wkb
 
 
 class MockShape:
@@ -43,3 +44,72 @@ class TestGeometryFormatter(TestCase):
         expected_result = 'POINT (125.6 10.1)'
 
         self.assertEqual(format_geometry(wkt), expected_result)
+
+    def test_format_geometry_rounding(self):
+        geojson = {'type': 'Point', 'coordinates': [125.6123, 10.1]}
+
+        self.assertEqual(format_geometry(geojson, rounding_precision=2), 'POINT (125.61 10.1)')
+        self.assertEqual(format_geometry(geojson, rounding_precision=2, trim=False), 'POINT (125.61 10.10)')
+
+
+class TestGeometriesFormatter(TestCase):
+
+    def test_format_geometries(self):
+        values = [
+            {'type': 'Point', 'coordinates': [125.6, 10.1]},
+            'POINT (1 2)',
+            None,
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]], [[0.1, 0.1], [0.2, 0.1], [0.2, 0.2], [0.1, 0.1]]]},
+            {'type': 'MultiPolygon', 'coordinates': [[[[0, 0], [1, 0], [1, 1], [0, 0]]], [[[5, 5], [6, 5], [6, 6], [5, 5]]]]},
+            {'type': 'LineString', 'coordinates': [[0, 0], [1.5, 1]]},
+            {'type': 'MultiLineString', 'coordinates': [[[0, 0], [1.5, 1]], [[2, 2], [3, 3]]]},
+            {'type': 'MultiPoint', 'coordinates': [[0, 0], [1.5, 1]]},
+            {'type': 'Point', 'coordinates': [121897.41412345678, 486037.556]},
+        ]
+
+        # Batches result in exactly the same wkt as value by value formatting
+        self.assertEqual([format_geometry(value) for value in values], format_geometries(values))
+
+    def test_format_geometries_fallback(self):
+        values = [
+            {'type': 'Polygon', 'coordinates': []},
+            {'type': 'Point', 'coordinates': [1, 2]},
+            {'type': 'Point', 'coordinates': [1, 2, 3]},
+            {'type': 'GeometryCollection', 'geometries': [{'type': 'Point', 'coordinates': [1, 2]}]},
+        ]
+
+        self.assertEqual([format_geometry(value) for value in values], format_geometries(values))
+
+        with self.assertRaises(GeometryTypeError):
+            format_geometries([{'type': 'Invalid', 'false': 'attribute'}])
+
+    def test_format_geometries_rounding(self):
+        values = [{'type': 'Point', 'coordinates': [125.6123, 10.1]}]
+
+        self.assertEqual(['POINT (125.61 10.1)'], format_geometries(values, rounding_precision=2))
+        self.assertEqual(['POINT (125.61 10.10)'], format_geometries(values, rounding_precision=2, trim=False))
+
+
+class TestGeometriesToWkb(TestCase):
+
+    def test_geometries_to_wkb(self):
+        values = [
+            {'type': 'Point', 'coordinates': [1, 2]},
+            None,
+            'POINT (3 4)',
+            '',
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]]]},
+            {'type': 'Point', 'coordinates': [5.5, 6]},
+            # Converted by shape, not supported by the vectorized conversion
+            {'type': 'GeometryCollection', 'geometries': [{'type': 'Point', 'coordinates': [7, 8]}]},
+        ]
+
+        result = geometries_to_wkb(values)
+
+        self.assertEqual([
+            'POINT (1 2)', None, 'POINT (3 4)', None, 'POLYGON ((0 0, 1 0, 1 1, 0 0))', 'POINT (5.5 6)',
+            'GEOMETRYCOLLECTION (POINT (7 8))'
+        ], [shapely.from_wkb(wkb).wkt if wkb is not None else None for wkb in result])
+
+    def test_geometries_to_wkb_empty(self):
+        self.assertEqual([], geometries_to_wkb([]))
@@ -3,6 +3,8 @@ import random
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
+from gobexport.filters.notempty_filter import NotEmptyFilter
+from gobexport.filters.unique_filter import UniqueFilter
 from gobexport.formatter.graphql import GraphQLResultFormatter
 
 
@@ -64,6 +66,47 @@ class TestGraphQLResultFormatter(TestCase):
 
         self.assertEqual(['flattened(formatted_row(a))'], list(formatter.format_item('a')))
 
+    def test_format_item_entity_filters(self):
+        def node(**kwargs):
+            return {'node': kwargs}
+
+        def relation(*nodes):
+            return {'edges': list(nodes)}
+
+        vot_filter = NotEmptyFilter('vot.[0].bronwaarde')
+        items = [
+            # Empty relation, pruned
+            node(id=1, vot=relation()),
+            # Relation with a value, not evaluated
+            node(id=2, vot=relation(node(bronwaarde='a'), node(bronwaarde=None))),
+            # Relation without a value, not evaluated
+            node(id=3, vot=relation(node(bronwaarde=None))),
+            # Empty relation, but a nested relation with the same name is copied into the rows
+            node(id=4, vot=relation(), rel=relation(node(vot=relation(node(bronwaarde='b'))))),
+            # Empty relation, other nested relations
+            node(id=5, vot=relation(), rel=relation(node(other=relation(node(bronwaarde='c'))), None)),
+        ]
+
+        formatter = GraphQLResultFormatter(unfold=True, entity_filters=[vot_filter, UniqueFilter('id')])
+        result = [row for item in items for row in formatter.format_item(item)]
+        self.assertEqual([2, 2, 3, 4], [row['id'] for row in result])
+        self.assertEqual(2, formatter.pruned)
+
+        # The rows that are not pruned are the same as without entity filters
+        formatter = GraphQLResultFormatter(unfold=True)
+        self.assertEqual(result, [row for item in items[1:4] for row in formatter.format_item(item)])
+
+        # Filters on attributes, missing attributes are not evaluated
+        formatter = GraphQLResultFormatter(entity_filters=[NotEmptyFilter('a', 'b')])
+        result = list(formatter.format_item([node(a='x', b=None), node(a=None, b=''), node(a=None)]))
+        self.assertEqual([{'a': 'x', 'b': None}, {'a': None}], result)
+        self.assertEqual(1, formatter.pruned)
+
+        # Items that are formatted by a row formatter or expanded to history rows are not filtered
+        for kwargs in [{'row_formatter': lambda x: x}, {'expand_history': True}]:
+            formatter = GraphQLResultFormatter(entity_filters=[vot_filter], **kwargs)
+            self.assertEqual([], formatter.entity_filters)
+
     def test_undouble(self):
         # Generate random lists of integers, plus add empty list
         testcases = [[random.randint(0, 10) for _ in range(random.randint(0, 50))] for _ in range(20)] + [[]]
@@ -0,0 +1,158 @@
+import csv
+from codecs import BOM_UTF8
+from io import BytesIO, FileIO, StringIO
+
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import gobexport.analysis as analysis
+
+
+class TestFlatfileStats(TestCase):
+
+    def test_count_chars(self):
+        stats = analysis.FlatfileStats()
+
+        # characters can be split over chunks
+        for chunk in [b'a\xc3', b'\x83B', b'\xc3', b'\x83\xe2\x85', b'\xab1 ']:
+            stats.count_chars(chunk)
+        stats.count_chars(b'', final=True)
+
+        self.assertEqual([1] * 4, [stats.ascii_counts[ord(char)] for char in 'aB1 '])
+        self.assertEqual({'Ã': 2, 'Ⅻ': 1}, stats.counter)
+        self.assertEqual((7, 1, 5, 4), (stats.calculate()['chars'], stats.digits, stats.alphas, stats.uppers))
+
+        # invalid or incomplete characters
+        for chunks in [[b'\xc3a\x83'], [b'\xc3\xc3\xc3 '], [b'\xc3', b'a']]:
+            with self.assertRaisesRegex(UnicodeDecodeError, "'utf-8' codec can't decode byte 0xc3"):
+                stats = analysis.FlatfileStats()
+                for chunk in chunks:
+                    stats.count_chars(chunk)
+
+        with self.assertRaises(UnicodeDecodeError):
+            stats = analysis.FlatfileStats()
+            stats.count_chars(b'\xc3')
+            stats.count_chars(b'', final=True)
+
+    def test_count_line_lengths(self):
+        stats = analysis.FlatfileStats()
+        stats.count_line_lengths(np.array([0, 5, 0, 3, 7]))
+        stats.count_line_lengths(np.array([], dtype=np.int64))
+        stats.count_line_lengths(np.array([2]))
+
+        # The same statistics as line by line
+        expected = analysis.FlatfileStats()
+        for length in [0, 5, 0, 3, 7, 2]:
+            expected.count_lines(length)
+
+        self.assertEqual((6, 2, 0, 7, 17), (stats.lines, stats.empty_lines, stats.min_line, stats.max_line,
+                                            stats.total_line))
+        self.assertEqual(expected.calculate(), stats.calculate())
+
+
+class TestAnalysis(TestCase):
+
+    @patch('gobexport.analysis.logger')
+    @patch('gobexport.analysis.LINE_BATCH_SIZE', 2)
+    def test_read_batches(self, mock_logger):
+        reader = csv.reader(StringIO('a;b\n"c\nd"\ne\n'), delimiter=';')
+        self.assertEqual([([['a', 'b'], ['c\nd']], [1, 3]), ([['e']], [4])], list(analysis._read_batches(reader)))
+
+    def test_scan_reader(self):
+        chunks = []
+        with analysis.ScanReader([b'0123', b'', b'456789'], chunks.append) as scan:
+            self.assertEqual(b'012', scan.read(3))
+            self.assertEqual(b'3', scan.read(3))
+            self.assertEqual(b'456789', scan.readall())
+            self.assertEqual(b'', scan.read(4))
+
+        # The chunks that have been read are passed to the callback
+        self.assertEqual([b'0123', b'456789'], chunks)
+
+    @patch('gobexport.analysis.READ_CHUNK_SIZE', 4)
+    def test_read_chunks(self):
+        with open('/tmp/read_chunks', mode='wb') as f:
+            f.write(b'0123456789')
+        open('/tmp/read_chunks_empty', mode='wb').close()
+
+        for obj in [BytesIO(b'0123456789'), FileIO('/tmp/read_chunks', mode='rb')]:
+            with obj:
+                obj.read(2)
+                self.assertEqual([b'0123', b'4567', b'89'], list(analysis.read_chunks(obj)))
+
+        for obj in [BytesIO(), FileIO('/tmp/read_chunks_empty', mode='rb')]:
+            with obj:
+                self.assertEqual([], list(analysis.read_chunks(obj)))
+
+    def test_analyse(self):
+        contents = BOM_UTF8 + b"a;b\n" + b"".join(f"{i};{'x' * i}\n".encode() for i in range(300))
+
+        # The statistics do not depend on the chunks
+        expected = analysis.analyse([contents], 'f.csv', 'text/csv')
+        for size in [3, 10_000, 12_000]:
+            chunks = [contents[offset:offset + size] for offset in range(0, len(contents), size)]
+            self.assertEqual(expected, analysis.analyse(chunks, 'f.csv', 'text/csv'))
+
+        self.assertEqual((301, 1, 302, 1, 3), (expected['lines'], expected['min_line'], expected['max_line'],
+                                               expected['minlength_col_1'], expected['maxlength_col_1']))
+
+        # Only the first bytes of other files
+        chunks = iter([contents[:10_000], contents[10_000:]])
+        self.assertEqual(['first_bytes'], list(analysis.analyse(chunks, 'f.zip', 'application/zip')))
+        self.assertEqual(contents[10_000:], next(chunks))
+
+        self.assertEqual(['first_bytes'], list(analysis.analyse([], 'f.csv', 'text/csv')))
+
+
+class TestGetCheck(TestCase):
+
+    def test_get_check(self):
+        checks = {
+            'key': 'value',
+            'any_{DATE}_key': 'any date value'
+        }
+        self.assertEqual(analysis.get_check(checks, 'key'), 'value')
+        self.assertEqual(analysis.get_check(checks, 'any_20200130_key'), 'any date value')
+        self.assertEqual(analysis.get_check(checks, 'some other key'), None)
+
+
+class TestStreamAnalysis(TestCase):
+
+    @patch('gobexport.analysis.STREAM_QUEUE_SIZE', 1)
+    def test_stream_analysis(self):
+        contents = b"a;b\n" + b"1;2\n" * 1_000
+        chunks = [contents[offset:offset + 100] for offset in range(0, len(contents), 100)]
+
+        stream = analysis.StreamAnalysis('f.csv', 'text/csv')
+        for chunk in chunks:
+            stream.write(chunk)
+        self.assertEqual(analysis.analyse(chunks, 'f.csv', 'text/csv'), stream.result())
+
+        # Writing does not wait for an analysis that has ended
+        stream = analysis.StreamAnalysis('f.zip', 'application/zip')
+        for chunk in chunks:
+            stream.write(chunk)
+        self.assertEqual(['first_bytes'], list(stream.result()))
+
+        # The uniqueness of columns is checked on request
+        stream = analysis.StreamAnalysis('f.csv', 'text/csv', {'unique_cols': [[1]]})
+        for chunk in chunks:
+            stream.write(chunk)
+        self.assertFalse(stream.result()['[1]_is_unique'])
+
+        stream = analysis.StreamAnalysis('f.csv', 'text/csv')
+        for chunk in [b'\xc3a'] + chunks:
+            stream.write(chunk)
+        with self.assertRaises(UnicodeDecodeError):
+            stream.result()
+
+    def test_stream_analysis_close(self):
+        stream = analysis.StreamAnalysis('f.csv', 'text/csv')
+        stream.write(b'a;b\n')
+        stream.close()
+        stream.close()
+
+        # The analysis finishes when it is closed
+        self.assertEqual(4, stream._result.result(timeout=5)['chars'])
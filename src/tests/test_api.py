@@ -1,8 +1,11 @@
 import requests
 import pytest
 
+from itertools import islice
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+
+from gobcore.exceptions import GOBException
 
 from gobexport.api import API
 from gobexport.requests import PUBLIC_URL
@@ -110,3 +113,48 @@ class TestStream(TestCase):
         self.assertEqual(result, [2, 4, 6])
 
         self.assertEqual(10, api.format_item(5))
+
+    @patch('gobexport.api.requests')
+    def test_iter_raw(self, mock_requests):
+        mock_requests.get_stream.return_value = [b'{"a": 1}', b'{"a": 2}']
+        api = API('host', 'path?ndjson=true', secure_user='any user')
+        self.assertEqual([b'{"a": 1}', b'{"a": 2}'], list(api.iter_raw()))
+        mock_requests.get_stream.assert_called_with('hostpath?ndjson=true', secure_user='any user')
+
+        for api in [API('host', 'path'), API('host', 'path?ndjson=true', row_formatter=lambda x: x)]:
+            with self.assertRaises(GOBException):
+                list(api.iter_raw())
+
+    @patch('gobexport.api.requests')
+    def test_ndjson_api_fields(self, mock_requests):
+        mock_requests.get_stream.return_value = [b'{"a": 1, "b": 2, "c": 3}']
+        api = API('host', 'path?ndjson=true', fields={'a', 'c'})
+        self.assertEqual([{'a': 1, 'c': 3}], list(api))
+
+
+class TestPages(TestCase):
+
+    @patch('gobexport.api.requests')
+    def test_resume(self, mock_requests):
+        pages = {
+            'page1': {'_links': {'next': {'href': 'page2'}}, 'results': [1, 2, 3]},
+            'page2': {'_links': {'next': {'href': None}}, 'results': [4, 5]},
+        }
+        mock_requests.get.side_effect = lambda url, secure_user: MagicMock(ok=True, json=lambda: pages[url[4:]])
+
+        api = API('host', 'page1')
+        self.assertTrue(api.resumable)
+        self.assertFalse(API('host', 'path?ndjson=true').resumable)
+        self.assertFalse(API('host', 'path?stream=true').resumable)
+
+        # Two entities of the first page have been returned before
+        api.resume({'path': 'page1', 'skip': 2})
+        entities = iter(api)
+
+        self.assertEqual([3], list(islice(entities, 1)))
+        self.assertEqual({'path': 'page1', 'skip': 3}, api.position)
+
+        self.assertEqual([4], list(islice(entities, 1)))
+        self.assertEqual({'path': 'page2', 'skip': 1}, api.position)
+
+        self.assertEqual([5], list(entities))
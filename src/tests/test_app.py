@@ -7,9 +7,10 @@ from gobexport.app import handle_export_msg, handle_export_test_msg, \
 @mock.patch('gobexport.app.logger')
 class TestApp(TestCase):
 
+    @mock.patch('gobexport.app.export_catalogues')
     @mock.patch('gobexport.app.test')
     @mock.patch('gobexport.app.export')
-    def test_main(self, mocked_export, mocked_test, mock_logger):
+    def test_main(self, mocked_export, mocked_test, mocked_export_catalogues, mock_logger):
 
         msg = {
             "header": {
@@ -35,6 +36,24 @@ class TestApp(TestCase):
         handle_export_msg(msg)
         mocked_export.assert_not_called()
 
+        # With collection '*' all collections of the catalogues are exported
+        msg['header'] = {'catalogue': 'brk,brk2', 'collection': '*', 'destination': 'Objectstore'}
+        handle_export_msg(msg)
+        mocked_export.assert_not_called()
+        mocked_export_catalogues.assert_called_with(catalogues=['brk', 'brk2'], destination='Objectstore')
+
+        mocked_export_catalogues.reset_mock()
+        msg['header'] = {'catalogue': 'brk', 'collection': '*', 'destination': 'Unknown destination'}
+        handle_export_msg(msg)
+        mocked_export_catalogues.assert_not_called()
+
+        # The collection is required
+        msg['header'] = {'catalogue': 'brk', 'destination': 'Objectstore'}
+        with self.assertRaises(AssertionError):
+            handle_export_msg(msg)
+        mocked_export.assert_not_called()
+        mocked_export_catalogues.assert_not_called()
+
         msg = {
             "header": {
                 "catalogue": "catalogue",
@@ -43,7 +62,12 @@ class TestApp(TestCase):
 
         handle_export_test_msg(msg)
 
-        mocked_test.assert_called_with("catalogue")
+        mocked_test.assert_called_with("catalogue", full_analysis=False)
+
+        # All files can be analysed on request
+        msg['header']['full_analysis'] = True
+        handle_export_test_msg(msg)
+        mocked_test.assert_called_with("catalogue", full_analysis=True)
 
 
     @mock.patch("gobexport.app.os._exit")
@@ -1,9 +1,10 @@
 from unittest import TestCase
 from unittest.mock import patch
 
+import contextvars
 import os
 
-from gobexport.buffered_iterable import Buffer, BufferedIterable
+from gobexport.buffered_iterable import Buffer, BufferedIterable, buffer_scope
 
 
 # test_context_manager_remove_exception() patch
@@ -30,6 +31,11 @@ class TestBuffer(TestCase):
         dirname = Buffer._get_dirname()
         self.assertEqual(dirname[-len("buffer"):], "buffer")
 
+    def test_dir_name_scope(self):
+        context = contextvars.copy_context()
+        context.run(buffer_scope.set, 'bag.panden')
+        self.assertEqual(context.run(Buffer._get_dirname), Buffer._get_dirname() + '.bag.panden')
+
     @patch('gobexport.buffered_iterable.os.makedirs')
     def test_get_filename(self, mock_makedirs):
         name = "name"
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobexport.checkpoint import Checkpoint, remove_checkpoint
+
+
+class TestCheckpoint(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.dir.name, 'export.csv')
+        self.source = MagicMock(position={'after': 'a', 'skip': 1})
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    @patch("gobexport.checkpoint.time.time")
+    def test_due(self, mock_time):
+        mock_time.return_value = 100
+        checkpoint = Checkpoint(self.file, self.source, 60)
+
+        mock_time.return_value = 159
+        self.assertFalse(checkpoint.due())
+
+        mock_time.return_value = 160
+        self.assertTrue(checkpoint.due())
+
+        with open(self.file, 'w') as fp:
+            checkpoint.save(fp, 0)
+        self.assertFalse(checkpoint.due())
+
+    def test_save_restore(self):
+        checkpoint = Checkpoint(self.file, self.source)
+        with open(self.file, 'w') as fp:
+            fp.write('header\nrow 1\n')
+            checkpoint.save(fp, 1)
+
+            # Written after the checkpoint
+            fp.write('row 2\n')
+
+        with open(f"{self.file}.checkpoint") as f:
+            self.assertEqual({'position': {'after': 'a', 'skip': 1}, 'offset': 13, 'rows': 1}, json.load(f))
+
+        source = MagicMock()
+        checkpoint = Checkpoint(self.file, source)
+        self.assertTrue(checkpoint.restore())
+
+        self.assertTrue(checkpoint.resumed)
+        self.assertEqual(1, checkpoint.rows)
+        source.resume.assert_called_with({'after': 'a', 'skip': 1})
+        with open(self.file) as f:
+            self.assertEqual('header\nrow 1\n', f.read())
+
+        checkpoint.clear()
+        self.assertFalse(os.path.exists(f"{self.file}.checkpoint"))
+
+    def test_restore_without_checkpoint(self):
+        checkpoint = Checkpoint(self.file, self.source)
+        self.assertFalse(checkpoint.restore())
+        self.assertFalse(checkpoint.resumed)
+        self.assertEqual(0, checkpoint.rows)
+
+        # The file is shorter than at the checkpoint
+        with open(self.file, 'w') as fp:
+            fp.write('header\nrow 1\n')
+            checkpoint.save(fp, 1)
+        with open(self.file, 'w') as fp:
+            fp.write('header\n')
+
+        self.assertFalse(checkpoint.restore())
+        self.source.resume.assert_not_called()
+
+        # The file has been removed
+        os.remove(self.file)
+        self.assertFalse(checkpoint.restore())
+
+    def test_remove_checkpoint(self):
+        for filename in [f"{self.file}.checkpoint", f"{self.file}.checkpoint.tmp"]:
+            with open(filename, 'w') as f:
+                f.write('{}')
+
+        remove_checkpoint(self.file)
+        self.assertEqual([], os.listdir(self.dir.name))
+
+        # No checkpoint
+        remove_checkpoint(self.file)
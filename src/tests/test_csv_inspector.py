@@ -1,7 +1,56 @@
 from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import call, patch
-from gobexport.csv_inspector import CSVInspector
+from gobexport.csv_inspector import CSVInspector, DuplicateFinder, get_lengths
+
+
+class TestGetLengths(TestCase):
+
+    def test_get_lengths(self):
+        line_lengths, column_lengths = get_lengths([['a', 'bc'], [], ['', 'abc', 'd'], ['abcd', '']])
+
+        self.assertEqual([3, 0, 4, 4], line_lengths.tolist())
+        self.assertEqual({2: [[1, 2], [4, 0]], 3: [[0, 3, 1]]},
+                         {width: lengths.tolist() for width, lengths in column_lengths.items()})
+
+        line_lengths, column_lengths = get_lengths([])
+        self.assertEqual(([], {}), (line_lengths.tolist(), column_lengths))
+
+
+class TestDuplicateFinder(TestCase):
+
+    def _add(self, finder, values):
+        for line_no, value in enumerate(values, start=2):
+            finder.add(value, line_no)
+
+    def test_get_duplicates(self):
+        values = ['b', 'a', 'c', 'a', 'é', '', 'b', 'é', '', 'a'] + [str(i) for i in range(100)] + ['b']
+
+        expected = {
+            '': [10, 7],
+            'a': [11, 3, 5],  # in the order of sort: 11 before 3
+            'b': [112, 2, 8],
+            'é': [6, 9],
+        }
+
+        finder = DuplicateFinder('tmp', 1_000_000)
+        self._add(finder, values)
+        self.assertEqual(expected, finder.get_duplicates())
+        self.assertEqual(['', 'a', 'b', 'é'], list(finder.get_duplicates()))
+
+        # Offload to disk
+        with TemporaryDirectory() as tmp_dir, patch.object(DuplicateFinder, 'BATCH_SIZE', 4):
+            finder = DuplicateFinder(tmp_dir, 100)
+            self._add(finder, values)
+            self.assertEqual(expected, finder.get_duplicates())
+
+    @patch("gobexport.csv_inspector.hash", lambda value: 0, create=True)
+    def test_get_duplicates_hash_collision(self):
+        # All values have the same hash
+
+        finder = DuplicateFinder('tmp', 1_000_000)
+        self._add(finder, ['a', 'b', 'c', 'b'])
+        self.assertEqual({'b': [3, 5]}, finder.get_duplicates())
 
 
 class TestCSVInspector(TestCase):
@@ -62,9 +111,10 @@ class TestCSVInspector(TestCase):
         }, 'tmp')
 
         i._collect_values_for_uniquess_check(['a', 'b', 'c'], 1)
+        i._collect_values_for_uniquess_check(['a', 'b', 'd'], 2)
 
-        self.assertEqual(i._write_cache["[1]"].getvalue(), '1 a\n')
-        self.assertEqual(i._write_cache["[2,3]"].getvalue(), '1 b.c\n')
+        self.assertEqual({'a': [1, 2]}, i._finders["[1]"].get_duplicates())
+        self.assertEqual({}, i._finders["[2,3]"].get_duplicates())
 
     def test_check_lengths(self):
         i = CSVInspector('any filename', [], {}, 'tmp')
@@ -122,6 +172,28 @@ class TestCSVInspector(TestCase):
             'maxlength_col_4': 1
         }, i.cols)
 
+    @patch("gobexport.csv_inspector.logger")
+    def test_check_lines(self, _):
+        lines = [['1', 'ab', 'c'], ['2', 'a'], ['1', 'abc', 'cd', 'd']]
+
+        i = CSVInspector('any filename', ['a', 'b', 'c'], {'unique_cols': [['a']]}, 'tmp')
+        i.check_lines(lines[:2], [2, 3], get_lengths(lines[:2])[1])
+        i.check_lines(lines[2:], [5], get_lengths(lines[2:])[1])
+
+        self.assertEqual({
+            "['a']_is_unique": False,
+            'minlength_col_1': 1,
+            'maxlength_col_1': 1,
+            'minlength_col_2': 1,
+            'maxlength_col_2': 3,
+            'minlength_col_3': 1,
+            'maxlength_col_3': 2,
+            'minlength_col_4': 1,
+            'maxlength_col_4': 1
+        }, i.check_uniqueness())
+        self.assertEqual(list(i.cols), ["['a']_is_unique"] + [f"{m}length_col_{n}" for n in range(1, 5)
+                                                                for m in ('min', 'max')])
+
     @patch("gobexport.csv_inspector.logger")
     def test_check_lines_unique_max_warnings(self, mock_logger):
         lines = [
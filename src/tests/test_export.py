@@ -1,5 +1,7 @@
+import json
 import pytest
 import tempfile
+import threading
 import os
 
 from unittest import mock, TestCase
@@ -7,14 +9,26 @@ from unittest.mock import call, mock_open, patch
 
 from gobcore.exceptions import GOBException
 
+from gobexport.analysis import analyse
+from gobexport.config import CONTAINER_BASE, EXPORT_DIR
+from gobexport.distributor.objectstore import ObjectstoreTarget
+from gobexport.objectstore_client import ObjectListing
+from gobexport.exporter.compression import open_file
 from gobexport.exporter.csv import csv_exporter
+from gobexport.exporter.ndjson import ndjson_exporter
 from gobexport.export import (
     cleanup_datefiles,
     get_cleanup_pattern,
     export,
     _export_collection,
-    _append_to_file
+    _export_product,
+    _export_products,
+    _append_to_file,
+    _AnalysedTarget,
+    _Uploader,
 )
+from gobexport.product_logs import ProductLogs, logger
+
 
 def fail(msg):
     raise Exception(msg)
@@ -44,6 +58,81 @@ class TestExport(TestCase):
         os.remove(file1)
         os.remove(file2)
 
+    def test_append_to_file_compressed(self):
+        tmpdir = tempfile.mkdtemp()
+        file1 = os.path.join(tmpdir, 'file1.gz')
+        file2 = os.path.join(tmpdir, 'file2.gz')
+
+        with open_file(file1, 'w', 'gzip') as f1, open_file(file2, 'w', 'gzip') as f2:
+            f1.write('A')
+            f2.write('B')
+
+        _append_to_file(file1, file2, 'gzip')
+
+        with open_file(file2, 'r', 'gzip') as f:
+            self.assertEqual('BA', f.read())
+
+    @patch('gobexport.export.logger', mock.MagicMock())
+    @patch('gobexport.export._export_product')
+    def test_export_products(self, mock_export_product):
+        mock_export_product.side_effect = lambda *args: [args[5]]
+        products = {
+            'a': {'endpoint': 'a', 'filename': 'a.csv'},
+            'b': {'endpoint': 'b', 'filename': 'b.csv'},
+            'c': {'endpoint': 'a', 'filename': 'c.csv'},
+        }
+        config = mock.MagicMock(products=products)
+
+        for workers in [1, 2, 4]:
+            with patch('gobexport.export.EXPORT_PRODUCT_WORKERS', workers), \
+                    patch('gobexport.export.export_groups') as mock_export_groups:
+                mock_export_groups.side_effect = lambda groups, export, max_workers: {
+                    name: export(name) for group in reversed(groups) for name in group}
+
+                # The files are in the order of the products
+                files = _export_products('host', 'catalogue', 'collection', config, 'File', products)
+                self.assertEqual(['a', 'b', 'c'], files)
+                mock_export_product.assert_called_with('host', 'catalogue', 'collection', config, 'File', 'c',
+                                                       products['c'])
+
+                if workers == 1:
+                    mock_export_groups.assert_not_called()
+                else:
+                    mock_export_groups.assert_called_with([['a', 'c'], ['b']], mock.ANY, 2)
+
+        # The files of each product are passed on as soon as the product has been exported
+        uploader = mock.MagicMock()
+        uploader.get_target.side_effect = lambda name: f'target {name}'
+        _export_products('host', 'catalogue', 'collection', config, 'Objectstore', products, uploader)
+        uploader.exported.assert_has_calls([call('a', ['a']), call('b', ['b']), call('c', ['c'])])
+        mock_export_product.assert_called_with('host', 'catalogue', 'collection', config, 'Objectstore', 'c',
+                                               products['c'], 'target c')
+
+    @patch('gobexport.export.logger', mock.MagicMock())
+    @patch('gobexport.export.time.sleep', lambda n: None)
+    @patch('gobexport.export.remove_checkpoint')
+    @patch('gobexport.export.export_to_file')
+    def test_export_product_target(self, mock_export_to_file, mock_remove_checkpoint):
+        product = {'filename': 'a.csv', 'mime_type': 'text/csv', 'compression': 'gzip', 'endpoint': 'a'}
+        config = mock.MagicMock(products={'a': product})
+        target = mock.MagicMock(spec=ObjectstoreTarget)
+        mock_export_to_file.return_value = 1
+
+        files = _export_product('host', 'cat', 'coll', config, 'Objectstore', 'a', product, target)
+        self.assertEqual([{'temp_location': None, 'distribution': 'a.csv.gz', 'mime_type': 'application/gzip'}],
+                         files)
+        mock_export_to_file.assert_called_with('host', product, target, 'cat', 'coll', buffer_items=False,
+                                               fields=mock.ANY)
+        target.commit.assert_called_once()
+        target.discard.assert_not_called()
+        mock_remove_checkpoint.assert_not_called()
+
+        # The segments of a failed export are discarded
+        mock_export_to_file.side_effect = lambda *args, **kwargs: fail("Export failed")
+        self.assertEqual([], _export_product('host', 'cat', 'coll', config, 'Objectstore', 'a', product, target))
+        target.discard.assert_called_once()
+        self.assertEqual(1, target.commit.call_count)
+
     @patch('gobexport.export.logger', mock.MagicMock())
     @patch('gobexport.export.time.sleep', lambda n: None)
     @patch('gobexport.export.export_to_file')
@@ -56,11 +145,12 @@ class TestExport(TestCase):
     @patch('gobexport.export.logger', mock.MagicMock())
     @patch('gobexport.export.time.sleep', lambda n: None)
     @patch('gobexport.export.export_to_file')
-    @patch('gobexport.export.distribute_to_objectstore')
+    @patch('gobexport.export.distribute_files')
     @patch("builtins.open", mock_open())
+    @patch('gobexport.export.EXPORT_STREAM_TO_OBJECTSTORE', False)
     def test_export_objectstore_exception(self, mock_distribute, mock_export_to_file):
         mock_export_to_file.side_effect = lambda *args, **kwargs: True
-        mock_distribute.side_effect = GOBException
+        mock_distribute.side_effect = lambda connection, container, files: [GOBException()] * len(files)
         result = _export_collection("host", "meetbouten", "meetbouten", None, "Objectstore")
         self.assertEqual(result, False)
 
@@ -68,37 +158,40 @@ class TestExport(TestCase):
     @patch('gobexport.export.time.sleep', lambda n: None)
     @mock.patch('builtins.open', mock_open())
     @mock.patch('gobexport.export.os.remove', lambda f: None)
-    @patch('gobexport.export.distribute_to_objectstore')
+    @patch('gobexport.export.distribute_files')
     @patch('gobexport.export.export_to_file')
+    @patch('gobexport.export.EXPORT_STREAM_TO_OBJECTSTORE', False)
     def test_export_objectstore_all_products(self, mock_export_to_file, mock_distribute):
         mock_export_to_file.side_effect = lambda *args, **kwargs: True
-        # All products (7 files) should be exported
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
+        # All products (8 files) should be exported
         result = _export_collection("host", "gebieden", "stadsdelen", None, "Objectstore")
         self.assertEqual(result, None)
         mock_distribute.assert_called()
-        self.assertEqual(mock_distribute.call_count, 7)
+        self.assertEqual(sum(len(c.args[2]) for c in mock_distribute.call_args_list), 8)
 
     @patch('gobexport.export.logger', mock.MagicMock())
     @patch('gobexport.export.time.sleep', lambda n: None)
     @mock.patch('builtins.open', mock_open())
     @mock.patch('gobexport.export.os.remove', lambda f: None)
-    @patch('gobexport.export.distribute_to_objectstore')
+    @patch('gobexport.export.distribute_files')
     @patch('gobexport.export.export_to_file')
     @patch('gobexport.export.cleanup_datefiles')
     def test_export_objectstore_one_product(self, mock_clean, mock_export_to_file, mock_distribute):
         mock_export_to_file.side_effect = lambda *args, **kwargs: True
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
         # Only csv_actueel should be exported
         result = _export_collection("host", "gebieden", "stadsdelen", "csv_actueel", "Objectstore")
         self.assertEqual(result, None)
-        mock_distribute.assert_called()
-        self.assertEqual(mock_distribute.call_count, 1)
+        mock_distribute.assert_called_once()
+        self.assertEqual(len(mock_distribute.call_args.args[2]), 1)
         mock_clean.assert_called()
 
     @patch('gobexport.export.logger', mock.MagicMock())
     @patch('gobexport.export.time.sleep', lambda n: None)
     @mock.patch('builtins.open', mock_open())
     @mock.patch('gobexport.export.os.remove', lambda f: None)
-    @patch('gobexport.export.distribute_to_objectstore')
+    @patch('gobexport.export.distribute_files')
     @patch('gobexport.export.export_to_file')
     @patch('gobexport.export.cleanup_datefiles')
     def test_export_objectstore_one_product(self, mock_clean, mock_export_to_file, mock_distribute):
@@ -113,7 +206,7 @@ class TestExport(TestCase):
     @patch('gobexport.export.time.sleep', lambda n: None)
     @mock.patch('builtins.open', mock_open())
     @mock.patch('gobexport.export.os.remove', lambda f: None)
-    @patch('gobexport.export.distribute_to_objectstore')
+    @patch('gobexport.export.distribute_files')
     @patch('gobexport.export._get_filename', lambda x: '/tmpfile/' + x)
     @patch('gobexport.export.export_to_file')
     @patch('gobexport.export.cleanup_datefiles')
@@ -146,16 +239,17 @@ class TestExport(TestCase):
             }
         }
         mock_export_to_file.side_effect = lambda *args, **kwargs: True
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
 
         with patch("gobexport.export.CONFIG_MAPPING", config):
             result = _export_collection("host", "cat", "coll", None, "File")
 
         mock_export_to_file.assert_has_calls([
-            call('host', products['prod1'], 'the/filename.csv', 'cat', 'coll', buffer_items=True),
-            call('host', products['prod2'], '/tmpfile/the/filename.csv.to_append', 'cat', 'coll', buffer_items=True)
+            call('host', products['prod1'], 'the/filename.csv', 'cat', 'coll', buffer_items=True, fields=None),
+            call('host', products['prod2'], '/tmpfile/the/filename.csv.to_append', 'cat', 'coll', buffer_items=True, fields=None)
         ])
 
-        mock_append.assert_called_with('/tmpfile/the/filename.csv.to_append', 'the/filename.csv')
+        mock_append.assert_called_with('/tmpfile/the/filename.csv.to_append', 'the/filename.csv', None)
 
         # Objectstore, uses two tmp files
         mock_export_to_file.reset_mock()
@@ -163,20 +257,49 @@ class TestExport(TestCase):
             result = _export_collection("host", "cat", "coll", None, "Objectstore")
 
         mock_export_to_file.assert_has_calls([
-            call('host', products['prod1'], '/tmpfile/the/filename.csv', 'cat', 'coll', buffer_items=True),
-            call('host', products['prod2'], '/tmpfile/the/filename.csv.to_append', 'cat', 'coll', buffer_items=True)
+            call('host', products['prod1'], '/tmpfile/the/filename.csv', 'cat', 'coll', buffer_items=True, fields=None),
+            call('host', products['prod2'], '/tmpfile/the/filename.csv.to_append', 'cat', 'coll', buffer_items=True, fields=None)
         ])
 
-        mock_append.assert_called_with('/tmpfile/the/filename.csv.to_append', '/tmpfile/the/filename.csv')
+        mock_append.assert_called_with('/tmpfile/the/filename.csv.to_append', '/tmpfile/the/filename.csv', None)
+
+    @patch('gobexport.export.logger', mock.MagicMock())
+    @mock.patch('builtins.open', mock_open())
+    @mock.patch('gobexport.export.os.remove', lambda f: None)
+    @patch('gobexport.export.distribute_files')
+    @patch('gobexport.export.export_to_file', mock.MagicMock(return_value=1))
+    @patch('gobexport.export.cleanup_datefiles', mock.MagicMock())
+    @patch('gobexport.export._get_filename', lambda x: '/tmpfile/' + x)
+    @patch('gobexport.export.EXPORT_STREAM_TO_OBJECTSTORE', False)
+    def test_export_collection_compression(self, mock_distribute):
+        products = {
+            'prod': {
+                'api_type': 'graphql_streaming',
+                'exporter': csv_exporter,
+                'query': 'q1',
+                'filename': 'the/filename.csv',
+                'mime_type': 'mime/type',
+                'compression': 'gzip'
+            }
+        }
+        config = {'cat': {'coll': type('Config', (), {'products': products})}}
+
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
+
+        with patch("gobexport.export.CONFIG_MAPPING", config):
+            _export_collection("host", "cat", "coll", None, "Objectstore")
+
+        file = mock_distribute.call_args.args[2][0]
+        self.assertEqual(('the/filename.csv.gz', 'application/gzip'), (file['distribution'], file['mime_type']))
 
     @patch('gobexport.export.logger', mock.MagicMock())
     @patch('gobexport.export.time.sleep', lambda n: None)
     @patch('gobexport.export.export_to_file', mock.MagicMock())
-    @patch('gobexport.export.get_datastore_config')
-    def test_export_file(self, mock_get_datastore_config):
+    @patch('gobexport.export.get_client')
+    def test_export_file(self, mock_get_client):
         result = _export_collection("host", "meetbouten", "meetbouten", None, "File")
         self.assertEqual(result, None)
-        mock_get_datastore_config.assert_not_called()
+        mock_get_client.assert_not_called()
 
     @patch('gobexport.export.logger', mock.MagicMock())
     @patch('gobexport.export.time.sleep', lambda n: None)
@@ -194,34 +317,299 @@ class TestExport(TestCase):
         )
 
     @patch('gobexport.export.logger', mock.MagicMock())
-    @patch('gobexport.export.get_full_container_list')
-    @patch('gobexport.export.delete_object')
-    def test_cleanup_datefiles(self, mock_delete, mock_list):
-        connection = 'any connection'
+    @patch('gobexport.export.delete_segments')
+    def test_cleanup_datefiles(self, mock_delete_segments):
+        client = mock.MagicMock()
         container = 'any container'
 
-        mock_list.return_value = []
-        cleanup_datefiles(connection, container, 'any filename')
-        mock_list.assert_not_called()
-        mock_delete.assert_not_called()
-
-        mock_list.return_value = ['f1', 'f2']
-        cleanup_datefiles(connection, container, 'any filename')
-        mock_list.assert_not_called()
-        mock_delete.assert_not_called()
-
-        mock_list.return_value = [{'name': '..f20201231..'}]
-        cleanup_datefiles(connection, container, '..f20201231..')
-        mock_list.assert_called_with(connection, container)
-        mock_delete.assert_not_called()
-
-        mock_list.return_value = [{'name': name}
-            for name in ['..f20201229..', '..f20201230..', '..f20201231..']]
-        cleanup_datefiles(connection, container, '..f20201231..')
-        mock_list.assert_called_with(connection, container)
-        calls = [call(connection, container, {'name': name})
+        def set_listing(names):
+            client.listing.side_effect = lambda container, prefix: ObjectListing(
+                container, prefix, [{'name': name} for name in names])
+
+        set_listing([])
+        cleanup_datefiles(client, container, 'any filename')
+        client.listing.assert_not_called()
+        client.delete_object.assert_not_called()
+
+        set_listing(['..f20201231..'])
+        cleanup_datefiles(client, container, '..f20201231..')
+        client.listing.assert_called_with(container, '')
+        client.delete_object.assert_not_called()
+
+        set_listing(['..f20201229..', '..f20201230..', '..f20201231..', 'other20201230..'])
+        cleanup_datefiles(client, container, '..f20201231..')
+        calls = [call(container, {'name': name})
             for name in ['..f20201229..', '..f20201230..']]
-        mock_delete.assert_has_calls(calls)
+        client.delete_object.assert_has_calls(calls)
+        self.assertEqual(2, client.delete_object.call_count)
+
+        # The segments of previous files are deleted with the files
+        mock_delete_segments.assert_has_calls([call(client.connection, container, name)
+                                               for name in ['..f20201229..', '..f20201230..']])
+
+        # The statistics manifest of the file is kept, the manifests of previous files are deleted
+        client.delete_object.reset_mock()
+        set_listing(['..f20201230...statistics.json', '..f20201231..', '..f20201231...statistics.json'])
+        cleanup_datefiles(client, container, '..f20201231..')
+        client.delete_object.assert_called_once_with(container, {'name': '..f20201230...statistics.json'})
+
+        # Only the directory of the file is listed
+        set_listing(['dir/sub/f20201230.csv', 'dir/sub/f20201231.csv'])
+        cleanup_datefiles(client, container, 'dir/sub/f20201231.csv')
+        client.listing.assert_called_with(container, 'dir/sub/')
+        client.delete_object.assert_called_with(container, {'name': 'dir/sub/f20201230.csv'})
+
+
+@patch("gobexport.distributor.objectstore._get_thread_connection", lambda connection: connection)
+@patch("gobexport.distributor.objectstore._delete_segments")
+@patch("gobexport.distributor.objectstore._put_manifest")
+@patch("gobexport.distributor.objectstore._put_segment")
+class TestAnalysedTarget(TestCase):
+
+    def test_analysed_target(self, mock_put_segment, mock_put_manifest, mock_delete_segments):
+        mock_put_segment.side_effect = lambda connection, container, name, fp, size: {'path': name}
+        connection = mock.MagicMock()
+        connection.head_object.return_value = {}
+        target = _AnalysedTarget(connection, 'container', 'a.csv', 'text/csv')
+
+        # The data is analysed while it is written
+        with target.open() as writer:
+            writer.write(b'a;b\n')
+        first_analysis = target.analysis
+        with target.open() as writer:
+            writer.write(b'a;b\n1;2\n')
+        target.commit()
+
+        self.assertEqual(analyse([b'a;b\n1;2\n'], 'a.csv', 'text/csv'), target.analysis.result())
+
+        # The analysis of a write that is discarded is ended
+        self.assertEqual(4, first_analysis.result()['chars'])
+        target.open()
+        analysis = target.analysis
+        target.discard()
+        self.assertIsNone(target.analysis)
+        self.assertEqual(['first_bytes'], list(analysis.result()))
+
+
+@patch('gobexport.export.logger')
+@patch('gobexport.export.os.remove')
+@patch('gobexport.export.cleanup_datefiles')
+@patch('gobexport.export.distribute_files')
+class TestUploader(TestCase):
+
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.connection = self.client.connection
+        self.products = {
+            'csv': {'filename': 'a.csv'},
+            'csv_append': {'filename': 'a.csv', 'append': True},
+            'shp': {'filename': 'b.shp'},
+        }
+
+        # The statistics manifests are tested in test_uploader_statistics
+        statistics = patch('gobexport.export.EXPORT_STATISTICS_MANIFEST', False)
+        statistics.start()
+        self.addCleanup(statistics.stop)
+
+    def file(self, name):
+        return {'temp_location': f'/tmp/{name}', 'distribution': name, 'mime_type': 'any'}
+
+    def test_uploader(self, mock_distribute, mock_cleanup, mock_remove, mock_logger):
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
+
+        with _Uploader(self.client, 'cat', self.products) as uploader:
+            uploader.exported('csv', [self.file('a.csv')])
+            uploader.exported('shp', [self.file('b.shp'), self.file('b.prj')])
+            # The csv file is uploaded when the product that appends to it has been exported
+            uploader.exported('csv_append', [])
+
+        container = f'{CONTAINER_BASE}/{EXPORT_DIR}/cat/'
+        self.assertEqual([
+            call(self.connection, container, [self.file('b.shp'), self.file('b.prj')]),
+            call(self.connection, container, [self.file('a.csv')]),
+        ], mock_distribute.call_args_list)
+        mock_cleanup.assert_called_with(self.client, CONTAINER_BASE, f'{EXPORT_DIR}/cat/a.csv')
+        self.assertEqual(3, mock_cleanup.call_count)
+        mock_remove.assert_called_with('/tmp/a.csv')
+        self.assertEqual([], uploader.errors)
+
+    def test_uploader_errors(self, mock_distribute, mock_cleanup, mock_remove, mock_logger):
+        mock_distribute.side_effect = [[None, GOBException('error')], ValueError('connection error')]
+
+        with _Uploader(self.client, 'cat', self.products) as uploader:
+            uploader.exported('shp', [self.file('b.shp'), self.file('b.prj')])
+            uploader.exported('csv', [self.file('a.csv')])
+            uploader.exported('csv_append', [])
+
+        # The uploads continue after an error
+        self.assertEqual(2, mock_distribute.call_count)
+        self.assertEqual(['b.prj', 'a.csv'], uploader.errors)
+
+        # The files that failed are not removed, no previous versions of the files of the product are cleaned up
+        mock_cleanup.assert_not_called()
+        mock_remove.assert_called_once_with('/tmp/b.shp')
+        mock_logger.warning.assert_called_with(
+            "Previous versions of b.shp are kept, not all files of the product have been copied")
+
+    def test_uploader_queue(self, mock_distribute, mock_cleanup, mock_remove, mock_logger):
+        uploading = threading.Event()
+        proceed = threading.Event()
+
+        def distribute(connection, container, files):
+            uploading.set()
+            proceed.wait()
+            return [None] * len(files)
+
+        mock_distribute.side_effect = distribute
+        products = {name: {'filename': name} for name in 'abcd'}
+
+        with patch('gobexport.export.EXPORT_UPLOAD_QUEUE_SIZE', 1), \
+                _Uploader(self.client, 'cat', products) as uploader:
+            uploader.exported('a', [self.file('a')])
+            uploading.wait()
+
+            # One product waits in the queue, the next one waits for room in the queue
+            uploader.exported('b', [self.file('b')])
+            exported = threading.Thread(target=uploader.exported, args=('c', [self.file('c')]))
+            exported.start()
+            exported.join(0.05)
+            self.assertTrue(exported.is_alive())
+
+            proceed.set()
+            exported.join()
+
+        self.assertEqual(3, mock_distribute.call_count)
+
+    @patch('gobexport.export.EXPORT_STREAM_TO_OBJECTSTORE', True)
+    def test_uploader_streamed(self, mock_distribute, mock_cleanup, mock_remove, mock_logger):
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
+        products = {
+            'csv': {'filename': 'a.csv', 'exporter': csv_exporter, 'mime_type': 'text/csv'},
+            'csv_append': {'filename': 'a.csv', 'exporter': csv_exporter, 'append': True},
+            'ndjson': {'filename': 'b.ndjson', 'exporter': ndjson_exporter, 'mime_type': 'application/x-ndjson',
+                       'compression': 'zstd'},
+            'shp': {'filename': 'c.shp'},
+        }
+
+        with _Uploader(self.client, 'cat', products) as uploader:
+            # Files that are appended to and files of other exporters are written to a local file first
+            self.assertIsNone(uploader.get_target('csv'))
+            self.assertIsNone(uploader.get_target('csv_append'))
+            self.assertIsNone(uploader.get_target('shp'))
+
+            target = uploader.get_target('ndjson')
+            self.assertEqual((self.connection, f'{CONTAINER_BASE}/{EXPORT_DIR}/cat/', 'b.ndjson.zst', 'application/zstd'),
+                             (target.connection, target.container, target.object_name, target.content_type))
+
+            uploader.exported('ndjson', [{'temp_location': None, 'distribution': 'b.ndjson.zst', 'mime_type': 'any'}])
+
+        # The file is not uploaded again, but its previous versions are cleaned up
+        mock_distribute.assert_called_once_with(self.connection, f'{CONTAINER_BASE}/{EXPORT_DIR}/cat/', [])
+        mock_cleanup.assert_called_once_with(self.client, CONTAINER_BASE, f'{EXPORT_DIR}/cat/b.ndjson.zst')
+        self.client.invalidate.assert_called_once_with(f'{CONTAINER_BASE}/{EXPORT_DIR}/cat/', 'b.ndjson.zst')
+        mock_remove.assert_not_called()
+
+        with patch('gobexport.export.EXPORT_STREAM_TO_OBJECTSTORE', False):
+            self.assertIsNone(_Uploader(self.client, 'cat', products).get_target('ndjson'))
+
+    @patch('gobexport.export.EXPORT_STATISTICS_MANIFEST', True)
+    @patch('gobexport.export.EXPORT_STREAM_TO_OBJECTSTORE', True)
+    @patch("gobexport.distributor.objectstore._get_thread_connection", lambda connection: connection)
+    @patch("gobexport.distributor.objectstore._put_manifest")
+    @patch("gobexport.distributor.objectstore._put_segment")
+    def test_uploader_statistics(self, mock_put_segment, mock_put_manifest, mock_distribute, mock_cleanup,
+                                 mock_remove, mock_logger):
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
+        mock_put_segment.side_effect = lambda connection, container, name, fp, size: {'path': name}
+        self.connection.head_object.return_value = {'etag': '"abc"'}
+        self.connection.get_object.return_value = ({}, json.dumps({'a.csv': {'unique_cols': [[1]], 'lines': [2]}}))
+        products = {
+            'csv': {'filename': 'a.csv'},
+            'ndjson': {'filename': 'b.ndjson', 'exporter': ndjson_exporter, 'mime_type': 'application/x-ndjson'},
+        }
+        with open('/tmp/uploader_a.csv', mode='wb') as f:
+            f.write(b'a;b\n1;2\n')
+
+        container = f'{CONTAINER_BASE}/{EXPORT_DIR}/cat/'
+        with _Uploader(self.client, 'cat', products) as uploader:
+            target = uploader.get_target('ndjson')
+            with target.open() as writer:
+                writer.write(b'{"a": 1}\n')
+            target.commit()
+
+            uploader.exported('csv', [{'temp_location': '/tmp/uploader_a.csv', 'distribution': 'a.csv',
+                                       'mime_type': 'text/csv'}])
+            uploader.exported('ndjson', [{'temp_location': None, 'distribution': 'b.ndjson',
+                                          'mime_type': 'application/x-ndjson'}])
+
+        # The statistics are written with the ETag of the uploaded file, after its previous versions are deleted
+        # The uniqueness of the columns of the check of a file is stored with the columns
+        self.connection.get_object.assert_called_once_with(CONTAINER_BASE, 'checks.cat.json')
+        self.connection.head_object.assert_has_calls([call(container, 'a.csv'), call(container, 'b.ndjson')])
+        manifests = {args[1]: json.loads(args[2]) for args, _ in self.client.put_object.call_args_list}
+        self.assertEqual({
+            'a.csv.statistics.json': {
+                'etag': 'abc',
+                'content_type': 'text/csv',
+                'unique_cols': [[1]],
+                'statistics': analyse([b'a;b\n1;2\n'], 'a.csv', 'text/csv', {'unique_cols': [[1]]}),
+            },
+            'b.ndjson.statistics.json': {
+                'etag': 'abc',
+                'content_type': 'application/x-ndjson',
+                'unique_cols': None,
+                'statistics': analyse([b'{"a": 1}\n'], 'b.ndjson', 'application/x-ndjson'),
+            },
+        }, manifests)
+        self.assertTrue(manifests['a.csv.statistics.json']['statistics']['[1]_is_unique'])
+        self.assertEqual({}, uploader.targets)
+        mock_remove.assert_called_with('/tmp/uploader_a.csv')
+
+        # A manifest that can not be written is skipped
+        self.client.put_object.reset_mock()
+        self.connection.head_object.side_effect = GOBException('error')
+        with _Uploader(self.client, 'cat', products) as uploader:
+            uploader.exported('csv', [{'temp_location': '/tmp/uploader_a.csv', 'distribution': 'a.csv',
+                                       'mime_type': 'text/csv'}])
+        self.client.put_object.assert_not_called()
+        mock_logger.warning.assert_called_with("Statistics manifest of a.csv not written: error")
+        self.assertEqual([], uploader.errors)
+
+    @patch('gobexport.export.EXPORT_STATISTICS_MANIFEST', True)
+    def test_uploader_checks(self, mock_distribute, mock_cleanup, mock_remove, mock_logger):
+        self.connection.get_object.return_value = ({}, b'{"a_{DATE}.csv": {"unique_cols": [["id"]]}}')
+        uploader = _Uploader(self.client, 'cat', self.products)
+        self.assertEqual({'unique_cols': [['id']]}, uploader._get_uniqueness_check('a_20240101.csv'))
+        self.assertIsNone(uploader._get_uniqueness_check('b.shp'))
+
+        # Without checks the uniqueness of columns is not determined
+        self.connection.get_object.side_effect = GOBException('error')
+        uploader = _Uploader(self.client, 'cat', self.products)
+        self.assertEqual({}, uploader.checks)
+        mock_logger.warning.assert_called_with(
+            "Checks of cat not loaded, the uniqueness of columns is not determined: error")
+
+        # The checks are only loaded for the statistics manifests
+        self.connection.get_object.reset_mock()
+        with patch('gobexport.export.EXPORT_STATISTICS_MANIFEST', False):
+            self.assertEqual({}, _Uploader(self.client, 'cat', self.products).checks)
+        self.connection.get_object.assert_not_called()
+
+    def test_uploader_log_capture(self, mock_distribute, mock_cleanup, mock_remove, mock_logger):
+        mock_distribute.side_effect = lambda connection, container, files: [None] * len(files)
+
+        # The messages of the uploads are collected with the messages of the export
+        logs = ProductLogs()
+        with patch('gobexport.export.logger', logger), patch('gobexport.product_logs.gob_logger', mock_logger):
+            def export():
+                with _Uploader(self.client, 'cat', self.products) as uploader:
+                    uploader.exported('shp', [self.file('b.shp')])
+
+            logs.run('collection', export)
+            mock_logger.info.assert_not_called()
+
+            logs.flush('collection')
+            mock_logger.info.assert_any_call("Write file 'b.shp'.")
 
 
 @pytest.mark.parametrize(
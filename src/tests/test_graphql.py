@@ -1,3 +1,6 @@
+import re
+
+from itertools import islice
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
@@ -138,7 +141,8 @@ class TestGraphQl(TestCase):
         for _ in api:
             pass
 
-        mock_formatter.assert_called_with(False, sort=sort, unfold=False, row_formatter=None, cross_relations=False)
+        mock_formatter.assert_called_with(False, sort=sort, unfold=False, row_formatter=None, cross_relations=False,
+                                          entity_filters=None)
         self.assertEqual(mock_formatter.return_value.format_item.call_count, 2)
 
     def test_update_query(self):
@@ -158,3 +162,32 @@ class TestGraphQl(TestCase):
         expected_query = '{bagWoonplaatsen(id: "test", first: 100, after: "") {edges {node { id}}pageInfo { endCursor, hasNextPage }}}'
 
         self.assertEqual(new_query, expected_query)
+
+    @patch("gobexport.graphql.requests.post")
+    @patch("gobexport.graphql.time.time")
+    def test_resume(self, mock_time, mock_req_post):
+        mock_time.side_effect = range(100, 0, -1)
+        pages = {
+            'a': {'pageInfo': {'endCursor': 'b', 'hasNextPage': True}, 'edges': [{'node': {'id': 1}}, {'node': {'id': 2}}]},
+            'b': {'pageInfo': {'endCursor': 'c', 'hasNextPage': False}, 'edges': [{'node': {'id': 3}}]},
+        }
+
+        def post(url, json, secure_user):
+            cursor = re.search('after: "(.*?)"', json['query'])[1]
+            return MagicMock(ok=True, json=lambda: {'data': {'bagWoonplaatsen': pages[cursor]}})
+
+        mock_req_post.side_effect = post
+
+        api = GraphQL('host', '{bagWoonplaatsen {edges {node { id}}}}', 'bag', 'woonplaatsen')
+        self.assertTrue(api.resumable)
+        self.assertEqual({'end_cursor': '', 'skip': 0}, api.position)
+
+        # The first row of the page after cursor 'a' has been returned before
+        api.resume({'end_cursor': 'a', 'skip': 1})
+        rows = iter(api)
+
+        self.assertEqual([{'id': 2}], list(islice(rows, 1)))
+        self.assertEqual({'end_cursor': 'a', 'skip': 2}, api.position)
+
+        self.assertEqual([{'id': 3}], list(rows))
+        self.assertEqual({'end_cursor': 'b', 'skip': 1}, api.position)
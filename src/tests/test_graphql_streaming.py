@@ -3,6 +3,8 @@ import random
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
 
+from gobcore.exceptions import GOBException
+
 from gobexport.graphql_streaming import GraphQLStreaming
 from gobexport.graphql_streaming import STREAMING_GRAPHQL_PUBLIC_ENDPOINT, STREAMING_GRAPHQL_SECURE_ENDPOINT
 from typing import Generator
@@ -27,6 +29,11 @@ class TestGraphQLStreaming(TestCase):
 
         graphql_streaming._query_paginated.assert_called_once()
 
+    def test_entity_filters(self, mock_formatter):
+        GraphQLStreaming('host', 'query', unfold=True, entity_filters=['filter'])
+        mock_formatter.assert_called_with(sort=None, unfold=True, row_formatter=None, cross_relations=False,
+                                          entity_filters=['filter'])
+
     def test_secure(self, mock_formatter):
         api = GraphQLStreaming('host', 'query')
         self.assertEqual(api.url, f'host{STREAMING_GRAPHQL_PUBLIC_ENDPOINT}')
@@ -44,6 +51,19 @@ class TestGraphQLStreaming(TestCase):
         self.assertEqual(['a', 'b', 'c', 'd'], list(result))
         mock_post.assert_called_with(f'host{STREAMING_GRAPHQL_PUBLIC_ENDPOINT}', {'query': 'the query'}, secure_user=None)
 
+    def test_iter_raw(self, mock_formatter):
+        graphql_streaming = GraphQLStreaming('host', 'query')
+        graphql_streaming._execute_query = MagicMock(return_value=iter([b'a', b'b']))
+
+        self.assertEqual([b'a', b'b'], list(graphql_streaming.iter_raw()))
+        graphql_streaming._execute_query.assert_called_with('query')
+
+        for kwargs in [{'unfold': True}, {'sort': {'a': 'b'}}, {'row_formatter': lambda x: x}, {'cross_relations': True},
+                       {'batch_size': 100}]:
+            graphql_streaming = GraphQLStreaming('host', 'query', **kwargs)
+            with self.assertRaises(GOBException):
+                list(graphql_streaming.iter_raw())
+
     @patch("gobexport.graphql_streaming.json_loads", lambda x: x)
     def test_query_all(self, mock_formatter):
         query = f'query{random.randint(0, 1000)}'
@@ -77,31 +97,67 @@ class TestGraphQLStreaming(TestCase):
     def test_query_paginated(self, mock_formatter):
         res = {
             None: [
-                {'cursor': 'a', 'other': 'field'},
-                {'cursor': 'b', 'other': 'field'},
-                {'cursor': 'c', 'other': 'field'},
-                {'cursor': 'd', 'other': 'field'},
-                {'cursor': 'e', 'other': 'field'}
+                {'node': {'cursor': 'a', 'other': 'field'}},
+                {'node': {'cursor': 'b', 'other': 'field'}},
+                {'node': {'cursor': 'c', 'other': 'field'}},
+                {'node': {'cursor': 'd', 'other': 'field'}},
+                {'node': {'cursor': 'e', 'other': 'field'}}
             ],
             'e': [
-                {'cursor': 'f', 'other': 'field'},
-                {'cursor': 'g', 'other': 'field'},
-                {'cursor': 'h', 'other': 'field'},
-                {'cursor': 'i', 'other': 'field'},
-                {'cursor': 'j', 'other': 'field'}
+                {'node': {'cursor': 'f', 'other': 'field'}},
+                {'node': {'cursor': 'g', 'other': 'field'}},
+                {'node': {'cursor': 'h', 'other': 'field'}},
+                {'node': {'cursor': 'i', 'other': 'field'}},
+                {'node': {'cursor': 'j', 'other': 'field'}}
             ],
             'j': []
         }
 
-        expected_result = res[None] + res['e']
+        expected_result = [item['node'] for item in res[None] + res['e']]
 
-        graphql_streaming = GraphQLStreaming('host', 'query')
+        graphql_streaming = GraphQLStreaming('host', 'query', batch_size=5)
         graphql_streaming._query_page = lambda x: res[x]
         graphql_streaming.formatter = MagicMock()
-        graphql_streaming.formatter.format_item = lambda x: [x]
+        graphql_streaming.formatter.format_item = lambda x: [x['node']]
 
         self.assertEqual(expected_result, list(graphql_streaming._query_paginated()))
 
+        # The cursor of an item is used when the formatter leaves out all rows of the item
+        graphql_streaming = GraphQLStreaming('host', 'query', batch_size=5)
+        graphql_streaming._query_page = lambda x: res[x]
+        graphql_streaming.formatter = MagicMock()
+        graphql_streaming.formatter.format_item = lambda x: [x['node']] if x['node']['cursor'] == 'b' else []
+
+        self.assertEqual([{'cursor': 'b', 'other': 'field'}], list(graphql_streaming._query_paginated()))
+
+    @patch("gobexport.graphql_streaming.json_loads", lambda x: x)
+    def test_resume(self, mock_formatter):
+        res = {
+            'a': [{'node': {'cursor': 'b', 'rows': [1, 2, 3]}}, {'node': {'cursor': 'c', 'rows': [4]}}],
+            'c': [{'node': {'cursor': 'd', 'rows': [5, 6]}}],
+            'd': [],
+        }
+
+        graphql_streaming = GraphQLStreaming('host', 'query', batch_size=2)
+        self.assertTrue(graphql_streaming.resumable)
+        self.assertFalse(GraphQLStreaming('host', 'query').resumable)
+
+        graphql_streaming._query_page = lambda x: res[x]
+        graphql_streaming.formatter = MagicMock()
+        graphql_streaming.formatter.format_item = lambda x: x['node']['rows']
+
+        # Two rows of the item after cursor 'a' have been returned before
+        graphql_streaming.resume({'after': 'a', 'skip': 2})
+        rows = iter(graphql_streaming)
+
+        self.assertEqual(3, next(rows))
+        self.assertEqual({'after': 'a', 'skip': 3}, graphql_streaming.position)
+
+        self.assertEqual(4, next(rows))
+        self.assertEqual({'after': 'b', 'skip': 1}, graphql_streaming.position)
+
+        self.assertEqual([5, 6], list(rows))
+        self.assertEqual({'after': 'd', 'skip': 0}, graphql_streaming.position)
 
     def test_add_pagination_to_query(self, mock_formatter):
         batch_size = 802
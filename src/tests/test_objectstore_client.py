@@ -0,0 +1,164 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, call, patch
+
+import swiftclient
+
+from gobcore.exceptions import GOBException
+
+from gobexport.objectstore_client import ObjectListing, ObjectstoreClient, get_client, normalize_name
+
+
+def items(*names):
+    return [{'name': name, 'last_modified': f'2024-01-0{index}'} for index, name in enumerate(names, start=1)]
+
+
+class TestObjectListing(TestCase):
+
+    def test_normalize_name(self):
+        self.assertEqual('dir/file_{DATE}.csv', normalize_name('dir/file_20240101.csv'))
+        self.assertEqual('dir/file_{DATE}.csv', normalize_name('dir/file_{DATE}.csv'))
+        self.assertEqual('file.csv', normalize_name('file.csv'))
+
+    def test_find(self):
+        listing = ObjectListing('container', 'dir/', items(
+            'dir/b_20240102.csv', 'dir/a.csv', 'dir/b_20240101.csv', 'dir/b_20240101.csv.segments/00000000'))
+
+        self.assertEqual(4, len(listing))
+        self.assertEqual(['dir/a.csv', 'dir/b_20240101.csv', 'dir/b_20240102.csv'],
+                         sorted(item['name'] for item in listing.find('dir/a.csv') + listing.find('dir/b_{DATE}.csv')))
+        self.assertEqual([], listing.find('dir/b.csv'))
+
+        self.assertEqual(3, len(listing.startswith('dir/b_20240105.csv')))
+
+    def test_latest(self):
+        listing = ObjectListing('container', '', [
+            {'name': 'f_20201101', 'last_modified': '100'},
+            {'name': 'f_20201104', 'last_modified': '300'},
+            {'name': 'f_20201103', 'last_modified': '300'},
+            {'name': 'f_20201102', 'last_modified': '200'},
+        ])
+
+        # The first of the most recent files
+        self.assertEqual('f_20201103', listing.latest('f_{DATE}')['name'])
+        self.assertIsNone(listing.latest('g_{DATE}'))
+
+    def test_remove(self):
+        listing = ObjectListing('container', '', items('f_20240101', 'f_20240102'))
+        listing.remove('f_20240101')
+        listing.remove('f_20240103')
+        self.assertEqual(['f_20240102'], [item['name'] for item in listing])
+
+
+@patch("gobexport.objectstore_client._get_thread_connection", lambda connection: connection)
+class TestObjectstoreClient(TestCase):
+
+    def setUp(self):
+        self.datastore = MagicMock()
+        self.connection = self.datastore.connection
+        self.connection.get_container.side_effect = lambda container, prefix, full_listing: (
+            {}, items(*[name for name in self.names if name.startswith(prefix or '')]))
+        self.names = ['cat/a_20240101.csv', 'cat/b.csv', 'checks.cat.json']
+        self.client = ObjectstoreClient(self.datastore)
+
+    def test_listing(self):
+        listing = self.client.listing('container', 'cat/')
+        self.assertEqual(['cat/a_20240101.csv', 'cat/b.csv'], [item['name'] for item in listing])
+        self.connection.get_container.assert_called_once_with('container', prefix='cat/', full_listing=True)
+
+        # The listing is cached
+        self.assertIs(listing, self.client.listing('container', 'cat/'))
+        self.assertEqual(1, self.connection.get_container.call_count)
+
+        self.assertIsNot(listing, self.client.listing('container', 'cat/', refresh=True))
+        self.assertEqual(2, self.connection.get_container.call_count)
+
+        # Empty listings are cached too
+        self.assertEqual(0, len(self.client.listing('container', 'none/')))
+        self.assertEqual(0, len(self.client.listing('container', 'none/')))
+        self.assertEqual(3, self.connection.get_container.call_count)
+
+    def test_listing_prefix(self):
+        self.client.listing('container')
+        self.connection.get_container.assert_called_once_with('container', prefix=None, full_listing=True)
+
+        # The listing of a longer prefix is taken from the cached listing
+        listing = self.client.listing('container', 'cat/a')
+        self.assertEqual(['cat/a_20240101.csv'], [item['name'] for item in listing])
+        self.assertEqual(1, self.connection.get_container.call_count)
+
+        self.client.listing('other container', 'cat/a')
+        self.assertEqual(2, self.connection.get_container.call_count)
+
+    @patch("gobexport.objectstore_client.OBJECTSTORE_LISTING_TTL", 10)
+    @patch("gobexport.objectstore_client.time.time")
+    def test_listing_expires(self, mock_time):
+        mock_time.return_value = 100
+        self.client.listing('container', 'cat/')
+
+        mock_time.return_value = 109
+        self.client.listing('container', 'cat/')
+        self.assertEqual(1, self.connection.get_container.call_count)
+
+        mock_time.return_value = 110
+        self.client.listing('container', 'cat/')
+        self.assertEqual(2, self.connection.get_container.call_count)
+
+    def test_listing_error(self):
+        self.connection.get_container.side_effect = swiftclient.exceptions.ClientException('Error')
+        with self.assertRaises(GOBException):
+            self.client.listing('container')
+
+    @patch("gobexport.objectstore_client.put_object")
+    def test_writes(self, mock_put_object):
+        self.client.listing('container', 'cat/')
+        self.client.listing('container', 'checks.')
+
+        # Writes invalidate the listings that contain the object
+        self.client.put_object('container', 'checks.cat.json', 'contents', 'application/json')
+        mock_put_object.assert_called_with(self.connection, 'container', 'checks.cat.json', contents='contents',
+                                           content_type='application/json')
+        self.client.listing('container', 'cat/')
+        self.client.listing('container', 'checks.')
+        self.assertEqual(3, self.connection.get_container.call_count)
+
+        # Containers can include a path
+        self.client.invalidate('container/cat/', 'b.csv')
+        self.client.listing('container', 'cat/')
+        self.assertEqual(4, self.connection.get_container.call_count)
+
+        self.client.copy_object('container', 'cat/b.csv', 'container/checks.b.csv')
+        self.connection.copy_object.assert_called_with('container', 'cat/b.csv', 'container/checks.b.csv')
+        self.client.listing('container', 'cat/')
+        self.client.listing('container', 'checks.')
+        self.assertEqual(5, self.connection.get_container.call_count)
+
+    @patch("gobexport.objectstore_client.delete_object")
+    def test_delete_object(self, mock_delete_object):
+        listing = self.client.listing('container', 'cat/')
+        item = listing.find('cat/b.csv')[0]
+
+        # Deleted objects are removed from the cached listings
+        self.client.delete_object('container', item)
+        mock_delete_object.assert_called_with(self.connection, 'container', item)
+        self.assertEqual(['cat/a_20240101.csv'], [item['name'] for item in self.client.listing('container', 'cat/')])
+        self.assertEqual(1, self.connection.get_container.call_count)
+
+
+class TestGetClient(TestCase):
+
+    @patch("gobexport.objectstore_client._clients", {})
+    @patch("gobexport.objectstore_client.ObjectDatastore", MagicMock)
+    @patch("gobexport.objectstore_client.get_datastore_config")
+    @patch("gobexport.objectstore_client.DatastoreFactory")
+    def test_get_client(self, mock_factory, mock_get_config):
+        client = get_client('Objectstore')
+        self.assertIs(client, get_client('Objectstore'))
+        self.assertIs(mock_factory.get_datastore.return_value, client.datastore)
+
+        # The objectstore is connected once
+        mock_get_config.assert_called_once_with('Objectstore')
+        mock_factory.get_datastore.assert_called_once_with(mock_get_config.return_value)
+        client.datastore.connect.assert_called_once()
+
+        self.assertIsNot(client, get_client('Other'))
+        mock_get_config.assert_has_calls([call('Objectstore'), call('Other')])
@@ -0,0 +1,89 @@
+import contextvars
+import threading
+import time
+
+from unittest import TestCase
+from unittest.mock import MagicMock, call, patch
+
+from gobexport.parallel import export_groups, get_product_groups
+from gobexport.product_logs import logger
+
+
+class TestGetProductGroups(TestCase):
+
+    def test_get_product_groups(self):
+        products = {
+            'csv': {'endpoint': 'a', 'filename': 'a.csv'},
+            'esri': {'query': 'q', 'filename': 'q.shp'},
+            'geojson': {'endpoint': 'a', 'filename': 'a.json'},
+            'other': {'endpoint': 'b', 'filename': 'b.csv'},
+            'append_q': {'query': 'q2', 'filename': 'a.csv', 'append': True},
+            'objectstore': {'api_type': 'objectstore', 'filename': 'c.csv'},
+        }
+        self.assertEqual([['csv', 'geojson', 'append_q'], ['esri'], ['other'], ['objectstore']],
+                         get_product_groups(products))
+
+        # A product that relates two groups joins them
+        products = {
+            'a': {'endpoint': 'a', 'filename': 'a.csv'},
+            'b': {'endpoint': 'b', 'filename': 'b.csv'},
+            'c': {'endpoint': 'b', 'filename': 'a.csv', 'append': True},
+        }
+        self.assertEqual([['a', 'b', 'c']], get_product_groups(products))
+
+        # Products with the same filename are only related when one of them appends
+        products = {
+            'a': {'endpoint': 'a', 'filename': 'a.csv'},
+            'b': {'endpoint': 'b', 'filename': 'a.csv'},
+        }
+        self.assertEqual([['a'], ['b']], get_product_groups(products))
+
+
+@patch("gobexport.product_logs.gob_logger")
+class TestExportGroups(TestCase):
+
+    def test_export_groups(self, mock_logger):
+        running = set()
+        concurrent = []
+        lock = threading.Lock()
+
+        def export(name):
+            logger.info(f'start {name}')
+            with lock:
+                running.add(name)
+                concurrent.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(name)
+            logger.info(f'end {name}')
+            return name.upper()
+
+        groups = [['a', 'b'], ['c'], ['d'], ['e']]
+        result = export_groups(groups, export, 2)
+
+        self.assertEqual({'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D', 'e': 'E'}, result)
+        self.assertEqual(2, max(concurrent))
+
+        # The messages of a product are logged together
+        messages = [c.args[0] for c in mock_logger.info.call_args_list]
+        self.assertEqual(10, len(messages))
+        for name in 'abcde':
+            index = messages.index(f'start {name}')
+            self.assertEqual(f'end {name}', messages[index + 1])
+        self.assertLess(messages.index('start a'), messages.index('start b'))
+
+    def test_export_groups_context(self, mock_logger):
+        scope = contextvars.ContextVar('scope', default=None)
+        scope.set('collection')
+
+        self.assertEqual({'a': 'collection'}, export_groups([['a']], lambda name: scope.get(), 2))
+
+    def test_export_groups_exception(self, mock_logger):
+        export = MagicMock(side_effect=lambda name: int(name))
+
+        with self.assertRaises(ValueError):
+            export_groups([['x', 'y'], ['1']], export, 2)
+
+        # The other groups are exported, the group stops at the exception
+        export.assert_has_calls([call('x'), call('1')], any_order=True)
+        self.assertEqual(2, export.call_count)
@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from unittest import TestCase
+from unittest.mock import call, patch
+
+from gobexport.product_logs import ProductLogs, get_log_capture, logger, run_with_log_capture
+
+
+@patch("gobexport.product_logs.gob_logger")
+class TestProductLogs(TestCase):
+
+    def test_product_logs(self, mock_logger):
+        logs = ProductLogs()
+        logger.info('collection')
+        mock_logger.info.assert_called_with('collection')
+
+        self.assertEqual('result', logs.run('product', lambda: logger.info('a') or logger.error('b') or 'result'))
+        self.assertEqual(1, mock_logger.info.call_count)
+
+        logs.flush('product')
+        mock_logger.info.assert_called_with('a')
+        mock_logger.error.assert_called_with('b')
+
+        # Messages are flushed only once
+        logs.flush('product')
+        self.assertEqual(2, mock_logger.info.call_count)
+
+    def test_product_logs_exception(self, mock_logger):
+        logs = ProductLogs()
+        with self.assertRaises(ValueError):
+            logs.run('product', lambda: logger.warning('w') or int('x'))
+        logger.info('collection')
+        logs.flush('product')
+
+        self.assertEqual([call.info('collection'), call.warning('w')], mock_logger.method_calls)
+
+    def test_product_logs_nested(self, mock_logger):
+        outer, inner = ProductLogs(), ProductLogs()
+        outer.run('collection', lambda: inner.run('product', lambda: logger.info('product')) or
+                  logger.info('collection') or inner.flush('product'))
+        mock_logger.info.assert_not_called()
+
+        # The messages of the inner product are part of the messages of the outer product
+        outer.flush('collection')
+        self.assertEqual([call('collection'), call('product')], mock_logger.info.call_args_list)
+
+    def test_product_logs_other_threads(self, mock_logger):
+        logs = ProductLogs()
+        started, logged = threading.Event(), threading.Event()
+
+        def other():
+            started.wait()
+            logger.info('other')
+            logged.set()
+
+        thread = threading.Thread(target=other)
+        thread.start()
+
+        # The messages of threads that do not run a product are not collected
+        logs.run('product', lambda: started.set() or logged.wait(5))
+        thread.join()
+        mock_logger.info.assert_called_once_with('other')
+        self.assertEqual([], logs.messages['product'])
+
+    def test_log_capture(self, mock_logger):
+        self.assertEqual((None, None), get_log_capture())
+        run_with_log_capture(get_log_capture(), lambda: logger.info('a'))
+        mock_logger.info.assert_called_with('a')
+
+        logs = ProductLogs()
+        capture = logs.run('product', get_log_capture)
+        self.assertEqual((logs, 'product'), capture)
+        self.assertEqual((None, None), get_log_capture())
+
+        # The messages of another thread are collected for the product
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(run_with_log_capture, capture, lambda: logger.info('b')).result()
+        self.assertEqual(1, mock_logger.info.call_count)
+
+        logs.flush('product')
+        mock_logger.info.assert_called_with('b')
+
+    def test_logger_attributes(self, mock_logger):
+        self.assertEqual(mock_logger.get_summary.return_value, logger.get_summary())
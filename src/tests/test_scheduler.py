@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobexport.buffered_iterable import buffer_scope
+from gobexport.product_logs import logger
+from gobexport.scheduler import export_catalogues, get_dependencies, get_priorities
+
+
+class MockConfig:
+
+    def __init__(self, **products):
+        self.products = products
+
+
+CONFIG_MAPPING = {
+    'cat': {
+        'a': MockConfig(csv={'endpoint': 'a', 'filename': 'a.csv'}),
+        'b': MockConfig(csv={'endpoint': 'b', 'filename': 'b.csv'},
+                        shp={'query': 'b', 'filename': 'b.shp', 'extra_files': [{'filename': 'shared.prj'}]}),
+        'c': MockConfig(csv={'endpoint': 'c', 'filename': 'a.csv', 'append': True}),
+    },
+    'cat2': {
+        'd': MockConfig(csv={'endpoint': 'b', 'filename': 'd.csv'}),
+        'e': MockConfig(shp={'query': 'e', 'filename': 'e.shp', 'extra_files': [{'filename': 'shared.prj'}]}),
+        'f': MockConfig(csv={'endpoint': 'f', 'filename': 'f.csv'}),
+    },
+}
+
+JOBS = [('cat', 'a'), ('cat', 'b'), ('cat', 'c'), ('cat2', 'd'), ('cat2', 'e'), ('cat2', 'f')]
+
+
+@patch("gobexport.scheduler.CONFIG_MAPPING", CONFIG_MAPPING)
+class TestScheduler(TestCase):
+
+    def test_get_dependencies(self):
+        self.assertEqual({
+            ('cat', 'a'): set(),
+            ('cat', 'b'): set(),
+            # Appends to a.csv
+            ('cat', 'c'): {('cat', 'a')},
+            # Only the same source
+            ('cat2', 'd'): set(),
+            # Same extra file
+            ('cat2', 'e'): {('cat', 'b')},
+            ('cat2', 'f'): set(),
+        }, get_dependencies(JOBS))
+
+    def test_get_priorities(self):
+        dependencies = get_dependencies(JOBS)
+
+        priorities = get_priorities(JOBS, dependencies, {'cat:a': 10, 'cat:b': 1, 'cat:c': 5, 'cat2:d': 20})
+        self.assertEqual({
+            ('cat', 'a'): 15,
+            ('cat', 'b'): 10,
+            ('cat', 'c'): 5,
+            ('cat2', 'd'): 20,
+            # The average of the recorded durations
+            ('cat2', 'e'): 9,
+            ('cat2', 'f'): 9,
+        }, priorities)
+
+        self.assertEqual({job: 0 for job in JOBS}, get_priorities(JOBS, dependencies, {}))
+
+    @patch("gobexport.scheduler.logger", MagicMock())
+    @patch("gobexport.scheduler.EXPORT_COLLECTION_WORKERS", 2)
+    @patch("gobexport.scheduler.get_client")
+    def test_export_catalogues(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.connection.get_object.return_value = {}, json.dumps({'cat:a': 1, 'cat:b': 2, 'cat2:f': 100}).encode()
+        started = []
+        scopes = []
+        concurrent = []
+        running = set()
+        lock = threading.Lock()
+
+        def export(catalogue, collection, product, destination):
+            with lock:
+                started.append(collection)
+                running.add(collection)
+                scopes.append(buffer_scope.get())
+                concurrent.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(collection)
+            if collection == 'f':
+                raise Exception('failed')
+
+        with patch("gobexport.scheduler.export", side_effect=export) as mock_export:
+            export_catalogues(['cat', 'cat2'], 'Objectstore')
+
+            mock_export.assert_any_call('cat', 'a', None, 'Objectstore')
+            self.assertEqual(6, mock_export.call_count)
+            self.assertEqual(2, max(concurrent))
+
+            # The buffers of each collection are kept separate
+            self.assertEqual([f'cat2.{c}' if c in 'def' else f'cat.{c}' for c in started], scopes)
+
+            # Longest expected first, and jobs start when their dependencies are done
+            self.assertEqual(['f', 'b'], started[:2])
+            self.assertLess(started.index('a'), started.index('c'))
+            self.assertLess(started.index('b'), started.index('e'))
+
+            # The durations are stored in the objectstore, the duration of a failed export is not recorded
+            client.connection.get_object.assert_called_with('development', '_state/export_durations.json')
+            container, name, contents, content_type = client.put_object.call_args.args
+            self.assertEqual(('development', '_state/export_durations.json', 'application/json'),
+                             (container, name, content_type))
+            durations = json.loads(contents)
+            self.assertEqual({'cat:a', 'cat:b', 'cat:c', 'cat2:d', 'cat2:e', 'cat2:f'}, set(durations))
+            self.assertEqual(100, durations['cat2:f'])
+
+        # Without recorded durations
+        client.connection.get_object.side_effect = Exception('not found')
+        with patch("gobexport.scheduler.export"):
+            export_catalogues(['cat'], 'File')
+            self.assertEqual({'cat:a', 'cat:b', 'cat:c'}, set(json.loads(client.put_object.call_args.args[2])))
+
+    @patch("gobexport.scheduler.logger", MagicMock())
+    @patch("gobexport.scheduler.EXPORT_COLLECTION_WORKERS", 2)
+    @patch("gobexport.scheduler.get_client", MagicMock())
+    def test_export_catalogues_independent(self):
+        # Collections that share a source but no files are exported at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        config_mapping = {'cat': {'b': CONFIG_MAPPING['cat']['b'], 'd': CONFIG_MAPPING['cat2']['d']}}
+
+        with patch("gobexport.scheduler.CONFIG_MAPPING", config_mapping), \
+                patch("gobexport.scheduler.export", side_effect=lambda *args: barrier.wait()) as mock_export:
+            export_catalogues(['cat'], 'File')
+
+        self.assertEqual(2, mock_export.call_count)
+        self.assertFalse(barrier.broken)
+
+    @patch("gobexport.scheduler.get_client")
+    def test_export_catalogues_one_worker(self, mock_get_client):
+        mock_get_client.return_value.put_object.side_effect = Exception('unavailable')
+
+        # Messages are logged as they occur when one collection is exported at a time
+        with patch("gobexport.product_logs.gob_logger") as mock_logger, \
+                patch("gobexport.scheduler.export", side_effect=lambda *args: logger.info('exporting') or
+                      mock_logger.info.assert_called_with('exporting')) as mock_export:
+            export_catalogues(['cat'], 'File')
+
+        self.assertEqual(3, mock_export.call_count)
+        mock_logger.warning.assert_called_with("Durations of the exports not saved: unavailable")
@@ -1,5 +1,6 @@
 import datetime
 import json
+import time
 from codecs import BOM_UTF8
 from io import BytesIO, FileIO
 
@@ -8,7 +9,11 @@ from unittest.mock import MagicMock, patch, call
 
 import freezegun
 
+from gobcore.exceptions import GOBException
+
+import gobexport.product_logs as product_logs
 import gobexport.test as test
+from gobexport.objectstore_client import ObjectListing
 from gobexport.exporter.config.brk.utils import brk_filename
 
 
@@ -25,16 +30,6 @@ class TestExportTest(TestCase):
     def setUp(self):
         self.maxDiff = None
 
-    @patch('gobexport.test.logger', MagicMock())
-    def test_get_check(self):
-        checks = {
-            'key': 'value',
-            'any_{DATE}_key': 'any date value'
-        }
-        self.assertEqual(test._get_check(checks, 'key'), 'value')
-        self.assertEqual(test._get_check(checks, 'any_20200130_key'), 'any date value')
-        self.assertEqual(test._get_check(checks, 'some other key'), None)
-
     @patch('gobexport.test.logger', MagicMock())
     def test_low_high(self):
         low, high = test._get_low_high(0.5)
@@ -213,7 +208,7 @@ class TestExportTest(TestCase):
         }
         self.assertEqual(expected, actual)
 
-    @patch('gobexport.test.logger')
+    @patch('gobexport.analysis.logger')
     def test_get_analysis_log_status(self, mock_logger):
         b = b"a;b" + b"\n".join([b"1;2"] * 255_000)
         obj = BytesIO(b)
@@ -228,20 +223,23 @@ class TestExportTest(TestCase):
         mock_logger.info.assert_called_with("Checking lines 250,000")
 
     @patch('gobexport.test.logger', MagicMock())
-    def test_read_test(self):
-        obj = BytesIO(b'\xc3\x83')
+    def test_get_analysis_file(self):
+        with open('/tmp/get_analysis', mode='wb') as f:
+            f.write(BOM_UTF8 + b"a;b\n\xc3\x83;12\n")
 
-        with patch("gobexport.test.READ_CHUNK_SIZE", return_value=1):
-            # fails the first iteration, passes on the second
-            test._read_text(obj)
+        obj_info = {
+            "name": "any name",
+            "last_modified": datetime.datetime.now().isoformat(),
+            "bytes": 14,
+            "content_type": "text/csv"
+        }
+        obj = FileIO('/tmp/get_analysis', mode='rb')
+        analysis = test._get_analysis(obj_info, obj, 'tmp')
 
-            # fails after adding reading 4 extra bytes
-            with self.assertRaisesRegex(
-                UnicodeDecodeError,
-                "'utf-8' codec can't decode byte 0xc3 in position 0: invalid continuation byte"
-            ):
-                obj = BytesIO(b'\xc3\xc3\xc3\xc3\xc3')
-                test._read_text(obj)
+        self.assertTrue(obj.closed)
+        self.assertEqual((9, 2, 3, 3), (analysis['chars'], analysis['lines'], analysis['min_line'],
+                                        analysis['max_line']))
+        self.assertEqual((1, 2), (analysis['minlength_col_1'], analysis['maxlength_col_2']))
 
     @patch('gobexport.test.logger', MagicMock())
     def test_get_analysis_csv(self):
@@ -393,19 +391,19 @@ class TestExportTest(TestCase):
         self.assertTrue('any {DATE} file' in proposals)
 
     @patch('gobexport.test.logger', MagicMock())
-    @patch('gobexport.test.put_object')
-    def test_write_proposals(self, mock_put_object):
+    def test_write_proposals(self):
         conn_info = {
+            'client': MagicMock(),
             'connection': "any connection",
             'container': "any container"
         }
+        mock_put_object = conn_info['client'].put_object
         test._write_proposals(None, 'any catalogue', None, {})
         mock_put_object.assert_not_called()
 
         proposals = {'any proposal': 'any value'}
         test._write_proposals(conn_info, 'any catalogue', {}, proposals)
         mock_put_object.assert_called_with(
-            'any connection',
             'any container',
             'checks.any catalogue.json',
             content_type='application/json',
@@ -415,7 +413,6 @@ class TestExportTest(TestCase):
         proposals = {'any proposal': 'any value'}
         test._write_proposals(conn_info, 'any catalogue', {'any check': 'any value'}, proposals)
         mock_put_object.assert_called_with(
-            'any connection',
             'any container',
             'checks.any catalogue.proposal.json',
             content_type='application/json',
@@ -457,18 +454,19 @@ class TestExportTest(TestCase):
         }
         filename = "any filename"
 
-        obj_info, obj = test._get_file([], conn_info, filename)
+        obj_info, obj = test._get_file(ObjectListing('any container', '', []), conn_info, filename)
         self.assertIsNone(obj_info)
         self.assertIsNone(obj)
         mock_get_object.assert_not_called()
         mock_logger.assert_not_called()
 
         mock_get_object.return_value = b"get object"
-        obj_info, obj = test._get_file([{'name': filename}], conn_info, filename)
-        self.assertEqual(obj_info, {'name': filename})
+        obj_info, obj = test._get_file(ObjectListing('any container', '', [{'name': filename, 'last_modified': '100'}]),
+                                       conn_info, filename)
+        self.assertEqual(obj_info, {'name': filename, 'last_modified': '100'})
         self.assertEqual(obj.read(), b"get object")
-        mock_get_object.assert_called_with('any connection', {'name': filename}, 'any container',
-                                           chunk_size=None)
+        mock_get_object.assert_called_with('any connection', {'name': filename, 'last_modified': '100'},
+                                           'any container', chunk_size=None)
         mock_logger.info.assert_called_with(f"Downloading {filename}")
         mock_logger.reset_mock()
 
@@ -477,62 +475,96 @@ class TestExportTest(TestCase):
             {'name': '20201101yz', 'last_modified': '100'},
             {'name': '20201103yz', 'last_modified': '300'},
             {'name': '20201102yz', 'last_modified': '200'},
+            {'name': '20201104yz', 'last_modified': '300'},
+            {'name': '20201104yz.segments/00000000', 'last_modified': '400'},
         ]
         mock_get_object.return_value = b"get object"
-        obj_info, obj = test._get_file(mock_container_list, conn_info, filename)
+        obj_info, obj = test._get_file(ObjectListing('any container', '', mock_container_list), conn_info, filename)
         self.assertEqual(obj_info, {'name': '20201103yz', 'last_modified': '300'})
-        mock_logger.info.assert_has_calls(
-            [call('Downloading 20201101yz'), call('Downloading 20201103yz')]
-        )
+
+        # Only the most recent file is downloaded
+        mock_logger.info.assert_called_once_with('Downloading 20201103yz')
 
     @patch('gobexport.test.logger', MagicMock())
     @patch('gobexport.test.get_object')
+    @patch('gobexport.test._get_thread_connection', lambda connection: connection)
+    @patch('gobexport.test._CHUNKSIZE', 4)
     def test_get_file_chunks(self, mock_get_object):
+        contents = b"get object"
+
+        def get_object(container, name, headers, resp_chunk_size):
+            start, end = map(int, headers['Range'][len('bytes='):].split('-'))
+            return {}, iter([contents[start:end + 1]])
+
         filename = '20201101yz'
-        conn_info = {'connection': "any connection", 'container': "any container"}
-        mock_container_list = [{'name': '20201101yz', 'last_modified': '100', "bytes": test._OFFLOAD_THRESHOLD + 1}]
-        mock_get_object.return_value = BytesIO(b"get object")
+        conn_info = {'connection': MagicMock(), 'container': "any container"}
+        conn_info['connection'].get_object.side_effect = get_object
+        mock_container_list = [{'name': '20201101yz', 'last_modified': '100', "bytes": len(contents)}]
 
-        obj_info, obj = test._get_file(mock_container_list, conn_info, filename, destination='/tmp/mock_get_file')
+        with patch('gobexport.test._OFFLOAD_THRESHOLD', 1):
+            obj_info, obj = test._get_file(ObjectListing('any container', '', mock_container_list), conn_info,
+                                           filename, destination='/tmp/mock_get_file')
 
+        # The file is downloaded in parts
         self.assertIsInstance(obj, FileIO)
         self.assertEqual(open('/tmp/mock_get_file/{DATE}yz', mode='rb').read(), b'get object')
+        conn_info['connection'].get_object.assert_has_calls([
+            call('any container', '20201101yz', headers={'Range': 'bytes=0-3'}, resp_chunk_size=test.READ_CHUNK_SIZE),
+            call('any container', '20201101yz', headers={'Range': 'bytes=4-7'}, resp_chunk_size=test.READ_CHUNK_SIZE),
+            call('any container', '20201101yz', headers={'Range': 'bytes=8-9'}, resp_chunk_size=test.READ_CHUNK_SIZE),
+        ], any_order=True)
+        mock_get_object.assert_not_called()
+
+        # Incomplete parts
+        contents = b"get"
+        with patch('gobexport.test._OFFLOAD_THRESHOLD', 1), \
+                self.assertRaisesRegex(GOBException, "Download of 20201101yz failed, 3 of 4 bytes received at offset 0"):
+            test._get_file(ObjectListing('any container', '', mock_container_list), conn_info, filename,
+                           destination='/tmp/mock_get_file')
+
+        # Unknown size
+        mock_get_object.return_value = BytesIO(b"get object")
+        mock_container_list = [{'name': '20201101yz', 'last_modified': '100', "bytes": 0}]
+        test._get_file(ObjectListing('any container', '', mock_container_list), conn_info, filename,
+                       destination='/tmp/mock_get_file')
+        self.assertEqual(open('/tmp/mock_get_file/{DATE}yz', mode='rb').read(), b'get object')
         mock_get_object.assert_called_with(
-            connection='any connection',
+            connection=conn_info['connection'],
             object_meta_data=mock_container_list[0],
             dirname='any container',
             chunk_size=test._CHUNKSIZE
         )
 
-        mock_get_object.return_value = BytesIO(b"get object")
-        mock_container_list = [{'name': '20201101yz', 'last_modified': '100', "bytes": 0}]
-        test._get_file(mock_container_list, conn_info, filename, destination='/tmp/mock_get_file')
-        self.assertEqual(open('/tmp/mock_get_file/{DATE}yz', mode='rb').read(), b'get object')
-
     @patch('gobexport.test.logger')
     @patch('gobexport.test._get_file')
     @patch('gobexport.test._write_proposals')
     @patch('gobexport.test._get_checks')
-    @patch('gobexport.test.get_datastore_config')
-    @patch('gobexport.test.DatastoreFactory.get_datastore')
+    @patch('gobexport.test.get_client')
     @patch('gobexport.test.distribute_file')
     @patch('gobexport.test.CONTAINER_BASE', 'development')
-    @patch('gobexport.test.get_full_container_list', lambda x, y: ["list"])
-    def test_test(self, mock_distribute, mock_get_datastore, mock_get_datastore_config, mock_get_checks, mock_write_proposals, mock_get_file, mock_logger):
+    def test_test(self, mock_distribute, mock_get_client, mock_get_checks, mock_write_proposals, mock_get_file, mock_logger):
         catalogue = "any catalogue"
-        connection = mock_get_datastore.return_value.connection
+        client = mock_get_client.return_value
+        connection = client.connection
         config = MockConfig()
 
         test._export_config[catalogue] = []
         mock_get_checks.return_value = {}
         test.test(catalogue)
         mock_write_proposals.assert_called_with(
-            {'connection': connection, 'container': 'development'},
+            {'client': client, 'connection': connection, 'container': 'development'},
             'any catalogue',
             {},
             {})
 
-        mock_get_datastore.assert_called_with(mock_get_datastore_config.return_value)
+        mock_get_client.assert_called_with(test.GOB_OBJECTSTORE)
+
+        # The exported files and the checks of the catalogue are listed at the start of the test
+        client.listing.assert_has_calls([
+            call('development', f'{test.EXPORT_DIR}/any catalogue/', refresh=True),
+            call('development', 'checks.any catalogue.', refresh=True),
+        ])
+        mock_get_checks.assert_called_with(client.listing.return_value, mock.ANY, catalogue)
 
         filename = 'any filename'
         config.products = {
@@ -546,11 +578,11 @@ class TestExportTest(TestCase):
 
         test._export_config[catalogue] = [config]
         mock_get_checks.return_value = {}
-        mock_get_file.return_value = None, None
+        client.listing.return_value.latest.return_value = None
 
         test.test(catalogue)
         mock_write_proposals.assert_called_with(
-            {'connection': connection, 'container': 'development'},
+            {'client': client, 'connection': connection, 'container': 'development'},
             'any catalogue',
             {},
             {})
@@ -562,10 +594,14 @@ class TestExportTest(TestCase):
             'bytes': 100,
             'content_type': 'any content typs'
         }
+        client.listing.return_value.latest.return_value = obj_info
+        client.listing.return_value.find.return_value = []
         mock_get_file.return_value = obj_info, BytesIO(b"123")
         test.test(catalogue)
+        mock_get_file.assert_called_with(client.listing.return_value, mock.ANY, "matched filename",
+                                         destination=mock.ANY)
         mock_write_proposals.assert_called_with(
-            {'connection': connection, 'container': 'development'},
+            {'client': client, 'connection': connection, 'container': 'development'},
             'any catalogue',
             {},
             {filename: {'age_hours': [0, 24], 'bytes': [100, None], 'first_bytes': [mock.ANY]}})
@@ -582,7 +618,7 @@ class TestExportTest(TestCase):
         mock_get_file.return_value = obj_info, BytesIO(b"123")
         test.test(catalogue)
         mock_write_proposals.assert_called_with(
-            {'connection': connection, 'container': 'development'},
+            {'client': client, 'connection': connection, 'container': 'development'},
             'any catalogue',
             {filename: {'bytes': [100]}},
             {filename: {'age_hours': [0, 24], 'bytes': [100, None], 'first_bytes': [mock.ANY]}})
@@ -596,21 +632,140 @@ class TestExportTest(TestCase):
         mock_get_file.return_value = obj_info, BytesIO(b"123")
         test.test(catalogue)
         mock_write_proposals.assert_called_with(
-            {'connection': connection, 'container': 'development'},
+            {'client': client, 'connection': connection, 'container': 'development'},
             'any catalogue',
             {filename: {'bytes': [0]}},
             {filename: {'age_hours': [0, 24], 'bytes': [100, None], 'first_bytes': [mock.ANY]}})
 
         # Check case in which check is defined, but filename is missing
-        mock_get_file.return_value = None, None
+        client.listing.return_value.latest.return_value = None
         test.test(catalogue)
         mock_logger.error.assert_called_with("File any filename MISSING")
 
+    @patch('gobexport.test.EXPORT_TEST_WORKERS', 3)
+    @patch('gobexport.test._test_file')
+    def test_test_files(self, mock_test_file):
+        logger = MagicMock()
+
+        def test_file(listing, conn_info, checks, catalogue, filename, tmp_dir, full_analysis):
+            product_logs.logger.info(f"start {filename}")
+            time.sleep({'a': 0.03, 'b': 0.01, 'c': 0.02}.get(filename, 0))
+            product_logs.logger.info(f"end {filename}")
+            if filename == 'x':
+                raise ValueError(filename)
+            return None if filename == 'c' else {'bytes': filename}
+
+        mock_test_file.side_effect = test_file
+
+        with patch('gobexport.product_logs.gob_logger', logger):
+            result = list(test._test_files('listing', 'conn_info', 'checks', 'cat', ['a', 'b', 'c', 'd'], 'tmp',
+                                           True))
+
+            # The files are tested at the same time, the results and messages are in the order of the files
+            self.assertEqual([('a', {'bytes': 'a'}), ('b', {'bytes': 'b'}), ('d', {'bytes': 'd'})], result)
+            self.assertEqual([call(f"{event} {filename}") for filename in 'abcd' for event in ('start', 'end')],
+                             logger.info.call_args_list)
+            mock_test_file.assert_any_call('listing', 'conn_info', 'checks', 'cat', 'a', 'tmp', True)
+
+            with self.assertRaisesRegex(ValueError, 'x'):
+                list(test._test_files('listing', 'conn_info', 'checks', 'cat', ['x'] + ['b'] * 10, 'tmp'))
+
+        # Files that have not been started are not tested after a failure
+        self.assertLess(mock_test_file.call_count, 4 + 11)
+
+    @patch('gobexport.test.get_object')
+    def test_test_file_connection(self, mock_get_object):
+        conn_info = {'client': MagicMock(), 'connection': 'main thread connection', 'container': 'any container'}
+        listing = ObjectListing('any container', '', [{'name': '_tmp/cat/f', 'last_modified': '1', 'bytes': 0,
+                                                       'content_type': 'any'}])
+        mock_get_object.return_value = b''
+
+        with patch('gobexport.test.logger'):
+            test._test_file(listing, conn_info, {}, 'cat', 'f', None)
+
+        # The file is downloaded with the connection of the thread
+        self.assertIs(conn_info['client'].connection, mock_get_object.call_args[0][0])
+
+    @patch('gobexport.test.logger', MagicMock())
+    @patch('gobexport.test.get_object')
+    def test_get_manifest_analysis(self, mock_get_object):
+        item = {'name': '_tmp/cat/f_20240102.csv', 'last_modified': datetime.datetime.now().isoformat(),
+                'bytes': 3, 'content_type': 'text/csv'}
+        listing = ObjectListing('any container', '', [
+            item,
+            {'name': '_tmp/cat/f_20240101.csv.statistics.json'},
+            {'name': '_tmp/cat/f_20240102.csv.statistics.json'},
+        ])
+        connection = MagicMock()
+        connection.head_object.return_value = {'etag': '"abc"'}
+        conn_info = {'connection': connection, 'container': 'any container'}
+        mock_get_object.return_value = json.dumps({
+            'etag': 'abc', 'content_type': 'text/csv', 'statistics': {'first_bytes': 'x', 'chars': 3}
+        }).encode()
+
+        # The statistics of the manifest of the file are used, with the age and the size of the file
+        self.assertEqual({'age_hours': mock.ANY, 'bytes': 3, 'first_bytes': 'x', 'chars': 3},
+                         test._get_manifest_analysis(listing, conn_info, item, {'chars': [3]}))
+        self.assertEqual('_tmp/cat/f_20240102.csv.statistics.json', mock_get_object.call_args[0][1]['name'])
+        connection.head_object.assert_called_with('any container', '_tmp/cat/f_20240102.csv')
+
+        # The file has changed since the manifest has been written
+        connection.head_object.return_value = {'etag': 'def'}
+        self.assertIsNone(test._get_manifest_analysis(listing, conn_info, item, None))
+
+        connection.head_object.side_effect = GOBException
+        self.assertIsNone(test._get_manifest_analysis(listing, conn_info, item, None))
+
+        # The uniqueness of the columns of the check has to be in the manifest
+        connection.head_object.side_effect = None
+        connection.head_object.return_value = {'etag': 'abc'}
+        self.assertIsNone(test._get_manifest_analysis(listing, conn_info, item, {'unique_cols': [[1]]}))
+
+        mock_get_object.return_value = json.dumps({
+            'etag': 'abc', 'content_type': 'text/csv', 'unique_cols': [[1], ['a', 'b']],
+            'statistics': {'first_bytes': 'x', '[1]_is_unique': True, "['a','b']_is_unique": False}
+        }).encode()
+        self.assertEqual(
+            {'age_hours': mock.ANY, 'bytes': 3, 'first_bytes': 'x', '[1]_is_unique': True,
+             "['a','b']_is_unique": False},
+            test._get_manifest_analysis(listing, conn_info, item, {'unique_cols': [[1], ['a', 'b']]}))
+        self.assertIsNone(test._get_manifest_analysis(listing, conn_info, item, {'unique_cols': [[2]]}))
+        mock_get_object.reset_mock()
+
+        # No manifest
+        self.assertIsNone(test._get_manifest_analysis(listing, conn_info, item | {'name': '_tmp/cat/g.csv'}, None))
+        mock_get_object.assert_not_called()
+
+    @patch('gobexport.test.distribute_file')
+    @patch('gobexport.test._get_file')
+    @patch('gobexport.test._get_manifest_analysis')
+    def test_test_file_manifest(self, mock_get_manifest_analysis, mock_get_file, mock_distribute_file):
+        conn_info = {'client': MagicMock(), 'connection': 'connection', 'container': 'any container'}
+        item = {'name': '_tmp/cat/f', 'last_modified': datetime.datetime.now().isoformat(), 'bytes': 3,
+                'content_type': 'plain/text'}
+        listing = ObjectListing('any container', '', [item])
+        checks = {'f': {'bytes': [3]}}
+        mock_get_manifest_analysis.return_value = {'bytes': 3}
+        mock_get_file.side_effect = lambda *args, **kwargs: (item, BytesIO(b'abc'))
+
+        with patch('gobexport.test.logger'):
+            self.assertEqual({'bytes': 3}, test._test_file(listing, conn_info, checks, 'cat', 'f', None))
+            mock_get_manifest_analysis.assert_called_with(listing, mock.ANY, item, {'bytes': [3]})
+            mock_get_file.assert_not_called()
+            mock_distribute_file.assert_called_once()
+
+            # The file is analysed if the manifest is not up to date, or on request
+            for manifest_analysis, full_analysis in [(None, False), ({'bytes': 3}, True)]:
+                mock_get_manifest_analysis.return_value = manifest_analysis
+                stats = test._test_file(listing, conn_info, checks, 'cat', 'f', None, full_analysis)
+                self.assertEqual(3, stats['chars'])
+            self.assertEqual(2, mock_get_file.call_count)
+            self.assertEqual(3, mock_distribute_file.call_count)
+
     @patch('gobexport.test.logger')
     @patch('gobexport.test._get_file')
     @patch('gobexport.test._get_checks', lambda x, y, z: {})
-    @patch('gobexport.test.DatastoreFactory.get_datastore', MagicMock())
-    @patch('gobexport.test.get_full_container_list', lambda x, y: ["list"])
+    @patch('gobexport.test.get_client', MagicMock())
     @patch('gobexport.exporter.config.brk.utils._get_filename_date', lambda: datetime.date(2022, 7, 7))
     def test_filter_filenames(self, mock_get_file, mock_logger):
         catalogue = "any catalogue"
@@ -671,16 +826,45 @@ class TestExportTest(TestCase):
     @patch("gobexport.test.cleanup_datefiles")
     def test_distribute_file(self, mock_cleanup_datefiles):
         conn_info = {
+            'client': MagicMock(),
             'connection': MagicMock(),
             'container': "any container"
         }
         filename = f"{test.EXPORT_DIR}/any filename"
         test.distribute_file(conn_info, filename)
-        conn_info['connection'].copy_object.assert_called_with(
+        conn_info['client'].copy_object.assert_called_with(
             test.CONTAINER_BASE,
             filename,
             f"{test.CONTAINER_BASE}/any filename")
         mock_cleanup_datefiles.assert_called_with(
-            conn_info['connection'],
+            conn_info['client'],
             test.CONTAINER_BASE,
             "any filename")
+
+    def test_get_product_filenames(self):
+        product = {
+            'filename': 'SHP/any_{DATE}.shp',
+            'extra_files': [{'filename': 'SHP/any_{DATE}.dbf'}]
+        }
+        container_list = ObjectListing('container', f"{test.EXPORT_DIR}/cat/", [
+            {'name': f"{test.EXPORT_DIR}/cat/SHP/any_20240101.shp"},
+            {'name': f"{test.EXPORT_DIR}/cat/SHP/any_20240101_part2.shp"},
+            {'name': f"{test.EXPORT_DIR}/cat/SHP/any_20240101_part3.shp"},
+            {'name': f"{test.EXPORT_DIR}/cat/SHP/any_20240101_part5.shp"},
+        ])
+
+        # Parts are only looked up for products that are split into parts
+        self.assertEqual(['SHP/any_{DATE}.shp', 'SHP/any_{DATE}.dbf'],
+                         test._get_product_filenames(container_list, 'cat', product))
+
+        product['compression'] = 'gzip'
+        self.assertEqual(['SHP/any_{DATE}.shp.gz', 'SHP/any_{DATE}.dbf'],
+                         test._get_product_filenames(container_list, 'cat', product))
+        del product['compression']
+
+        product['max_part_size'] = 100
+        self.assertEqual([
+            'SHP/any_{DATE}.shp', 'SHP/any_{DATE}.dbf',
+            'SHP/any_{DATE}_part2.shp', 'SHP/any_{DATE}_part2.dbf',
+            'SHP/any_{DATE}_part3.shp', 'SHP/any_{DATE}_part3.dbf',
+        ], test._get_product_filenames(container_list, 'cat', product))
@@ -1,7 +1,8 @@
 from unittest import TestCase
-from unittest.mock import ANY
+from unittest.mock import ANY, patch
 
-from gobexport.utils import resolve_config_filenames
+from gobexport.utils import FULL_DECODER, ORJSON_DECODER, ProjectedJsonDecoder, get_decoder, json_loads, \
+    resolve_config_filenames
 
 
 class TestUtils(TestCase):
@@ -63,3 +64,48 @@ class TestUtils(TestCase):
         resolve_config_filenames(config)
 
         self.assertEqual(expected, config.products)
+
+
+class TestJsonLoads(TestCase):
+
+    def test_json_loads(self):
+        self.assertEqual({'a': [1, 2.5, None, True]}, json_loads(b'{"a": [1, 2.5, null, true]}'))
+        self.assertEqual({'a': 'é'}, json_loads('{"a": "é"}'))
+
+        # Values that only the full decoder accepts
+        self.assertEqual({'a': 2 ** 64, 'b': float('inf')}, json_loads('{"a": 18446744073709551616, "b": Infinity}'))
+        self.assertIsInstance(json_loads('{"a": 18446744073709551616}', ORJSON_DECODER)['a'], float)
+        with patch('gobexport.utils.logger'), self.assertRaises(ValueError):
+            json_loads('{"b": Infinity}', ORJSON_DECODER)
+
+        with patch('gobexport.utils.logger') as mock_logger, self.assertRaises(ValueError):
+            json_loads(b'{"a"')
+        self.assertTrue(mock_logger.error.call_args.args[0].startswith("Deserialization failed for item b'{\"a\"': "))
+
+        # Long items are truncated
+        with patch('gobexport.utils.logger') as mock_logger, patch('gobexport.utils.MAX_LOGGED_ITEM_LENGTH', 3), \
+                self.assertRaises(ValueError):
+            json_loads('{"abc"')
+        self.assertTrue(mock_logger.error.call_args.args[0].startswith("Deserialization failed for item '{\"a'...: "))
+
+    def test_projected_json_loads(self):
+        decoder = get_decoder(['a', 'b', 'missing'])
+        self.assertIsInstance(decoder, ProjectedJsonDecoder)
+
+        item = b'{"a": {"b": [1, {"c": null}]}, "b": [true, "x"], "c": 1.5, "d": {"e": 1}}'
+        self.assertEqual({'a': {'b': [1, {'c': None}]}, 'b': [True, 'x']}, json_loads(item, decoder))
+        self.assertEqual({'a': 'é', 'b': 1.5}, json_loads('{"a": "é", "b": 1.5, "c": 1}', decoder))
+
+        with patch('gobexport.utils.logger'), self.assertRaises(ValueError):
+            json_loads(b'{"a"', decoder)
+
+    def test_get_decoder(self):
+        self.assertIs(FULL_DECODER, get_decoder())
+        self.assertIs(FULL_DECODER, get_decoder(None))
+
+        with patch('gobexport.utils.MAX_PROJECTED_FIELDS', 2):
+            self.assertIsInstance(get_decoder(['a', 'b']), ProjectedJsonDecoder)
+            self.assertIs(ORJSON_DECODER, get_decoder(['a', 'b', 'c']))
+
+        with patch('gobexport.utils.simdjson', None):
+            self.assertIs(ORJSON_DECODER, get_decoder(['a']))